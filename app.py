@@ -15,7 +15,8 @@ import threading
 import time
 import atexit
 
-from modules.shared.database import init_db
+from modules.shared.database import init_db, init_app as init_db_app, get_pool_stats
+from modules.shared.cache import get_cache_stats
 
 # Import all module blueprints
 from modules.auth.routes import auth_bp
@@ -48,6 +49,9 @@ from modules.sync.api_routes import sync_api_bp
 app = Flask(__name__, template_folder='frontend/screens/templates', static_folder='frontend/assets/static')
 logger = logging.getLogger(__name__)
 
+# Pooled DB connections: one connection per request, returned on teardown
+init_db_app(app)
+
 # Enable CORS for all domains and methods (for mobile app)
 CORS(app, origins="*", methods=["GET", "POST", "PUT", "DELETE", "OPTIONS"], 
      allow_headers=["Content-Type", "Authorization", "X-Requested-With"])
@@ -144,10 +148,12 @@ app.register_blueprint(sync_api_bp)
 
 # Background task for cleanup
 def cleanup_task():
-    """Background task to cleanup inactive sessions"""
+    """Background task to cleanup inactive sessions and compact the sync log"""
+    from modules.shared.sync_log import maybe_compact_sync_log
     while True:
         try:
             sync_service.cleanup_inactive_sessions()
+            maybe_compact_sync_log()
             time.sleep(60)  # Run every minute
         except Exception as e:
             logger.error(f"❌ Cleanup task error: {e}")
@@ -166,6 +172,12 @@ def start_background_services():
         print("✅ Stock monitoring service started")
     except Exception as e:
         print(f"❌ Failed to start stock monitoring service: {e}")
+    try:
+        from modules.shared.outbox import start_outbox_worker
+        start_outbox_worker(app)
+        print("✅ Outbox worker started")
+    except Exception as e:
+        print(f"❌ Failed to start outbox worker: {e}")
 
 # Start background services in a separate thread to avoid blocking startup
 services_thread = threading.Thread(target=start_background_services, daemon=True)
@@ -177,6 +189,10 @@ def cleanup_on_exit():
     try:
         from modules.notifications.stock_monitor import stop_stock_monitor
         stop_stock_monitor()
+        from modules.shared.outbox import stop_outbox_worker
+        stop_outbox_worker()
+        from modules.shared.sync_log import sync_fanout
+        sync_fanout.stop()
         print("✅ Background services stopped")
     except Exception as e:
         print(f"❌ Error stopping background services: {e}")
@@ -199,7 +215,7 @@ def initialize_database():
     print("✅ Database initialized successfully")
 
 # Import auth decorators for CMS
-from modules.shared.auth_decorators import require_cms_auth
+from modules.shared.auth_decorators import require_cms_auth, require_internal
 from flask import render_template, redirect, url_for, session, flash
 
 # CMS Routes
@@ -324,12 +340,60 @@ def print_startup_info():
     print("✅ All modules loaded successfully!")
     print()
 
-# Health check endpoint for Render
+# Health check endpoint for Render; the /health/* detail endpoints are internal only
 @app.route('/health')
 def health_check():
     """Health check endpoint for monitoring"""
     return {'status': 'healthy', 'service': 'BizPulse ERP'}, 200
 
+@app.route('/health/db')
+@require_internal
+def db_pool_health():
+    """Database connection pool metrics"""
+    try:
+        return {'status': 'healthy', 'pool': get_pool_stats()}, 200
+    except Exception as e:
+        return {'status': 'unhealthy', 'error': str(e)}, 503
+
+@app.route('/health/cache')
+@require_internal
+def cache_health():
+    """Per-tenant result cache hit/miss counters (per worker process)"""
+    try:
+        return {'status': 'healthy', 'cache': get_cache_stats()}, 200
+    except Exception as e:
+        return {'status': 'unhealthy', 'error': str(e)}, 503
+
+@app.route('/health/outbox')
+@require_internal
+def outbox_health():
+    """Outbox queue depth by status and worker counters"""
+    try:
+        from modules.shared.outbox import get_outbox_stats
+        return {'status': 'healthy', 'outbox': get_outbox_stats()}, 200
+    except Exception as e:
+        return {'status': 'unhealthy', 'error': str(e)}, 503
+
+@app.route('/health/barcodes')
+@require_internal
+def barcode_index_health():
+    """In-memory barcode index size and hit/fallback/miss counters (per worker process)"""
+    try:
+        from modules.shared.barcode_index import get_barcode_index_stats
+        return {'status': 'healthy', 'barcode_index': get_barcode_index_stats()}, 200
+    except Exception as e:
+        return {'status': 'unhealthy', 'error': str(e)}, 503
+
+@app.route('/health/stock-monitor')
+@require_internal
+def stock_monitor_health():
+    """Last stock monitor sweep: duration, tenants, candidates and alerts per shard"""
+    try:
+        from modules.notifications.stock_monitor import get_stock_monitor_stats
+        return {'status': 'healthy', 'stock_monitor': get_stock_monitor_stats()}, 200
+    except Exception as e:
+        return {'status': 'unhealthy', 'error': str(e)}, 503
+
 if __name__ == '__main__':
     initialize_database()
     print_startup_info()
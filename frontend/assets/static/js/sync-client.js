@@ -11,6 +11,9 @@ class SyncClient {
         this.maxReconnectAttempts = 5;
         this.reconnectDelay = 1000; // Start with 1 second
         this.lastSyncTimestamp = null;
+        this.lastSyncSeq = null; // Cursor into the server's sync log
+        this.syncVersions = null; // Per-table row version already synced (delta sync)
+        this.initialSyncDone = false;
         this.syncCallbacks = {};
         this.deviceId = this.generateDeviceId();
         
@@ -70,7 +73,10 @@ class SyncClient {
             query: {
                 user_id: userId,
                 platform: platform,
-                device_id: this.deviceId
+                device_id: this.deviceId,
+                delta: 1,
+                // One data_sync_batch frame per burst of changes instead of a message per change
+                batch: (typeof DecompressionStream !== 'undefined') ? 'gzip' : 'json'
             },
             transports: ['websocket', 'polling'],
             timeout: 10000,
@@ -89,6 +95,9 @@ class SyncClient {
             this.reconnectDelay = 1000;
             this.showSyncStatus('Connected', 'success');
             
+            // Only what changed since the last sync (everything on first connect)
+            this.requestChanges();
+            
             // Start heartbeat
             this.startHeartbeat();
         });
@@ -116,16 +125,48 @@ class SyncClient {
             console.log('📡 Initial sync received:', data);
             if (data.success && data.data) {
                 this.lastSyncTimestamp = data.data.sync_timestamp;
+                if (data.sync_seq !== undefined) {
+                    this.lastSyncSeq = data.sync_seq;
+                }
                 this.handleInitialSync(data.data);
                 this.showSyncStatus('Synced', 'success');
             }
         });
         
+        this.socket.on('delta_sync', async (data) => {
+            if (!data.success) return;
+            try {
+                let changes = data.data;
+                if (data.encoding === 'gzip') {
+                    const stream = new Blob([data.payload]).stream().pipeThrough(new DecompressionStream('gzip'));
+                    changes = await new Response(stream).json();
+                }
+                this.handleDeltaSync(changes);
+            } catch (error) {
+                console.error('❌ Delta sync decode error:', error);
+                this.showSyncStatus('Sync Error', 'error');
+            }
+        });
+        
         this.socket.on('data_sync', (data) => {
             console.log('🔄 Data sync received:', data);
             this.handleDataSync(data);
         });
         
+        this.socket.on('data_sync_batch', async (data) => {
+            try {
+                let frame = data.frame;
+                if (data.encoding === 'gzip') {
+                    const stream = new Blob([data.payload]).stream().pipeThrough(new DecompressionStream('gzip'));
+                    frame = await new Response(stream).json();
+                }
+                this.handleDataSyncBatch(frame);
+            } catch (error) {
+                console.error('❌ Batch sync decode error:', error);
+                this.requestSyncViaAPI(false);
+            }
+        });
+        
         this.socket.on('force_sync', (data) => {
             console.log('⚡ Force sync received:', data);
             this.handleForceSync(data);
@@ -224,6 +265,7 @@ class SyncClient {
         }
         
         this.socket.emit('request_sync', {
+            after_seq: this.lastSyncSeq,
             since_timestamp: this.lastSyncTimestamp,
             include_full_data: includeFullData
         });
@@ -232,6 +274,50 @@ class SyncClient {
         this.showSyncStatus('Syncing...', 'info');
     }
     
+    // Ask for rows changed since our per-table versions
+    requestChanges() {
+        if (!this.socket) return;
+        this.socket.emit('request_changes', {
+            since: this.syncVersions || {},
+            compress: (typeof DecompressionStream !== 'undefined') ? 'gzip' : ''
+        });
+    }
+    
+    handleDeltaSync(changes) {
+        this.syncVersions = this.syncVersions || {};
+        
+        Object.entries(changes.tables).forEach(([table, page]) => {
+            if (page.reset) {
+                // Tombstones we missed were pruned: reload this table from scratch
+                delete this.syncVersions[table];
+                this.triggerCallback(`${table}_reset`, {});
+                return;
+            }
+            if (page.rows.length) {
+                this.triggerCallback(`${table}_synced`, page.rows);
+            }
+            if (page.deleted.length) {
+                this.triggerCallback(`${table}_deleted`, page.deleted);
+            }
+            this.syncVersions[table] = page.version;
+        });
+        
+        if (this.lastSyncSeq === null || changes.sync_seq > this.lastSyncSeq) {
+            this.lastSyncSeq = changes.sync_seq;
+        }
+        this.lastSyncTimestamp = changes.sync_timestamp;
+        
+        const reset = Object.values(changes.tables).some(page => page.reset);
+        if (changes.has_more || reset) {
+            this.requestChanges();
+            return;
+        }
+        
+        this.triggerCallback(this.initialSyncDone ? 'delta_sync_complete' : 'initial_sync_complete', changes);
+        this.initialSyncDone = true;
+        this.showSyncStatus('Synced', 'success');
+    }
+    
     // Handle sync events
     handleInitialSync(data) {
         // Update local data with server data
@@ -255,6 +341,10 @@ class SyncClient {
         const event = data.event;
         const sourceSession = data.source_session;
         
+        if (event.seq !== undefined && (this.lastSyncSeq === null || event.seq > this.lastSyncSeq)) {
+            this.lastSyncSeq = event.seq;
+        }
+        
         // Don't process events from this device
         if (sourceSession === this.socket?.id) {
             return;
@@ -271,6 +361,37 @@ class SyncClient {
         this.showSyncNotification(`Data ${event.event_type}d on another device`, 'info');
     }
     
+    handleDataSyncBatch(frame) {
+        console.log(`🔄 Data sync batch received: seq ${frame.first_seq}-${frame.last_seq}`);
+        const events = frame.events.map(row => {
+            const event = {};
+            frame.fields.forEach((field, i) => { event[field] = row[i]; });
+            return event;
+        });
+        
+        const ownSession = this.socket?.id;
+        const changes = [];
+        events.forEach(event => {
+            if (event.seq !== undefined && (this.lastSyncSeq === null || event.seq > this.lastSyncSeq)) {
+                this.lastSyncSeq = event.seq;
+            }
+            if (event.source_session === ownSession) return;
+            changes.push({
+                event_type: event.event_type,
+                table: event.data.table,
+                record: event.data.record,
+                timestamp: event.timestamp
+            });
+        });
+        if (!changes.length) return;
+        
+        changes.forEach(change => this.triggerCallback('data_changed', change));
+        this.triggerCallback('data_batch_changed', changes);
+        this.showSyncNotification(
+            changes.length === 1 ? `Data ${changes[0].event_type}d on another device`
+                                 : `${changes.length} changes synced from another device`, 'info');
+    }
+    
     handleForceSync(data) {
         this.lastSyncTimestamp = data.timestamp;
         this.handleInitialSync(data.latest_data);
@@ -290,10 +411,34 @@ class SyncClient {
     
     async requestSyncViaAPI(includeFullData = false) {
         try {
+            // Catch up from the last seen seq; fall back to a full snapshot
+            if (!includeFullData && this.lastSyncSeq !== null) {
+                let hasMore = true;
+                while (hasMore) {
+                    const response = await fetch(`/api/sync/pending-events?after_seq=${this.lastSyncSeq}`);
+                    if (!response.ok) break;
+                    const result = await response.json();
+                    if (!result.success || result.data.reset_required) break;
+                    result.data.events.forEach(event => this.handleDataSync({
+                        event: event,
+                        source_session: event.source_session
+                    }));
+                    this.lastSyncSeq = result.data.next_after_seq;
+                    hasMore = result.data.has_more;
+                }
+                if (!hasMore) {
+                    this.showSyncStatus('Synced (API)', 'success');
+                    return;
+                }
+            }
+            
             const response = await fetch('/api/sync/latest-data');
             if (response.ok) {
                 const result = await response.json();
                 if (result.success) {
+                    if (result.sync_seq !== undefined) {
+                        this.lastSyncSeq = result.sync_seq;
+                    }
                     this.handleInitialSync(result.data);
                     this.showSyncStatus('Synced (API)', 'success');
                 }
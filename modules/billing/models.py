@@ -4,6 +4,7 @@ COPIED AS-IS from app_original_backup.py
 """
 
 from modules.shared.database import get_db_connection
+from modules.shared.stock_ledger import post_movement, set_stock
 
 class BillingModels:
     
@@ -69,11 +70,9 @@ class BillingModels:
         """Update product stock after sale"""
         conn = get_db_connection()
         try:
-            conn.execute("""UPDATE products SET stock = CASE 
-                    WHEN stock - ? >= 0 THEN stock - ?
-                    ELSE 0
-                END 
-                WHERE id = ?""", (quantity, quantity, product_id))
+            # Never below zero: sell what is left if the full quantity is not available
+            if post_movement(conn, product_id, -quantity, 'sale', require_available=True) is None:
+                set_stock(conn, product_id, 0, reference_type='sale')
             conn.commit()
             return True
         finally:
@@ -6,6 +6,7 @@ COPIED AS-IS from app_original_backup.py
 from flask import Blueprint, request, jsonify, session
 from .service import BillingService
 from modules.shared.auth_decorators import require_auth
+from modules.shared.pagination import decode_cursor, page_size
 
 billing_bp = Blueprint('billing', __name__)
 billing_service = BillingService()
@@ -20,11 +21,22 @@ def get_user_id_from_session():
 
 @billing_bp.route('/api/bills', methods=['GET'])
 def get_bills():
-    """Get all bills with customer information - Mobile ERP Style - Filtered by user"""
+    """
+    Bills with customer information, newest first - Mobile ERP Style - Filtered by user
+    Pages of ?limit= (default 500); the next page is ?cursor=<X-Next-Cursor header>
+    """
     try:
         user_id = get_user_id_from_session()
-        result = billing_service.get_all_bills(user_id)
-        return jsonify(result)
+        cursor = decode_cursor(request.args.get('cursor'))
+        bills, next_cursor = billing_service.get_bills_page(
+            user_id, page_size(request.args.get('limit'), default=500), cursor
+        )
+        response = jsonify(bills)
+        if next_cursor:
+            response.headers['X-Next-Cursor'] = next_cursor
+        return response
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
@@ -3,52 +3,42 @@ Billing service
 UPDATED to use new transaction-based stock system
 """
 
-from modules.shared.database import get_db_connection, generate_id
+from modules.shared.database import get_db_connection, generate_id, bulk_insert
+from modules.shared.bill_summary import summarize_items
+from modules.shared.costing import unit_costs
+from modules.shared.sales_rollup import record_bill
+from modules.shared.stock_ledger import post_movement
+from modules.shared.cache import invalidate_tenant
+from modules.shared.outbox import notify_outbox
+from modules.shared.pagination import keyset_clause, keyset_page
+from modules.billing.side_effects import enqueue_bill_side_effects
 from datetime import datetime
-from modules.dashboard.models import ActivityTracker, log_sale_activity, log_order_activity
-
-# Import new stock service
-try:
-    from modules.stock.service import StockService
-    from modules.stock.database import get_current_stock
-    stock_service = StockService()
-except ImportError:
-    # Fallback if stock module is not available
-    stock_service = None
-    def get_current_stock(product_id, business_owner_id=None):
-        # Fallback to old products.stock field
-        conn = get_db_connection()
-        result = conn.execute("SELECT stock FROM products WHERE id = ?", (product_id,)).fetchone()
-        conn.close()
-        return result[0] if result else 0
-
-# Import notification helper
-try:
-    from modules.notifications.routes import create_notification_for_user
-except ImportError:
-    # Fallback if notifications module is not available
-    def create_notification_for_user(user_id, notification_type, message, action_url=None):
-        pass
 
 class BillingService:
     
-    def get_all_bills(self, user_id=None):
-        """Get all bills with customer information - STRICT DATA ISOLATION"""
-        conn = get_db_connection()
+    def get_bills_page(self, user_id=None, limit=500, cursor=None):
+        """
+        One page of bills with customer information, newest first - STRICT DATA ISOLATION
+        Keyset-paginated on (created_at, id); returns (bills, next_cursor or None)
+        """
+        if not user_id:
+            # No user_id: show nothing
+            return [], None
         
-        if user_id:
+        keyset_sql, keyset_params = keyset_clause("b.created_at", "b.id", cursor)
+        conn = get_db_connection()
+        try:
             # STRICT FILTER: Only show bills belonging to this user
-            bills = conn.execute("""SELECT b.*, c.name as customer_name 
+            bills = conn.execute(f"""SELECT b.*, c.name as customer_name 
                 FROM bills b 
                 LEFT JOIN customers c ON b.customer_id = c.id 
-                WHERE b.business_owner_id = ?
-                ORDER BY b.created_at DESC""", (user_id,)).fetchall()
-        else:
-            # No user_id: show nothing
-            bills = []
-        
-        conn.close()
-        return [dict(row) for row in bills]
+                WHERE b.business_owner_id = ? {'AND ' + keyset_sql if keyset_sql else ''}
+                ORDER BY b.created_at DESC, b.id DESC
+                LIMIT ?""", [user_id] + keyset_params + [limit + 1]).fetchall()
+        finally:
+            conn.close()
+        bills, next_cursor = keyset_page(bills, limit)
+        return [dict(row) for row in bills], next_cursor
     
     def get_bill_items(self, bill_id):
         """Get items for a specific bill - Mobile ERP Style"""
@@ -85,7 +75,8 @@ class BillingService:
         
         products_map = {p['id']: dict(p) for p in products_data}
         
-        # Quick stock validation
+        # Quick stock validation (fast rejection only - the authoritative check is
+        # the conditional decrement in _reserve_stock, inside the transaction)
         out_of_stock_items = []
         for item in data['items']:
             product = products_map.get(item['product_id'])
@@ -118,6 +109,24 @@ class BillingService:
         conn.execute('BEGIN TRANSACTION')
         
         try:
+            # Reserve stock first: check-and-decrement is one statement per product,
+            # so concurrent bills for the last unit can't both succeed
+            _, out_of_stock_items = self._reserve_stock(conn, data['items'], products_map,
+                                                        bill_id, bill_number, business_owner_id)
+            if out_of_stock_items:
+                conn.rollback()
+                conn.close()
+                print(f"❌ [BILLING SERVICE] Stock taken by a concurrent bill: {out_of_stock_items}")
+                return {
+                    "error": "Insufficient stock for some items",
+                    "out_of_stock_items": out_of_stock_items,
+                    "success": False
+                }
+            
+            # Cost of goods at the time of sale (weighted average, see shared/costing.py),
+            # read after the stock rows are taken so it matches the stock sold
+            costs = unit_costs(conn, products_map)
+            
             # Prepare data
             customer_name = data.get('customer_name', 'Walk-in Customer')
             gst_rate = data.get('gst_rate', 18)
@@ -130,13 +139,66 @@ class BillingService:
             sale_date = datetime.now().strftime('%Y-%m-%d')
             sale_time = datetime.now().strftime('%H:%M:%S')
             
-            # Create bill record
-            conn.execute("""INSERT INTO bills (id, bill_number, customer_id, customer_name, business_type, business_owner_id, subtotal, tax_amount, discount_amount, gst_rate, total_amount, status, created_at)
-                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)""", (
+            # ============================================================================
+            # Final payment values first, so every row is inserted once in its final
+            # state (no UPDATE of rows written by this same transaction)
+            # ============================================================================
+            transaction_customer_id = data.get('customer_id') or 'walk-in-customer'
+            partial_payment_method = None
+            credit_transactions_data = []
+            
+            if payment_method == 'credit':
+                paid_amount = 0
+                balance_due = total_amount
+                is_credit, payment_status = True, 'unpaid'
+                
+                credit_transactions_data.append((
+                    generate_id(), bill_id, transaction_customer_id, 'credit_issued',
+                    balance_due, payment_method, bill_number,
+                    f'Credit bill created for {customer_name}', current_time
+                ))
+                
+            elif payment_method == 'partial':
+                partial_amount = float(data.get('partial_amount', 0))
+                partial_payment_method = data.get('partial_payment_method', 'cash')
+                if partial_amount <= 0:
+                    partial_amount = 0
+                paid_amount = partial_amount
+                balance_due = total_amount - partial_amount
+                is_credit, payment_status = True, 'partial'
+                
+                credit_transactions_data.append((
+                    generate_id(), bill_id, transaction_customer_id, 'credit_issued',
+                    total_amount, payment_method, bill_number,
+                    f'Partial payment bill created for {customer_name}', current_time
+                ))
+                if partial_amount > 0:
+                    credit_transactions_data.append((
+                        generate_id(), bill_id, transaction_customer_id, 'payment',
+                        partial_amount, partial_payment_method, bill_number,
+                        f'Initial partial payment by {customer_name}', current_time
+                    ))
+                
+            else:
+                # Regular payment
+                paid_amount = total_amount
+                balance_due = 0
+                is_credit, payment_status = False, 'paid'
+            
+            # Create bill record (with its item summary, see shared/bill_summary.py)
+            summary = summarize_items(data['items'], costs)
+            conn.execute("""INSERT INTO bills (id, bill_number, customer_id, customer_name, business_type, business_owner_id,
+                    subtotal, tax_amount, discount_amount, gst_rate, total_amount, status, created_at,
+                    payment_method, payment_status, is_credit, credit_paid_amount, credit_balance, partial_payment_method,
+                    item_count, total_quantity, product_names, items_total, cogs)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)""", (
                 bill_id, bill_number, data.get('customer_id'), customer_name,
                 data.get('business_type', 'retail'), business_owner_id,
                 subtotal, tax_amount, discount_amount, gst_rate, total_amount,
-                'completed', current_time
+                'completed', current_time,
+                payment_method, payment_status, is_credit,
+                paid_amount if is_credit else 0, balance_due if is_credit else 0, partial_payment_method,
+                *summary
             ))
             
             # ============================================================================
@@ -144,42 +206,22 @@ class BillingService:
             # ============================================================================
             bill_items_data = []
             sales_data = []
-            stock_updates = []
-            stock_transactions = []
-            low_stock_products = []
             
             for item in data['items']:
                 item_id = generate_id()
                 product = products_map.get(item['product_id'])
                 
+                unit_cost = costs.get(item['product_id'], 0)
+                cogs = unit_cost * item['quantity']
+                
                 # Prepare bill item
                 bill_items_data.append((
                     item_id, bill_id, item['product_id'], item['product_name'],
-                    item['quantity'], item['unit_price'], item['total_price']
+                    item['quantity'], item['unit_price'], item['total_price'], unit_cost, cogs
                 ))
                 
-                # Prepare stock update
-                stock_updates.append((item['quantity'], item['product_id']))
-                
-                # Prepare stock transaction if service available
-                if stock_service:
-                    stock_transactions.append({
-                        'product_id': item['product_id'],
-                        'quantity': item['quantity'],
-                        'bill_id': bill_id,
-                        'bill_number': bill_number
-                    })
-                
-                # Check for low stock (for later notification)
-                if product:
-                    new_stock = product['stock'] - item['quantity']
-                    min_stock = product.get('min_stock', 0) or 0
-                    if new_stock <= min_stock and min_stock > 0:
-                        low_stock_products.append({
-                            'name': product['name'],
-                            'stock': new_stock,
-                            'min_stock': min_stock
-                        })
+                # (Low-stock alerts are queued by the stock ledger when a decrement
+                # crosses the product's threshold - see shared/stock_alerts.py)
                 
                 # Prepare sales entry
                 sale_id = generate_id()
@@ -192,261 +234,61 @@ class BillingService:
                     item['product_id'], item['product_name'], category,
                     item['quantity'], item['unit_price'], item['total_price'],
                     item_tax, item_discount, payment_method, business_owner_id,
-                    sale_date, sale_time, current_time
+                    sale_date, sale_time, balance_due, paid_amount, current_time, unit_cost, cogs
                 ))
             
             # ============================================================================
-            # OPTIMIZED: Execute all inserts in batch
+            # OPTIMIZED: Execute all inserts in batch (multi-row VALUES on PostgreSQL)
             # ============================================================================
             
-            # Batch insert bill items
-            conn.executemany("""INSERT INTO bill_items (id, bill_id, product_id, product_name, quantity, unit_price, total_price)
-                VALUES (?, ?, ?, ?, ?, ?, ?)""", bill_items_data)
+            bulk_insert(conn, 'bill_items',
+                        ('id', 'bill_id', 'product_id', 'product_name', 'quantity', 'unit_price', 'total_price',
+                         'unit_cost', 'cogs'),
+                        bill_items_data)
             
-            # Batch update stock
-            conn.executemany("""UPDATE products SET stock = stock - ? WHERE id = ?""", stock_updates)
+            bulk_insert(conn, 'sales',
+                        ('id', 'bill_id', 'bill_number', 'customer_id', 'customer_name',
+                         'product_id', 'product_name', 'category', 'quantity', 'unit_price',
+                         'total_price', 'tax_amount', 'discount_amount', 'payment_method',
+                         'business_owner_id', 'sale_date', 'sale_time', 'balance_due', 'paid_amount', 'created_at',
+                         'unit_cost', 'cogs'),
+                        sales_data)
             
-            # Batch insert sales entries
-            conn.executemany("""INSERT INTO sales (
-                    id, bill_id, bill_number, customer_id, customer_name,
-                    product_id, product_name, category, quantity, unit_price,
-                    total_price, tax_amount, discount_amount, payment_method,
-                    business_owner_id, sale_date, sale_time, created_at
-                )
-                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)""", sales_data)
+            bulk_insert(conn, 'payments', ('id', 'bill_id', 'method', 'amount', 'processed_at'),
+                        [(generate_id(), bill_id, payment_method, paid_amount, current_time)])
             
-            # ============================================================================
-            # Handle payment records
-            # ============================================================================
-            payment_id = generate_id()
+            bulk_insert(conn, 'credit_transactions',
+                        ('id', 'bill_id', 'customer_id', 'transaction_type', 'amount',
+                         'payment_method', 'reference_number', 'notes', 'created_at'),
+                        credit_transactions_data)
             
-            if payment_method == 'credit':
-                paid_amount = 0
-                balance_due = total_amount
-                
-                conn.execute("""UPDATE bills SET is_credit = 1, payment_method = ?, payment_status = 'unpaid',
-                           credit_paid_amount = ?, credit_balance = ?
-                    WHERE id = ?""", (payment_method, paid_amount, balance_due, bill_id))
-                
-                conn.execute("""UPDATE sales SET balance_due = ?, paid_amount = ? 
-                    WHERE bill_id = ?""", (balance_due, paid_amount, bill_id))
-                
-                conn.execute("""INSERT INTO payments (id, bill_id, method, amount, processed_at)
-                    VALUES (?, ?, ?, ?, ?)""", (payment_id, bill_id, payment_method, paid_amount, current_time))
-                
-                # Credit transaction record
-                transaction_id = generate_id()
-                transaction_customer_id = data.get('customer_id') or 'walk-in-customer'
-                conn.execute("""INSERT INTO credit_transactions (
-                        id, bill_id, customer_id, transaction_type, amount, 
-                        payment_method, reference_number, notes, created_at
-                    )
-                    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)""", (
-                    transaction_id, bill_id, transaction_customer_id, 'credit_issued',
-                    balance_due, payment_method, bill_number,
-                    f'Credit bill created for {customer_name}', current_time
-                ))
-                
-            elif payment_method == 'partial':
-                partial_amount = float(data.get('partial_amount', 0))
-                balance_due = total_amount - partial_amount
-                partial_payment_method = data.get('partial_payment_method', 'cash')
-                
-                if partial_amount <= 0:
-                    partial_amount = 0
-                    balance_due = total_amount
-                
-                conn.execute("""UPDATE bills SET is_credit = 1, payment_method = ?, payment_status = 'partial',
-                           credit_paid_amount = ?, credit_balance = ?, partial_payment_method = ?
-                    WHERE id = ?""", (payment_method, partial_amount, balance_due, partial_payment_method, bill_id))
-                
-                conn.execute("""UPDATE sales SET balance_due = ?, paid_amount = ? 
-                    WHERE bill_id = ?""", (balance_due, partial_amount, bill_id))
-                
-                conn.execute("""INSERT INTO payments (id, bill_id, method, amount, processed_at)
-                    VALUES (?, ?, ?, ?, ?)""", (payment_id, bill_id, payment_method, partial_amount, current_time))
-                
-                # Credit transaction records
-                transaction_customer_id = data.get('customer_id') or 'walk-in-customer'
-                
-                transaction_id_credit = generate_id()
-                conn.execute("""INSERT INTO credit_transactions (
-                        id, bill_id, customer_id, transaction_type, amount, 
-                        payment_method, reference_number, notes, created_at
-                    )
-                    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)""", (
-                    transaction_id_credit, bill_id, transaction_customer_id, 'credit_issued',
-                    total_amount, payment_method, bill_number,
-                    f'Partial payment bill created for {customer_name}', current_time
-                ))
-                
-                if partial_amount > 0:
-                    transaction_id_payment = generate_id()
-                    conn.execute("""INSERT INTO credit_transactions (
-                            id, bill_id, customer_id, transaction_type, amount, 
-                            payment_method, reference_number, notes, created_at
-                        )
-                        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)""", (
-                        transaction_id_payment, bill_id, transaction_customer_id, 'payment',
-                        partial_amount, partial_payment_method, bill_number,
-                        f'Initial partial payment by {customer_name}', current_time
-                    ))
-                
-            else:
-                # Regular payment
-                paid_amount = total_amount
-                balance_due = 0
-                
-                conn.execute("""UPDATE bills SET payment_method = ?, payment_status = 'paid'
-                    WHERE id = ?""", (payment_method, bill_id))
-                
-                conn.execute("""UPDATE sales SET balance_due = ?, paid_amount = ? 
-                    WHERE bill_id = ?""", (balance_due, paid_amount, bill_id))
-                
-                conn.execute("""INSERT INTO payments (id, bill_id, method, amount, processed_at)
-                    VALUES (?, ?, ?, ?, ?)""", (payment_id, bill_id, payment_method, paid_amount, current_time))
+            # Daily sales rollup (same transaction as the bill)
+            record_bill(conn, bill_id)
+            
+            # Post-commit side effects go to the outbox in the same transaction,
+            # so they exist exactly when the bill does (see modules/billing/side_effects.py)
+            enqueue_bill_side_effects(conn, {
+                'bill_id': bill_id,
+                'bill_number': bill_number,
+                'business_owner_id': business_owner_id,
+                'customer_name': customer_name,
+                'total_amount': total_amount,
+                'payment_method': payment_method,
+                'partial_amount': data.get('partial_amount', 0),
+                'created_at': current_time
+            }, data['items'])
             
-            # Commit transaction - CRITICAL: Do this BEFORE notifications/logging
+            # Commit transaction - the only work on the request's critical path
             conn.commit()
             conn.close()
             
-            print(f"✅ [BILLING SERVICE] Bill created successfully: {bill_number}")
-            
-            # ============================================================================
-            # ASYNC OPERATIONS - After commit (non-blocking)
-            # ============================================================================
-            
-            # Stock transactions (if service available)
-            if stock_service and stock_transactions:
-                for st in stock_transactions:
-                    try:
-                        stock_service.create_sale_transaction(
-                            product_id=st['product_id'],
-                            quantity=st['quantity'],
-                            bill_id=st['bill_id'],
-                            bill_number=st['bill_number'],
-                            created_by=business_owner_id,
-                            business_owner_id=business_owner_id
-                        )
-                    except Exception as e:
-                        print(f"⚠️ [STOCK] Transaction failed: {e}")
+            # Cached dashboard KPIs for this shop are now stale
+            invalidate_tenant(business_owner_id)
             
-            # Low stock notifications
-            for product in low_stock_products:
-                try:
-                    if product['stock'] == 0:
-                        create_notification_for_user(
-                            user_id=business_owner_id,
-                            notification_type='alert',
-                            message=f"Out of stock: {product['name']} (0 remaining)",
-                            action_url='/retail/products'
-                        )
-                    else:
-                        create_notification_for_user(
-                            user_id=business_owner_id,
-                            notification_type='alert',
-                            message=f"Low stock alert: {product['name']} (Only {product['stock']} left)",
-                            action_url='/retail/products'
-                        )
-                except Exception as e:
-                    print(f"⚠️ [NOTIFICATION] Low stock alert failed: {e}")
+            # Notifications, activity, sync and E-Way check run in the outbox worker
+            notify_outbox()
             
-            # Activity logging
-            try:
-                if total_amount > 15000:
-                    log_order_activity(
-                        order_id=bill_id,
-                        amount=total_amount,
-                        order_type='processed',
-                        customer_name=customer_name,
-                        item_count=len(data['items'])
-                    )
-                elif payment_method == 'credit':
-                    ActivityTracker.log_activity(
-                        activity_type='sale',
-                        title='Credit sale processed',
-                        description=f'₹{total_amount:,.0f} - {customer_name} (Credit)',
-                        amount=total_amount,
-                        reference_id=bill_id,
-                        reference_type='bill',
-                        icon_type='success',
-                        metadata={
-                            'bill_number': bill_number,
-                            'payment_method': payment_method,
-                            'is_credit': True,
-                            'has_dropdown': True,
-                            'dropdown_type': 'sales'
-                        }
-                    )
-                elif payment_method in ['upi', 'card']:
-                    ActivityTracker.log_activity(
-                        activity_type='sale',
-                        title=f'{payment_method.upper()} payment {"received" if payment_method == "upi" else "processed"}',
-                        description=f'₹{total_amount:,.0f} - {customer_name}',
-                        amount=total_amount,
-                        reference_id=bill_id,
-                        reference_type='bill',
-                        icon_type='success',
-                        metadata={
-                            'bill_number': bill_number,
-                            'payment_method': payment_method,
-                            'has_dropdown': True,
-                            'dropdown_type': 'sales'
-                        }
-                    )
-                else:
-                    log_sale_activity(
-                        bill_id=bill_id,
-                        amount=total_amount,
-                        customer_name=customer_name
-                    )
-            except Exception as e:
-                print(f"⚠️ [ACTIVITY] Logging failed: {e}")
-            
-            # Sale notification
-            try:
-                if payment_method == 'credit':
-                    notification_message = f"Credit sale completed: ₹{total_amount:,.0f} from {customer_name}"
-                elif payment_method == 'partial':
-                    partial_amount = float(data.get('partial_amount', 0))
-                    notification_message = f"Partial payment sale: ₹{partial_amount:,.0f} paid, ₹{total_amount - partial_amount:,.0f} due from {customer_name}"
-                else:
-                    notification_message = f"Sale completed: ₹{total_amount:,.0f} from {customer_name}"
-                
-                create_notification_for_user(
-                    user_id=business_owner_id,
-                    notification_type='sale',
-                    message=notification_message,
-                    action_url='/retail/sales'
-                )
-            except Exception as e:
-                print(f"⚠️ [NOTIFICATION] Sale notification failed: {e}")
-            
-            # Sync broadcasting
-            try:
-                from modules.sync.utils import broadcast_data_change
-                for item in data['items']:
-                    sale_data = {
-                        'bill_id': bill_id,
-                        'bill_number': bill_number,
-                        'customer_name': customer_name,
-                        'product_name': item['product_name'],
-                        'quantity': item['quantity'],
-                        'total_price': item['total_price'],
-                        'payment_method': payment_method,
-                        'created_at': current_time
-                    }
-                    broadcast_data_change('create', 'sales', sale_data, business_owner_id)
-            except Exception as e:
-                print(f"⚠️ [SYNC] Broadcasting failed: {e}")
-            
-            # E-Way Bill check
-            try:
-                from modules.eway.service import eway_service
-                if eway_service.check_eway_requirement(total_amount, 'Maharashtra', 'Maharashtra'):
-                    print(f"💡 [E-WAY BILL] Invoice {bill_number} (₹{total_amount}) requires E-Way Bill generation")
-            except Exception as e:
-                print(f"⚠️ [E-WAY BILL] Check failed: {e}")
+            print(f"✅ [BILLING SERVICE] Bill created successfully: {bill_number}")
             print(f"✅ [BILLING SERVICE] Sales entries created: {len(data['items'])}")
             
             return {
@@ -461,4 +303,40 @@ class BillingService:
             conn.rollback()
             conn.close()
             print(f"❌ [BILLING SERVICE] Transaction failed: {e}")
-            raise e
\ No newline at end of file
+            raise e
+    
+    def _reserve_stock(self, conn, items, products_map, bill_id, bill_number, business_owner_id):
+        """
+        Take stock for every known product in the bill, in the caller's transaction.
+        Each product is one guarded ledger movement (`UPDATE products ... WHERE stock >= ?`
+        plus its stock_ledger entry), so the check and the decrement are atomic per row
+        (row lock on PostgreSQL, write lock on SQLite).
+        Products are updated in id order so concurrent bills lock rows in the same order.
+        Returns ({product_id: new_stock}, out_of_stock_items); the caller rolls back on failure.
+        """
+        quantities = {}
+        for item in items:
+            if item['product_id'] in products_map:
+                quantities[item['product_id']] = quantities.get(item['product_id'], 0) + item['quantity']
+        
+        new_stock_map = {}
+        out_of_stock_items = []
+        for product_id in sorted(quantities):
+            quantity = quantities[product_id]
+            new_stock = post_movement(
+                conn, product_id, -quantity, 'sale',
+                reference_id=bill_id,
+                business_owner_id=business_owner_id,
+                created_by=business_owner_id,
+                notes=f"Sale: {products_map[product_id]['name']} - Bill #{bill_number}",
+                require_available=True
+            )
+            if new_stock is None:
+                available = conn.execute("SELECT stock FROM products WHERE id = ?", (product_id,)).fetchone()
+                out_of_stock_items.append(
+                    f"❌ {products_map[product_id]['name']}: Requested {quantity}, Available {available['stock'] if available else 0}"
+                )
+            else:
+                new_stock_map[product_id] = new_stock
+        
+        return new_stock_map, out_of_stock_items
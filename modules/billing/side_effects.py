@@ -0,0 +1,144 @@
+"""
+Bill side effects, run after commit by the outbox worker (modules/shared/outbox.py)
+create_bill only enqueues these in its transaction; notifications, activity
+log, sync broadcasts and the E-Way check run in the background, in order,
+with retries. (Stock movements are not side effects: they are written to the
+stock ledger inside the bill's transaction.)
+"""
+
+from modules.shared.outbox import enqueue_events, register_handler
+from modules.dashboard.models import ActivityTracker, log_sale_activity, log_order_activity
+
+# Import notification helper
+try:
+    from modules.notifications.routes import create_notification_for_user
+except ImportError:
+    # Fallback if notifications module is not available
+    def create_notification_for_user(user_id, notification_type, message, action_url=None):
+        return True
+
+
+def enqueue_bill_side_effects(conn, bill, items):
+    """
+    Queue every post-commit side effect of a new bill, in the order they used to run.
+    `bill` holds bill_id, bill_number, business_owner_id, customer_name, total_amount,
+    payment_method, partial_amount and created_at. (Low-stock alerts are queued by
+    the stock ledger itself, see modules/shared/stock_alerts.py.)
+    """
+    owner = bill['business_owner_id']
+    events = []
+
+    events.append(('billing.activity', {**bill, 'item_count': len(items)}))
+    events.append(('billing.sale_notification', bill))
+
+    # One broadcast for the whole bill; devices receive its lines as one batch
+    events.append(('billing.sync_broadcast', {
+        'business_owner_id': owner,
+        'sales': [{
+            'bill_id': bill['bill_id'],
+            'bill_number': bill['bill_number'],
+            'customer_name': bill['customer_name'],
+            'product_name': item['product_name'],
+            'quantity': item['quantity'],
+            'total_price': item['total_price'],
+            'payment_method': bill['payment_method'],
+            'created_at': bill['created_at'],
+        } for item in items],
+    }))
+
+    events.append(('billing.eway_check', {
+        'bill_number': bill['bill_number'],
+        'total_amount': bill['total_amount'],
+    }))
+
+    return enqueue_events(conn, 'bill', bill['bill_id'], events, owner)
+
+
+@register_handler('billing.activity')
+def handle_bill_activity(payload):
+    total_amount = payload['total_amount']
+    payment_method = payload['payment_method']
+    customer_name = payload['customer_name']
+
+    if total_amount > 15000:
+        log_order_activity(
+            order_id=payload['bill_id'],
+            amount=total_amount,
+            order_type='processed',
+            customer_name=customer_name,
+            item_count=payload['item_count']
+        )
+    elif payment_method == 'credit':
+        ActivityTracker.log_activity(
+            activity_type='sale',
+            title='Credit sale processed',
+            description=f'₹{total_amount:,.0f} - {customer_name} (Credit)',
+            amount=total_amount,
+            reference_id=payload['bill_id'],
+            reference_type='bill',
+            icon_type='success',
+            metadata={
+                'bill_number': payload['bill_number'],
+                'payment_method': payment_method,
+                'is_credit': True,
+                'has_dropdown': True,
+                'dropdown_type': 'sales'
+            }
+        )
+    elif payment_method in ['upi', 'card']:
+        ActivityTracker.log_activity(
+            activity_type='sale',
+            title=f'{payment_method.upper()} payment {"received" if payment_method == "upi" else "processed"}',
+            description=f'₹{total_amount:,.0f} - {customer_name}',
+            amount=total_amount,
+            reference_id=payload['bill_id'],
+            reference_type='bill',
+            icon_type='success',
+            metadata={
+                'bill_number': payload['bill_number'],
+                'payment_method': payment_method,
+                'has_dropdown': True,
+                'dropdown_type': 'sales'
+            }
+        )
+    else:
+        log_sale_activity(
+            bill_id=payload['bill_id'],
+            amount=total_amount,
+            customer_name=customer_name
+        )
+
+
+@register_handler('billing.sale_notification')
+def handle_sale_notification(payload):
+    total_amount = payload['total_amount']
+    customer_name = payload['customer_name']
+    if payload['payment_method'] == 'credit':
+        message = f"Credit sale completed: ₹{total_amount:,.0f} from {customer_name}"
+    elif payload['payment_method'] == 'partial':
+        partial_amount = float(payload.get('partial_amount') or 0)
+        message = f"Partial payment sale: ₹{partial_amount:,.0f} paid, ₹{total_amount - partial_amount:,.0f} due from {customer_name}"
+    else:
+        message = f"Sale completed: ₹{total_amount:,.0f} from {customer_name}"
+
+    if create_notification_for_user(
+        user_id=payload['business_owner_id'],
+        notification_type='sale',
+        message=message,
+        action_url='/retail/sales'
+    ) is None:
+        raise RuntimeError("Sale notification was not stored")
+
+
+@register_handler('billing.sync_broadcast')
+def handle_sync_broadcast(payload):
+    # Best effort: connected devices also catch up through the sync APIs
+    from modules.sync.utils import broadcast_data_changes
+    broadcast_data_changes('create', 'sales', payload['sales'], payload['business_owner_id'])
+
+
+@register_handler('billing.eway_check')
+def handle_eway_check(payload):
+    from modules.eway.service import eway_service
+    if eway_service.check_eway_requirement(payload['total_amount'], 'Maharashtra', 'Maharashtra'):
+        print(f"💡 [E-WAY BILL] Invoice {payload['bill_number']} (₹{payload['total_amount']}) requires E-Way Bill generation")
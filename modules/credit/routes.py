@@ -1,6 +1,10 @@
 from flask import jsonify, request, session
 from . import credit_bp
 from modules.shared.database import get_db_connection
+from modules.shared.sales_rollup import record_bill
+from modules.shared.cache import invalidate_tenant
+from modules.shared.date_ranges import range_clause
+from modules.shared.export import export_date_bounds, export_response, stream_rows
 from datetime import datetime, timedelta
 import traceback
 
@@ -394,43 +398,54 @@ def get_today_summary():
 
 @credit_bp.route('/api/credit/export', methods=['GET'])
 def export_credit_bills():
-    """Export credit bills data"""
+    """Export open credit bills of the current business - CSV/Excel streamed, JSON otherwise"""
     try:
-        conn = get_db_connection()
-        cursor = conn.cursor()
+        user_id = get_user_id_from_session()
+        if not user_id:
+            return jsonify({'success': False, 'error': 'User not authenticated'}), 401
         
         query = """
             SELECT 
                 b.bill_number,
-                b.customer_name,
-                b.customer_id,
-                b.total_amount,
-                b.credit_paid_amount,
-                b.credit_balance,
-                b.payment_status,
+                COALESCE(b.customer_name, 'Walk-in Customer'),
+                COALESCE(c.phone, ''),
+                COALESCE(b.total_amount, 0),
+                COALESCE(b.credit_paid_amount, 0),
+                COALESCE(b.credit_balance, 0),
+                COALESCE(b.payment_status, 'unpaid'),
                 b.created_at
             FROM bills b
+            LEFT JOIN customers c ON b.customer_id = c.id
             WHERE b.is_credit = 1 AND b.credit_balance > 0
-            ORDER BY b.created_at DESC
+              AND (b.business_owner_id = ? OR b.business_owner_id IS NULL)
         """
+        params = [user_id]
         
-        cursor.execute(query)
-        rows = cursor.fetchall()
+        date_sql, date_params = range_clause("b.created_at", *export_date_bounds(request.args))
+        if date_sql:
+            query += f" AND {date_sql}"
+            params.extend(date_params)
         
-        bills = []
-        for row in rows:
-            bills.append({
-                'bill_number': row[0],
-                'customer_name': row[1] or 'Walk-in Customer',
-                'customer_phone': '',
-                'total_amount': float(row[3] or 0),
-                'paid_amount': float(row[4] or 0),
-                'remaining_amount': float(row[5] or 0),
-                'payment_status': row[6] or 'unpaid',
-                'date': row[7]
-            })
-        
-        conn.close()
+        query += " ORDER BY b.created_at DESC"
+        rows = stream_rows(query, params)
+        
+        format_type = request.args.get('format', 'json')
+        if format_type in ('csv', 'excel', 'xlsx'):
+            return export_response(rows, [
+                'Bill Number', 'Customer', 'Phone', 'Total Amount', 'Paid Amount',
+                'Remaining Amount', 'Payment Status', 'Date'
+            ], f"credit_bills_{datetime.now().strftime('%Y-%m-%d')}", format_type)
+        
+        bills = [{
+            'bill_number': row[0],
+            'customer_name': row[1],
+            'customer_phone': row[2],
+            'total_amount': float(row[3]),
+            'paid_amount': float(row[4]),
+            'remaining_amount': float(row[5]),
+            'payment_status': row[6],
+            'date': row[7]
+        } for row in rows]
         
         return jsonify({
             'success': True,
@@ -503,7 +518,8 @@ def record_credit_payment():
         conn.execute('BEGIN TRANSACTION')
         
         try:
-            # Update bill
+            # Update bill (and move its contribution in the daily sales rollup)
+            record_bill(conn, bill_id, -1)
             cursor.execute("""
                 UPDATE bills
                 SET credit_paid_amount = ?,
@@ -512,6 +528,7 @@ def record_credit_payment():
                     payment_method = ?
                 WHERE id = ?
             """, (new_paid, new_balance, new_status, payment_method, bill_id))
+            record_bill(conn, bill_id)
             
             # 🔥 CRITICAL FIX: Insert transaction record into credit_transactions table
             from modules.shared.database import generate_id
@@ -546,6 +563,7 @@ def record_credit_payment():
             """, (payment_id, bill_id, payment_method, payment_amount, datetime.now().strftime('%Y-%m-%d %H:%M:%S')))
             
             conn.commit()
+            invalidate_tenant(get_user_id_from_session())
             
             print(f"✅ [CREDIT PAYMENT] Payment recorded successfully:")
             print(f"   Bill: {bill_number}")
@@ -5,6 +5,8 @@ Customers service
 import sqlite3
 from datetime import datetime
 from modules.shared.database import get_db_connection, generate_id
+from modules.shared.cache import invalidate_tenant
+from modules.shared.search import search_rows
 
 class CustomersService:
     
@@ -96,6 +98,7 @@ class CustomersService:
             ))
             
             conn.commit()
+            invalidate_tenant(user_id)
             print(f"[CUSTOMER ADD] Successfully added customer: {customer_id} for user: {user_id}")
             
         except sqlite3.IntegrityError as e:
@@ -273,12 +276,7 @@ class CustomersService:
         
         if user_id:
             # STRICT FILTER: Search only within user's own customers
-            customers = conn.execute('''
-                SELECT * FROM customers 
-                WHERE (name LIKE ? OR phone LIKE ?) AND is_active = 1 AND user_id = ?
-                ORDER BY name
-                LIMIT 20
-            ''', (f'%{query}%', f'%{query}%', user_id)).fetchall()
+            customers = search_rows(conn, 'customer', user_id, query, 20)
         else:
             customers = []
         
@@ -3,6 +3,8 @@ Dashboard Models - Real-time Activity Tracking
 """
 
 from modules.shared.database import get_db_connection, generate_id
+from modules.shared.date_ranges import day_bounds, month_bounds, period_bounds
+from modules.shared.sales_rollup import rollup_period_totals
 from datetime import datetime, timedelta
 import json
 
@@ -135,9 +137,9 @@ class ActivityTracker:
             FROM bills b
             LEFT JOIN customers c ON b.customer_id = c.id
             LEFT JOIN bill_items bi ON b.id = bi.bill_id
-            WHERE DATE(b.created_at) = ?
+            WHERE b.created_at >= ? AND b.created_at < ?
         '''
-        params = [today]
+        params = list(day_bounds(today))
         
         # Add user filtering for data isolation
         if user_id:
@@ -339,9 +341,9 @@ class ActivityTracker:
             FROM bills b
             LEFT JOIN customers c ON b.customer_id = c.id
             LEFT JOIN bill_items bi ON b.id = bi.bill_id
-            WHERE DATE(b.created_at) = ? AND b.total_amount > 10000
+            WHERE b.created_at >= ? AND b.created_at < ? AND b.total_amount > 10000
         '''
-        params = [today]
+        params = list(day_bounds(today))
         
         # Add user filtering for data isolation
         if user_id:
@@ -615,37 +617,17 @@ class DashboardStats:
             user_filter = " AND business_owner_id = ?"
             user_params = [user_id]
         
-        # Total sales today (ALL bills including credit)
-        # Revenue today (only PAID amounts)
-        cursor.execute(f'''
-            SELECT 
-                COALESCE(SUM(total_amount), 0) as today_sales,
-                COALESCE(SUM(CASE 
-                    WHEN payment_status = 'paid' THEN total_amount
-                    WHEN payment_status = 'partial' THEN COALESCE(credit_paid_amount, 0)
-                    ELSE 0
-                END), 0) as today_revenue,
-                COUNT(*) as today_orders
-            FROM bills 
-            WHERE DATE(created_at) = DATE('now'){user_filter}
-        ''', user_params)
-        today_stats = cursor.fetchone()
+        # Half-open created_at ranges computed in Python (index-friendly)
+        today_start, today_end = period_bounds('today')
+        month_start, month_end = period_bounds('this_month')
         
-        # Total sales this month (ALL bills including credit)
-        # Revenue this month (only PAID amounts)
-        cursor.execute(f'''
-            SELECT 
-                COALESCE(SUM(total_amount), 0) as month_sales,
-                COALESCE(SUM(CASE 
-                    WHEN payment_status = 'paid' THEN total_amount
-                    WHEN payment_status = 'partial' THEN COALESCE(credit_paid_amount, 0)
-                    ELSE 0
-                END), 0) as month_revenue,
-                COUNT(*) as month_orders
-            FROM bills 
-            WHERE strftime('%Y-%m', created_at) = strftime('%Y-%m', 'now'){user_filter}
-        ''', user_params)
-        month_stats = cursor.fetchone()
+        # Today / this month from the daily sales rollup (shared/sales_rollup.py)
+        # Sales = ALL bills including credit, Revenue = only PAID amounts
+        periods = rollup_period_totals(conn, user_id, {
+            'today': (today_start, today_end),
+            'month': (month_start, month_end),
+        })
+        today_stats, month_stats = periods['today'], periods['month']
         
         # Recent orders
         cursor.execute(f'''
@@ -669,25 +651,25 @@ class DashboardStats:
             FROM bill_items bi
             JOIN products p ON bi.product_id = p.id
             JOIN bills b ON bi.bill_id = b.id
-            WHERE strftime('%Y-%m', b.created_at) = strftime('%Y-%m', 'now'){user_filter}
+            WHERE b.created_at >= ? AND b.created_at < ?{user_filter}
             GROUP BY p.id, p.name
             ORDER BY total_sold DESC
             LIMIT 5
-        ''', user_params)
+        ''', [month_start, month_end] + user_params)
         top_products = cursor.fetchall()
         
         conn.close()
         
         return {
             'today': {
-                'sales': float(today_stats['today_sales'] or 0),
-                'revenue': float(today_stats['today_revenue'] or 0),
-                'orders': int(today_stats['today_orders'] or 0)
+                'sales': today_stats['total_sales'],
+                'revenue': today_stats['revenue'],
+                'orders': today_stats['bill_count']
             },
             'month': {
-                'sales': float(month_stats['month_sales'] or 0),
-                'revenue': float(month_stats['month_revenue'] or 0),
-                'orders': int(month_stats['month_orders'] or 0)
+                'sales': month_stats['total_sales'],
+                'revenue': month_stats['revenue'],
+                'orders': month_stats['bill_count']
             },
             'pending_orders': int(pending_orders['pending_orders'] or 0),
             'low_stock_count': int(low_stock['low_stock_count'] or 0),
@@ -700,18 +682,17 @@ class DashboardStats:
         conn = get_db_connection()
         cursor = conn.cursor()
         
-        # Total customers
-        cursor.execute('SELECT COUNT(*) as total FROM customers WHERE is_active = 1')
-        total_customers = cursor.fetchone()['total']
-        
-        # New customers this month
+        # Total and new-this-month customers in one scan
         cursor.execute('''
-            SELECT COUNT(*) as new_customers
+            SELECT 
+                COUNT(*) as total,
+                COALESCE(SUM(CASE WHEN created_at >= ? AND created_at < ? THEN 1 ELSE 0 END), 0) as new_customers
             FROM customers 
-            WHERE strftime('%Y-%m', created_at) = strftime('%Y-%m', 'now')
-            AND is_active = 1
-        ''')
-        new_customers = cursor.fetchone()['new_customers']
+            WHERE is_active = 1
+        ''', month_bounds())
+        customer_counts = cursor.fetchone()
+        total_customers = customer_counts['total']
+        new_customers = customer_counts['new_customers']
         
         # Top customers by purchases
         cursor.execute('''
@@ -739,33 +720,21 @@ class DashboardStats:
         conn = get_db_connection()
         cursor = conn.cursor()
         
-        # Total products
-        cursor.execute('SELECT COUNT(*) as total FROM products WHERE is_active = 1')
-        total_products = cursor.fetchone()['total']
-        
-        # Low stock products
-        cursor.execute('''
-            SELECT COUNT(*) as low_stock
-            FROM products 
-            WHERE stock <= min_stock AND is_active = 1
-        ''')
-        low_stock_count = cursor.fetchone()['low_stock']
-        
-        # Out of stock products
-        cursor.execute('''
-            SELECT COUNT(*) as out_of_stock
-            FROM products 
-            WHERE stock = 0 AND is_active = 1
-        ''')
-        out_of_stock = cursor.fetchone()['out_of_stock']
-        
-        # Total inventory value
+        # Counts and inventory value in one scan (conditional aggregation)
         cursor.execute('''
-            SELECT COALESCE(SUM(stock * cost), 0) as inventory_value
+            SELECT 
+                COUNT(*) as total,
+                COALESCE(SUM(CASE WHEN stock <= min_stock THEN 1 ELSE 0 END), 0) as low_stock,
+                COALESCE(SUM(CASE WHEN stock = 0 THEN 1 ELSE 0 END), 0) as out_of_stock,
+                COALESCE(SUM(stock * cost), 0) as inventory_value
             FROM products 
             WHERE is_active = 1
         ''')
-        inventory_value = cursor.fetchone()['inventory_value']
+        inventory = cursor.fetchone()
+        total_products = inventory['total']
+        low_stock_count = inventory['low_stock']
+        out_of_stock = inventory['out_of_stock']
+        inventory_value = inventory['inventory_value']
         
         conn.close()
         
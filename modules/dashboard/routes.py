@@ -699,8 +699,8 @@ def universal_search():
             }), 400
         
         from modules.shared.database import get_db_connection
+        from modules.shared.search import search_rows
         conn = get_db_connection()
-        cursor = conn.cursor()
         
         search_results = {
             'customers': [],
@@ -710,17 +710,17 @@ def universal_search():
             'total_results': 0
         }
         
-        # 1. Search Customers (by name, phone)
-        cursor.execute('''
-            SELECT id, name, phone, address, created_at
-            FROM customers
-            WHERE is_active = 1 
-            AND (name LIKE ? OR phone LIKE ? OR address LIKE ?)
-            ORDER BY created_at DESC
-            LIMIT ?
-        ''', (f'%{query}%', f'%{query}%', f'%{query}%', limit))
+        # Every entity is searched within the current tenant only
+        from flask import session
+        user_type = session.get('user_type')
+        if user_type == 'employee':
+            user_id = session.get('client_id')  # For employees, use client_id
+        else:
+            user_id = session.get('user_id')    # For clients, use user_id
         
-        customers = cursor.fetchall()
+        # 1. Search Customers (by name, phone, address)
+        customers = search_rows(conn, 'customer', user_id, query, limit,
+                                'id, name, phone, address, created_at')
         for customer in customers:
             search_results['customers'].append({
                 'id': customer['id'],
@@ -733,17 +733,9 @@ def universal_search():
                 'created_at': customer['created_at']
             })
         
-        # 2. Search Products (by name, category)
-        cursor.execute('''
-            SELECT id, name, category, price, stock, created_at
-            FROM products
-            WHERE is_active = 1 
-            AND (name LIKE ? OR category LIKE ?)
-            ORDER BY created_at DESC
-            LIMIT ?
-        ''', (f'%{query}%', f'%{query}%', limit))
-        
-        products = cursor.fetchall()
+        # 2. Search Products (by name, code, barcode, category)
+        products = search_rows(conn, 'product', user_id, query, limit,
+                               'id, name, category, price, stock, created_at')
         for product in products:
             price = float(product['price']) if product['price'] else 0
             search_results['products'].append({
@@ -757,35 +749,10 @@ def universal_search():
                 'created_at': product['created_at']
             })
         
-        # 3. Search Sales/Bills (by bill number, customer name, amount)
-        # Build query with user filtering
-        bills_query = '''
-            SELECT 
-                b.id, b.bill_number, b.total_amount, b.created_at,
-                COALESCE(b.customer_name, c.name, 'Walk-in Customer') as customer_name
-            FROM bills b
-            LEFT JOIN customers c ON b.customer_id = c.id
-            WHERE (b.bill_number LIKE ? OR b.customer_name LIKE ? OR c.name LIKE ?)
-        '''
-        bills_params = [f'%{query}%', f'%{query}%', f'%{query}%']
-        
-        # Add user filtering for data isolation
-        from flask import session
-        user_type = session.get('user_type')
-        if user_type == 'employee':
-            user_id = session.get('client_id')  # For employees, use client_id
-        else:
-            user_id = session.get('user_id')    # For clients, use user_id
-        if user_id:
-            bills_query += ' AND b.business_owner_id = ?'
-            bills_params.append(user_id)
-            
-        bills_query += ' ORDER BY b.created_at DESC LIMIT ?'
-        bills_params.append(limit)
-        
-        cursor.execute(bills_query, bills_params)
-        
-        sales = cursor.fetchall()
+        # 3. Search Sales/Bills (by bill number, customer name)
+        sales = search_rows(conn, 'bill', user_id, query, limit,
+                            "id, bill_number, total_amount, created_at, "
+                            "COALESCE(customer_name, 'Walk-in Customer') as customer_name")
         for sale in sales:
             amount = float(sale['total_amount']) if sale['total_amount'] else 0
             search_results['sales'].append({
@@ -4,6 +4,9 @@ Dashboard Service Layer - Business Logic for Dashboard Operations
 
 from modules.dashboard.models import ActivityTracker, DashboardStats
 from modules.shared.database import get_db_connection
+from modules.shared.date_ranges import period_bounds
+from modules.shared.sales_rollup import rollup_period_totals
+from modules.shared.cache import cached, DASHBOARD_CACHE_TTL
 from datetime import datetime, timedelta
 import json
 
@@ -20,8 +23,10 @@ class DashboardService:
         print("Dashboard initialized - Using real data from database")
     
     @staticmethod
+    @cached('dashboard_data', ttl=DASHBOARD_CACHE_TTL)
     def get_dashboard_data(client_id=None):
-        """Get complete dashboard data"""
+        """Get complete dashboard data (cached per tenant for a few seconds, see shared/cache.py)"""
+        # All helpers share the request's pooled connection
         return {
             'recent_activities': ActivityTracker.get_recent_activities(limit=10, client_id=client_id),
             'sales_stats': DashboardStats.get_sales_stats(client_id=client_id),
@@ -31,6 +36,7 @@ class DashboardService:
         }
     
     @staticmethod
+    @cached('premium_sections', ttl=DASHBOARD_CACHE_TTL)
     def get_premium_dashboard_sections(client_id=None):
         """Get premium dashboard sections for new UI"""
         return ActivityTracker.get_premium_dashboard_sections(client_id=client_id)
@@ -103,7 +109,6 @@ class DashboardService:
     def _get_dashboard_summary(client_id=None):
         """Get dashboard summary metrics"""
         conn = get_db_connection()
-        cursor = conn.cursor()
         
         # Get user_id from session for data isolation
         from flask import session
@@ -113,80 +118,33 @@ class DashboardService:
         else:
             user_id = session.get('user_id')    # For clients, use user_id
         
-        # Build user filter
-        user_filter = ""
-        user_params = []
-        if user_id:
-            user_filter = " AND business_owner_id = ?"
-            user_params = [user_id]
-        
-        # Today's metrics
+        # Pre-aggregated per-day rows (shared/sales_rollup.py), all three windows in one pass
         # Sales = ALL bills (including credit/partial)
         # Revenue = Only PAID amount (exclude unpaid credit)
-        cursor.execute(f'''
-            SELECT 
-                COALESCE(SUM(total_amount), 0) as today_sales,
-                COALESCE(SUM(CASE 
-                    WHEN payment_status = 'paid' THEN total_amount
-                    WHEN payment_status = 'partial' THEN COALESCE(credit_paid_amount, 0)
-                    ELSE 0
-                END), 0) as today_revenue,
-                COUNT(*) as today_orders
-            FROM bills 
-            WHERE DATE(created_at) = DATE('now'){user_filter}
-        ''', user_params)
-        today = cursor.fetchone()
-        
-        # This week's metrics
-        cursor.execute(f'''
-            SELECT 
-                COALESCE(SUM(total_amount), 0) as week_sales,
-                COALESCE(SUM(CASE 
-                    WHEN payment_status = 'paid' THEN total_amount
-                    WHEN payment_status = 'partial' THEN COALESCE(credit_paid_amount, 0)
-                    ELSE 0
-                END), 0) as week_revenue,
-                COUNT(*) as week_orders
-            FROM bills 
-            WHERE created_at >= date('now', '-7 days'){user_filter}
-        ''', user_params)
-        week = cursor.fetchone()
-        
-        # This month's metrics
-        cursor.execute(f'''
-            SELECT 
-                COALESCE(SUM(total_amount), 0) as month_sales,
-                COALESCE(SUM(CASE 
-                    WHEN payment_status = 'paid' THEN total_amount
-                    WHEN payment_status = 'partial' THEN COALESCE(credit_paid_amount, 0)
-                    ELSE 0
-                END), 0) as month_revenue,
-                COUNT(*) as month_orders
-            FROM bills 
-            WHERE strftime('%Y-%m', created_at) = strftime('%Y-%m', 'now'){user_filter}
-        ''', user_params)
-        month = cursor.fetchone()
-        
-        conn.close()
-        month = cursor.fetchone()
+        periods = rollup_period_totals(conn, user_id, {
+            'today': period_bounds('today'),
+            'week': period_bounds('week'),
+            'month': period_bounds('this_month'),
+        })
+        today, week, month = periods['today'], periods['week'], periods['month']
         
         conn.close()
         
         return {
             'today': {
-                'sales': float(today['today_sales'] or 0),
-                'revenue': float(today['today_revenue'] or 0),
-                'orders': int(today['today_orders'] or 0)
+                'sales': today['total_sales'],
+                'revenue': today['revenue'],
+                'orders': today['bill_count']
             },
             'week': {
-                'sales': float(week['week_sales'] or 0),
-                'revenue': float(week['week_revenue'] or 0),
-                'orders': int(week['week_orders'] or 0)
+                'sales': week['total_sales'],
+                'revenue': week['revenue'],
+                'orders': week['bill_count']
             },
             'month': {
-                'sales': float(month['month_sales'] or 0),
-                'revenue': float(month['month_revenue'] or 0),
-                'orders': int(month['month_orders'] or 0)
+                'sales': month['total_sales'],
+                'revenue': month['revenue'],
+                'orders': month['bill_count']
             }
         }
     
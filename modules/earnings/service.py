@@ -3,7 +3,7 @@ Earnings service - Handle all earnings and profit calculations
 """
 
 from modules.shared.database import get_db_connection
-from datetime import datetime, timedelta
+from modules.shared.date_ranges import period_clause
 
 class EarningsService:
     
@@ -24,77 +24,45 @@ class EarningsService:
             where_clauses.append("(b.business_owner_id = ? OR b.business_owner_id IS NULL)")
             params.append(user_id)
         
-        if date_filter:
-            if date_filter == 'today':
-                today = datetime.now().strftime('%Y-%m-%d')
-                where_clauses.append("DATE(b.created_at) = ?")
-                params.append(today)
-            elif date_filter == 'yesterday':
-                yesterday = (datetime.now() - timedelta(days=1)).strftime('%Y-%m-%d')
-                where_clauses.append("DATE(b.created_at) = ?")
-                params.append(yesterday)
-            elif date_filter == 'week':
-                week_ago = (datetime.now() - timedelta(days=7)).strftime('%Y-%m-%d')
-                where_clauses.append("DATE(b.created_at) >= ?")
-                params.append(week_ago)
-            elif date_filter == 'month':
-                month_ago = (datetime.now() - timedelta(days=30)).strftime('%Y-%m-%d')
-                where_clauses.append("DATE(b.created_at) >= ?")
-                params.append(month_ago)
-            elif date_filter == 'all':
-                # All data - no date filter
-                pass
+        # Half-open created_at range so the (business_owner_id, created_at) index is usable
+        if date_filter in ('today', 'yesterday', 'week', 'month'):
+            date_sql, date_params = period_clause("b.created_at", date_filter)
+            where_clauses.append(date_sql)
+            params.extend(date_params)
         
         # Build WHERE clause
-        date_condition = ""
-        if where_clauses:
-            date_condition = "WHERE " + " AND ".join(where_clauses)
+        date_condition = "WHERE " + " AND ".join(where_clauses) if where_clauses else "WHERE 1=1"
+        paid_bill = "(b.payment_method NOT IN ('credit', 'partial') OR b.payment_method IS NULL)"
+        pending_bill = "(b.payment_method IN ('credit', 'partial') AND b.credit_balance > 0)"
         
-        # Calculate REALIZED profit (only from paid bills)
-        query_paid = f"""
-            SELECT 
-                COUNT(DISTINCT b.id) as transaction_count,
-                COALESCE(SUM(b.total_amount), 0) as total_revenue,
-                COALESCE(SUM(
-                    (SELECT SUM(COALESCE(p.cost, 0) * bi.quantity)
-                     FROM bill_items bi
-                     LEFT JOIN products p ON bi.product_id = p.id
-                     WHERE bi.bill_id = b.id)
-                ), 0) as total_cost
-            FROM bills b
-            {date_condition}
-            AND (b.payment_method NOT IN ('credit', 'partial') OR b.payment_method IS NULL)
-        """
-        
-        # Calculate PENDING profit (from credit/partial bills)
-        query_pending = f"""
+        # REALIZED profit comes from paid bills, PENDING profit from the unpaid
+        # share of credit/partial bills - one pass over bills, using the item
+        # total and cost each bill stores (shared/bill_summary.py)
+        query = f"""
             SELECT 
-                COALESCE(SUM(b.credit_balance), 0) as pending_amount,
-                COALESCE(SUM(
-                    (SELECT SUM((bi.total_price - (COALESCE(p.cost, 0) * bi.quantity)) * (b.credit_balance / b.total_amount))
-                     FROM bill_items bi
-                     LEFT JOIN products p ON bi.product_id = p.id
-                     WHERE bi.bill_id = b.id)
-                ), 0) as pending_profit
+                COALESCE(SUM(CASE WHEN {paid_bill} THEN 1 ELSE 0 END), 0) as transaction_count,
+                COALESCE(SUM(CASE WHEN {paid_bill} THEN b.total_amount ELSE 0 END), 0) as total_revenue,
+                COALESCE(SUM(CASE WHEN {paid_bill} THEN b.cogs ELSE 0 END), 0) as total_cost,
+                COALESCE(SUM(CASE WHEN {pending_bill} THEN b.credit_balance ELSE 0 END), 0) as pending_amount,
+                COALESCE(SUM(CASE WHEN {pending_bill}
+                    THEN (b.items_total - b.cogs) * (b.credit_balance / NULLIF(b.total_amount, 0))
+                    ELSE 0 END), 0) as pending_profit
             FROM bills b
             {date_condition}
-            AND b.payment_method IN ('credit', 'partial')
-            AND b.credit_balance > 0
         """
         
-        result_paid = conn.execute(query_paid, params).fetchone()
-        result_pending = conn.execute(query_pending, params).fetchone()
+        result = conn.execute(query, params).fetchone()
         conn.close()
         
         # Calculate realized profit
-        total_revenue = float(result_paid['total_revenue'] or 0)
-        total_cost = float(result_paid['total_cost'] or 0)
+        total_revenue = float(result['total_revenue'] or 0)
+        total_cost = float(result['total_cost'] or 0)
         total_profit = total_revenue - total_cost
-        transaction_count = int(result_paid['transaction_count'] or 0)
+        transaction_count = int(result['transaction_count'] or 0)
         
         # Get pending amounts
-        pending_amount = float(result_pending['pending_amount'] or 0)
-        pending_profit = float(result_pending['pending_profit'] or 0)
+        pending_amount = float(result['pending_amount'] or 0)
+        pending_profit = float(result['pending_profit'] or 0)
         
         # Calculate profit margin percentage
         profit_margin = (total_profit / total_revenue * 100) if total_revenue > 0 else 0
@@ -130,53 +98,38 @@ class EarningsService:
             where_clauses.append("(s.business_owner_id = ? OR s.business_owner_id IS NULL)")
             params.append(user_id)
         
-        if date_filter:
-            if date_filter == 'today':
-                today = datetime.now().strftime('%Y-%m-%d')
-                where_clauses.append("DATE(s.sale_date) = ?")
-                params.append(today)
-            elif date_filter == 'yesterday':
-                yesterday = (datetime.now() - timedelta(days=1)).strftime('%Y-%m-%d')
-                where_clauses.append("DATE(s.sale_date) = ?")
-                params.append(yesterday)
-            elif date_filter == 'week':
-                week_ago = (datetime.now() - timedelta(days=7)).strftime('%Y-%m-%d')
-                where_clauses.append("DATE(s.sale_date) >= ?")
-                params.append(week_ago)
-            elif date_filter == 'month':
-                month_ago = (datetime.now() - timedelta(days=30)).strftime('%Y-%m-%d')
-                where_clauses.append("DATE(s.sale_date) >= ?")
-                params.append(month_ago)
-            elif date_filter == 'all':
-                # All data - no date filter
-                pass
+        # Half-open sale_date range keeps the sale_date index usable
+        if date_filter in ('today', 'yesterday', 'week', 'month'):
+            date_sql, date_params = period_clause("s.sale_date", date_filter)
+            where_clauses.append(date_sql)
+            params.extend(date_params)
         
         # Build WHERE clause
         date_condition = ""
         if where_clauses:
             date_condition = "WHERE " + " AND ".join(where_clauses)
         
-        # Get product-wise earnings
+        # Get product-wise earnings - cost is the cogs snapshot taken at sale time
+        # (shared/costing.py), so this aggregates sales alone
         query = f"""
             SELECT 
-                p.id as product_id,
-                p.name as product_name,
-                p.price as product_price,
-                p.cost as product_cost,
+                s.product_id as product_id,
+                MAX(s.product_name) as product_name,
+                SUM(s.total_price) / NULLIF(SUM(s.quantity), 0) as product_price,
+                SUM(s.cogs) / NULLIF(SUM(s.quantity), 0) as product_cost,
                 SUM(s.quantity) as total_quantity_sold,
                 COALESCE(SUM(s.total_price), 0) as total_sales,
-                COALESCE(SUM(COALESCE(p.cost, 0) * s.quantity), 0) as total_cost,
-                COALESCE(SUM(s.total_price - (COALESCE(p.cost, 0) * s.quantity)), 0) as total_profit,
+                COALESCE(SUM(s.cogs), 0) as total_cost,
+                COALESCE(SUM(s.total_price - COALESCE(s.cogs, 0)), 0) as total_profit,
                 CASE 
                     WHEN SUM(s.total_price) > 0 THEN 
-                        (SUM(s.total_price - (COALESCE(p.cost, 0) * s.quantity)) / SUM(s.total_price)) * 100
+                        (SUM(s.total_price - COALESCE(s.cogs, 0)) / SUM(s.total_price)) * 100
                     ELSE 0
                 END as profit_margin
             FROM sales s
-            LEFT JOIN products p ON s.product_id = p.id
             {date_condition}
-            GROUP BY p.id, p.name, p.price, p.cost
-            HAVING total_quantity_sold > 0
+            GROUP BY s.product_id
+            HAVING SUM(s.quantity) > 0
             ORDER BY total_profit DESC
         """
         
@@ -225,13 +225,10 @@ def get_current_stock(product_id, user_id):
     cursor = conn.cursor()
     
     try:
-        # Calculate current stock from transactions
+        # Materialized balance maintained by the stock ledger
         cursor.execute("""
-            SELECT SUM(
-                CASE WHEN transaction_type = 'in' THEN quantity ELSE -quantity END
-            ) as current_stock
-            FROM stock_transactions
-            WHERE product_id = ? AND business_owner_id = ?
+            SELECT stock as current_stock FROM products
+            WHERE id = ? AND user_id = ?
         """, (product_id, user_id))
         
         result = cursor.fetchone()
@@ -258,18 +255,10 @@ def update_stock_alerts(user_id):
         cursor.execute("""
             SELECT 
                 p.id, p.name, p.min_stock,
-                COALESCE(s.current_stock, 0) as current_stock
+                COALESCE(p.stock, 0) as current_stock
             FROM products p
-            LEFT JOIN (
-                SELECT 
-                    product_id,
-                    SUM(CASE WHEN transaction_type = 'in' THEN quantity ELSE -quantity END) as current_stock
-                FROM stock_transactions 
-                WHERE business_owner_id = ?
-                GROUP BY product_id
-            ) s ON p.id = s.product_id
             WHERE p.user_id = ? AND p.is_active = 1
-        """, (user_id, user_id))
+        """, (user_id,))
         
         from modules.shared.database import generate_id
         from datetime import datetime
@@ -303,48 +292,16 @@ def update_stock_alerts(user_id):
         conn.close()
 
 def migrate_existing_products_to_integrated():
-    """Migrate existing products to the integrated inventory system"""
+    """Migrate existing products into the stock ledger (see modules/shared/stock_ledger.py)"""
+    from modules.shared.stock_ledger import reconcile_stock_sources
     conn = get_db_connection()
-    cursor = conn.cursor()
     
     try:
-        # Get all products that don't have stock transactions yet
-        cursor.execute("""
-            SELECT p.id, p.stock, p.price, p.user_id
-            FROM products p
-            LEFT JOIN stock_transactions st ON p.id = st.product_id
-            WHERE st.product_id IS NULL AND p.is_active = 1
-        """)
-        
-        products_to_migrate = cursor.fetchall()
-        
-        from modules.shared.database import generate_id
-        from datetime import datetime
-        
-        migrated_count = 0
-        
-        for product_id, stock, price, user_id in products_to_migrate:
-            if stock > 0:
-                # Create opening stock transaction
-                transaction_id = generate_id()
-                now = datetime.now().isoformat()
-                
-                cursor.execute("""
-                    INSERT INTO stock_transactions (
-                        id, product_id, transaction_type, quantity, unit_cost, total_cost,
-                        reference_type, reference_id, notes, created_by, business_owner_id, created_at
-                    ) VALUES (?, ?, 'in', ?, ?, ?, 'opening', ?, 'Opening stock migration', ?, ?, ?)
-                """, (
-                    transaction_id, product_id, stock, price, stock * price,
-                    product_id, user_id, user_id, now
-                ))
-                
-                migrated_count += 1
-        
+        summary = reconcile_stock_sources(conn)
         conn.commit()
-        print(f"✅ Migrated {migrated_count} products to integrated inventory system")
+        print(f"✅ Migrated {summary['products']} products to integrated inventory system")
         
-        return migrated_count
+        return summary['products']
         
     except Exception as e:
         print(f"❌ Error migrating products: {e}")
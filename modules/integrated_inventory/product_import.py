@@ -0,0 +1,387 @@
+"""
+Bulk product import
+Streams a CSV or XLSX catalogue and loads it chunk by chunk:
+
+- the file is read row by row (csv.reader, or the XLSX sheet XML through
+  iterparse - no spreadsheet package, nothing held in memory but a chunk)
+- each chunk of PRODUCT_IMPORT_CHUNK_SIZE rows is validated, checked against
+  the tenant's existing product codes / barcodes (loaded into sets once per
+  import, then kept up to date with the rows accepted so far) and against
+  the other tenants' with one IN probe per chunk (both columns are globally
+  unique), and bulk-loaded: COPY on PostgreSQL, executemany on SQLite,
+  plus one bulk load of opening-stock ledger entries
+- every chunk is its own short transaction, committed together with the
+  job's progress and per-row errors (shared/import_jobs.py)
+
+The SKU is the product's code. Rows without one get a generated code that
+cannot collide across imports.
+
+- start_product_import(file_storage, user_id) -> job id (runs in the background)
+- import_products(conn, user_id, rows) -> (processed, imported, errors) for in-memory rows
+"""
+
+import csv
+import os
+import re
+import tempfile
+import uuid
+import zipfile
+from datetime import datetime
+from xml.etree.ElementTree import iterparse
+
+from modules.shared import barcode_index
+from modules.shared import import_jobs
+from modules.shared.cache import invalidate_tenant
+from modules.shared.database import copy_insert, generate_id, get_db_connection
+from modules.shared.stock_ledger import bulk_opening_stock
+
+PRODUCT_IMPORT_CHUNK_SIZE = int(os.environ.get('PRODUCT_IMPORT_CHUNK_SIZE', 1000))
+
+# Accepted header spellings -> field
+HEADER_ALIASES = {
+    'name': 'name', 'product_name': 'name', 'product': 'name', 'item_name': 'name',
+    'sku': 'sku', 'code': 'sku', 'product_code': 'sku', 'item_code': 'sku',
+    'barcode': 'barcode', 'barcode_data': 'barcode', 'ean': 'barcode', 'upc': 'barcode',
+    'category': 'category',
+    'selling_price': 'selling_price', 'price': 'selling_price', 'sale_price': 'selling_price',
+    'mrp': 'mrp',
+    'purchase_price': 'purchase_price', 'cost': 'purchase_price', 'cost_price': 'purchase_price',
+    'stock': 'stock', 'opening_stock': 'stock', 'quantity': 'stock', 'qty': 'stock',
+    'unit': 'unit', 'uom': 'unit',
+    'min_stock': 'min_stock', 'reorder_level': 'min_stock',
+    'max_stock': 'max_stock',
+    'hsn_code': 'hsn_code', 'hsn': 'hsn_code',
+    'gst_rate': 'gst_rate', 'gst': 'gst_rate', 'tax_rate': 'gst_rate',
+    'description': 'description',
+}
+
+_XLSX_NS = '{http://schemas.openxmlformats.org/spreadsheetml/2006/main}'
+_REL_NS = '{http://schemas.openxmlformats.org/officeDocument/2006/relationships}'
+_CELL_COLUMN = re.compile(r'[A-Z]+')
+
+
+# ==================== READERS ====================
+
+def iter_csv_rows(path):
+    """Lists of cell strings, header row first"""
+    with open(path, newline='', encoding='utf-8-sig') as handle:
+        sample = handle.read(4096)
+        handle.seek(0)
+        try:
+            dialect = csv.Sniffer().sniff(sample, delimiters=',;\t')
+        except csv.Error:
+            dialect = csv.excel
+        yield from csv.reader(handle, dialect)
+
+
+def _first_sheet(archive):
+    """Path of the workbook's first worksheet inside the zip"""
+    try:
+        with archive.open('xl/workbook.xml') as handle:
+            sheet = next(element for _, element in iterparse(handle) if element.tag == f'{_XLSX_NS}sheet')
+        rel_id = sheet.get(f'{_REL_NS}id')
+        with archive.open('xl/_rels/workbook.xml.rels') as handle:
+            for _, element in iterparse(handle):
+                if element.get('Id') == rel_id:
+                    target = element.get('Target').lstrip('/')
+                    return target if target.startswith('xl/') else f'xl/{target}'
+    except (KeyError, StopIteration):
+        pass
+    return 'xl/worksheets/sheet1.xml'
+
+
+def _column_index(ref):
+    index = 0
+    for letter in _CELL_COLUMN.match(ref).group():
+        index = index * 26 + ord(letter) - 64
+    return index - 1
+
+
+def iter_xlsx_rows(path):
+    """Lists of cell strings of the first worksheet, header row first"""
+    with zipfile.ZipFile(path) as archive:
+        shared = []
+        if 'xl/sharedStrings.xml' in archive.namelist():
+            with archive.open('xl/sharedStrings.xml') as handle:
+                for _, element in iterparse(handle):
+                    if element.tag == f'{_XLSX_NS}si':
+                        shared.append(''.join(text.text or '' for text in element.iter(f'{_XLSX_NS}t')))
+                        element.clear()
+        with archive.open(_first_sheet(archive)) as handle:
+            for _, element in iterparse(handle):
+                if element.tag != f'{_XLSX_NS}row':
+                    continue
+                values = []
+                for cell in element.iter(f'{_XLSX_NS}c'):
+                    if cell.get('r'):
+                        index = _column_index(cell.get('r'))
+                        values.extend([''] * (index - len(values)))
+                    kind = cell.get('t')
+                    if kind == 'inlineStr':
+                        value = ''.join(text.text or '' for text in cell.iter(f'{_XLSX_NS}t'))
+                    else:
+                        raw = cell.find(f'{_XLSX_NS}v')
+                        value = raw.text if raw is not None and raw.text is not None else ''
+                        if kind == 's' and value:
+                            value = shared[int(value)]
+                        elif kind is None and value.endswith('.0'):
+                            value = value[:-2]
+                    values.append(value)
+                element.clear()
+                yield values
+
+
+def _field(name):
+    return HEADER_ALIASES.get(re.sub(r'[^a-z0-9]+', '_', str(name).strip().lower()).strip('_'))
+
+
+def normalize_row(raw):
+    """{field: value} of a dict keyed by any accepted header spelling"""
+    return {_field(key): value for key, value in raw.items() if _field(key)}
+
+
+def iter_file_rows(path, fmt):
+    """(row_number, {field: value}) of a CSV / XLSX file; row 1 is the header"""
+    rows = iter_xlsx_rows(path) if fmt == 'xlsx' else iter_csv_rows(path)
+    header = next(rows, None)
+    if not header:
+        raise ValueError("The file is empty")
+    fields = [_field(name) for name in header]
+    if 'name' not in fields:
+        raise ValueError("The file needs a 'name' column")
+    for row_number, values in enumerate(rows, start=2):
+        if not any(str(value).strip() for value in values):
+            continue
+        yield row_number, {field: value for field, value in zip(fields, values) if field}
+
+
+# ==================== VALIDATION ====================
+
+def _text(value):
+    return str(value).strip() if value is not None else ''
+
+
+def _number(row, field, default=0, whole=False, maximum=None):
+    value = _text(row.get(field)).replace(',', '')
+    if not value:
+        return default
+    try:
+        number = float(value)
+    except ValueError:
+        raise ValueError(f"{field} must be a number (got '{value}')")
+    if number < 0 or (maximum is not None and number > maximum):
+        raise ValueError(f"{field} is out of range ({value})")
+    if whole:
+        if not number.is_integer():
+            raise ValueError(f"{field} must be a whole number (got '{value}')")
+        return int(number)
+    return number
+
+
+def validate_row(row):
+    """Normalized product fields of an input row; ValueError with the reason if invalid"""
+    name = _text(row.get('name'))
+    if not name:
+        raise ValueError("name is required")
+    if _text(row.get('selling_price')) == '':
+        raise ValueError("selling_price is required")
+    selling_price = _number(row, 'selling_price')
+    return {
+        'name': name[:255],
+        'sku': _text(row.get('sku'))[:100] or None,
+        'barcode': _text(row.get('barcode'))[:255] or None,
+        'category': _text(row.get('category')) or 'General',
+        'selling_price': selling_price,
+        'mrp': _number(row, 'mrp', default=selling_price),
+        'purchase_price': _number(row, 'purchase_price'),
+        'stock': _number(row, 'stock', whole=True),
+        'unit': _text(row.get('unit')) or 'piece',
+        'min_stock': _number(row, 'min_stock', whole=True),
+        'max_stock': _number(row, 'max_stock', whole=True),
+        'hsn_code': _text(row.get('hsn_code')),
+        'gst_rate': _number(row, 'gst_rate', default=18, maximum=100),
+        'description': _text(row.get('description')),
+    }
+
+
+# ==================== LOADING ====================
+
+def _generated_code():
+    return f"SKU{uuid.uuid4().hex[:12].upper()}"
+
+
+class ProductImporter:
+    """Loads validated chunks of products for one tenant on one connection"""
+
+    # products column -> product field; columns missing from this schema are skipped
+    COLUMNS = (
+        ('name', 'name'), ('category', 'category'), ('price', 'selling_price'), ('cost', 'purchase_price'),
+        ('stock', 'stock'), ('min_stock', 'min_stock'), ('unit', 'unit'), ('barcode_data', 'barcode'),
+        ('description', 'description'), ('max_stock', 'max_stock'), ('hsn_code', 'hsn_code'),
+        ('gst_rate', 'gst_rate'), ('mrp', 'mrp'), ('purchase_price', 'purchase_price'),
+        ('selling_price', 'selling_price'),
+    )
+
+    def __init__(self, conn, user_id):
+        self.conn = conn
+        self.user_id = user_id
+        existing = {column[0] for column in conn.execute('SELECT * FROM products LIMIT 0').description}
+        self.columns = [(column, field) for column, field in self.COLUMNS if column in existing]
+        self.has_ledger_seq = 'ledger_seq' in existing
+        # The tenant's codes and barcodes, loaded once
+        self.codes, self.barcodes = set(), set()
+        for row in conn.execute('SELECT code, barcode_data FROM products WHERE user_id = ?', (user_id,)):
+            if row['code']:
+                self.codes.add(row['code'])
+            if row['barcode_data']:
+                self.barcodes.add(row['barcode_data'])
+
+    def _taken(self, column, values):
+        """Which of `values` another tenant already uses (the columns are globally unique)"""
+        values = [value for value in values if value]
+        if not values:
+            return set()
+        rows = self.conn.execute(f"SELECT {column} FROM products WHERE {column} IN ({','.join('?' * len(values))})",
+                                 values).fetchall()
+        return {row[0] for row in rows}
+
+    def load_chunk(self, rows):
+        """
+        Validate and insert [(row_number, raw_row), ...]; returns
+        (imported, errors) with errors as [(row_number, sku, message), ...].
+        Caller commits.
+        """
+        accepted, errors = [], []
+        # Codes of this chunk; they join self.codes/self.barcodes only once inserted,
+        # so a chunk that rolls back does not block its SKUs in later chunks
+        chunk_codes, chunk_barcodes = set(), set()
+        for row_number, raw in rows:
+            try:
+                product = validate_row(raw)
+            except ValueError as e:
+                errors.append((row_number, _text(raw.get('sku')), str(e)))
+                continue
+            if product['sku'] and (product['sku'] in self.codes or product['sku'] in chunk_codes):
+                errors.append((row_number, product['sku'], f"SKU {product['sku']} already exists"))
+                continue
+            if product['barcode'] and (product['barcode'] in self.barcodes or product['barcode'] in chunk_barcodes):
+                errors.append((row_number, product['sku'], f"Barcode {product['barcode']} already exists"))
+                continue
+            product['sku'] = product['sku'] or _generated_code()
+            chunk_codes.add(product['sku'])
+            if product['barcode']:
+                chunk_barcodes.add(product['barcode'])
+            accepted.append((row_number, product))
+
+        taken_codes = self._taken('code', [product['sku'] for _, product in accepted])
+        taken_barcodes = self._taken('barcode_data', [product['barcode'] for _, product in accepted])
+        if taken_codes or taken_barcodes:
+            kept = []
+            for row_number, product in accepted:
+                if product['sku'] in taken_codes:
+                    errors.append((row_number, product['sku'], f"SKU {product['sku']} is used by another business"))
+                elif product['barcode'] in taken_barcodes:
+                    errors.append((row_number, product['sku'],
+                                   f"Barcode {product['barcode']} is used by another business"))
+                else:
+                    kept.append((row_number, product))
+            accepted = kept
+
+        now = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+        product_rows, openings = [], []
+        for _, product in accepted:
+            product_id = generate_id()
+            values = [product_id, product['sku'], self.user_id, True, now]
+            values.extend(product[field] for _, field in self.columns)
+            if self.has_ledger_seq:
+                values.append(1 if product['stock'] else 0)
+            product_rows.append(tuple(values))
+            if product['stock']:
+                openings.append((product_id, product['stock'], self.user_id, product['purchase_price'] or None))
+
+        columns = ['id', 'code', 'user_id', 'is_active', 'created_at'] + [column for column, _ in self.columns]
+        if self.has_ledger_seq:
+            columns.append('ledger_seq')
+        copy_insert(self.conn, 'products', columns, product_rows)
+        if self.has_ledger_seq:
+            bulk_opening_stock(self.conn, openings)
+        for _, product in accepted:
+            self.codes.add(product['sku'])
+            if product['barcode']:
+                self.barcodes.add(product['barcode'])
+        errors.sort()
+        return len(product_rows), errors
+
+
+def _chunks(rows, size):
+    chunk = []
+    for row in rows:
+        chunk.append(row)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def import_products(conn, user_id, rows, job_id=None, chunk_size=None):
+    """
+    Import (row_number, raw_row) pairs chunk by chunk, committing each chunk
+    (with the job's progress when job_id is given). Returns
+    (processed, imported, errors); errors are only collected without a job.
+    """
+    importer = ProductImporter(conn, user_id)
+    processed = imported = 0
+    collected = []
+    for chunk in _chunks(rows, chunk_size or PRODUCT_IMPORT_CHUNK_SIZE):
+        try:
+            chunk_imported, errors = importer.load_chunk(chunk)
+        except Exception as e:
+            # A constraint the pre-checks could not see (a concurrent insert):
+            # nothing of the chunk is kept, every row is reported
+            conn.rollback()
+            chunk_imported = 0
+            errors = [(row_number, _text(raw.get('sku')), f"Not imported: {e}") for row_number, raw in chunk]
+        if job_id:
+            import_jobs.record_chunk(conn, job_id, len(chunk), chunk_imported, errors)
+        else:
+            collected.extend(errors)
+        conn.commit()
+        processed += len(chunk)
+        imported += chunk_imported
+    return processed, imported, collected
+
+
+# ==================== JOBS ====================
+
+def run_product_import(job_id, path, fmt, user_id):
+    """Import job body: stream the saved upload into products, then drop the file"""
+    conn = get_db_connection()
+    try:
+        processed, imported, _ = import_products(conn, user_id, iter_file_rows(path, fmt), job_id=job_id)
+        import_jobs.finish_job(job_id, total_rows=processed)
+        print(f"📦 Product import {job_id}: {imported}/{processed} rows imported")
+    finally:
+        conn.close()
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+        if user_id:
+            invalidate_tenant(user_id)
+            barcode_index.barcode_index.invalidate(user_id)
+
+
+def start_product_import(file_storage, user_id):
+    """Save an uploaded CSV/XLSX and queue its import; returns the job id"""
+    filename = file_storage.filename or 'products.csv'
+    fmt = 'xlsx' if filename.lower().endswith(('.xlsx', '.xlsm')) else 'csv'
+    handle, path = tempfile.mkstemp(prefix='product-import-', suffix=f'.{fmt}')
+    with os.fdopen(handle, 'wb') as target:
+        file_storage.save(target)
+    if fmt == 'xlsx' and not zipfile.is_zipfile(path):
+        os.remove(path)
+        raise ValueError("Not a valid .xlsx file")
+    job_id = import_jobs.create_job('products', user_id, filename)
+    import_jobs.submit(job_id, run_product_import, path, fmt, user_id)
+    return job_id
@@ -6,6 +6,11 @@ Connects Product Master, Inventory Control, and Purchase Entry
 from flask import Blueprint, request, jsonify, session, render_template
 from modules.shared.auth_decorators import require_auth
 from modules.shared.database import get_db_connection, generate_id
+from modules.shared.stock_ledger import post_movement, stock_history
+from modules.shared.search import search_rows
+from modules.shared import import_jobs
+from modules.shared.export import export_response, stream_rows
+from modules.integrated_inventory.product_import import start_product_import
 from datetime import datetime
 import json
 
@@ -57,21 +62,12 @@ def get_products_for_inventory():
         cursor.execute("""
             SELECT 
                 p.*,
-                COALESCE(s.current_stock, p.stock) as current_stock,
-                COALESCE(s.last_updated, p.updated_at) as stock_last_updated
+                COALESCE(p.stock, 0) as current_stock,
+                p.updated_at as stock_last_updated
             FROM products p
-            LEFT JOIN (
-                SELECT 
-                    product_id,
-                    SUM(CASE WHEN transaction_type = 'in' THEN quantity ELSE -quantity END) as current_stock,
-                    MAX(created_at) as last_updated
-                FROM stock_transactions 
-                WHERE business_owner_id = ?
-                GROUP BY product_id
-            ) s ON p.id = s.product_id
             WHERE p.user_id = ? AND p.is_active = 1
             ORDER BY p.name
-        """, (user_id, user_id))
+        """, (user_id,))
         
         products = []
         for row in cursor.fetchall():
@@ -159,16 +155,6 @@ def create_product():
             gst_rate, mrp, purchase_price, selling_price
         ))
         
-        # Initialize stock transaction record
-        cursor.execute("""
-            INSERT INTO stock_transactions (
-                id, product_id, transaction_type, quantity, unit_cost, total_cost,
-                reference_type, reference_id, notes, created_by, business_owner_id, created_at
-            ) VALUES (?, ?, 'opening', 0, ?, 0, 'product_creation', ?, 'Initial product creation', ?, ?, ?)
-        """, (
-            generate_id(), product_id, purchase_price, product_id, user_id, user_id, now
-        ))
-        
         conn.commit()
         conn.close()
         
@@ -206,32 +192,23 @@ def get_stock_summary():
                 p.sku,
                 p.unit,
                 p.min_stock,
-                COALESCE(s.current_stock, 0) as current_stock,
-                COALESCE(s.last_updated, p.created_at) as last_updated,
+                COALESCE(p.stock, 0) as current_stock,
+                COALESCE(p.updated_at, p.created_at) as last_updated,
                 CASE 
-                    WHEN COALESCE(s.current_stock, 0) = 0 THEN 'out-of-stock'
-                    WHEN COALESCE(s.current_stock, 0) <= p.min_stock THEN 'low-stock'
+                    WHEN COALESCE(p.stock, 0) = 0 THEN 'out-of-stock'
+                    WHEN COALESCE(p.stock, 0) <= p.min_stock THEN 'low-stock'
                     ELSE 'in-stock'
                 END as status
             FROM products p
-            LEFT JOIN (
-                SELECT 
-                    product_id,
-                    SUM(CASE WHEN transaction_type = 'in' THEN quantity ELSE -quantity END) as current_stock,
-                    MAX(created_at) as last_updated
-                FROM stock_transactions 
-                WHERE business_owner_id = ?
-                GROUP BY product_id
-            ) s ON p.id = s.product_id
             WHERE p.user_id = ? AND p.is_active = 1
             ORDER BY 
                 CASE 
-                    WHEN COALESCE(s.current_stock, 0) = 0 THEN 1
-                    WHEN COALESCE(s.current_stock, 0) <= p.min_stock THEN 2
+                    WHEN COALESCE(p.stock, 0) = 0 THEN 1
+                    WHEN COALESCE(p.stock, 0) <= p.min_stock THEN 2
                     ELSE 3
                 END,
                 p.name
-        """, (user_id, user_id))
+        """, (user_id,))
         
         products = []
         total_products = 0
@@ -262,19 +239,11 @@ def get_stock_summary():
         # Calculate total inventory value
         cursor.execute("""
             SELECT SUM(
-                COALESCE(s.current_stock, 0) * p.purchase_price
+                COALESCE(p.stock, 0) * p.purchase_price
             ) as total_value
             FROM products p
-            LEFT JOIN (
-                SELECT 
-                    product_id,
-                    SUM(CASE WHEN transaction_type = 'in' THEN quantity ELSE -quantity END) as current_stock
-                FROM stock_transactions 
-                WHERE business_owner_id = ?
-                GROUP BY product_id
-            ) s ON p.id = s.product_id
             WHERE p.user_id = ? AND p.is_active = 1
-        """, (user_id, user_id))
+        """, (user_id,))
         
         total_value_row = cursor.fetchone()
         total_value = total_value_row[0] if total_value_row and total_value_row[0] else 0
@@ -314,32 +283,18 @@ def get_stock_ledger(product_id):
         if not product:
             return jsonify({'success': False, 'error': 'Product not found'}), 404
         
-        # Get transaction history
-        cursor.execute("""
-            SELECT 
-                transaction_type,
-                quantity,
-                unit_cost,
-                total_cost,
-                reference_type,
-                notes,
-                created_at
-            FROM stock_transactions
-            WHERE product_id = ? AND business_owner_id = ?
-            ORDER BY created_at DESC
-            LIMIT 50
-        """, (product_id, user_id))
-        
+        # Get transaction history (newest first, from the stock ledger)
         transactions = []
-        for row in cursor.fetchall():
+        for entry in stock_history(conn, product_id, user_id, limit=50):
             transactions.append({
-                'type': row[0],
-                'quantity': row[1],
-                'unit_cost': row[2],
-                'total_cost': row[3],
-                'reference_type': row[4],
-                'notes': row[5],
-                'created_at': row[6]
+                'type': entry['transaction_type'],
+                'quantity': entry['quantity'],
+                'unit_cost': entry['unit_cost'],
+                'total_cost': abs(entry['quantity']) * (entry['unit_cost'] or 0),
+                'reference_type': entry['reference_type'],
+                'notes': entry['notes'],
+                'balance_after': entry['balance_after'],
+                'created_at': entry['created_at']
             })
         
         conn.close()
@@ -354,6 +309,54 @@ def get_stock_ledger(product_id):
         print(f"❌ Error getting stock ledger: {e}")
         return jsonify({'success': False, 'error': str(e)}), 500
 
+# ==================== BULK PRODUCT IMPORT API ====================
+
+@integrated_inventory_bp.route('/api/products/import', methods=['POST'])
+@require_auth
+def import_products():
+    """Upload a CSV/XLSX catalogue; the import runs in the background (poll the job)"""
+    try:
+        user_id = get_user_id_from_session()
+        if not user_id:
+            return jsonify({'success': False, 'error': 'User not authenticated'}), 401
+        
+        if 'file' not in request.files or not request.files['file'].filename:
+            return jsonify({'success': False, 'error': 'No file uploaded'}), 400
+        
+        job_id = start_product_import(request.files['file'], user_id)
+        return jsonify({
+            'success': True,
+            'job_id': job_id,
+            'status_url': f'/inventory/api/products/import/{job_id}'
+        }), 202
+        
+    except ValueError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+    except Exception as e:
+        print(f"❌ Error starting product import: {e}")
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+@integrated_inventory_bp.route('/api/products/import/<job_id>', methods=['GET'])
+@require_auth
+def get_import_job(job_id):
+    """Progress of a product import, with its first row errors"""
+    user_id = get_user_id_from_session()
+    job = import_jobs.get_job(job_id, user_id)
+    if job is None:
+        return jsonify({'success': False, 'error': 'Import job not found'}), 404
+    return jsonify({'success': True, 'job': job})
+
+@integrated_inventory_bp.route('/api/products/import/<job_id>/errors', methods=['GET'])
+@require_auth
+def export_import_errors(job_id):
+    """Full per-row error report of a product import (CSV or ?format=excel)"""
+    user_id = get_user_id_from_session()
+    if import_jobs.get_job(job_id, user_id) is None:
+        return jsonify({'success': False, 'error': 'Import job not found'}), 404
+    sql, params = import_jobs.error_rows_query(job_id)
+    return export_response(stream_rows(sql, params), ['Row', 'SKU', 'Error'],
+                           f'product_import_errors_{job_id[:8]}', request.args.get('format', 'csv'))
+
 # ==================== PURCHASE ENTRY API ====================
 
 @integrated_inventory_bp.route('/api/purchase-entry', methods=['POST'])
@@ -417,19 +420,12 @@ def create_purchase_entry():
             item_total = quantity * unit_cost
             total_amount += item_total
             
-            # Create stock transaction
-            transaction_id = generate_id()
-            cursor.execute("""
-                INSERT INTO stock_transactions (
-                    id, product_id, transaction_type, quantity, unit_cost, total_cost,
-                    reference_type, reference_id, supplier_name, batch_number, expiry_date,
-                    notes, created_by, business_owner_id, created_at
-                ) VALUES (?, ?, 'in', ?, ?, ?, 'purchase', ?, ?, ?, ?, ?, ?, ?, ?)
-            """, (
-                transaction_id, product_id, quantity, unit_cost, item_total,
-                purchase_id, supplier, batch_number, expiry_date,
-                item_notes, user_id, user_id, now
-            ))
+            # Post the receipt to the stock ledger
+            new_stock = post_movement(conn, product_id, quantity, 'purchase', reference_id=purchase_id,
+                                      business_owner_id=user_id, created_by=user_id,
+                                      notes=item_notes, unit_cost=unit_cost,
+                                      details={'supplier_name': supplier, 'batch_number': batch_number,
+                                               'expiry_date': expiry_date})
             
             # Update product's last purchase price
             cursor.execute("""
@@ -441,7 +437,8 @@ def create_purchase_entry():
                 'product_id': product_id,
                 'name': product[0],
                 'quantity_added': quantity,
-                'unit_cost': unit_cost
+                'unit_cost': unit_cost,
+                'new_stock': new_stock
             })
         
         # Update purchase entry total
@@ -481,28 +478,18 @@ def search_products():
         conn = get_db_connection()
         cursor = conn.cursor()
         
-        # Search by name, SKU, or barcode
-        cursor.execute("""
-            SELECT 
-                p.id, p.name, p.sku, p.unit, p.purchase_price,
-                COALESCE(s.current_stock, 0) as current_stock
-            FROM products p
-            LEFT JOIN (
-                SELECT 
-                    product_id,
-                    SUM(CASE WHEN transaction_type = 'in' THEN quantity ELSE -quantity END) as current_stock
-                FROM stock_transactions 
-                WHERE business_owner_id = ?
-                GROUP BY product_id
-            ) s ON p.id = s.product_id
-            WHERE p.user_id = ? AND p.is_active = 1
-            AND (p.name LIKE ? OR p.sku LIKE ? OR p.barcode_data LIKE ?)
-            ORDER BY p.name
-            LIMIT 10
-        """, (user_id, user_id, f'%{query}%', f'%{query}%', f'%{query}%'))
+        # Exact SKU first, then ranked matches on name, code or barcode
+        columns = "id, name, sku, unit, purchase_price, COALESCE(stock, 0) as current_stock"
+        cursor.execute(f"""
+            SELECT {columns} FROM products
+            WHERE user_id = ? AND is_active = 1 AND sku = ?
+        """, (user_id, query))
+        rows = cursor.fetchall()
+        seen = {row[0] for row in rows}
+        rows += [row for row in search_rows(conn, 'product', user_id, query, 10, columns) if row[0] not in seen]
         
         products = []
-        for row in cursor.fetchall():
+        for row in rows[:10]:
             products.append({
                 'id': row[0],
                 'name': row[1],
@@ -549,22 +536,12 @@ def stock_adjustment():
         if not product:
             return jsonify({'success': False, 'error': 'Product not found'}), 404
         
-        # Create adjustment transaction
+        # Post the adjustment to the stock ledger
         transaction_id = generate_id()
-        now = datetime.now().isoformat()
-        transaction_type = 'in' if quantity_change > 0 else 'out'
-        abs_quantity = abs(quantity_change)
-        
-        cursor.execute("""
-            INSERT INTO stock_transactions (
-                id, product_id, transaction_type, quantity, unit_cost, total_cost,
-                reference_type, reference_id, notes, created_by, business_owner_id, created_at
-            ) VALUES (?, ?, ?, ?, 0, 0, 'adjustment', ?, ?, ?, ?, ?)
-        """, (
-            transaction_id, product_id, transaction_type, abs_quantity,
-            f"{adjustment_type}: {reason}", f"{reason} - {notes}".strip(' -'),
-            user_id, user_id, now
-        ))
+        new_stock = post_movement(conn, product_id, quantity_change, 'adjustment', reference_id=transaction_id,
+                                  business_owner_id=user_id, created_by=user_id,
+                                  notes=f"{adjustment_type}: {reason} - {notes}".strip(' -'),
+                                  transaction_type='ADJUSTMENT')
         
         conn.commit()
         conn.close()
@@ -572,7 +549,8 @@ def stock_adjustment():
         return jsonify({
             'success': True,
             'message': f'Stock adjustment recorded for {product[0]}',
-            'transaction_id': transaction_id
+            'transaction_id': transaction_id,
+            'new_stock': new_stock
         })
         
     except Exception as e:
@@ -596,23 +574,15 @@ def get_reorder_report():
         cursor.execute("""
             SELECT 
                 p.id, p.name, p.category, p.sku, p.unit, p.min_stock,
-                COALESCE(s.current_stock, 0) as current_stock,
-                (p.min_stock - COALESCE(s.current_stock, 0)) as shortage
+                COALESCE(p.stock, 0) as current_stock,
+                (p.min_stock - COALESCE(p.stock, 0)) as shortage
             FROM products p
-            LEFT JOIN (
-                SELECT 
-                    product_id,
-                    SUM(CASE WHEN transaction_type = 'in' THEN quantity ELSE -quantity END) as current_stock
-                FROM stock_transactions 
-                WHERE business_owner_id = ?
-                GROUP BY product_id
-            ) s ON p.id = s.product_id
             WHERE p.user_id = ? AND p.is_active = 1
-            AND COALESCE(s.current_stock, 0) <= p.min_stock
+            AND COALESCE(p.stock, 0) <= p.min_stock
             ORDER BY 
-                CASE WHEN COALESCE(s.current_stock, 0) = 0 THEN 1 ELSE 2 END,
-                (p.min_stock - COALESCE(s.current_stock, 0)) DESC
-        """, (user_id, user_id))
+                CASE WHEN COALESCE(p.stock, 0) = 0 THEN 1 ELSE 2 END,
+                (p.min_stock - COALESCE(p.stock, 0)) DESC
+        """, (user_id,))
         
         reorder_items = []
         for row in cursor.fetchall():
@@ -4,7 +4,10 @@ Business logic for Product Master, Inventory Control, and Purchase Entry
 """
 
 from modules.shared.database import get_db_connection, generate_id
+from modules.shared.stock_ledger import post_movement, stock_history
+from modules.shared.cache import invalidate_tenant
 from modules.integrated_inventory.database import get_current_stock, update_stock_alerts
+from modules.integrated_inventory.product_import import import_products, normalize_row
 from datetime import datetime, timedelta
 import json
 
@@ -68,18 +71,6 @@ class IntegratedInventoryService:
                 product_data.get('selling_price', 0)
             ))
             
-            # Create initial stock transaction (opening balance)
-            transaction_id = generate_id()
-            cursor.execute("""
-                INSERT INTO stock_transactions (
-                    id, product_id, transaction_type, quantity, unit_cost, total_cost,
-                    reference_type, reference_id, notes, created_by, business_owner_id, created_at
-                ) VALUES (?, ?, 'opening', 0, ?, 0, 'product_creation', ?, 'Product created', ?, ?, ?)
-            """, (
-                transaction_id, product_id, product_data.get('purchase_price', 0),
-                product_id, user_id, user_id, now
-            ))
-            
             conn.commit()
             conn.close()
             
@@ -136,82 +127,19 @@ class IntegratedInventoryService:
             return {'success': False, 'error': str(e)}
     
     def bulk_import_products(self, products_data, user_id):
-        """Bulk import products from CSV/Excel data"""
+        """Bulk import products from CSV/Excel data (list of row dicts); see product_import.py"""
+        conn = None
         try:
             conn = self.get_db_connection()
-            cursor = conn.cursor()
-            
-            imported_count = 0
-            errors = []
-            
-            for i, product_data in enumerate(products_data):
-                try:
-                    # Generate SKU if not provided
-                    sku = product_data.get('sku')
-                    if not sku:
-                        sku = f"SKU{datetime.now().strftime('%Y%m%d%H%M%S')}{i:03d}"
-                    
-                    # Check if SKU already exists
-                    cursor.execute("SELECT id FROM products WHERE sku = ? AND user_id = ?", (sku, user_id))
-                    if cursor.fetchone():
-                        errors.append(f"Row {i+1}: SKU {sku} already exists")
-                        continue
-                    
-                    # Create product
-                    product_id = generate_id()
-                    now = datetime.now().isoformat()
-                    
-                    cursor.execute("""
-                        INSERT INTO products (
-                            id, name, description, category, price, stock, unit, sku, 
-                            barcode_data, is_active, user_id, created_at, updated_at,
-                            min_stock, max_stock, hsn_code, gst_rate, mrp, purchase_price, selling_price
-                        ) VALUES (?, ?, ?, ?, ?, 0, ?, ?, ?, 1, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-                    """, (
-                        product_id,
-                        product_data.get('name'),
-                        product_data.get('description', ''),
-                        product_data.get('category', 'other'),
-                        product_data.get('selling_price', 0),
-                        product_data.get('unit', 'piece'),
-                        sku,
-                        product_data.get('barcode', ''),
-                        user_id,
-                        now,
-                        now,
-                        product_data.get('min_stock', 0),
-                        product_data.get('max_stock', 0),
-                        product_data.get('hsn_code', ''),
-                        product_data.get('gst_rate', 18),
-                        product_data.get('mrp', 0),
-                        product_data.get('purchase_price', 0),
-                        product_data.get('selling_price', 0)
-                    ))
-                    
-                    # Create initial stock transaction
-                    transaction_id = generate_id()
-                    cursor.execute("""
-                        INSERT INTO stock_transactions (
-                            id, product_id, transaction_type, quantity, unit_cost, total_cost,
-                            reference_type, reference_id, notes, created_by, business_owner_id, created_at
-                        ) VALUES (?, ?, 'opening', 0, ?, 0, 'bulk_import', ?, 'Bulk import', ?, ?, ?)
-                    """, (
-                        transaction_id, product_id, product_data.get('purchase_price', 0),
-                        product_id, user_id, user_id, now
-                    ))
-                    
-                    imported_count += 1
-                    
-                except Exception as e:
-                    errors.append(f"Row {i+1}: {str(e)}")
-            
-            conn.commit()
+            rows = [(i + 1, normalize_row(product_data)) for i, product_data in enumerate(products_data)]
+            processed, imported_count, errors = import_products(conn, user_id, rows)
             conn.close()
+            invalidate_tenant(user_id)
             
             return {
                 'success': True,
                 'imported_count': imported_count,
-                'errors': errors,
+                'errors': [f"Row {row_number}: {message}" for row_number, _, message in errors],
                 'message': f'Successfully imported {imported_count} products'
             }
             
@@ -233,32 +161,23 @@ class IntegratedInventoryService:
             cursor.execute("""
                 SELECT 
                     p.id, p.name, p.category, p.sku, p.unit, p.min_stock, p.selling_price,
-                    COALESCE(s.current_stock, 0) as current_stock,
-                    COALESCE(s.last_updated, p.created_at) as last_updated,
+                    COALESCE(p.stock, 0) as current_stock,
+                    COALESCE(p.updated_at, p.created_at) as last_updated,
                     CASE 
-                        WHEN COALESCE(s.current_stock, 0) = 0 THEN 'out-of-stock'
-                        WHEN COALESCE(s.current_stock, 0) <= p.min_stock AND p.min_stock > 0 THEN 'low-stock'
+                        WHEN COALESCE(p.stock, 0) = 0 THEN 'out-of-stock'
+                        WHEN COALESCE(p.stock, 0) <= p.min_stock AND p.min_stock > 0 THEN 'low-stock'
                         ELSE 'in-stock'
                     END as status
                 FROM products p
-                LEFT JOIN (
-                    SELECT 
-                        product_id,
-                        SUM(CASE WHEN transaction_type = 'in' THEN quantity ELSE -quantity END) as current_stock,
-                        MAX(created_at) as last_updated
-                    FROM stock_transactions 
-                    WHERE business_owner_id = ?
-                    GROUP BY product_id
-                ) s ON p.id = s.product_id
                 WHERE p.user_id = ? AND p.is_active = 1
                 ORDER BY 
                     CASE 
-                        WHEN COALESCE(s.current_stock, 0) = 0 THEN 1
-                        WHEN COALESCE(s.current_stock, 0) <= p.min_stock THEN 2
+                        WHEN COALESCE(p.stock, 0) = 0 THEN 1
+                        WHEN COALESCE(p.stock, 0) <= p.min_stock THEN 2
                         ELSE 3
                     END,
                     p.name
-            """, (user_id, user_id))
+            """, (user_id,))
             
             products = []
             stats = {
@@ -320,42 +239,22 @@ class IntegratedInventoryService:
             if not product:
                 return {'success': False, 'error': 'Product not found'}
             
-            # Get transaction history with running balance
-            cursor.execute("""
-                SELECT 
-                    transaction_type, quantity, unit_cost, total_cost,
-                    reference_type, supplier_name, customer_name, notes, created_at
-                FROM stock_transactions
-                WHERE product_id = ? AND business_owner_id = ?
-                ORDER BY created_at DESC
-                LIMIT ?
-            """, (product_id, user_id, limit))
-            
+            # Ledger entries carry their own balance, so no running total is rebuilt here
             transactions = []
-            running_balance = get_current_stock(product_id, user_id)
-            
-            for row in cursor.fetchall():
-                transaction = {
-                    'type': row[0],
-                    'quantity': row[1],
-                    'unit_cost': row[2],
-                    'total_cost': row[3],
-                    'reference_type': row[4],
-                    'supplier_name': row[5],
-                    'customer_name': row[6],
-                    'notes': row[7],
-                    'created_at': row[8],
-                    'balance_after': running_balance
-                }
-                
-                # Calculate balance before this transaction
-                if transaction['type'] == 'in':
-                    running_balance -= transaction['quantity']
-                else:
-                    running_balance += transaction['quantity']
-                
-                transaction['balance_before'] = running_balance
-                transactions.append(transaction)
+            for entry in stock_history(conn, product_id, user_id, limit=limit):
+                transactions.append({
+                    'type': entry['transaction_type'],
+                    'quantity': entry['quantity'],
+                    'unit_cost': entry['unit_cost'],
+                    'total_cost': abs(entry['quantity']) * (entry['unit_cost'] or 0),
+                    'reference_type': entry['reference_type'],
+                    'supplier_name': entry['supplier_name'],
+                    'customer_name': entry['customer_name'],
+                    'notes': entry['notes'],
+                    'created_at': entry['created_at'],
+                    'balance_after': entry['balance_after'],
+                    'balance_before': entry['balance_after'] - entry['quantity']
+                })
             
             conn.close()
             
@@ -428,20 +327,15 @@ class IntegratedInventoryService:
                 item_total = quantity * unit_cost
                 total_amount += item_total
                 
-                # Create stock transaction
-                transaction_id = generate_id()
-                cursor.execute("""
-                    INSERT INTO stock_transactions (
-                        id, product_id, transaction_type, quantity, unit_cost, total_cost,
-                        reference_type, reference_id, supplier_name, batch_number, expiry_date,
-                        notes, created_by, business_owner_id, created_at
-                    ) VALUES (?, ?, 'in', ?, ?, ?, 'purchase', ?, ?, ?, ?, ?, ?, ?, ?)
-                """, (
-                    transaction_id, product_id, quantity, unit_cost, item_total,
-                    purchase_id, purchase_data.get('supplier', ''),
-                    item.get('batch_number', ''), item.get('expiry_date'),
-                    item.get('notes', ''), user_id, user_id, now
-                ))
+                # Post the receipt to the stock ledger
+                new_stock = post_movement(conn, product_id, quantity, 'purchase', reference_id=purchase_id,
+                                          business_owner_id=user_id, created_by=user_id,
+                                          notes=item.get('notes', ''), unit_cost=unit_cost,
+                                          details={
+                                              'supplier_name': purchase_data.get('supplier', ''),
+                                              'batch_number': item.get('batch_number', ''),
+                                              'expiry_date': item.get('expiry_date'),
+                                          })
                 
                 # Update product's last purchase price
                 cursor.execute("""
@@ -454,7 +348,7 @@ class IntegratedInventoryService:
                     'name': product[0],
                     'quantity_added': quantity,
                     'unit_cost': unit_cost,
-                    'new_stock': get_current_stock(product_id, user_id) + quantity
+                    'new_stock': new_stock
                 })
             
             # Update purchase entry total
@@ -504,22 +398,13 @@ class IntegratedInventoryService:
             if not product:
                 return {'success': False, 'error': 'Product not found'}
             
-            # Create adjustment transaction
+            # Post the adjustment to the stock ledger
             transaction_id = generate_id()
-            now = datetime.now().isoformat()
-            transaction_type = 'in' if quantity_change > 0 else 'out'
-            abs_quantity = abs(quantity_change)
-            
-            cursor.execute("""
-                INSERT INTO stock_transactions (
-                    id, product_id, transaction_type, quantity, unit_cost, total_cost,
-                    reference_type, reference_id, notes, created_by, business_owner_id, created_at
-                ) VALUES (?, ?, ?, ?, 0, 0, 'adjustment', ?, ?, ?, ?, ?)
-            """, (
-                transaction_id, product_id, transaction_type, abs_quantity,
-                f"{adjustment_type}_{transaction_id}", f"{adjustment_type}: {reason} - {notes}".strip(' -'),
-                user_id, user_id, now
-            ))
+            new_stock = post_movement(conn, product_id, quantity_change, 'adjustment',
+                                      reference_id=f"{adjustment_type}_{transaction_id}",
+                                      business_owner_id=user_id, created_by=user_id,
+                                      notes=f"{adjustment_type}: {reason} - {notes}".strip(' -'),
+                                      transaction_type='ADJUSTMENT')
             
             conn.commit()
             conn.close()
@@ -527,8 +412,6 @@ class IntegratedInventoryService:
             # Update stock alerts
             update_stock_alerts(user_id)
             
-            new_stock = get_current_stock(product_id, user_id)
-            
             return {
                 'success': True,
                 'transaction_id': transaction_id,
@@ -553,24 +436,16 @@ class IntegratedInventoryService:
             cursor.execute("""
                 SELECT 
                     p.id, p.name, p.category, p.sku, p.unit, p.min_stock, p.purchase_price,
-                    COALESCE(s.current_stock, 0) as current_stock,
-                    (p.min_stock - COALESCE(s.current_stock, 0)) as shortage
+                    COALESCE(p.stock, 0) as current_stock,
+                    (p.min_stock - COALESCE(p.stock, 0)) as shortage
                 FROM products p
-                LEFT JOIN (
-                    SELECT 
-                        product_id,
-                        SUM(CASE WHEN transaction_type = 'in' THEN quantity ELSE -quantity END) as current_stock
-                    FROM stock_transactions 
-                    WHERE business_owner_id = ?
-                    GROUP BY product_id
-                ) s ON p.id = s.product_id
                 WHERE p.user_id = ? AND p.is_active = 1
-                AND COALESCE(s.current_stock, 0) <= p.min_stock
+                AND COALESCE(p.stock, 0) <= p.min_stock
                 AND p.min_stock > 0
                 ORDER BY 
-                    CASE WHEN COALESCE(s.current_stock, 0) = 0 THEN 1 ELSE 2 END,
-                    (p.min_stock - COALESCE(s.current_stock, 0)) DESC
-            """, (user_id, user_id))
+                    CASE WHEN COALESCE(p.stock, 0) = 0 THEN 1 ELSE 2 END,
+                    (p.min_stock - COALESCE(p.stock, 0)) DESC
+            """, (user_id,))
             
             reorder_items = []
             total_estimated_cost = 0
@@ -618,22 +493,14 @@ class IntegratedInventoryService:
                 SELECT 
                     p.category,
                     COUNT(*) as product_count,
-                    SUM(COALESCE(s.current_stock, 0)) as total_quantity,
-                    SUM(COALESCE(s.current_stock, 0) * p.purchase_price) as purchase_value,
-                    SUM(COALESCE(s.current_stock, 0) * p.selling_price) as selling_value
+                    SUM(COALESCE(p.stock, 0)) as total_quantity,
+                    SUM(COALESCE(p.stock, 0) * p.purchase_price) as purchase_value,
+                    SUM(COALESCE(p.stock, 0) * p.selling_price) as selling_value
                 FROM products p
-                LEFT JOIN (
-                    SELECT 
-                        product_id,
-                        SUM(CASE WHEN transaction_type = 'in' THEN quantity ELSE -quantity END) as current_stock
-                    FROM stock_transactions 
-                    WHERE business_owner_id = ?
-                    GROUP BY product_id
-                ) s ON p.id = s.product_id
                 WHERE p.user_id = ? AND p.is_active = 1
                 GROUP BY p.category
                 ORDER BY selling_value DESC
-            """, (user_id, user_id))
+            """, (user_id,))
             
             categories = []
             total_purchase_value = 0
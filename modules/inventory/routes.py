@@ -6,6 +6,7 @@ Handles all types of inventory: Assets, Equipment, Supplies, Products, etc.
 from flask import Blueprint, request, jsonify, session, render_template
 from modules.shared.database import get_db_connection, generate_id
 from modules.shared.auth_decorators import require_auth
+from modules.shared.export import export_response, stream_rows
 from datetime import datetime
 import json
 
@@ -628,17 +629,14 @@ def get_inventory_summary():
 @inventory_bp.route('/export', methods=['GET'])
 @require_auth
 def export_inventory():
-    """Export inventory data as CSV"""
+    """Export inventory data as CSV (or ?format=excel), streamed from the database"""
     try:
         user_id = get_user_id_from_session()
         if not user_id:
             return jsonify({'success': False, 'error': 'User not authenticated'}), 401
         
-        conn = get_db_connection()
-        cursor = conn.cursor()
-        
         # Get all items with category names
-        cursor.execute("""
+        rows = stream_rows("""
             SELECT 
                 i.name, i.description, i.item_type, c.name as category_name,
                 i.serial_number, i.barcode, i.quantity, i.unit,
@@ -651,36 +649,12 @@ def export_inventory():
             ORDER BY i.name
         """, (user_id,))
         
-        items = cursor.fetchall()
-        conn.close()
-        
-        # Create CSV content
-        import csv
-        import io
-        
-        output = io.StringIO()
-        writer = csv.writer(output)
-        
-        # Write header
-        writer.writerow([
+        return export_response(rows, [
             'Name', 'Description', 'Type', 'Category', 'Serial Number', 'Barcode',
             'Quantity', 'Unit', 'Purchase Price', 'Current Value', 'Location',
             'Supplier', 'Purchase Date', 'Warranty Expiry', 'Status', 'Condition',
             'Notes', 'Created At'
-        ])
-        
-        # Write data
-        for item in items:
-            writer.writerow(item)
-        
-        output.seek(0)
-        
-        from flask import Response
-        return Response(
-            output.getvalue(),
-            mimetype='text/csv',
-            headers={'Content-Disposition': 'attachment; filename=inventory_export.csv'}
-        )
+        ], 'inventory_export', request.args.get('format', 'csv'))
         
     except Exception as e:
         print(f"❌ Error exporting inventory: {e}")
@@ -5,6 +5,8 @@ Invoices are the source of truth for all transactions
 
 from flask import Blueprint, request, jsonify, session
 from .service import InvoiceService
+from modules.shared.export import export_date_bounds, export_response, stream_rows
+from modules.shared.pagination import page_size
 from datetime import datetime
 
 invoices_bp = Blueprint('invoices', __name__)
@@ -54,14 +56,18 @@ def get_invoices():
                 filters['page'] = 1
         
         if request.args.get('limit'):
-            try:
-                filters['limit'] = int(request.args.get('limit'))
-            except ValueError:
-                filters['limit'] = 50
+            filters['limit'] = page_size(request.args.get('limit'))
+        
+        # Keyset pagination: ?cursor= (empty for the first page), then the returned next_cursor
+        if 'cursor' in request.args:
+            filters['cursor'] = request.args.get('cursor')
+            filters['include_total'] = request.args.get('include_total') in ('1', 'true')
         
         result = invoice_service.get_invoices(filters, user_id)
         return jsonify(result)
         
+    except ValueError as e:
+        return jsonify({"success": False, "error": str(e)}), 400
     except Exception as e:
         return jsonify({
             "success": False,
@@ -79,15 +85,20 @@ def get_all_invoices():
         to_date = request.args.get('to')
         limit = request.args.get('limit', 100, type=int)
         
-        filters = {'limit': limit}
+        filters = {'limit': page_size(limit)}
         if from_date:
             filters['date_from'] = from_date
         if to_date:
             filters['date_to'] = to_date
+        if 'cursor' in request.args:
+            filters['cursor'] = request.args.get('cursor')
+            filters['include_total'] = request.args.get('include_total') in ('1', 'true')
         
         result = invoice_service.get_invoices(filters, user_id)
         return jsonify(result)
         
+    except ValueError as e:
+        return jsonify({"success": False, "error": str(e)}), 400
     except Exception as e:
         return jsonify({
             "success": False,
@@ -210,12 +221,24 @@ def refresh_invoices():
 
 @invoices_bp.route('/api/invoices/export', methods=['GET'])
 def export_invoices():
-    """Export invoices data"""
+    """Export invoices data - CSV/Excel streamed from the database, JSON otherwise"""
     try:
-        date_range = request.args.get('date_range', 'today')
-        payment_status = request.args.get('payment_status', 'all')
+        user_id = get_user_id_from_session()
+        if not user_id:
+            return jsonify({"success": False, "error": "User not authenticated"}), 401
+        
+        date_range = request.args.get('date_filter') or request.args.get('date_range', 'today')
+        payment_status = request.args.get('status') or request.args.get('payment_status', 'all')
         format_type = request.args.get('format', 'json')
         
+        if format_type in ('csv', 'excel', 'xlsx'):
+            start, end = export_date_bounds({**request.args.to_dict(), 'date_range': date_range})
+            query, params = invoice_service.export_query(user_id, start, end, payment_status)
+            return export_response(stream_rows(query, params), [
+                'Invoice Number', 'Date', 'Customer', 'Phone', 'Subtotal', 'Tax', 'Discount',
+                'Total', 'Paid', 'Balance', 'Payment Method', 'Status'
+            ], f"invoices_{datetime.now().strftime('%Y-%m-%d')}", format_type)
+        
         filters = {}
         if date_range in ['today', 'yesterday', 'week', 'month']:
             filters['date_filter'] = date_range
@@ -223,7 +246,7 @@ def export_invoices():
         if payment_status and payment_status != 'all':
             filters['status'] = payment_status
         
-        result = invoice_service.get_invoices(filters)
+        result = invoice_service.get_invoices(filters, user_id)
         
         return jsonify({
             "success": True,
@@ -4,47 +4,50 @@ Invoices are the source of truth - they read from bills table
 """
 
 from modules.shared.database import get_db_connection, generate_id
+from modules.shared.date_ranges import between_bounds, period_clause, range_clause
+from modules.shared.pagination import cached_count, decode_cursor, keyset_clause, keyset_page
+from modules.shared.sales_rollup import record_bill
+from modules.shared.stock_ledger import post_movement
 from datetime import datetime, timedelta
 
+# Payments recorded against a bill. Correlated on idx_payments_bill_id, so it
+# only runs for the bills actually read (one page), not a join over all payments.
+PAYMENTS_TOTAL_SQL = "(SELECT SUM(p.amount) FROM payments p WHERE p.bill_id = b.id)"
+
+PAID_AMOUNT_SQL = f"""
+    CASE
+        WHEN b.is_credit = 1 THEN COALESCE(b.credit_paid_amount, 0)
+        ELSE COALESCE({PAYMENTS_TOTAL_SQL}, b.total_amount)
+    END
+"""
+
+PAYMENT_STATUS_SQL = f"""
+    CASE
+        WHEN b.payment_status IN ('paid', 'partial', 'unpaid') THEN b.payment_status
+        WHEN b.is_credit = 1 AND b.credit_balance > 0 THEN 'partial'
+        WHEN b.is_credit = 1 THEN 'paid'
+        WHEN COALESCE({PAYMENTS_TOTAL_SQL}, 0) = 0 THEN 'unpaid'
+        WHEN {PAYMENTS_TOTAL_SQL} < b.total_amount THEN 'partial'
+        ELSE 'paid'
+    END
+"""
+
 class InvoiceService:
     
     def get_invoices(self, filters=None, user_id=None):
-        """Get invoices with comprehensive filtering and pagination - Filtered by user"""
+        """
+        Get invoices with filtering and pagination - Filtered by user
+        With filters['cursor'] (empty for the first page) pages are keyset-paginated
+        on (created_at, id) and the total is only counted with filters['include_total'];
+        otherwise page/limit numbering is used with a cached total.
+        """
+        filters = filters or {}
+        # A malformed cursor raises ValueError to the caller
+        cursor = decode_cursor(filters['cursor']) if 'cursor' in filters else None
         conn = get_db_connection()
         
         try:
-            # Get query parameters with defaults
-            page = filters.get('page', 1) if filters else 1
-            limit = filters.get('limit', 50) if filters else 50
-            offset = (page - 1) * limit
-            
-            # Base query - bills are invoices
-            base_query = '''
-                SELECT b.*, 
-                       COALESCE(b.customer_name, c.name, 'Walk-in Customer') as customer_name, 
-                       c.phone as customer_phone,
-                       c.email as customer_email,
-                       DATE(b.created_at) as invoice_date,
-                       TIME(b.created_at) as invoice_time,
-                       CASE 
-                           WHEN b.is_credit = 1 THEN COALESCE(b.credit_paid_amount, 0)
-                           ELSE COALESCE(SUM(p.amount), b.total_amount)
-                       END as paid_amount,
-                       CASE 
-                           WHEN b.payment_status = 'paid' THEN 'paid'
-                           WHEN b.payment_status = 'partial' THEN 'partial'
-                           WHEN b.payment_status = 'unpaid' THEN 'unpaid'
-                           WHEN b.is_credit = 1 AND b.credit_balance > 0 THEN 'partial'
-                           WHEN b.is_credit = 1 AND b.credit_balance <= 0 THEN 'paid'
-                           WHEN COALESCE(SUM(p.amount), 0) = 0 THEN 'unpaid'
-                           WHEN COALESCE(SUM(p.amount), 0) < b.total_amount THEN 'partial'
-                           WHEN COALESCE(SUM(p.amount), 0) >= b.total_amount THEN 'paid'
-                           ELSE 'paid'
-                       END as payment_status_calc
-                FROM bills b
-                LEFT JOIN customers c ON b.customer_id = c.id
-                LEFT JOIN payments p ON b.id = p.bill_id
-            '''
+            limit = filters.get('limit', 50)
             
             # Build WHERE conditions
             conditions = []
@@ -55,62 +58,75 @@ class InvoiceService:
                 conditions.append("b.business_owner_id = ?")
                 params.append(user_id)
             
-            if filters:
-                # Date filtering
-                if filters.get('date_filter') == 'today':
-                    today = datetime.now().strftime('%Y-%m-%d')
-                    conditions.append("DATE(b.created_at) = ?")
-                    params.append(today)
-                elif filters.get('date_filter') == 'yesterday':
-                    yesterday = (datetime.now() - timedelta(days=1)).strftime('%Y-%m-%d')
-                    conditions.append("DATE(b.created_at) = ?")
-                    params.append(yesterday)
-                elif filters.get('date_filter') == 'week':
-                    week_ago = (datetime.now() - timedelta(days=7)).strftime('%Y-%m-%d')
-                    conditions.append("DATE(b.created_at) >= ?")
-                    params.append(week_ago)
-                elif filters.get('date_filter') == 'month':
-                    month_ago = (datetime.now() - timedelta(days=30)).strftime('%Y-%m-%d')
-                    conditions.append("DATE(b.created_at) >= ?")
-                    params.append(month_ago)
-                elif filters.get('date_filter') == 'custom' and filters.get('custom_date'):
-                    conditions.append("DATE(b.created_at) = ?")
-                    params.append(filters['custom_date'])
-                
-                # Date range filtering
-                if filters.get('date_from'):
-                    conditions.append('DATE(b.created_at) >= ?')
-                    params.append(filters['date_from'])
-                
-                if filters.get('date_to'):
-                    conditions.append('DATE(b.created_at) <= ?')
-                    params.append(filters['date_to'])
-            
-            # Add WHERE clause if conditions exist
-            if conditions:
-                base_query += ' WHERE ' + ' AND '.join(conditions)
-            
-            # Group by bill to aggregate payments
-            base_query += ' GROUP BY b.id'
-            
-            # Add payment status filter after GROUP BY
-            if filters and filters.get('status') and filters['status'] != 'all':
-                status = filters['status']
-                base_query += f" HAVING payment_status_calc = '{status}'"
-            
-            # Order by creation date (newest first)
-            base_query += ' ORDER BY b.created_at DESC'
-            
-            # Get total count for pagination
-            count_query = f'SELECT COUNT(*) as total FROM ({base_query})'
-            total_count = conn.execute(count_query, params).fetchone()['total']
-            
-            # Add pagination
-            base_query += ' LIMIT ? OFFSET ?'
-            params.extend([limit, offset])
-            
-            # Execute main query
-            bills = conn.execute(base_query, params).fetchall()
+            # Date filtering - half-open created_at ranges keep the index usable
+            date_filter = filters.get('date_filter')
+            if date_filter in ('today', 'yesterday', 'week', 'month'):
+                date_sql, date_params = period_clause("b.created_at", date_filter)
+            elif date_filter == 'custom' and filters.get('custom_date'):
+                date_sql, date_params = period_clause("b.created_at", filters['custom_date'])
+            else:
+                date_sql, date_params = '', []
+            if date_sql:
+                conditions.append(date_sql)
+                params.extend(date_params)
+            
+            # Date range filtering
+            date_sql, date_params = range_clause(
+                "b.created_at", *between_bounds(filters.get('date_from'), filters.get('date_to'))
+            )
+            if date_sql:
+                conditions.append(date_sql)
+                params.extend(date_params)
+            
+            # Payment status filter
+            if filters.get('status') and filters['status'] != 'all':
+                conditions.append(f"{PAYMENT_STATUS_SQL} = ?")
+                params.append(filters['status'])
+            
+            # Bills are invoices; payments are summed only for the bills of the page
+            base_query = f'''
+                SELECT b.*, 
+                       COALESCE(b.customer_name, c.name, 'Walk-in Customer') as customer_name, 
+                       c.phone as customer_phone,
+                       c.email as customer_email,
+                       DATE(b.created_at) as invoice_date,
+                       TIME(b.created_at) as invoice_time,
+                       {PAID_AMOUNT_SQL} as paid_amount,
+                       {PAYMENT_STATUS_SQL} as payment_status_calc
+                FROM bills b
+                LEFT JOIN customers c ON b.customer_id = c.id
+            '''
+            where = (' WHERE ' + ' AND '.join(conditions)) if conditions else ''
+            count_query = f"SELECT b.id FROM bills b{where}"
+            
+            if 'cursor' in filters:
+                keyset_sql, keyset_params = keyset_clause("b.created_at", "b.id", cursor)
+                page_where = (' WHERE ' + ' AND '.join(conditions + [keyset_sql])) if keyset_sql else where
+                bills = conn.execute(base_query + page_where + ' ORDER BY b.created_at DESC, b.id DESC LIMIT ?',
+                                     params + keyset_params + [limit + 1]).fetchall()
+                bills, next_cursor = keyset_page(bills, limit)
+                pagination = {
+                    "per_page": limit,
+                    "next_cursor": next_cursor,
+                    "has_next": next_cursor is not None,
+                    "has_prev": cursor is not None
+                }
+                if filters.get('include_total'):
+                    pagination["total_records"] = cached_count(conn, 'invoice_counts', user_id, count_query, params)
+            else:
+                page = filters.get('page', 1)
+                total_count = cached_count(conn, 'invoice_counts', user_id, count_query, params)
+                bills = conn.execute(base_query + where + ' ORDER BY b.created_at DESC, b.id DESC LIMIT ? OFFSET ?',
+                                     params + [limit, (page - 1) * limit]).fetchall()
+                total_pages = max(1, (total_count + limit - 1) // limit)
+                pagination = {
+                    "current_page": page,
+                    "total_pages": total_pages,
+                    "total_records": total_count,
+                    "per_page": limit,
+                    "has_next": page < total_pages,
+                    "has_prev": page > 1
+                }
             
             # Format invoices
             invoices = []
@@ -152,20 +168,10 @@ class InvoiceService:
                 
                 invoices.append(invoice)
             
-            # Calculate pagination info
-            total_pages = max(1, (total_count + limit - 1) // limit)
-            
             return {
                 "success": True,
                 "invoices": invoices,
-                "pagination": {
-                    "current_page": page,
-                    "total_pages": total_pages,
-                    "total_records": total_count,
-                    "per_page": limit,
-                    "has_next": page < total_pages,
-                    "has_prev": page > 1
-                }
+                "pagination": pagination
             }
             
         except Exception as e:
@@ -180,6 +186,29 @@ class InvoiceService:
             conn.close()
 
     
+    def export_query(self, user_id, start=None, end=None, status=None):
+        """(sql, params) for streaming a business's invoices in a date range, newest first"""
+        query = f'''
+            SELECT b.bill_number, b.created_at,
+                   COALESCE(b.customer_name, c.name, 'Walk-in Customer'), c.phone,
+                   b.subtotal, b.tax_amount, b.discount_amount, b.total_amount,
+                   {PAID_AMOUNT_SQL}, b.total_amount - ({PAID_AMOUNT_SQL}),
+                   b.payment_method, {PAYMENT_STATUS_SQL}
+            FROM bills b
+            LEFT JOIN customers c ON b.customer_id = c.id
+            WHERE b.business_owner_id = ?
+        '''
+        params = [user_id]
+        date_sql, date_params = range_clause("b.created_at", start, end)
+        if date_sql:
+            query += f" AND {date_sql}"
+            params.extend(date_params)
+        if status and status != 'all':
+            query += f" AND {PAYMENT_STATUS_SQL} = ?"
+            params.append(status)
+        query += " ORDER BY b.created_at DESC"
+        return query, params
+    
     def get_invoice_by_id(self, invoice_id, user_id=None):
         """Get invoice details by ID - Filtered by user"""
         conn = get_db_connection()
@@ -253,19 +282,20 @@ class InvoiceService:
             
             # Get all bill items to revert stock
             bill_items = conn.execute('''
-                SELECT product_id, quantity FROM bill_items WHERE bill_id = ?
+                SELECT product_id, quantity, unit_cost FROM bill_items WHERE bill_id = ?
             ''', (invoice_id,)).fetchall()
             
-            # Revert stock for each item
+            # Revert stock for each item, back into the average at the cost it left with
             for item in bill_items:
-                conn.execute('''
-                    UPDATE products SET stock = stock + ? WHERE id = ?
-                ''', (item['quantity'], item['product_id']))
+                post_movement(conn, item['product_id'], item['quantity'], 'sale_reversal',
+                              reference_id=invoice_id, business_owner_id=bill['business_owner_id'],
+                              notes=f"Invoice #{bill['bill_number']} deleted", unit_cost=item['unit_cost'])
             
             # Delete related records in correct order
             conn.execute('DELETE FROM payments WHERE bill_id = ?', (invoice_id,))
             conn.execute('DELETE FROM sales WHERE bill_id = ?', (invoice_id,))
             conn.execute('DELETE FROM bill_items WHERE bill_id = ?', (invoice_id,))
+            record_bill(conn, invoice_id, -1)
             conn.execute('DELETE FROM bills WHERE id = ?', (invoice_id,))
             
             conn.commit()
@@ -293,13 +323,12 @@ class InvoiceService:
             params = []
             
             if filters:
-                if filters.get('date_from'):
-                    conditions.append("DATE(created_at) >= ?")
-                    params.append(filters['date_from'])
-                
-                if filters.get('date_to'):
-                    conditions.append("DATE(created_at) <= ?")
-                    params.append(filters['date_to'])
+                date_sql, date_params = range_clause(
+                    "created_at", *between_bounds(filters.get('date_from'), filters.get('date_to'))
+                )
+                if date_sql:
+                    conditions.append(date_sql)
+                    params.extend(date_params)
             
             where_clause = ' WHERE ' + ' AND '.join(conditions) if conditions else ''
             
@@ -6,6 +6,7 @@ Handles notification system for the dashboard
 from flask import Blueprint, request, jsonify, session
 from modules.shared.database import get_db_connection, generate_id
 from modules.shared.auth_decorators import require_auth
+from modules.shared.stock_alerts import forget_settings
 from datetime import datetime, timedelta
 import json
 
@@ -233,6 +234,9 @@ def save_notification_settings():
         conn.commit()
         conn.close()
         
+        # Low-stock crossing checks read the new threshold from now on
+        forget_settings(client_id)
+        
         print(f"✅ [NOTIFICATION SETTINGS] Saved for client {client_id}: enabled={low_stock_enabled}, threshold={low_stock_threshold}")
         
         return jsonify({
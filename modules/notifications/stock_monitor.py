@@ -1,42 +1,65 @@
 """
 Background Stock Monitor Service
-Runs independently to check stock levels and send alerts
+Low-stock alerts are event-driven: the stock ledger queues one when a
+decrement crosses a product's threshold (modules/shared/stock_alerts.py).
+This sweep is the optional safety net for stock that crossed without a
+ledger decrement (e.g. min_stock raised above the current stock); it only
+runs periodically when STOCK_MONITOR_INTERVAL > 0.
+
+Each sweep is set-based: the tenants with alerts enabled are split into
+contiguous client_id ranges (shards) processed by a small worker pool. Per
+shard, one query joins notification_settings x products and anti-joins the
+alerts already sent inside the dedup window (stock_alert_state); the alerts
+are then claimed with the same conditional upsert the event path uses (so
+neither path nor another process alerts twice) and the notifications are
+bulk-inserted in the same transaction.
 """
 
+import os
 import threading
 import time
-from datetime import datetime, date
-from modules.shared.database import get_db_connection, generate_id
-from modules.notifications.routes import create_notification_for_user
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from modules.shared.database import get_db_connection
+from modules.shared.stock_alerts import (STOCK_ALERT_DEDUP_MINUTES, alert_message, claim_alerts,
+                                         insert_alert_notifications)
+
 
 class StockMonitorService:
-    def __init__(self):
+    def __init__(self, check_interval=600, workers=4):
         self.running = False
         self.thread = None
-        self.check_interval = 600  # 10 minutes in seconds
-        
+        self.check_interval = check_interval  # seconds
+        self.workers = max(1, workers)
+        self._sweep_lock = threading.Lock()
+        self.metrics = {'sweeps': 0, 'skipped': 0, 'overruns': 0, 'errors': 0, 'alerts': 0, 'last_sweep': None}
+
     def start(self):
         """Start the background stock monitoring service"""
+        if self.check_interval <= 0:
+            print("📊 [STOCK MONITOR] Periodic sweep disabled - low-stock alerts are event-driven")
+            return
         if self.running:
             print("📊 [STOCK MONITOR] Service already running")
             return
-            
+
         self.running = True
-        
+
         # Start the monitoring thread
         self.thread = threading.Thread(target=self._run_monitor, daemon=True)
         self.thread.start()
-        
-        print(f"🚀 [STOCK MONITOR] Background service started - checking every {self.check_interval//60} minutes")
-        
+
+        print(f"🚀 [STOCK MONITOR] Background service started - checking every {self.check_interval//60} minutes "
+              f"with {self.workers} workers")
+
         # Run initial check after 30 seconds to allow app to fully start
         threading.Timer(30.0, self.check_all_clients_stock).start()
-        
+
     def stop(self):
         """Stop the background stock monitoring service"""
         self.running = False
         print("🛑 [STOCK MONITOR] Background service stopped")
-        
+
     def _run_monitor(self):
         """Internal method to run the monitoring loop"""
         while self.running:
@@ -47,135 +70,142 @@ class StockMonitorService:
             except Exception as e:
                 print(f"❌ [STOCK MONITOR] Monitor loop error: {e}")
                 time.sleep(60)  # Wait 1 minute before retrying
-                
-    def check_all_clients_stock(self):
-        """Check stock levels for all clients and send alerts if needed"""
+
+    def _shards(self):
+        """Enabled tenants split into at most `workers` contiguous client_id ranges"""
+        conn = get_db_connection()
         try:
-            print(f"🔍 [STOCK MONITOR] Starting stock check at {datetime.now()}")
-            
-            conn = get_db_connection()
-            cursor = conn.cursor()
-            
-            # Get all clients with notification settings enabled
-            cursor.execute("""
-                SELECT ns.client_id, ns.low_stock_threshold, c.company_name
+            clients = [row[0] for row in conn.execute("""
+                SELECT ns.client_id
                 FROM notification_settings ns
                 JOIN clients c ON ns.client_id = c.id
                 WHERE ns.low_stock_enabled = 1 AND c.is_active = 1
-            """)
-            
-            clients_with_settings = cursor.fetchall()
-            
-            if not clients_with_settings:
-                print("📊 [STOCK MONITOR] No clients with stock alerts enabled")
-                conn.close()
-                return
-                
-            total_alerts_sent = 0
-            
-            for client_row in clients_with_settings:
-                client_id = client_row[0]
-                threshold = client_row[1]
-                company_name = client_row[2]
-                
-                alerts_sent = self.check_client_stock(cursor, client_id, threshold, company_name)
-                total_alerts_sent += alerts_sent
-                
+                ORDER BY ns.client_id
+            """).fetchall()]
+        finally:
+            conn.close()
+        if not clients:
+            return [], 0
+        size = -(-len(clients) // self.workers)
+        return [(clients[i], clients[min(i + size, len(clients)) - 1])
+                for i in range(0, len(clients), size)], len(clients)
+
+    def check_shard(self, first_client, last_client, cutoff=None):
+        """Find, claim and notify new low-stock alerts for tenants in [first_client, last_client]"""
+        cutoff = cutoff or (datetime.now() - timedelta(minutes=STOCK_ALERT_DEDUP_MINUTES)).strftime('%Y-%m-%d %H:%M:%S')
+        result = {'candidates': 0, 'alerts': 0, 'query_ms': 0.0, 'write_ms': 0.0}
+        started = time.perf_counter()
+        conn = get_db_connection()
+        try:
+            # Threshold: the product's min_stock, else the tenant's low_stock_threshold
+            candidates = conn.execute("""
+                SELECT p.user_id, p.id, p.name, p.stock, p.category,
+                       CASE WHEN COALESCE(p.min_stock, 0) > 0 THEN p.min_stock ELSE ns.low_stock_threshold END
+                FROM notification_settings ns
+                JOIN clients c ON ns.client_id = c.id
+                JOIN products p ON p.user_id = ns.client_id
+                WHERE ns.low_stock_enabled = 1 AND c.is_active = 1
+                  AND ns.client_id >= ? AND ns.client_id <= ?
+                  AND p.is_active = 1
+                  AND p.stock <= CASE WHEN COALESCE(p.min_stock, 0) > 0 THEN p.min_stock ELSE ns.low_stock_threshold END
+                  AND NOT EXISTS (
+                      SELECT 1 FROM stock_alert_state s
+                      WHERE s.client_id = p.user_id AND s.product_id = p.id AND s.alerted_at >= ?
+                  )
+                ORDER BY p.user_id, p.stock
+            """, (first_client, last_client, cutoff)).fetchall()
+            result['candidates'] = len(candidates)
+            result['query_ms'] = (time.perf_counter() - started) * 1000
+            if not candidates:
+                return result
+
+            started = time.perf_counter()
+            alerts = {(row[0], row[1], 'out_of_stock' if row[3] <= 0 else 'low_stock'): row for row in candidates}
+            claimed = claim_alerts(conn, [key + (row[3], row[5]) for key, row in alerts.items()])
+            notifications = [(key[0], alert_message(key[2], row[2], row[3], row[4]))
+                             for key, row in alerts.items() if key in claimed]
+            insert_alert_notifications(conn, notifications)
+            conn.commit()
+            result['alerts'] = len(notifications)
+            result['write_ms'] = (time.perf_counter() - started) * 1000
+            return result
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
             conn.close()
-            
+
+    def check_all_clients_stock(self):
+        """Check stock levels for all clients and send alerts if needed; returns the alerts sent"""
+        if not self._sweep_lock.acquire(blocking=False):
+            self.metrics['skipped'] += 1
+            print("⏭️ [STOCK MONITOR] Previous stock check still running - skipped")
+            return 0
+        try:
+            started = time.perf_counter()
+            started_at = datetime.now()
+            print(f"🔍 [STOCK MONITOR] Starting stock check at {started_at}")
+
+            shards, tenants = self._shards()
+            if not shards:
+                print("📊 [STOCK MONITOR] No clients with stock alerts enabled")
+                return 0
+
+            cutoff = (datetime.now() - timedelta(minutes=STOCK_ALERT_DEDUP_MINUTES)).strftime('%Y-%m-%d %H:%M:%S')
+            with ThreadPoolExecutor(max_workers=len(shards), thread_name_prefix='stock-monitor') as pool:
+                futures = [pool.submit(self.check_shard, first, last, cutoff) for first, last in shards]
+                shard_results = []
+                for (first, last), future in zip(shards, futures):
+                    try:
+                        shard_results.append({'first_client': first, 'last_client': last, **future.result()})
+                    except Exception as e:
+                        self.metrics['errors'] += 1
+                        shard_results.append({'first_client': first, 'last_client': last, 'error': str(e)})
+                        print(f"❌ [STOCK MONITOR] Error checking clients {first}..{last}: {e}")
+
+            duration_ms = (time.perf_counter() - started) * 1000
+            total_alerts_sent = sum(r.get('alerts', 0) for r in shard_results)
+            self.metrics['sweeps'] += 1
+            self.metrics['alerts'] += total_alerts_sent
+            if duration_ms > self.check_interval * 1000:
+                self.metrics['overruns'] += 1
+            self.metrics['last_sweep'] = {
+                'started_at': started_at.isoformat(),
+                'duration_ms': round(duration_ms, 1),
+                'tenants': tenants,
+                'candidates': sum(r.get('candidates', 0) for r in shard_results),
+                'alerts': total_alerts_sent,
+                'shards': shard_results,
+            }
+
             if total_alerts_sent > 0:
-                print(f"✅ [STOCK MONITOR] Completed stock check - {total_alerts_sent} alerts sent")
+                print(f"✅ [STOCK MONITOR] Completed stock check - {total_alerts_sent} alerts sent "
+                      f"({tenants} clients, {len(shards)} shards, {duration_ms:.0f}ms)")
             else:
-                print(f"✅ [STOCK MONITOR] Completed stock check - no alerts needed")
-                
+                print(f"✅ [STOCK MONITOR] Completed stock check - no alerts needed "
+                      f"({tenants} clients, {duration_ms:.0f}ms)")
+            return total_alerts_sent
+
         except Exception as e:
+            self.metrics['errors'] += 1
             print(f"❌ [STOCK MONITOR] Error in stock check: {e}")
             import traceback
             traceback.print_exc()
-            
-    def check_client_stock(self, cursor, client_id, threshold, company_name):
-        """Check stock for a specific client and send alerts"""
-        try:
-            today = date.today().isoformat()
-            alerts_sent = 0
-            
-            # Get all products for this client that are at or below threshold
-            cursor.execute("""
-                SELECT id, name, stock, category
-                FROM products 
-                WHERE user_id = ? AND is_active = 1 AND stock <= ?
-                ORDER BY stock ASC
-            """, (client_id, threshold))
-            
-            low_stock_products = cursor.fetchall()
-            
-            if not low_stock_products:
-                return 0
-                
-            print(f"📦 [STOCK MONITOR] Client {company_name}: Found {len(low_stock_products)} products at/below threshold {threshold}")
-            
-            for product in low_stock_products:
-                product_id = product[0]
-                product_name = product[1]
-                current_stock = product[2]
-                category = product[3]
-                
-                # Check if we already sent an alert today for this product
-                cursor.execute("""
-                    SELECT id FROM stock_alert_log 
-                    WHERE client_id = ? AND product_id = ? AND alert_date = ?
-                """, (client_id, product_id, today))
-                
-                existing_alert = cursor.fetchone()
-                
-                if existing_alert:
-                    # Already sent alert today for this product
-                    continue
-                    
-                # Create the alert notification
-                if current_stock == 0:
-                    notification_message = f"Out of Stock: {product_name} ({category})"
-                    notification_type = "alert"
-                else:
-                    notification_message = f"Low Stock Alert: {product_name} - Only {current_stock} remaining ({category})"
-                    notification_type = "alert"
-                
-                # Create notification
-                notification_id = create_notification_for_user(
-                    user_id=client_id,
-                    notification_type=notification_type,
-                    message=notification_message,
-                    action_url='/retail/products'
-                )
-                
-                if notification_id:
-                    # Log that we sent this alert
-                    log_id = generate_id()
-                    cursor.execute("""
-                        INSERT INTO stock_alert_log (
-                            id, client_id, product_id, alert_date, 
-                            stock_level, threshold_level, created_at
-                        )
-                        VALUES (?, ?, ?, ?, ?, ?, ?)
-                    """, (
-                        log_id, client_id, product_id, today,
-                        current_stock, threshold, datetime.now().isoformat()
-                    ))
-                    
-                    alerts_sent += 1
-                    print(f"🔔 [STOCK MONITOR] Alert sent: {product_name} (stock: {current_stock})")
-                    
-            # Commit all changes for this client
-            cursor.connection.commit()
-            
-            return alerts_sent
-            
-        except Exception as e:
-            print(f"❌ [STOCK MONITOR] Error checking client {client_id} stock: {e}")
             return 0
+        finally:
+            self._sweep_lock.release()
+
+    def stats(self):
+        return {
+            'running': self.running,
+            'check_interval': self.check_interval,
+            'workers': self.workers,
+            **self.metrics,
+        }
 
 # Global instance
-stock_monitor = StockMonitorService()
+stock_monitor = StockMonitorService(check_interval=int(os.environ.get('STOCK_MONITOR_INTERVAL', 0)),
+                                    workers=int(os.environ.get('STOCK_MONITOR_WORKERS', 4)))
 
 def start_stock_monitor():
     """Start the stock monitoring service"""
@@ -183,4 +213,8 @@ def start_stock_monitor():
 
 def stop_stock_monitor():
     """Stop the stock monitoring service"""
-    stock_monitor.stop()
\ No newline at end of file
+    stock_monitor.stop()
+
+def get_stock_monitor_stats():
+    """Per-sweep timing and alert counters (per worker process)"""
+    return stock_monitor.stats()
@@ -4,6 +4,8 @@ UPDATED to use new transaction-based stock system
 """
 
 from modules.shared.database import get_db_connection
+from modules.shared.stock_ledger import record_opening_stock, set_stock
+from modules.shared import barcode_index
 
 # Import new stock system
 try:
@@ -27,9 +29,8 @@ class ProductsModels:
             if user_id:
                 # Get products with current stock from new system
                 products = conn.execute('''
-                    SELECT p.*, COALESCE(cs.current_quantity, 0) as current_stock
+                    SELECT p.*, COALESCE(p.stock, 0) as current_stock
                     FROM products p
-                    LEFT JOIN current_stock cs ON p.id = cs.product_id
                     WHERE p.is_active = 1 AND p.user_id = ?
                     ORDER BY p.name
                 ''', (user_id,)).fetchall()
@@ -55,9 +56,8 @@ class ProductsModels:
         try:
             # Get product with current stock
             product = conn.execute('''
-                SELECT p.*, COALESCE(cs.current_quantity, 0) as current_stock
+                SELECT p.*, COALESCE(p.stock, 0) as current_stock
                 FROM products p
-                LEFT JOIN current_stock cs ON p.id = cs.product_id
                 WHERE p.id = ? AND p.is_active = 1
             ''', (product_id,)).fetchone()
             
@@ -77,9 +77,8 @@ class ProductsModels:
         try:
             # Get product with current stock
             product = conn.execute('''
-                SELECT p.*, COALESCE(cs.current_quantity, 0) as current_stock
+                SELECT p.*, COALESCE(p.stock, 0) as current_stock
                 FROM products p
-                LEFT JOIN current_stock cs ON p.id = cs.product_id
                 WHERE p.barcode_data = ? AND p.is_active = 1
             ''', (barcode,)).fetchone()
             
@@ -141,6 +140,7 @@ class ProductsModels:
                     id, code, name, category, price, cost, stock, min_stock, 
                     unit, business_type, barcode_data, barcode_image, image_url, is_active
                 ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)""", product_data)
+            record_opening_stock(conn, product_data[0])
             conn.commit()
             return True
         finally:
@@ -151,12 +151,16 @@ class ProductsModels:
         """Update an existing product"""
         conn = get_db_connection()
         try:
+            # Stock (6th field) goes through the ledger as an adjustment
+            product_data = tuple(product_data)
             conn.execute("""UPDATE products SET
                     code = ?, name = ?, category = ?, price = ?, cost = ?, 
-                    stock = ?, min_stock = ?, unit = ?, business_type = ?,
+                    min_stock = ?, unit = ?, business_type = ?,
                     barcode_data = ?, barcode_image = ?, image_url = ?
-                WHERE id = ?""", product_data + (product_id,))
+                WHERE id = ?""", product_data[:5] + product_data[6:] + (product_id,))
+            set_stock(conn, product_id, product_data[5], notes='Stock edited on product')
             conn.commit()
+            barcode_index.forget_product(product_id)
             return True
         finally:
             conn.close()
@@ -168,6 +172,7 @@ class ProductsModels:
         try:
             conn.execute('DELETE FROM products WHERE id = ?', (product_id,))
             conn.commit()
+            barcode_index.forget_product(product_id)
             return True
         finally:
             conn.close()
@@ -179,6 +184,7 @@ class ProductsModels:
         try:
             conn.execute("UPDATE products SET barcode_data = ?, updated_at = CURRENT_TIMESTAMP WHERE id = ?", (barcode, product_id))
             conn.commit()
+            barcode_index.forget_product(product_id)
             return True
         finally:
             conn.close()
\ No newline at end of file
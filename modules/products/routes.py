@@ -8,6 +8,8 @@ from .service import ProductsService
 from .variants_service import ProductVariantsService
 from modules.shared.auth_decorators import require_auth
 from modules.shared.database import get_current_client_id
+from modules.shared.cache import cached_response, invalidate_tenant
+from modules.shared.stock_ledger import set_stock
 
 products_bp = Blueprint('products', __name__)
 products_service = ProductsService()
@@ -23,6 +25,7 @@ def get_user_id_from_session():
 
 @products_bp.route('/api/products', methods=['GET'])
 @require_auth
+@cached_response('products')
 def get_products():
     """Get products - STRICT MULTI-TENANT ISOLATION - Only user's own products"""
     conn = products_service.get_db_connection()
@@ -81,7 +84,7 @@ def add_barcode_to_product(product_id):
 def search_product_by_barcode(barcode):
     """⚡ FAST barcode search - Optimized for instant response"""
     try:
-        result = products_service.search_product_by_barcode(barcode)
+        result = products_service.search_product_by_barcode(barcode, get_user_id_from_session())
         
         if result['success']:
             return jsonify(result), 200
@@ -95,12 +98,34 @@ def search_product_by_barcode(barcode):
             "barcode": barcode
         }), 500
 
+@products_bp.route('/api/products/search/barcodes', methods=['POST'])
+@require_auth
+def search_products_by_barcodes():
+    """⚡ Batch barcode lookup - a scanner buffer in one request"""
+    try:
+        data = request.get_json(silent=True) or {}
+        barcodes = data.get('barcodes')
+        if not isinstance(barcodes, list) or not barcodes:
+            return jsonify({"success": False, "error": "barcodes must be a non-empty list"}), 400
+        if len(barcodes) > 500:
+            return jsonify({"success": False, "error": "At most 500 barcodes per request"}), 400
+        
+        result = products_service.lookup_barcodes(barcodes, get_user_id_from_session())
+        return jsonify(result), 200
+        
+    except Exception as e:
+        print(f"[BARCODE BATCH] Exception: {e}")
+        return jsonify({
+            "success": False,
+            "error": "Search failed"
+        }), 500
+
 @products_bp.route('/api/products/barcode-to-cart/<barcode>', methods=['POST'])
 def barcode_to_cart(barcode):
     """⚡ INSTANT barcode-to-cart - For billing system"""
     try:
         # ⚡ LIGHTNING-FAST barcode lookup
-        result = products_service.search_product_by_barcode(barcode)
+        result = products_service.search_product_by_barcode(barcode, get_user_id_from_session())
         
         if result['success']:
             product = result['product']
@@ -220,10 +245,13 @@ def update_product_stock(product_id):
             }), 404
         
         # Update only the stock
-        conn.execute("UPDATE products SET stock = ?, updated_at = CURRENT_TIMESTAMP WHERE id = ? AND user_id = ?", 
-                    (new_stock, product_id, user_id))
+        set_stock(conn, product_id, new_stock, business_owner_id=user_id, created_by=user_id,
+                  notes='Stock updated from product list')
+        conn.execute("UPDATE products SET updated_at = CURRENT_TIMESTAMP WHERE id = ? AND user_id = ?", 
+                    (product_id, user_id))
         conn.commit()
         conn.close()
+        invalidate_tenant(user_id)
         
         print(f"[STOCK UPDATE] Successfully updated stock for {product['name']}: {product['stock']} → {new_stock}")
         
@@ -345,6 +373,7 @@ def recommend_product_images():
         }), 500
 
 @products_bp.route('/api/products/alerts', methods=['GET'])
+@cached_response('product_alerts')
 def get_product_alerts():
     """
     Get product alerts for:
@@ -361,7 +390,6 @@ def get_product_alerts():
         
         # Get current date
         today = datetime.now().date()
-        expiry_threshold = (today + timedelta(days=7)).isoformat()
         
         alerts = {
             'low_stock': [],
@@ -371,9 +399,17 @@ def get_product_alerts():
         }
         
         # Build query - STRICT MULTI-TENANT ISOLATION
+        # Only rows that can produce an alert are read (stock at/below min_stock,
+        # or expiring within the week), not the whole catalogue
         if user_id:
-            base_query = 'SELECT * FROM products WHERE is_active = 1 AND user_id = ?'
-            products = conn.execute(base_query, (user_id,)).fetchall()
+            base_query = '''
+                SELECT id, name, category, stock, min_stock, expiry_date FROM products
+                WHERE is_active = 1 AND user_id = ?
+                  AND (stock <= COALESCE(min_stock, 0)
+                       OR (expiry_date IS NOT NULL AND expiry_date <> '' AND expiry_date < ?))
+            '''
+            expiry_before = (today + timedelta(days=8)).isoformat()
+            products = conn.execute(base_query, (user_id, expiry_before)).fetchall()
         else:
             products = []
         
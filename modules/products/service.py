@@ -6,6 +6,9 @@ COPIED AS-IS from app.py
 import sqlite3
 from datetime import datetime
 from modules.shared.database import get_db_connection, generate_id
+from modules.shared.cache import invalidate_tenant
+from modules.shared.stock_ledger import record_opening_stock, set_stock
+from modules.shared import barcode_index
 
 class ProductsService:
     
@@ -44,6 +47,7 @@ class ProductsService:
         
         conn.commit()
         conn.close()
+        barcode_index.forget_product(product_id)
         
         return {
             "success": True,
@@ -52,44 +56,32 @@ class ProductsService:
             "barcode": barcode
         }
     
-    def search_product_by_barcode(self, barcode):
-        """⚡ FAST barcode search - Optimized for instant response"""
+    def search_product_by_barcode(self, barcode, tenant_id=None):
+        """⚡ FAST barcode search - served from the in-memory barcode index"""
         # Quick validation
         if not barcode or len(barcode.strip()) == 0:
             return {"success": False, "error": "Invalid barcode"}
         
         barcode = barcode.strip()
-        conn = get_db_connection()
-        
-        # ⚡ SINGLE OPTIMIZED QUERY - Fast lookup with index
-        product = conn.execute("""SELECT id, code, name, category, price, cost, stock, 
+        if tenant_id:
+            product = barcode_index.lookup(tenant_id, barcode)
+        else:
+            # No tenant in the session: untenanted lookup straight from the database
+            conn = get_db_connection()
+            row = conn.execute("""SELECT id, code, name, category, price, cost, stock, 
                                          min_stock, unit, business_type, barcode_data, 
-                                         barcode_image, image_url, is_active 
+                                         barcode_image, image_url 
                                   FROM products 
                                   WHERE barcode_data = ? AND is_active = 1 
                                   LIMIT 1""", (barcode,)).fetchone()
-        
-        conn.close()
+            conn.close()
+            product = dict(row) if row else None
         
         if product:
             # ⚡ INSTANT RESPONSE - Return product data immediately
             return {
                 "success": True,
-                "product": {
-                    "id": product['id'],
-                    "code": product['code'],
-                    "name": product['name'],
-                    "category": product['category'],
-                    "price": product['price'],
-                    "cost": product['cost'],
-                    "stock": product['stock'],
-                    "min_stock": product['min_stock'],
-                    "unit": product['unit'],
-                    "business_type": product['business_type'],
-                    "barcode_data": product['barcode_data'],
-                    "barcode_image": product['barcode_image'],
-                    "image_url": product['image_url']
-                }
+                "product": product
             }
         else:
             # ⚡ FAST FAILURE - No debug info for speed
@@ -99,6 +91,17 @@ class ProductsService:
                 "barcode": barcode
             }
     
+    def lookup_barcodes(self, barcodes, tenant_id):
+        """Batch scan lookup for scanner buffers: {barcode: product or None}"""
+        products = barcode_index.lookup_many(tenant_id, barcodes)
+        missing = [code for code, product in products.items() if product is None]
+        return {
+            "success": True,
+            "products": products,
+            "found": len(products) - len(missing),
+            "missing": missing
+        }
+    
     def add_product(self, data):
         """Add a new product"""
         print(f"[PRODUCT ADD] Received data: {data}")
@@ -170,8 +173,11 @@ class ProductsService:
                 1,  # is_active
                 data.get('user_id')  # 🔥 Store user_id for multi-tenant support
             ))
+            record_opening_stock(conn, product_id, data.get('user_id'), data.get('user_id'),
+                                 unit_cost=float(data.get('cost', 0)))
             
             conn.commit()
+            invalidate_tenant(data.get('user_id'))
             print(f"[PRODUCT ADD] Successfully added product: {product_id}")
             
         except sqlite3.IntegrityError as e:
@@ -281,7 +287,7 @@ class ProductsService:
         try:
             conn.execute("""UPDATE products SET
                     code = ?, name = ?, category = ?, price = ?, cost = ?, 
-                    stock = ?, min_stock = ?, unit = ?, business_type = ?,
+                    min_stock = ?, unit = ?, business_type = ?,
                     barcode_data = ?, barcode_image = ?, image_url = ?, expiry_date = ?,
                     supplier = ?, description = ?, bill_receipt_photo = ?, last_stock_update = ?
                 WHERE id = ?""", (
@@ -290,7 +296,6 @@ class ProductsService:
                 data.get('category', existing_product['category']),
                 float(data['price']), 
                 float(data.get('cost', existing_product['cost'])), 
-                int(data.get('stock', existing_product['stock'])),
                 int(data.get('min_stock', existing_product['min_stock'])), 
                 data.get('unit', existing_product['unit']), 
                 data.get('business_type', existing_product['business_type']),
@@ -304,8 +309,13 @@ class ProductsService:
                 datetime.now().isoformat(),  # Update last_stock_update timestamp
                 product_id
             ))
+            if 'stock' in data:
+                set_stock(conn, product_id, int(data['stock']), business_owner_id=existing_product['user_id'],
+                          notes='Stock edited on product')
             
             conn.commit()
+            invalidate_tenant(existing_product['user_id'])
+            barcode_index.forget_product(product_id)
             print(f"[PRODUCT UPDATE] Successfully updated product: {product_id}")
             
         except sqlite3.IntegrityError as e:
@@ -341,7 +351,7 @@ class ProductsService:
         conn = get_db_connection()
         
         # Check if product exists
-        product = conn.execute("SELECT id, name, barcode_data FROM products WHERE id = ?", (product_id,)).fetchone()
+        product = conn.execute("SELECT id, name, barcode_data, user_id FROM products WHERE id = ?", (product_id,)).fetchone()
         
         if not product:
             conn.close()
@@ -354,6 +364,8 @@ class ProductsService:
         conn.execute('DELETE FROM products WHERE id = ?', (product_id,))
         conn.commit()
         conn.close()
+        invalidate_tenant(product['user_id'])
+        barcode_index.forget_product(product_id)
         
         print(f"[PRODUCT DELETE] Successfully deleted: {product['name']}")
         
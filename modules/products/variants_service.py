@@ -4,6 +4,7 @@ Handles product variants (different sizes, prices for same product)
 """
 
 from modules.shared.database import get_db_connection, generate_id
+from modules.shared import barcode_index
 from datetime import datetime
 
 class ProductVariantsService:
@@ -35,6 +36,7 @@ class ProductVariantsService:
             
             conn.commit()
             conn.close()
+            barcode_index.forget_product(product_id)
             
             return {
                 "success": True,
@@ -67,10 +69,11 @@ class ProductVariantsService:
         conn = get_db_connection()
         
         try:
-            conn.execute("""UPDATE product_variants SET
+            row = conn.execute("""UPDATE product_variants SET
                     variant_name = ?, size = ?, price = ?, cost = ?, 
                     stock = ?, sku = ?, barcode = ?
-                WHERE id = ?""", (
+                WHERE id = ?
+                RETURNING product_id""", (
                 variant_data.get('variant_name'),
                 variant_data.get('size'),
                 float(variant_data.get('price', 0)),
@@ -79,10 +82,12 @@ class ProductVariantsService:
                 variant_data.get('sku'),
                 variant_data.get('barcode'),
                 variant_id
-            ))
+            )).fetchone()
             
             conn.commit()
             conn.close()
+            if row:
+                barcode_index.forget_product(row['product_id'])
             
             return {
                 "success": True,
@@ -102,9 +107,12 @@ class ProductVariantsService:
         conn = get_db_connection()
         
         try:
-            conn.execute("UPDATE product_variants SET is_active = 0 WHERE id = ?", (variant_id,))
+            row = conn.execute("UPDATE product_variants SET is_active = 0 WHERE id = ? RETURNING product_id",
+                               (variant_id,)).fetchone()
             conn.commit()
             conn.close()
+            if row:
+                barcode_index.forget_product(row['product_id'])
             
             return {
                 "success": True,
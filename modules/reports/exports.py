@@ -0,0 +1,231 @@
+"""
+Report exports - the queries behind /api/reports/<report_type>/export
+Each report is streamed straight from the database (modules/shared/export.py)
+with no row limit. Reports over bills/sales accept a date range:
+?date_from=YYYY-MM-DD&date_to=YYYY-MM-DD (inclusive) or ?date_range=today|week|month|...
+"""
+
+from datetime import date, datetime
+
+from modules.shared.database import sql_date_bucket
+from modules.shared.date_ranges import range_clause
+from modules.shared.export import export_date_bounds
+
+
+def _with_days_to_expiry(rows):
+    today = date.today()
+    for name, code, stock, expiry_date in rows:
+        try:
+            days = (datetime.strptime(str(expiry_date)[:10], '%Y-%m-%d').date() - today).days
+        except ValueError:
+            days = None
+        yield name, code, stock, expiry_date, days
+
+
+def _number_payments(rows):
+    """One row per payment, numbered per bill, or one 'No Payment' row (rows arrive ordered by bill)"""
+    current, number, placeholder = None, 0, None
+    for (bill_number, customer, bill_amount, bill_date, amount, method, paid_at, notes,
+         total_paid, remaining) in rows:
+        customer = customer or 'Walk-in Customer'
+        if bill_number != current:
+            if placeholder:
+                yield placeholder
+            current, number = bill_number, 0
+            placeholder = (bill_number, customer, bill_amount, bill_date, 'No Payment', 0, '-', '-', '-',
+                           total_paid or 0, remaining or 0)
+        if amount and amount > 0:
+            number += 1
+            placeholder = None
+            yield (bill_number, customer, bill_amount, bill_date, f"Payment {number}", amount,
+                   method or 'CASH', paid_at, notes or '', total_paid or 0, remaining or 0)
+    if placeholder:
+        yield placeholder
+
+
+# report_type -> sql ({where}, {day} placeholders), tenant column, date column, headers
+REPORT_EXPORTS = {
+    # ---------- Sales ----------
+    'sales_summary': {
+        'sql': """
+            SELECT sale_date, SUM(bill_count), SUM(total_sales),
+                   SUM(CASE WHEN payment_method = 'cash' THEN total_sales ELSE 0 END),
+                   SUM(CASE WHEN payment_method = 'upi' THEN total_sales ELSE 0 END),
+                   SUM(CASE WHEN payment_method = 'card' THEN total_sales ELSE 0 END),
+                   SUM(credit_sales)
+            FROM daily_sales_rollup
+            WHERE bill_count > 0 {where}
+            GROUP BY sale_date ORDER BY sale_date DESC
+        """,
+        'owner': 'business_owner_id', 'date': 'sale_date',
+        'columns': ['Date', 'Bills', 'Revenue', 'Cash', 'UPI', 'Card', 'Credit'],
+    },
+    'sales_by_product': {
+        'sql': """
+            SELECT product_name, SUM(quantity), SUM(total_price), COUNT(*), AVG(unit_price)
+            FROM sales WHERE 1=1 {where}
+            GROUP BY product_name ORDER BY SUM(total_price) DESC
+        """,
+        'owner': 'business_owner_id', 'date': 'created_at',
+        'columns': ['Product', 'Quantity', 'Revenue', 'Transactions', 'Avg Price'],
+    },
+    'sales_by_customer': {
+        'sql': """
+            SELECT customer_name, COUNT(*), SUM(total_amount), AVG(total_amount), MAX(created_at)
+            FROM bills WHERE 1=1 {where}
+            GROUP BY customer_name ORDER BY SUM(total_amount) DESC
+        """,
+        'owner': 'business_owner_id', 'date': 'created_at',
+        'columns': ['Customer', 'Bills', 'Revenue', 'Avg Bill Value', 'Last Purchase'],
+    },
+    'sales_by_payment': {
+        'sql': """
+            SELECT payment_method, COUNT(*), SUM(total_amount), AVG(total_amount)
+            FROM bills WHERE 1=1 {where}
+            GROUP BY payment_method ORDER BY SUM(total_amount) DESC
+        """,
+        'owner': 'business_owner_id', 'date': 'created_at',
+        'columns': ['Payment Method', 'Transactions', 'Amount', 'Avg Transaction'],
+    },
+    'daily_sales': {
+        'sql': """
+            SELECT {day}, COUNT(*), SUM(total_amount), AVG(total_amount)
+            FROM bills WHERE 1=1 {where}
+            GROUP BY {day} ORDER BY {day} DESC
+        """,
+        'owner': 'business_owner_id', 'date': 'created_at',
+        'columns': ['Date', 'Bills', 'Revenue', 'Avg Value'],
+    },
+    # ---------- Inventory ----------
+    'stock_summary': {
+        'sql': """
+            SELECT name, code, category, stock, unit, price, cost, stock * price
+            FROM products WHERE 1=1 {where}
+            ORDER BY stock * price DESC
+        """,
+        'owner': 'user_id',
+        'columns': ['Product', 'Code', 'Category', 'Stock', 'Unit', 'Selling Price', 'Cost Price', 'Stock Value'],
+    },
+    'low_stock': {
+        'sql': """
+            SELECT name, code, stock, min_stock, min_stock - stock, unit
+            FROM products WHERE stock <= min_stock AND stock > 0 {where}
+            ORDER BY min_stock - stock DESC
+        """,
+        'owner': 'user_id',
+        'columns': ['Product', 'Code', 'Stock', 'Minimum Stock', 'Shortage', 'Unit'],
+    },
+    'out_of_stock': {
+        'sql': """
+            SELECT name, code, category, unit, price
+            FROM products WHERE stock = 0 {where}
+            ORDER BY name
+        """,
+        'owner': 'user_id',
+        'columns': ['Product', 'Code', 'Category', 'Unit', 'Selling Price'],
+    },
+    'expiry_report': {
+        'sql': """
+            SELECT name, code, stock, expiry_date
+            FROM products WHERE expiry_date IS NOT NULL AND expiry_date != '' {where}
+            ORDER BY expiry_date
+        """,
+        'owner': 'user_id',
+        'columns': ['Product', 'Code', 'Stock', 'Expiry Date', 'Days To Expiry'],
+        'transform': _with_days_to_expiry,
+    },
+    'stock_valuation': {
+        'sql': """
+            SELECT name, stock, cost, price, stock * cost, stock * price, stock * price - stock * cost
+            FROM products WHERE stock > 0 {where}
+            ORDER BY stock * price DESC
+        """,
+        'owner': 'user_id',
+        'columns': ['Product', 'Quantity', 'Cost Price', 'Selling Price', 'Cost Value', 'Selling Value',
+                    'Potential Profit'],
+    },
+    # ---------- Financial ----------
+    'profit_loss': {
+        'sql': """
+            SELECT {day}, SUM(s.total_price), SUM(s.cogs), SUM(s.total_price - COALESCE(s.cogs, 0))
+            FROM sales s
+            WHERE 1=1 {where}
+            GROUP BY {day} ORDER BY {day} DESC
+        """,
+        'owner': 's.business_owner_id', 'date': 's.sale_date',
+        'columns': ['Date', 'Revenue', 'Cost', 'Profit'],
+    },
+    'revenue_report': {
+        'sql': """
+            SELECT {day}, COUNT(*), SUM(total_amount), AVG(total_amount)
+            FROM bills WHERE 1=1 {where}
+            GROUP BY {day} ORDER BY {day} DESC
+        """,
+        'owner': 'business_owner_id', 'date': 'created_at',
+        'columns': ['Date', 'Transactions', 'Revenue', 'Avg Revenue'],
+    },
+    # ---------- Customers ----------
+    'customer_list': {
+        'sql': """
+            SELECT name, phone, email, address, created_at
+            FROM customers WHERE 1=1 {where}
+            ORDER BY name
+        """,
+        'owner': 'user_id',
+        'columns': ['Name', 'Phone', 'Email', 'Address', 'Registration Date'],
+    },
+    'top_customers': {
+        'sql': """
+            SELECT customer_name, COUNT(*), SUM(total_amount), AVG(total_amount), MAX(created_at)
+            FROM bills WHERE 1=1 {where}
+            GROUP BY customer_name ORDER BY SUM(total_amount) DESC
+        """,
+        'owner': 'business_owner_id', 'date': 'created_at',
+        'columns': ['Customer', 'Purchases', 'Total Spent', 'Avg Purchase', 'Last Purchase'],
+    },
+    # ---------- Credit ----------
+    'outstanding_credit': {
+        'sql': """
+            SELECT bill_number, customer_name, total_amount, credit_paid_amount, credit_balance, created_at
+            FROM bills WHERE is_credit = 1 AND credit_balance > 0 {where}
+            ORDER BY credit_balance DESC
+        """,
+        'owner': 'business_owner_id', 'date': 'created_at',
+        'columns': ['Bill Number', 'Customer', 'Bill Amount', 'Paid', 'Outstanding', 'Bill Date'],
+    },
+    'credit_payment_history': {
+        'sql': """
+            SELECT b.bill_number, b.customer_name, b.total_amount, b.created_at,
+                   ct.amount, ct.payment_method, ct.created_at, ct.notes,
+                   b.credit_paid_amount, b.credit_balance
+            FROM bills b
+            LEFT JOIN credit_transactions ct ON b.id = ct.bill_id AND ct.transaction_type = 'payment'
+            WHERE b.is_credit = 1 {where}
+            ORDER BY b.bill_number, ct.created_at ASC
+        """,
+        'owner': 'b.business_owner_id', 'date': 'b.created_at',
+        'columns': ['Bill Number', 'Customer', 'Bill Amount', 'Bill Date', 'Payment No', 'Payment Amount',
+                    'Payment Method', 'Payment Date', 'Notes', 'Total Paid', 'Remaining Balance'],
+        'transform': _number_payments,
+    },
+}
+
+
+def build_export_query(report_type, user_id, args):
+    """(sql, params, spec) for a report export, or None for an unknown report"""
+    spec = REPORT_EXPORTS.get(report_type)
+    if spec is None:
+        return None
+    conditions, params = [], []
+    if user_id:
+        conditions.append(f"({spec['owner']} = ? OR {spec['owner']} IS NULL)")
+        params.append(user_id)
+    date_column = spec.get('date')
+    if date_column:
+        date_sql, date_params = range_clause(date_column, *export_date_bounds(args))
+        if date_sql:
+            conditions.append(date_sql)
+            params.extend(date_params)
+    where = ''.join(f" AND {condition}" for condition in conditions)
+    day = sql_date_bucket(date_column, 'day') if date_column else ''
+    return spec['sql'].format(where=where, day=day), params, spec
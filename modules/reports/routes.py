@@ -4,6 +4,10 @@ Reports routes - Handle all report generation
 
 from flask import Blueprint, request, jsonify, session, send_file, render_template
 from modules.shared.database import get_db_connection
+from modules.shared.sales_rollup import rollup_daily
+from modules.shared.cache import cached_response, REPORTS_CACHE_TTL
+from modules.shared.export import export_response, stream_rows
+from .exports import build_export_query
 from datetime import datetime, timedelta
 import io
 import csv
@@ -27,37 +31,15 @@ def get_user_id_from_session():
 # ========== SALES REPORTS ==========
 
 @reports_bp.route('/api/reports/sales_summary', methods=['GET'])
+@cached_response('reports', ttl=REPORTS_CACHE_TTL)
 def sales_summary_report():
     """Sales Summary Report"""
     try:
         conn = get_db_connection()
         user_id = get_user_id_from_session()
         
-        query = """
-            SELECT 
-                DATE(created_at) as date,
-                COUNT(*) as total_bills,
-                SUM(total_amount) as total_revenue,
-                AVG(total_amount) as avg_bill_value,
-                SUM(CASE WHEN payment_method = 'cash' THEN total_amount ELSE 0 END) as cash_sales,
-                SUM(CASE WHEN payment_method = 'upi' THEN total_amount ELSE 0 END) as upi_sales,
-                SUM(CASE WHEN payment_method = 'card' THEN total_amount ELSE 0 END) as card_sales,
-                SUM(CASE WHEN is_credit = 1 THEN total_amount ELSE 0 END) as credit_sales
-            FROM bills
-            WHERE 1=1
-        """
-        
-        params = []
-        if user_id:
-            query += " AND (business_owner_id = ? OR business_owner_id IS NULL)"
-            params.append(user_id)
-        
-        query += " GROUP BY DATE(created_at) ORDER BY date DESC LIMIT 30"
-        
-        cursor = conn.execute(query, params)
-        rows = cursor.fetchall()
-        
-        report_data = [dict(row) for row in rows]
+        # Read the per-day rollup (shared/sales_rollup.py) instead of grouping every bill
+        report_data = rollup_daily(conn, user_id, limit=30, include_unowned=True)
         
         # Calculate summary
         total_revenue = sum(row['total_revenue'] for row in report_data)
@@ -74,6 +56,7 @@ def sales_summary_report():
         return jsonify({'success': False, 'error': str(e)}), 500
 
 @reports_bp.route('/api/reports/sales_by_product', methods=['GET'])
+@cached_response('reports', ttl=REPORTS_CACHE_TTL)
 def sales_by_product_report():
     """Product-wise Sales Report"""
     try:
@@ -116,6 +99,7 @@ def sales_by_product_report():
         return jsonify({'success': False, 'error': str(e)}), 500
 
 @reports_bp.route('/api/reports/sales_by_customer', methods=['GET'])
+@cached_response('reports', ttl=REPORTS_CACHE_TTL)
 def sales_by_customer_report():
     """Customer-wise Sales Report"""
     try:
@@ -158,6 +142,7 @@ def sales_by_customer_report():
         return jsonify({'success': False, 'error': str(e)}), 500
 
 @reports_bp.route('/api/reports/sales_by_payment', methods=['GET'])
+@cached_response('reports', ttl=REPORTS_CACHE_TTL)
 def sales_by_payment_report():
     """Payment Method Report"""
     try:
@@ -199,6 +184,7 @@ def sales_by_payment_report():
         return jsonify({'success': False, 'error': str(e)}), 500
 
 @reports_bp.route('/api/reports/daily_sales', methods=['GET'])
+@cached_response('reports', ttl=REPORTS_CACHE_TTL)
 def daily_sales_report():
     """Daily Sales Report"""
     try:
@@ -242,6 +228,7 @@ def daily_sales_report():
 # ========== INVENTORY REPORTS ==========
 
 @reports_bp.route('/api/reports/stock_summary', methods=['GET'])
+@cached_response('reports', ttl=REPORTS_CACHE_TTL)
 def stock_summary_report():
     """Stock Summary Report"""
     try:
@@ -264,7 +251,7 @@ def stock_summary_report():
         
         params = []
         if user_id:
-            query += " AND (business_owner_id = ? OR business_owner_id IS NULL)"
+            query += " AND (user_id = ? OR user_id IS NULL)"
             params.append(user_id)
         
         query += " ORDER BY stock_value DESC"
@@ -287,6 +274,7 @@ def stock_summary_report():
         return jsonify({'success': False, 'error': str(e)}), 500
 
 @reports_bp.route('/api/reports/low_stock', methods=['GET'])
+@cached_response('reports', ttl=REPORTS_CACHE_TTL)
 def low_stock_report():
     """Low Stock Alert Report"""
     try:
@@ -307,7 +295,7 @@ def low_stock_report():
         
         params = []
         if user_id:
-            query += " AND (business_owner_id = ? OR business_owner_id IS NULL)"
+            query += " AND (user_id = ? OR user_id IS NULL)"
             params.append(user_id)
         
         query += " ORDER BY shortage DESC"
@@ -329,6 +317,7 @@ def low_stock_report():
         return jsonify({'success': False, 'error': str(e)}), 500
 
 @reports_bp.route('/api/reports/out_of_stock', methods=['GET'])
+@cached_response('reports', ttl=REPORTS_CACHE_TTL)
 def out_of_stock_report():
     """Out of Stock Report"""
     try:
@@ -348,7 +337,7 @@ def out_of_stock_report():
         
         params = []
         if user_id:
-            query += " AND (business_owner_id = ? OR business_owner_id IS NULL)"
+            query += " AND (user_id = ? OR user_id IS NULL)"
             params.append(user_id)
         
         query += " ORDER BY name"
@@ -370,6 +359,7 @@ def out_of_stock_report():
         return jsonify({'success': False, 'error': str(e)}), 500
 
 @reports_bp.route('/api/reports/expiry_report', methods=['GET'])
+@cached_response('reports', ttl=REPORTS_CACHE_TTL)
 def expiry_report():
     """Product Expiry Report"""
     try:
@@ -389,7 +379,7 @@ def expiry_report():
         
         params = []
         if user_id:
-            query += " AND (business_owner_id = ? OR business_owner_id IS NULL)"
+            query += " AND (user_id = ? OR user_id IS NULL)"
             params.append(user_id)
         
         query += " ORDER BY days_to_expiry ASC"
@@ -411,6 +401,7 @@ def expiry_report():
         return jsonify({'success': False, 'error': str(e)}), 500
 
 @reports_bp.route('/api/reports/stock_valuation', methods=['GET'])
+@cached_response('reports', ttl=REPORTS_CACHE_TTL)
 def stock_valuation_report():
     """Stock Valuation Report"""
     try:
@@ -432,7 +423,7 @@ def stock_valuation_report():
         
         params = []
         if user_id:
-            query += " AND (business_owner_id = ? OR business_owner_id IS NULL)"
+            query += " AND (user_id = ? OR user_id IS NULL)"
             params.append(user_id)
         
         query += " ORDER BY selling_value DESC"
@@ -457,21 +448,21 @@ def stock_valuation_report():
 # ========== FINANCIAL REPORTS ==========
 
 @reports_bp.route('/api/reports/profit_loss', methods=['GET'])
+@cached_response('reports', ttl=REPORTS_CACHE_TTL)
 def profit_loss_report():
     """Profit & Loss Report"""
     try:
         conn = get_db_connection()
         user_id = get_user_id_from_session()
         
-        # Get sales data with cost
+        # Sales with their cost-of-goods snapshot (shared/costing.py)
         query = """
             SELECT 
                 DATE(s.sale_date) as date,
                 SUM(s.total_price) as revenue,
-                SUM(s.quantity * p.cost) as cost,
-                SUM(s.total_price - (s.quantity * p.cost)) as profit
+                SUM(s.cogs) as cost,
+                SUM(s.total_price - COALESCE(s.cogs, 0)) as profit
             FROM sales s
-            LEFT JOIN products p ON s.product_id = p.id
             WHERE 1=1
         """
         
@@ -500,6 +491,7 @@ def profit_loss_report():
         return jsonify({'success': False, 'error': str(e)}), 500
 
 @reports_bp.route('/api/reports/revenue_report', methods=['GET'])
+@cached_response('reports', ttl=REPORTS_CACHE_TTL)
 def revenue_report():
     """Revenue Report"""
     try:
@@ -543,6 +535,7 @@ def revenue_report():
 # ========== CUSTOMER REPORTS ==========
 
 @reports_bp.route('/api/reports/customer_list', methods=['GET'])
+@cached_response('reports', ttl=REPORTS_CACHE_TTL)
 def customer_list_report():
     """Customer List Report"""
     try:
@@ -562,7 +555,7 @@ def customer_list_report():
         
         params = []
         if user_id:
-            query += " AND (business_owner_id = ? OR business_owner_id IS NULL)"
+            query += " AND (user_id = ? OR user_id IS NULL)"
             params.append(user_id)
         
         query += " ORDER BY name"
@@ -584,6 +577,7 @@ def customer_list_report():
         return jsonify({'success': False, 'error': str(e)}), 500
 
 @reports_bp.route('/api/reports/top_customers', methods=['GET'])
+@cached_response('reports', ttl=REPORTS_CACHE_TTL)
 def top_customers_report():
     """Top Customers Report"""
     try:
@@ -628,6 +622,7 @@ def top_customers_report():
 # ========== CREDIT REPORTS ==========
 
 @reports_bp.route('/api/reports/outstanding_credit', methods=['GET'])
+@cached_response('reports', ttl=REPORTS_CACHE_TTL)
 def outstanding_credit_report():
     """Outstanding Credit Report"""
     try:
@@ -671,6 +666,7 @@ def outstanding_credit_report():
         return jsonify({'success': False, 'error': str(e)}), 500
 
 @reports_bp.route('/api/reports/credit_payment_history', methods=['GET'])
+@cached_response('reports', ttl=REPORTS_CACHE_TTL)
 def credit_payment_history_report():
     """Credit Payment History Report - Complete transaction history with all payment details"""
     try:
@@ -788,16 +784,22 @@ def credit_payment_history_report():
 # Export functionality
 @reports_bp.route('/api/reports/<report_type>/export', methods=['GET'])
 def export_report(report_type):
-    """Export report to CSV/Excel"""
+    """Export report to CSV/Excel, streamed from the database (see exports.py)"""
     try:
-        format_type = request.args.get('format', 'csv')
-        
-        # For now, return a simple message
-        # In production, generate actual file
-        return jsonify({
-            'success': True,
-            'message': f'Export {report_type} as {format_type} - Feature coming soon!'
-        })
+        user_id = get_user_id_from_session()
+        if not user_id:
+            return jsonify({'success': False, 'error': 'User not authenticated'}), 401
+        
+        export = build_export_query(report_type, user_id, request.args)
+        if export is None:
+            return jsonify({'success': False, 'error': f'Unknown report: {report_type}'}), 404
+        query, params, spec = export
+        
+        rows = stream_rows(query, params)
+        if spec.get('transform'):
+            rows = spec['transform'](rows)
+        filename = f"{report_type}_{datetime.now().strftime('%Y-%m-%d')}"
+        return export_response(rows, spec['columns'], filename, request.args.get('format', 'csv'))
         
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)}), 500
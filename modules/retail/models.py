@@ -50,9 +50,8 @@ class RetailModels:
             result = conn.execute('''
                 SELECT 
                     COALESCE(SUM(s.total_price), 0) as total_sales,
-                    COALESCE(SUM(s.quantity * p.cost), 0) as total_cost
+                    COALESCE(SUM(s.cogs), 0) as total_cost
                 FROM sales s
-                LEFT JOIN products p ON s.product_id = p.id
                 WHERE s.sale_date = ?
                 AND s.payment_method != 'credit'
             ''', (date,)).fetchone()
@@ -6,6 +6,11 @@ COPIED AS-IS from app.py
 from flask import Blueprint, render_template, jsonify, session
 from modules.shared.auth_decorators import require_auth
 from .service import RetailService
+from modules.shared.cache import cached_response, invalidate_tenant
+from modules.shared.stock_ledger import record_opening_stock, set_stock
+from modules.shared import barcode_index
+from modules.shared.date_ranges import period_clause
+from modules.shared.pagination import decode_cursor, keyset_clause, keyset_page, page_size
 from datetime import datetime
 
 retail_bp = Blueprint('retail', __name__)
@@ -301,68 +306,9 @@ def get_credit_bills():
 
 @retail_bp.route('/api/credit/export', methods=['GET'])
 def export_credit():
-    """Export credit bills - Filtered by user"""
-    from modules.shared.database import get_db_connection
-    
-    try:
-        # 🔥 Get user_id for filtering
-        user_id = get_user_id_from_session()
-        print(f"🔍 [CREDIT EXPORT] Filtering by user_id: {user_id}")
-        
-        conn = get_db_connection()
-        cursor = conn.cursor()
-        
-        # Query with user filtering
-        query = """
-            SELECT 
-                b.bill_number,
-                b.customer_name,
-                b.total_amount,
-                b.credit_paid_amount,
-                b.credit_balance,
-                b.payment_status,
-                b.created_at
-            FROM bills b
-            WHERE b.is_credit = 1 AND b.credit_balance > 0
-        """
-        
-        params = []
-        
-        # 🔥 Add user filtering
-        if user_id:
-            query += " AND (b.business_owner_id = ? OR b.business_owner_id IS NULL)"
-            params.append(user_id)
-        
-        query += " ORDER BY b.created_at DESC"
-        
-        cursor.execute(query, params)
-        rows = cursor.fetchall()
-        
-        bills = []
-        for row in rows:
-            bills.append({
-                'bill_number': row[0],
-                'customer_name': row[1] or 'Walk-in Customer',
-                'customer_phone': '',
-                'total_amount': float(row[2] or 0),
-                'paid_amount': float(row[3] or 0),
-                'remaining_amount': float(row[4] or 0),
-                'payment_status': row[5] or 'unpaid',
-                'date': row[6]
-            })
-        
-        conn.close()
-        
-        return jsonify({
-            'success': True,
-            'data': bills
-        })
-        
-    except Exception as e:
-        return jsonify({
-            'success': False,
-            'error': str(e)
-        }), 500
+    """Export credit bills - Filtered by user (same export as the credit module)"""
+    from modules.credit.routes import export_credit_bills
+    return export_credit_bills()
 
 
 @retail_bp.route('/api/credit/payment', methods=['POST'])
@@ -370,6 +316,7 @@ def record_credit_payment():
     """Record a payment for a credit bill"""
     from flask import request
     from modules.shared.database import get_db_connection
+    from modules.shared.sales_rollup import record_bill
     import traceback
     import uuid
     from datetime import datetime
@@ -456,7 +403,8 @@ def record_credit_payment():
         
         print(f"💾 Payment record created: {payment_id}")
         
-        # Update bill
+        # Update bill (and move its contribution in the daily sales rollup)
+        record_bill(conn, bill_id, -1)
         cursor.execute("""
             UPDATE bills
             SET credit_paid_amount = ?,
@@ -466,9 +414,11 @@ def record_credit_payment():
                 is_credit = ?
             WHERE id = ?
         """, (new_paid, new_balance, new_status, payment_method, is_credit, bill_id))
+        record_bill(conn, bill_id)
         
         conn.commit()
         conn.close()
+        invalidate_tenant(get_user_id_from_session())
         
         print(f"✅ Payment recorded successfully for {bill_number}")
         print(f"📅 Revenue will be counted for bill date: {bill_created_at}")
@@ -494,6 +444,65 @@ def record_credit_payment():
         }), 500
 
 
+def _credit_history_page(cursor, query, params, page_cursor, limit):
+    """One keyset page of credit history; summary and customer list come with the first page only"""
+    keyset_sql, keyset_params = keyset_clause("b.created_at", "b.id", page_cursor)
+    cursor.execute(query + (f" AND {keyset_sql}" if keyset_sql else '') +
+                   " ORDER BY b.created_at DESC, b.id DESC LIMIT ?", params + keyset_params + [limit + 1])
+    rows, next_cursor = keyset_page(cursor.fetchall(), limit)
+    bills = [{
+        'id': row['id'],
+        'bill_number': row['bill_number'],
+        'customer_name': row['customer_name'] or 'Walk-in Customer',
+        'customer_id': row['customer_id'],
+        'total_amount': float(row['total_amount'] or 0),
+        'paid_amount': float(row['credit_paid_amount'] or 0),
+        'balance_due': float(row['credit_balance'] or 0),
+        'remaining_amount': float(row['credit_balance'] or 0),
+        'payment_method': row['payment_method'] or 'cash',
+        'payment_status': row['payment_status'] or 'unpaid',
+        'created_at': row['created_at'],
+        'is_credit': row['is_credit'],
+        'last_payment_date': row['last_payment_date'],
+        'customer_phone': ''
+    } for row in rows]
+    response_data = {
+        'success': True,
+        'bills': bills,
+        'pagination': {
+            'per_page': limit,
+            'next_cursor': next_cursor,
+            'has_next': next_cursor is not None,
+            'has_prev': page_cursor is not None
+        }
+    }
+    if page_cursor is None:
+        # Totals over the whole filtered history, aggregated in the database
+        cursor.execute(f"""
+            SELECT COUNT(*), COALESCE(SUM(h.credit_paid_amount), 0), COALESCE(SUM(h.total_amount), 0),
+                   COALESCE(SUM(h.credit_balance), 0)
+            FROM ({query}) h
+        """, params)
+        total_bills, total_paid, total_amount, total_remaining = cursor.fetchone()
+        cursor.execute(f"SELECT DISTINCT COALESCE(h.customer_name, 'Walk-in Customer') FROM ({query}) h", params)
+        customers = [row[0] for row in cursor.fetchall()]
+        response_data['customers'] = customers
+        response_data['summary'] = {
+            'total_paid': round(float(total_paid), 2),
+            'total_bills': total_bills,
+            'total_customers': len(customers),
+            'total_remaining': round(float(total_remaining), 2)
+        }
+        response_data['stats'] = {
+            'total_bills': total_bills,
+            'pending_amount': round(float(total_remaining), 2),
+            'total_amount': round(float(total_amount), 2),
+            'received_amount': round(float(total_paid), 2)
+        }
+    print(f"✅ Returning {len(bills)} history records (page of {limit})")
+    return response_data
+
+
 @retail_bp.route('/api/credit/history', methods=['GET'])
 def get_credit_history():
     """Get credit payment history - paid and partially paid bills - Filtered by user"""
@@ -544,22 +553,24 @@ def get_credit_history():
             query += " AND (b.business_owner_id = ? OR b.business_owner_id IS NULL)"
             params.append(user_id)
         
-        # Add date filter
-        if date_range != 'all':
-            if date_range == 'today':
-                query += " AND DATE(b.created_at) = DATE('now', 'localtime')"
-            elif date_range == 'yesterday':
-                query += " AND DATE(b.created_at) = DATE('now', 'localtime', '-1 day')"
-            elif date_range == 'week':
-                query += " AND DATE(b.created_at) >= DATE('now', 'localtime', '-7 days')"
-            elif date_range == 'month':
-                query += " AND DATE(b.created_at) >= DATE('now', 'localtime', '-30 days')"
+        # Add date filter (half-open created_at range, see shared/date_ranges.py)
+        if date_range in ('today', 'yesterday', 'week', 'month'):
+            date_sql, date_params = period_clause("b.created_at", date_range)
+            query += f" AND {date_sql}"
+            params.extend(date_params)
         
         # Add customer filter
         if customer != 'all':
             query += " AND b.customer_name = ?"
             params.append(customer)
         
+        # Keyset pagination: ?cursor= (empty for the first page), then the returned next_cursor
+        if 'cursor' in request.args:
+            response_data = _credit_history_page(cursor, query, params, decode_cursor(request.args.get('cursor')),
+                                                 page_size(request.args.get('limit')))
+            conn.close()
+            return jsonify(response_data)
+        
         query += " ORDER BY b.created_at DESC"
         
         print(f"🔍 Executing history query...")
@@ -624,6 +635,8 @@ def get_credit_history():
         
         return jsonify(response_data)
         
+    except ValueError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
     except Exception as e:
         print(f"❌ ERROR: {str(e)}")
         traceback.print_exc()
@@ -719,6 +732,7 @@ def get_bill_payment_history(bill_id):
 # ============================================================================
 
 @retail_bp.route('/api/products', methods=['GET'])
+@cached_response('retail_products')
 def get_products():
     """Get all products - Filtered by user"""
     from modules.shared.database import get_db_connection
@@ -856,9 +870,11 @@ def add_product():
             user_id,
             now
         ))
+        record_opening_stock(conn, product_id, user_id, user_id, unit_cost=data.get('cost', 0))
         
         conn.commit()
         conn.close()
+        invalidate_tenant(get_user_id_from_session())
         
         return jsonify({
             'success': True,
@@ -889,7 +905,7 @@ def update_product(product_id):
         cursor.execute("""
             UPDATE products SET
                 name = ?, description = ?, category = ?, price = ?, cost = ?,
-                stock = ?, min_stock = ?, unit = ?, code = ?, barcode_data = ?, image_url = ?
+                min_stock = ?, unit = ?, code = ?, barcode_data = ?, image_url = ?
             WHERE id = ?
         """, (
             data.get('name'),
@@ -897,7 +913,6 @@ def update_product(product_id):
             data.get('category', 'Other'),
             data.get('price', 0),
             data.get('cost', 0),
-            data.get('stock', 0),
             data.get('min_stock', 0),
             data.get('unit', 'piece'),
             data.get('code', ''),
@@ -905,9 +920,13 @@ def update_product(product_id):
             data.get('image_url', ''),
             product_id
         ))
+        set_stock(conn, product_id, data.get('stock', 0), business_owner_id=get_user_id_from_session(),
+                  notes='Stock edited on product')
         
         conn.commit()
         conn.close()
+        invalidate_tenant(get_user_id_from_session())
+        barcode_index.forget_product(product_id)
         
         return jsonify({
             'success': True,
@@ -934,6 +953,8 @@ def delete_product(product_id):
         
         conn.commit()
         conn.close()
+        invalidate_tenant(get_user_id_from_session())
+        barcode_index.forget_product(product_id)
         
         return jsonify({
             'success': True,
@@ -4,18 +4,27 @@ COPIED AS-IS from app.py
 """
 
 from modules.shared.database import get_db_connection
+from modules.shared.date_ranges import day_bounds, period_bounds
+from modules.shared.sales_rollup import rollup_period_totals
+from modules.shared.cache import cached, DASHBOARD_CACHE_TTL
 from datetime import datetime, timedelta
 
 class RetailService:
     
+    @cached('dashboard_stats', ttl=DASHBOARD_CACHE_TTL, tenant_arg='user_id')
     def get_dashboard_stats(self, user_id=None):
-        """Get comprehensive dashboard statistics with real-time data - Filtered by user"""
+        """
+        Get comprehensive dashboard statistics with real-time data - Filtered by user
+        All KPIs come from a handful of conditional-aggregation queries on one connection;
+        the result is cached per tenant briefly and invalidated on bill creation.
+        """
         conn = get_db_connection()
         cursor = conn.cursor()
         
         today = datetime.now().strftime('%Y-%m-%d')
         yesterday = (datetime.now() - timedelta(days=1)).strftime('%Y-%m-%d')
-        week_start = (datetime.now() - timedelta(days=7)).strftime('%Y-%m-%d')
+        today_start, today_end = day_bounds(today)
+        yesterday_start, yesterday_end = day_bounds(yesterday)
         
         # Build user filter condition - STRICT ISOLATION
         user_filter = ""
@@ -24,193 +33,85 @@ class RetailService:
             user_filter = "AND business_owner_id = ?"
             user_params = [user_id]
         
-        # Today's Sales (ALL bills including credit/partial)
-        today_sales_data = cursor.execute(f'''
-            SELECT 
-                COALESCE(SUM(total_amount), 0) as total_sales,
-                COUNT(*) as transactions
-            FROM bills 
-            WHERE DATE(created_at) = ? {user_filter}
-        ''', [today] + user_params).fetchone()
-        
-        # Today's Revenue (only PAID amounts - exclude unpaid credit)
-        today_revenue_data = cursor.execute(f'''
-            SELECT 
-                COALESCE(SUM(CASE 
-                    WHEN is_credit = 0 OR payment_status = 'paid' THEN total_amount
-                    WHEN is_credit = 1 AND payment_status != 'paid' THEN credit_paid_amount
+        # Bill totals for every window in ONE pass over the daily sales rollup (shared/sales_rollup.py)
+        # Sales = ALL bills including credit/partial, Revenue = only PAID amounts,
+        # Receivable = unpaid credit balance (includes partial payments)
+        periods = rollup_period_totals(conn, user_id, {
+            'today': (today_start, today_end),
+            'yesterday': (yesterday_start, yesterday_end),
+            'week': period_bounds('this_week'),
+            'month': period_bounds('this_month'),
+            'all_time': (None, None),  # 🔥 TOTAL Receivable (ALL pending credit bills)
+        })
+        today_totals = periods['today']
+        yesterday_totals = periods['yesterday']
+        all_time_totals = periods['all_time']
+        
+        # Cost & Profit in ONE scan of bill_items for today, yesterday and all pending credit bills:
+        # - paid share (proportional for partial payments) of today's / yesterday's bills
+        # - unpaid share of today's / all open credit bills (receivable profit)
+        paid_share = '''CASE
+                    WHEN b.is_credit = 0 OR b.payment_status = 'paid' THEN {value}
+                    WHEN b.is_credit = 1 AND b.payment_status = 'partial' AND b.total_amount > 0 THEN
+                        ({value} * b.credit_paid_amount / b.total_amount)
                     ELSE 0
-                END), 0) as revenue
-            FROM bills 
-            WHERE DATE(created_at) = ? {user_filter}
-        ''', [today] + user_params).fetchone()
-        
-        # Today's Receivable (unpaid credit balance) - includes partial payments
-        today_receivable_data = cursor.execute(f'''
-            SELECT 
-                COALESCE(SUM(credit_balance), 0) as receivable
-            FROM bills 
-            WHERE DATE(created_at) = ? {user_filter}
-            AND is_credit = 1
-            AND credit_balance > 0
-        ''', [today] + user_params).fetchone()
-        
-        # 🔥 TOTAL Receivable (ALL pending credit bills - not just today)
-        total_receivable_data = cursor.execute(f'''
-            SELECT 
-                COALESCE(SUM(credit_balance), 0) as total_receivable,
-                COUNT(*) as pending_bills
-            FROM bills 
-            WHERE is_credit = 1
-            AND credit_balance > 0 {user_filter}
-        ''', user_params).fetchone()
-        
-        
-        # Yesterday's Sales for comparison
-        yesterday_sales_data = cursor.execute(f'''
-            SELECT 
-                COALESCE(SUM(total_amount), 0) as total_sales
-            FROM bills 
-            WHERE DATE(created_at) = ? {user_filter}
-        ''', [yesterday] + user_params).fetchone()
-        
-        # Yesterday's Revenue for comparison
-        yesterday_revenue_data = cursor.execute(f'''
-            SELECT 
-                COALESCE(SUM(CASE 
-                    WHEN is_credit = 0 OR payment_status = 'paid' THEN total_amount
-                    WHEN is_credit = 1 AND payment_status != 'paid' THEN credit_paid_amount
+                END'''
+        unpaid_share = '''CASE
+                    WHEN b.payment_status = 'unpaid' THEN {value}
+                    WHEN b.payment_status = 'partial' AND b.total_amount > 0 THEN
+                        ({value} * b.credit_balance / b.total_amount)
                     ELSE 0
-                END), 0) as revenue
-            FROM bills 
-            WHERE DATE(created_at) = ? {user_filter}
-        ''', [yesterday] + user_params).fetchone()
-        
-        # Yesterday's orders for comparison
-        yesterday_orders = cursor.execute(f'''
-            SELECT COUNT(*) as bills
-            FROM bills
-            WHERE DATE(created_at) = ? {user_filter}
-        ''', [yesterday] + user_params).fetchone()
-        
-        # Today's Cost & Profit (from paid revenue only - proportional for partial payments)
-        today_profit_data = cursor.execute(f'''
-            SELECT 
-                COALESCE(SUM(
-                    CASE 
-                        WHEN b.is_credit = 0 OR b.payment_status = 'paid' THEN bi.total_price
-                        WHEN b.is_credit = 1 AND b.payment_status = 'partial' AND b.total_amount > 0 THEN 
-                            (bi.total_price * b.credit_paid_amount / b.total_amount)
-                        ELSE 0
-                    END
-                ), 0) as total_sales,
-                COALESCE(SUM(
-                    CASE 
-                        WHEN b.is_credit = 0 OR b.payment_status = 'paid' THEN bi.quantity * COALESCE(p.cost, 0)
-                        WHEN b.is_credit = 1 AND b.payment_status = 'partial' AND b.total_amount > 0 THEN 
-                            (bi.quantity * COALESCE(p.cost, 0) * b.credit_paid_amount / b.total_amount)
-                        ELSE 0
-                    END
-                ), 0) as total_cost
-            FROM bill_items bi
-            LEFT JOIN products p ON bi.product_id = p.id
-            JOIN bills b ON bi.bill_id = b.id
-            WHERE DATE(b.created_at) = ? {user_filter}
-        ''', [today] + user_params).fetchone()
-        
-        # Receivable Profit (profit from unpaid portion - includes partial payments)
-        today_receivable_profit_data = cursor.execute(f'''
-            SELECT 
-                COALESCE(SUM(
-                    CASE 
-                        WHEN b.payment_status = 'unpaid' THEN bi.total_price
-                        WHEN b.payment_status = 'partial' AND b.total_amount > 0 THEN 
-                            (bi.total_price * b.credit_balance / b.total_amount)
-                        ELSE 0
-                    END
-                ), 0) as total_sales,
-                COALESCE(SUM(
-                    CASE 
-                        WHEN b.payment_status = 'unpaid' THEN bi.quantity * COALESCE(p.cost, 0)
-                        WHEN b.payment_status = 'partial' AND b.total_amount > 0 THEN 
-                            (bi.quantity * COALESCE(p.cost, 0) * b.credit_balance / b.total_amount)
-                        ELSE 0
-                    END
-                ), 0) as total_cost
-            FROM bill_items bi
-            LEFT JOIN products p ON bi.product_id = p.id
-            JOIN bills b ON bi.bill_id = b.id
-            WHERE DATE(b.created_at) = ? {user_filter}
-            AND b.is_credit = 1
-            AND b.credit_balance > 0
-        ''', [today] + user_params).fetchone()
-        
-        # 🔥 TOTAL Receivable Profit (ALL pending credit bills - not just today)
-        total_receivable_profit_data = cursor.execute(f'''
+                END'''
+        fully_paid = '''CASE WHEN b.is_credit = 0 OR b.payment_status = 'paid' THEN {value} ELSE 0 END'''
+        is_today = 'b.created_at >= ? AND b.created_at < ?'
+        is_yesterday = 'b.created_at >= ? AND b.created_at < ?'
+        is_open = 'b.is_credit = 1 AND b.credit_balance > 0'
+        line_sales = 'bi.total_price'
+        line_cost = 'COALESCE(bi.cogs, 0)'
+        
+        profit = cursor.execute(f'''
             SELECT 
-                COALESCE(SUM(
-                    CASE 
-                        WHEN b.payment_status = 'unpaid' THEN bi.total_price
-                        WHEN b.payment_status = 'partial' AND b.total_amount > 0 THEN 
-                            (bi.total_price * b.credit_balance / b.total_amount)
-                        ELSE 0
-                    END
-                ), 0) as total_sales,
-                COALESCE(SUM(
-                    CASE 
-                        WHEN b.payment_status = 'unpaid' THEN bi.quantity * COALESCE(p.cost, 0)
-                        WHEN b.payment_status = 'partial' AND b.total_amount > 0 THEN 
-                            (bi.quantity * COALESCE(p.cost, 0) * b.credit_balance / b.total_amount)
-                        ELSE 0
-                    END
-                ), 0) as total_cost
+                COALESCE(SUM(CASE WHEN {is_today} THEN {paid_share.format(value=line_sales)} ELSE 0 END), 0) as today_sales,
+                COALESCE(SUM(CASE WHEN {is_today} THEN {paid_share.format(value=line_cost)} ELSE 0 END), 0) as today_cost,
+                COALESCE(SUM(CASE WHEN {is_today} AND {is_open} THEN {unpaid_share.format(value=line_sales)} ELSE 0 END), 0) as today_receivable_sales,
+                COALESCE(SUM(CASE WHEN {is_today} AND {is_open} THEN {unpaid_share.format(value=line_cost)} ELSE 0 END), 0) as today_receivable_cost,
+                COALESCE(SUM(CASE WHEN {is_open} THEN {unpaid_share.format(value=line_sales)} ELSE 0 END), 0) as total_receivable_sales,
+                COALESCE(SUM(CASE WHEN {is_open} THEN {unpaid_share.format(value=line_cost)} ELSE 0 END), 0) as total_receivable_cost,
+                COALESCE(SUM(CASE WHEN {is_yesterday} THEN {fully_paid.format(value=line_sales)} ELSE 0 END), 0) as yesterday_sales,
+                COALESCE(SUM(CASE WHEN {is_yesterday} THEN {fully_paid.format(value=line_cost)} ELSE 0 END), 0) as yesterday_cost
             FROM bill_items bi
-            LEFT JOIN products p ON bi.product_id = p.id
             JOIN bills b ON bi.bill_id = b.id
-            WHERE b.is_credit = 1
-            AND b.credit_balance > 0 {user_filter}
-        ''', user_params).fetchone()
+            WHERE ((b.created_at >= ? AND b.created_at < ?) OR ({is_open})) {user_filter.replace('business_owner_id', 'b.business_owner_id')}
+        ''', [today_start, today_end] * 4 + [yesterday_start, yesterday_end] * 2
+             + [yesterday_start, today_end] + user_params).fetchone()
         
-        
-        # Yesterday's Cost & Profit for comparison
-        yesterday_profit_data = cursor.execute(f'''
-            SELECT 
-                COALESCE(SUM(bi.total_price), 0) as total_sales,
-                COALESCE(SUM(bi.quantity * COALESCE(p.cost, 0)), 0) as total_cost
-            FROM bill_items bi
-            LEFT JOIN products p ON bi.product_id = p.id
-            JOIN bills b ON bi.bill_id = b.id
-            WHERE DATE(b.created_at) = ? {user_filter}
-            AND (b.is_credit = 0 OR b.payment_status = 'paid')
-        ''', [yesterday] + user_params).fetchone()
-        
-        total_sales = float(today_profit_data['total_sales'])
-        total_cost = float(today_profit_data['total_cost'])
+        total_sales = float(profit['today_sales'])
+        total_cost = float(profit['today_cost'])
         today_profit = total_sales - total_cost
         profit_margin = (today_profit / total_sales * 100) if total_sales > 0 else 0
         
         # Calculate today's receivable profit
-        receivable_sales = float(today_receivable_profit_data['total_sales'])
-        receivable_cost = float(today_receivable_profit_data['total_cost'])
+        receivable_sales = float(profit['today_receivable_sales'])
+        receivable_cost = float(profit['today_receivable_cost'])
         receivable_profit = receivable_sales - receivable_cost
         
         # 🔥 Calculate TOTAL receivable profit (all pending bills)
-        total_receivable_sales = float(total_receivable_profit_data['total_sales'])
-        total_receivable_cost = float(total_receivable_profit_data['total_cost'])
+        total_receivable_sales = float(profit['total_receivable_sales'])
+        total_receivable_cost = float(profit['total_receivable_cost'])
         total_receivable_profit = total_receivable_sales - total_receivable_cost
         
-        yesterday_total_sales = float(yesterday_profit_data['total_sales'])
-        yesterday_total_cost = float(yesterday_profit_data['total_cost'])
+        yesterday_total_sales = float(profit['yesterday_sales'])
+        yesterday_total_cost = float(profit['yesterday_cost'])
         yesterday_profit = yesterday_total_sales - yesterday_total_cost
         
         # Calculate percentage changes
-        today_sales_value = float(today_sales_data['total_sales'])
-        yesterday_sales_value = float(yesterday_sales_data['total_sales'])
-        today_revenue_value = float(today_revenue_data['revenue'])
-        yesterday_revenue_value = float(yesterday_revenue_data['revenue'])
-        today_receivable_value = float(today_receivable_data['receivable'])
-        total_receivable_value = float(total_receivable_data['total_receivable'])
-        total_pending_bills = int(total_receivable_data['pending_bills'])
+        today_sales_value = today_totals['total_sales']
+        yesterday_sales_value = yesterday_totals['total_sales']
+        today_revenue_value = today_totals['revenue']
+        yesterday_revenue_value = yesterday_totals['revenue']
+        today_receivable_value = today_totals['credit_balance']
+        total_receivable_value = all_time_totals['credit_balance']
+        total_pending_bills = all_time_totals['open_credit_bills']
         
         # Debug logging (after all variables are defined)
         print(f"📊 [DASHBOARD] Today's Stats:")
@@ -241,54 +142,36 @@ class RetailService:
             profit_change = 100
             
         orders_change = 0
-        today_orders_count = int(today_sales_data['transactions'])
-        yesterday_orders_count = int(yesterday_orders['bills'])
+        today_orders_count = today_totals['bill_count']
+        yesterday_orders_count = yesterday_totals['bill_count']
         
         if yesterday_orders_count > 0:
             orders_change = ((today_orders_count - yesterday_orders_count) / yesterday_orders_count) * 100
         elif today_orders_count > 0:
             orders_change = 100
         
-        # Total Products
+        # Product counts in one scan (conditional aggregation)
+        product_filter = "AND user_id = ?" if user_id else ""
+        product_counts = cursor.execute(f'''
+            SELECT 
+                COUNT(*) as total,
+                COALESCE(SUM(CASE WHEN stock > 0 AND stock <= min_stock THEN 1 ELSE 0 END), 0) as low_stock,
+                COALESCE(SUM(CASE WHEN stock = 0 THEN 1 ELSE 0 END), 0) as out_of_stock
+            FROM products 
+            WHERE is_active = 1 {product_filter}
+        ''', [user_id] if user_id else []).fetchone()
+        low_stock = int(product_counts['low_stock'])
+        out_of_stock = int(product_counts['out_of_stock'])
+        
         if user_id:
-            # STRICT ISOLATION: Only count user's own products
-            total_products = cursor.execute('''
-                SELECT COUNT(*) as count FROM products WHERE is_active = 1 AND user_id = ?
-            ''', (user_id,)).fetchone()['count']
-            
-            # Low Stock Products - STRICT ISOLATION
-            low_stock = cursor.execute('''
-                SELECT COUNT(*) as count FROM products 
-                WHERE stock > 0 AND stock <= min_stock AND is_active = 1 AND user_id = ?
-            ''', (user_id,)).fetchone()['count']
-            
-            # Out of Stock Products - STRICT ISOLATION
-            out_of_stock = cursor.execute('''
-                SELECT COUNT(*) as count FROM products 
-                WHERE stock = 0 AND is_active = 1 AND user_id = ?
-            ''', (user_id,)).fetchone()['count']
-            
-            # Total Customers - STRICT ISOLATION
+            # STRICT ISOLATION: Only count user's own products/customers
+            total_products = int(product_counts['total'])
             total_customers = cursor.execute('''
                 SELECT COUNT(*) as count FROM customers WHERE is_active = 1 AND user_id = ?
             ''', (user_id,)).fetchone()['count']
         else:
             # No user_id: count nothing
             total_products = 0
-            
-            # Low Stock Products (excluding out of stock)
-            low_stock = cursor.execute('''
-                SELECT COUNT(*) as count FROM products 
-                WHERE stock > 0 AND stock <= min_stock AND is_active = 1
-            ''').fetchone()['count']
-            
-            # Out of Stock Products
-            out_of_stock = cursor.execute('''
-                SELECT COUNT(*) as count FROM products 
-                WHERE stock = 0 AND is_active = 1
-            ''').fetchone()['count']
-            
-            # Total Customers - No user_id
             total_customers = 0
         
         # Recent Sales (Last 10)
@@ -301,10 +184,10 @@ class RetailService:
                 strftime('%H:%M', b.created_at) as time
             FROM bills b
             LEFT JOIN customers c ON b.customer_id = c.id
-            WHERE DATE(b.created_at) = ? {user_filter}
+            WHERE b.created_at >= ? AND b.created_at < ? {user_filter.replace('business_owner_id', 'b.business_owner_id')}
             ORDER BY b.created_at DESC
             LIMIT 10
-        ''', [today] + user_params).fetchall()
+        ''', [today_start, today_end] + user_params).fetchall()
         
         # Top Selling Products Today
         top_products = cursor.execute(f'''
@@ -320,19 +203,9 @@ class RetailService:
             LIMIT 5
         ''', [today] + user_params).fetchall()
         
-        # This Week's Revenue
-        week_revenue = cursor.execute(f'''
-            SELECT COALESCE(SUM(total_amount), 0) as revenue
-            FROM bills 
-            WHERE DATE(created_at) >= DATE('now', 'weekday 0', '-6 days') {user_filter}
-        ''', user_params).fetchone()['revenue']
-        
-        # This Month's Revenue
-        month_revenue = cursor.execute(f'''
-            SELECT COALESCE(SUM(total_amount), 0) as revenue
-            FROM bills 
-            WHERE strftime('%Y-%m', created_at) = strftime('%Y-%m', 'now') {user_filter}
-        ''', user_params).fetchone()['revenue']
+        # This Week's / Month's Revenue (bill totals, week starts Monday)
+        week_revenue = periods['week']['total_sales']
+        month_revenue = periods['month']['total_sales']
         
         conn.close()
         
@@ -345,7 +218,7 @@ class RetailService:
             'today_receivable': float(today_receivable_value),  # TODAY's unpaid credit balance ONLY
             'total_receivable': float(total_receivable_value),  # 🔥 TOTAL receivable (ALL pending bills)
             'total_pending_bills': total_pending_bills,  # 🔥 Count of pending bills
-            'today_orders': int(today_sales_data['transactions']),  # Total bills count
+            'today_orders': today_orders_count,  # Total bills count
             'today_profit': round(today_profit, 2),
             'today_receivable_profit': round(receivable_profit, 2),  # TODAY's profit from unpaid credit ONLY
             'total_receivable_profit': round(total_receivable_profit, 2),  # 🔥 TOTAL receivable profit
@@ -368,7 +241,7 @@ class RetailService:
                 'sales': float(today_sales_value),  # Includes ALL bills
                 'revenue': float(today_revenue_value),  # Only PAID amounts
                 'receivable': float(today_receivable_value),  # TODAY's unpaid credit balance ONLY
-                'transactions': int(today_sales_data['transactions']),
+                'transactions': today_orders_count,
                 'profit': round(today_profit, 2),
                 'receivable_profit': round(receivable_profit, 2),  # TODAY's profit from unpaid credit ONLY
                 'cost': round(total_cost, 2),
@@ -4,6 +4,7 @@ Sales routes - Handle all sales API endpoints
 
 from flask import Blueprint, request, jsonify, session
 from .service import SalesService
+from modules.shared.pagination import decode_cursor, page_size
 from datetime import datetime, timedelta
 
 sales_bp = Blueprint('sales', __name__)
@@ -50,6 +51,41 @@ def get_all_sales():
         per_page = request.args.get('per_page', 15, type=int)  # Default 15 per page
         user_id = get_user_id_from_session()
         
+        # Keyset pagination: ?cursor= (empty for the first page), then the returned next_cursor.
+        # Reads one page from the database instead of slicing the whole list.
+        if 'cursor' in request.args:
+            cursor = decode_cursor(request.args.get('cursor'))
+            if date_filter not in ['today', 'yesterday', 'week', 'month']:
+                date_filter = None
+            sales, next_cursor = sales_service.get_sales_page(
+                user_id, date_filter, from_date, to_date, payment_method, page_size(per_page, default=15), cursor
+            )
+            response = {
+                "success": True,
+                "sales": sales,
+                "bills": sales,
+                "pagination": {
+                    "per_page": page_size(per_page, default=15),
+                    "next_cursor": next_cursor,
+                    "has_next": next_cursor is not None,
+                    "has_prev": cursor is not None
+                }
+            }
+            # Summary cards only need loading with the first page
+            if cursor is None:
+                summary = sales_service.get_sales_summary(date_filter or 'all', user_id)
+                response["summary"] = {
+                    "total_sales": summary.get('total_revenue', 0),
+                    "total_bills": summary.get('total_sales', 0),
+                    "total_revenue": summary.get('total_revenue', 0),
+                    "total_items": summary.get('total_items', 0),
+                    "avg_sale_value": summary.get('avg_sale_value', 0),
+                    "net_profit": summary.get('total_revenue', 0) * 0.2,  # Estimated 20% profit
+                    "receivable": summary.get('total_receivables', 0),
+                    "receivable_profit": summary.get('total_receivables', 0)
+                }
+            return jsonify(response)
+        
         # Use date_filter if provided, otherwise use date range
         if date_filter and date_filter in ['today', 'yesterday', 'week', 'month', 'all']:
             sales = sales_service.get_all_sales(date_filter, user_id)
@@ -111,6 +147,8 @@ def get_all_sales():
             "total_records": total_records
         })
         
+    except ValueError as e:
+        return jsonify({"success": False, "error": str(e)}), 400
     except Exception as e:
         print(f"❌ [SALES API] Error: {str(e)}")
         import traceback
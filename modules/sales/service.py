@@ -3,9 +3,49 @@ Sales service - Handle all sales data and analytics
 """
 
 from modules.shared.database import get_db_connection
+from modules.shared.date_ranges import between_bounds, day_bounds, period_bounds, period_clause, range_clause
+from modules.shared.pagination import keyset_clause, keyset_page
 from datetime import datetime, timedelta
 import sqlite3
 
+# Bill-level sales rows (bills are the sales of record); callers append WHERE/ORDER BY.
+# Item count, quantity and product names come from the bill's stored summary
+# (shared/bill_summary.py), so no bill_items lookups per row.
+BILL_SALES_SELECT = """
+    SELECT 
+        b.id,
+        b.id as bill_id,
+        b.bill_number,
+        b.customer_id,
+        COALESCE(b.customer_name, c.name, 'Walk-in Customer') as customer_name,
+        b.total_amount,
+        b.total_amount as total_price,
+        b.subtotal,
+        b.tax_amount,
+        b.discount_amount,
+        b.payment_method,
+        b.payment_status,
+        b.is_credit,
+        b.credit_balance,
+        b.credit_paid_amount,
+        DATE(b.created_at) as sale_date,
+        TIME(b.created_at) as sale_time,
+        b.created_at,
+        b.business_type,
+        b.status,
+        COALESCE(b.product_names, 'Multiple Items') as products,
+        b.total_quantity as quantity,
+        b.item_count as items_count,
+        CASE 
+            WHEN b.is_credit = 1 AND b.credit_balance > 0 THEN 'due'
+            WHEN b.payment_method = 'partial' THEN 'partial'
+            WHEN b.payment_method = 'credit' THEN 'due'
+            ELSE 'completed'
+        END as transaction_status
+    FROM bills b
+    LEFT JOIN customers c ON b.customer_id = c.id
+"""
+
 class SalesService:
     
     def get_sales_by_date_range(self, from_date=None, to_date=None, limit=100, user_id=None):
@@ -30,13 +70,11 @@ class SalesService:
             where_clauses.append("s.business_owner_id = ?")
             params.append(user_id)
         
-        # Add date filters
-        if from_date and to_date:
-            where_clauses.append("DATE(s.sale_date) >= ? AND DATE(s.sale_date) <= ?")
-            params.extend([from_date, to_date])
-        elif from_date:
-            where_clauses.append("DATE(s.sale_date) >= ?")
-            params.append(from_date)
+        # Add date filters (to_date only applies together with from_date)
+        if from_date:
+            date_sql, date_params = range_clause("s.sale_date", *between_bounds(from_date, to_date))
+            where_clauses.append(date_sql)
+            params.extend(date_params)
         
         # Combine where clauses
         if where_clauses:
@@ -55,43 +93,7 @@ class SalesService:
         conn = get_db_connection()
         
         # Query bills table for accurate bill-level data
-        base_query = """
-            SELECT 
-                b.id,
-                b.id as bill_id,
-                b.bill_number,
-                b.customer_id,
-                COALESCE(b.customer_name, c.name, 'Walk-in Customer') as customer_name,
-                b.total_amount,
-                b.total_amount as total_price,
-                b.subtotal,
-                b.tax_amount,
-                b.discount_amount,
-                b.payment_method,
-                b.payment_status,
-                b.is_credit,
-                b.credit_balance,
-                b.credit_paid_amount,
-                DATE(b.created_at) as sale_date,
-                TIME(b.created_at) as sale_time,
-                b.created_at,
-                b.business_type,
-                b.status,
-                COALESCE(
-                    (SELECT GROUP_CONCAT(bi.product_name, ', ') FROM bill_items bi WHERE bi.bill_id = b.id),
-                    'Multiple Items'
-                ) as products,
-                (SELECT SUM(bi.quantity) FROM bill_items bi WHERE bi.bill_id = b.id) as quantity,
-                (SELECT COUNT(*) FROM bill_items bi WHERE bi.bill_id = b.id) as items_count,
-                CASE 
-                    WHEN b.is_credit = 1 AND b.credit_balance > 0 THEN 'due'
-                    WHEN b.payment_method = 'partial' THEN 'partial'
-                    WHEN b.payment_method = 'credit' THEN 'due'
-                    ELSE 'completed'
-                END as transaction_status
-            FROM bills b
-            LEFT JOIN customers c ON b.customer_id = c.id
-        """
+        base_query = BILL_SALES_SELECT
         
         # Build WHERE clause
         where_clauses = []
@@ -102,30 +104,11 @@ class SalesService:
             where_clauses.append("b.business_owner_id = ?")
             params.append(user_id)
         
-        if date_filter:
-            if date_filter == 'today':
-                today = datetime.now().strftime('%Y-%m-%d')
-                where_clauses.append("DATE(b.created_at) = ?")
-                params.append(today)
-            elif date_filter == 'yesterday':
-                yesterday = (datetime.now() - timedelta(days=1)).strftime('%Y-%m-%d')
-                where_clauses.append("DATE(b.created_at) = ?")
-                params.append(yesterday)
-            elif date_filter == 'week':
-                week_ago = (datetime.now() - timedelta(days=7)).strftime('%Y-%m-%d')
-                where_clauses.append("DATE(b.created_at) >= ?")
-                params.append(week_ago)
-            elif date_filter == 'month':
-                month_ago = (datetime.now() - timedelta(days=30)).strftime('%Y-%m-%d')
-                where_clauses.append("DATE(b.created_at) >= ?")
-                params.append(month_ago)
-            elif date_filter == 'all':
-                # All sales - no date filter, but limit results
-                pass
-            else:
-                # Custom date
-                where_clauses.append("DATE(b.created_at) = ?")
-                params.append(date_filter)
+        # Half-open created_at range so the (business_owner_id, created_at) index is usable
+        date_sql, date_params = period_clause("b.created_at", date_filter)
+        if date_sql:
+            where_clauses.append(date_sql)
+            params.extend(date_params)
         
         # Add WHERE clause if we have conditions
         if where_clauses:
@@ -141,9 +124,59 @@ class SalesService:
         
         conn.close()
         
-        # Convert to list of dicts with proper field names matching frontend expectations
+        return self._format_bill_sales(sales)
+    
+    def get_sales_page(self, user_id=None, date_filter=None, from_date=None, to_date=None,
+                       payment_method=None, limit=15, cursor=None):
+        """
+        One page of bill-level sales, newest first - Filtered by user
+        Keyset-paginated on (created_at, id); returns (sales, next_cursor or None).
+        Serial numbers count from 1 on every page.
+        """
+        where_clauses = []
+        params = []
+        
+        # STRICT DATA ISOLATION - Only show user's own bills
+        if user_id:
+            where_clauses.append("b.business_owner_id = ?")
+            params.append(user_id)
+        
+        if from_date or to_date:
+            date_sql, date_params = range_clause("b.created_at", *between_bounds(from_date, to_date))
+        else:
+            date_sql, date_params = period_clause("b.created_at", date_filter)
+        if date_sql:
+            where_clauses.append(date_sql)
+            params.extend(date_params)
+        
+        if payment_method and payment_method != 'all':
+            where_clauses.append("b.payment_method = ?")
+            params.append(payment_method)
+        
+        keyset_sql, keyset_params = keyset_clause("b.created_at", "b.id", cursor)
+        if keyset_sql:
+            where_clauses.append(keyset_sql)
+            params.extend(keyset_params)
+        
+        query = BILL_SALES_SELECT
+        if where_clauses:
+            query += " WHERE " + " AND ".join(where_clauses)
+        query += " ORDER BY b.created_at DESC, b.id DESC LIMIT ?"
+        params.append(limit + 1)
+        
+        conn = get_db_connection()
+        try:
+            rows = conn.execute(query, params).fetchall()
+        finally:
+            conn.close()
+        
+        rows, next_cursor = keyset_page(rows, limit)
+        return self._format_bill_sales(rows), next_cursor
+    
+    def _format_bill_sales(self, rows, first_serial=1):
+        """Convert bill rows to dicts with the field names the frontend expects"""
         result = []
-        for index, row in enumerate(sales, 1):
+        for index, row in enumerate(rows, first_serial):
             sale = dict(row)
             
             # Fix S.NO - frontend expects 'serial_no'
@@ -212,30 +245,11 @@ class SalesService:
             where_clauses.append("business_owner_id = ?")
             params.append(user_id)
         
-        if date_filter:
-            if date_filter == 'today':
-                today = datetime.now().strftime('%Y-%m-%d')
-                where_clauses.append("DATE(created_at) = ?")
-                params.append(today)
-            elif date_filter == 'yesterday':
-                yesterday = (datetime.now() - timedelta(days=1)).strftime('%Y-%m-%d')
-                where_clauses.append("DATE(created_at) = ?")
-                params.append(yesterday)
-            elif date_filter == 'week':
-                week_ago = (datetime.now() - timedelta(days=7)).strftime('%Y-%m-%d')
-                where_clauses.append("DATE(created_at) >= ?")
-                params.append(week_ago)
-            elif date_filter == 'month':
-                month_ago = (datetime.now() - timedelta(days=30)).strftime('%Y-%m-%d')
-                where_clauses.append("DATE(created_at) >= ?")
-                params.append(month_ago)
-            elif date_filter == 'all':
-                # All data - no date filter
-                pass
-            else:
-                # Custom date
-                where_clauses.append("DATE(created_at) = ?")
-                params.append(date_filter)
+        # Half-open created_at range so the (business_owner_id, created_at) index is usable
+        date_sql, date_params = period_clause("created_at", date_filter)
+        if date_sql:
+            where_clauses.append(date_sql)
+            params.extend(date_params)
         
         # Build WHERE clause
         date_condition = ""
@@ -296,11 +310,11 @@ class SalesService:
                         SUM(total_price) as total_revenue,
                         COUNT(*) as sale_count
                     FROM sales 
-                    WHERE DATE(sale_date) = ?
+                    WHERE sale_date >= ? AND sale_date < ?
                     GROUP BY product_id, product_name
                     ORDER BY total_revenue DESC
                     LIMIT ?
-                """, (today, limit)).fetchall()
+                """, (*day_bounds(today), limit)).fetchall()
             elif date_filter == 'week':
                 week_ago = (datetime.now() - timedelta(days=7)).strftime('%Y-%m-%d')
                 products = conn.execute("""
@@ -310,7 +324,7 @@ class SalesService:
                         SUM(total_price) as total_revenue,
                         COUNT(*) as sale_count
                     FROM sales 
-                    WHERE DATE(sale_date) >= ?
+                    WHERE sale_date >= ?
                     GROUP BY product_id, product_name
                     ORDER BY total_revenue DESC
                     LIMIT ?
@@ -324,11 +338,11 @@ class SalesService:
                         SUM(total_price) as total_revenue,
                         COUNT(*) as sale_count
                     FROM sales 
-                    WHERE DATE(sale_date) = ?
+                    WHERE sale_date >= ? AND sale_date < ?
                     GROUP BY product_id, product_name
                     ORDER BY total_revenue DESC
                     LIMIT ?
-                """, (date_filter, limit)).fetchall()
+                """, (*period_bounds(date_filter), limit)).fetchall()
         else:
             # All time
             products = conn.execute("""
@@ -359,7 +373,7 @@ class SalesService:
                 SUM(total_price) as daily_revenue,
                 COUNT(*) as daily_sales
             FROM sales 
-            WHERE DATE(sale_date) >= ?
+            WHERE sale_date >= ?
             GROUP BY DATE(sale_date)
             ORDER BY sale_date ASC
         """, (start_date,)).fetchall()
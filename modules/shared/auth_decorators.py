@@ -3,8 +3,10 @@ Authentication decorators
 COPIED AS-IS from app.py
 """
 
+import hmac
+import os
 from functools import wraps
-from flask import session, redirect, url_for, render_template, request
+from flask import session, redirect, url_for, render_template, request, jsonify
 from .database import get_current_client_id
 
 # Authentication decorator
@@ -49,6 +51,25 @@ def require_super_admin(f):
         return f(*args, **kwargs)
     return decorated_function
 
+# Internal-only decorator for operational detail endpoints (/health/*)
+def require_internal(f):
+    """
+    Allow a direct loopback request, a request carrying X-Health-Token equal to
+    HEALTH_DETAILS_TOKEN, or a logged-in super admin; everyone else gets 403
+    """
+    @wraps(f)
+    def decorated_function(*args, **kwargs):
+        token = os.environ.get('HEALTH_DETAILS_TOKEN')
+        if token and hmac.compare_digest(request.headers.get('X-Health-Token', ''), token):
+            return f(*args, **kwargs)
+        # Proxied requests arrive from the proxy's address, so loopback only counts without one
+        if request.remote_addr in ('127.0.0.1', '::1') and 'X-Forwarded-For' not in request.headers:
+            return f(*args, **kwargs)
+        if 'user_id' in session and session.get('is_super_admin', False):
+            return f(*args, **kwargs)
+        return jsonify({"success": False, "error": "Internal endpoint"}), 403
+    return decorated_function
+
 # BizPulse User Authentication decorator (for Client Management)
 def require_bizpulse_user(f):
     @wraps(f)
@@ -0,0 +1,300 @@
+"""
+In-memory barcode -> product index for POS scanning
+Checkout lanes scan several items per second; each scan used to open a
+connection and run a query. This keeps, per tenant, a dict from every
+scannable key to a compact product tuple, so a scan is a dict lookup.
+
+Keys, in priority order when two items share one: products.barcode_data,
+product_variants.barcode, products.code, product_variants.sku. A variant hit
+returns its product with the variant's price and stock.
+
+- A tenant is loaded with one query on its first scan (or warm()) and
+  reloaded after BARCODE_INDEX_TTL seconds (scans keep using the old index
+  during the reload); at most BARCODE_INDEX_MAX_TENANTS tenants are kept (LRU).
+  barcode_image is not held in memory.
+- A miss falls back to the database for just the missing keys and merges the
+  result, so products created by another worker are found immediately.
+- Product / variant write paths call forget_product(); stock movements call
+  note_stock() so the stock shown on scan stays current in this process.
+  Other workers converge within the TTL (stock is advisory here; create_bill
+  re-checks it atomically).
+
+- lookup(tenant_id, code) / lookup_many(tenant_id, codes)
+- forget_product(product_id), note_stock(tenant_id, product_id, stock)
+- warm(tenant_id), invalidate(tenant_id=None)
+"""
+
+import os
+import threading
+import time
+from collections import OrderedDict
+
+from .database import get_db_connection
+
+PRODUCT_COLUMNS = ('id', 'code', 'name', 'category', 'price', 'cost', 'stock', 'min_stock',
+                   'unit', 'business_type', 'barcode_data', 'image_url')
+# Entry layout: PRODUCT_COLUMNS followed by the variant fields (None for products)
+ENTRY_FIELDS = PRODUCT_COLUMNS + ('variant_id', 'variant_name')
+_CODE, _NAME, _PRICE, _COST, _STOCK, _BARCODE, _VARIANT = (
+    ENTRY_FIELDS.index(f) for f in ('code', 'name', 'price', 'cost', 'stock', 'barcode_data', 'variant_id'))
+
+# Placeholder chunk size for the miss fallback (SQLite's variable limit is 999)
+_LOOKUP_CHUNK = 200
+
+
+class _TenantIndex:
+    __slots__ = ('keys', 'by_product', 'loaded_at')
+
+    def __init__(self):
+        self.keys = {}        # scanned key -> entry tuple
+        self.by_product = {}  # product_id -> [keys], to drop a product's entries
+        self.loaded_at = time.monotonic()
+
+    def add(self, key, entry):
+        if not key:
+            return
+        key = str(key).strip()
+        if key and key not in self.keys:
+            self.keys[key] = entry
+            self.by_product.setdefault(entry[0], []).append(key)
+
+    def drop(self, product_id):
+        for key in self.by_product.pop(product_id, ()):
+            self.keys.pop(key, None)
+
+
+def _variants_table_exists(conn):
+    if conn.dialect == 'postgresql':
+        row = conn.execute("SELECT to_regclass('product_variants') IS NOT NULL as n").fetchone()
+    else:
+        row = conn.execute("SELECT COUNT(*) as n FROM sqlite_master WHERE type = 'table' "
+                           "AND name = 'product_variants'").fetchone()
+    return bool(row['n'])
+
+
+def _placeholders(values):
+    return ', '.join('?' * len(values))
+
+
+def _fill(index, conn, tenant_id, codes=None):
+    """
+    Add the tenant's active products (all, or those matching `codes`) and their
+    variants to `index`. Returns the number of products read.
+    """
+    columns = ', '.join(f'p.{c}' for c in PRODUCT_COLUMNS)
+    has_variants = _variants_table_exists(conn)
+    if codes is None:
+        match, params = '', [tenant_id]
+    else:
+        marks = _placeholders(codes)
+        match = f' AND (p.barcode_data IN ({marks}) OR p.code IN ({marks})'
+        params = [tenant_id] + list(codes) * 2
+        if has_variants:
+            match += (f' OR p.id IN (SELECT product_id FROM product_variants WHERE is_active = 1 '
+                      f'AND (barcode IN ({marks}) OR sku IN ({marks})))')
+            params += list(codes) * 2
+        match += ')'
+    products = conn.execute(f'SELECT {columns} FROM products p WHERE p.user_id = ? AND p.is_active = 1{match}',
+                            params).fetchall()
+    if not products:
+        return 0
+
+    entries = {row['id']: tuple(row[c] for c in PRODUCT_COLUMNS) + (None, None) for row in products}
+    variants = []
+    if has_variants:
+        if codes is None:
+            scope, scope_params = 'SELECT id FROM products WHERE user_id = ? AND is_active = 1', [tenant_id]
+        else:
+            scope, scope_params = _placeholders(entries), list(entries)
+        variants = conn.execute(f'''
+            SELECT id, product_id, variant_name, price, cost, stock, sku, barcode
+            FROM product_variants WHERE is_active = 1 AND product_id IN ({scope})
+        ''', scope_params).fetchall()
+
+    variant_entries = []
+    for v in variants:
+        base = entries.get(v['product_id'])
+        if base is None:
+            continue
+        entry = list(base)
+        entry[_NAME] = f"{base[_NAME]} - {v['variant_name']}"
+        entry[_PRICE] = v['price']
+        entry[_COST] = v['cost']
+        entry[_STOCK] = v['stock']
+        entry[_VARIANT] = v['id']
+        entry[_VARIANT + 1] = v['variant_name']
+        variant_entries.append((v, tuple(entry)))
+
+    for entry in entries.values():
+        index.add(entry[_BARCODE], entry)
+    for v, entry in variant_entries:
+        index.add(v['barcode'], entry)
+    for entry in entries.values():
+        index.add(entry[_CODE], entry)
+    for v, entry in variant_entries:
+        index.add(v['sku'], entry)
+    return len(products)
+
+
+def _as_product(entry):
+    product = dict(zip(ENTRY_FIELDS, entry))
+    if product['variant_id'] is None:
+        del product['variant_id'], product['variant_name']
+    return product
+
+
+class BarcodeIndex:
+    """Per-tenant scan index, LRU over tenants, reloaded after `ttl` seconds"""
+
+    def __init__(self, max_tenants=256, ttl=300):
+        self.max_tenants = max(1, max_tenants)
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._tenants = OrderedDict()  # tenant_id -> _TenantIndex
+        self._load_locks = {}
+        self.hits = self.misses = self.fallback_hits = self.loads = 0
+
+    def _tenant(self, tenant_id):
+        with self._lock:
+            index = self._tenants.get(tenant_id)
+            if index is not None and time.monotonic() - index.loaded_at < self.ttl:
+                self._tenants.move_to_end(tenant_id)
+                return index
+            load_lock = self._load_locks.setdefault(tenant_id, threading.Lock())
+
+        # One loader per tenant; concurrent scans wait for it instead of loading
+        # again, or keep using the expired index while it reloads
+        if index is not None and not load_lock.acquire(blocking=False):
+            return index
+        if index is None:
+            load_lock.acquire()
+        try:
+            with self._lock:
+                index = self._tenants.get(tenant_id)
+                if index is not None and time.monotonic() - index.loaded_at < self.ttl:
+                    return index
+            return self.warm(tenant_id)
+        finally:
+            load_lock.release()
+
+    def warm(self, tenant_id):
+        """(Re)load a tenant's index from the database"""
+        started = time.perf_counter()
+        index = _TenantIndex()
+        conn = get_db_connection()
+        try:
+            count = _fill(index, conn, tenant_id)
+        finally:
+            conn.close()
+        with self._lock:
+            self._tenants[tenant_id] = index
+            self._tenants.move_to_end(tenant_id)
+            while len(self._tenants) > self.max_tenants:
+                evicted, _ = self._tenants.popitem(last=False)
+                self._load_locks.pop(evicted, None)
+            self.loads += 1
+        if count > 1000:
+            print(f"🔖 Barcode index: {count:,} products for tenant {tenant_id} "
+                  f"in {(time.perf_counter() - started) * 1000:.0f}ms")
+        return index
+
+    def lookup_many(self, tenant_id, codes):
+        """{code: product dict or None}; codes not in memory are looked up in one query"""
+        codes = [str(c).strip() for c in codes if c is not None and str(c).strip()]
+        index = self._tenant(tenant_id)
+        found, missing = {}, []
+        for code in codes:
+            entry = index.keys.get(code)
+            if entry is None:
+                missing.append(code)
+            else:
+                found[code] = entry
+        missing = list(dict.fromkeys(missing))
+
+        if missing:
+            fetched = _TenantIndex()
+            conn = get_db_connection()
+            try:
+                for i in range(0, len(missing), _LOOKUP_CHUNK):
+                    _fill(fetched, conn, tenant_id, missing[i:i + _LOOKUP_CHUNK])
+            finally:
+                conn.close()
+            with self._lock:
+                for key, entry in fetched.keys.items():
+                    index.add(key, entry)
+            for code in missing:
+                entry = index.keys.get(code)
+                if entry is not None:
+                    found[code] = entry
+
+        with self._lock:
+            self.hits += len(codes) - len(missing)
+            self.fallback_hits += sum(1 for code in missing if code in found)
+            self.misses += sum(1 for code in missing if code not in found)
+        return {code: _as_product(found[code]) if code in found else None for code in codes}
+
+    def lookup(self, tenant_id, code):
+        if code is None or not str(code).strip():
+            return None
+        return self.lookup_many(tenant_id, [code]).get(str(code).strip())
+
+    def forget_product(self, product_id):
+        """Drop a product (and its variants) after a write; the next scan re-reads it"""
+        with self._lock:
+            for index in self._tenants.values():
+                index.drop(product_id)
+
+    def note_stock(self, tenant_id, product_id, stock):
+        """Keep the product's (not its variants') stock current after a movement"""
+        with self._lock:
+            index = self._tenants.get(tenant_id)
+            if index is None:
+                return
+            for key in index.by_product.get(product_id, ()):
+                entry = index.keys.get(key)
+                if entry is not None and entry[_VARIANT] is None:
+                    index.keys[key] = entry[:_STOCK] + (stock,) + entry[_STOCK + 1:]
+
+    def invalidate(self, tenant_id=None):
+        with self._lock:
+            if tenant_id is None:
+                self._tenants.clear()
+            else:
+                self._tenants.pop(tenant_id, None)
+
+    def stats(self):
+        with self._lock:
+            return {
+                'tenants': len(self._tenants),
+                'max_tenants': self.max_tenants,
+                'keys': sum(len(index.keys) for index in self._tenants.values()),
+                'ttl': self.ttl,
+                'hits': self.hits,
+                'fallback_hits': self.fallback_hits,
+                'misses': self.misses,
+                'loads': self.loads,
+            }
+
+
+barcode_index = BarcodeIndex(max_tenants=int(os.environ.get('BARCODE_INDEX_MAX_TENANTS', 256)),
+                             ttl=float(os.environ.get('BARCODE_INDEX_TTL', 300)))
+
+
+def lookup(tenant_id, code):
+    return barcode_index.lookup(tenant_id, code)
+
+
+def lookup_many(tenant_id, codes):
+    return barcode_index.lookup_many(tenant_id, codes)
+
+
+def forget_product(product_id):
+    barcode_index.forget_product(product_id)
+
+
+def note_stock(tenant_id, product_id, stock):
+    barcode_index.note_stock(tenant_id, product_id, stock)
+
+
+def get_barcode_index_stats():
+    return barcode_index.stats()
@@ -0,0 +1,67 @@
+"""
+Per-bill item summary
+bills.item_count, total_quantity, product_names, items_total and cogs hold
+what the sales lists and the earnings summary used to work out with
+correlated bill_items subqueries per bill (COUNT, SUM(quantity),
+GROUP_CONCAT of names, SUM(total_price), SUM(cost * quantity)), so both read
+bills alone.
+
+The summary is written with the bill: create_bill already has the items and
+their products in hand (summarize_items). cogs is the cost of the items at
+the time of sale (the items' cost snapshot, see costing.py). Bills written
+before the columns existed are filled once by backfill_bill_summaries(),
+called from init_db.
+"""
+
+import sqlite3
+
+# column -> (SQLite type, PostgreSQL type)
+SUMMARY_COLUMNS = {
+    'item_count': ('INTEGER', 'INTEGER'),
+    'total_quantity': ('REAL', 'NUMERIC(14,3)'),
+    'product_names': ('TEXT', 'TEXT'),
+    'items_total': ('REAL', 'NUMERIC(14,2)'),
+    'cogs': ('REAL', 'NUMERIC(14,2)'),
+}
+
+
+def init_bill_summary_columns(cursor, db_type='sqlite'):
+    """Add the summary columns to bills (called from init_db)"""
+    for column, (sqlite_type, pg_type) in SUMMARY_COLUMNS.items():
+        if db_type == 'postgresql':
+            cursor.execute(f'ALTER TABLE bills ADD COLUMN IF NOT EXISTS {column} {pg_type}')
+        else:
+            try:
+                cursor.execute(f'ALTER TABLE bills ADD COLUMN {column} {sqlite_type}')
+            except sqlite3.OperationalError:
+                # Column already exists
+                pass
+
+
+def summarize_items(items, unit_costs):
+    """
+    Summary values for a bill's item dicts, in SUMMARY_COLUMNS order;
+    unit_costs maps product_id -> unit cost at the time of sale (shared/costing.py)
+    """
+    names = ', '.join(str(item['product_name']) for item in items if item.get('product_name'))
+    return (
+        len(items),
+        sum(float(item.get('quantity') or 0) for item in items),
+        names or None,
+        sum(float(item.get('total_price') or 0) for item in items),
+        sum(float(unit_costs.get(item['product_id']) or 0) * float(item.get('quantity') or 0) for item in items),
+    )
+
+
+def backfill_bill_summaries(conn):
+    """Fill the summary of bills that have none; returns the number of bills filled"""
+    cursor = conn.execute('''
+        UPDATE bills SET
+            item_count = (SELECT COUNT(*) FROM bill_items bi WHERE bi.bill_id = bills.id),
+            total_quantity = (SELECT SUM(bi.quantity) FROM bill_items bi WHERE bi.bill_id = bills.id),
+            product_names = (SELECT GROUP_CONCAT(bi.product_name, ', ') FROM bill_items bi WHERE bi.bill_id = bills.id),
+            items_total = (SELECT SUM(bi.total_price) FROM bill_items bi WHERE bi.bill_id = bills.id),
+            cogs = (SELECT SUM(bi.cogs) FROM bill_items bi WHERE bi.bill_id = bills.id)
+        WHERE item_count IS NULL
+    ''')
+    return cursor.rowcount
@@ -0,0 +1,300 @@
+"""
+Per-tenant result cache for read-heavy APIs
+Dashboards, product lists, alerts and reports are polled constantly from every
+device of a shop and recompute identical results; this caches them per tenant
+for a short TTL and drops a tenant's entries as soon as that tenant writes.
+
+- cached(namespace, ...)          decorator for service functions
+- cached_response(namespace, ...) decorator for GET routes returning JSON
+- invalidate_tenant(tenant_id)    called from the product/bill/customer write paths
+
+Invalidation bumps a per-tenant generation number that is part of every key,
+so it is O(1) on any backend; stale generations simply age out.
+
+Backends (CACHE_BACKEND):
+- memory (default): in-process LRU with TTL, per gunicorn worker
+- redis: shared across workers/processes; needs `pip install redis` and
+  CACHE_REDIS_URL (or REDIS_URL). Falls back to memory if unavailable.
+"""
+
+import functools
+import inspect
+import os
+import pickle
+import threading
+import time
+from collections import OrderedDict
+
+from flask import Response, has_request_context, make_response, request, session
+
+_MISSING = object()
+
+
+class MemoryBackend:
+    """In-process LRU with a per-entry TTL"""
+
+    name = 'memory'
+
+    def __init__(self, max_entries=2048):
+        self.max_entries = max(1, max_entries)
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()  # key -> (expires_at, value)
+        self._counters = {}
+        self.evictions = 0
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return _MISSING
+            expires_at, value = entry
+            if time.monotonic() >= expires_at:
+                del self._entries[key]
+                return _MISSING
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl):
+        with self._lock:
+            self._entries[key] = (time.monotonic() + ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def counter(self, key):
+        with self._lock:
+            return self._counters.get(key, 0)
+
+    def incr(self, key):
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + 1
+            return self._counters[key]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            return {
+                'backend': self.name,
+                'entries': len(self._entries),
+                'max_entries': self.max_entries,
+                'evictions': self.evictions,
+            }
+
+
+class RedisBackend:
+    """Shared backend so every gunicorn worker sees the same entries and invalidations"""
+
+    name = 'redis'
+
+    def __init__(self, url, prefix='bizpulse:cache:'):
+        import redis  # optional dependency
+        self._redis = redis.Redis.from_url(url)
+        self._redis.ping()
+        self.prefix = prefix
+
+    def get(self, key):
+        raw = self._redis.get(self.prefix + key)
+        return _MISSING if raw is None else pickle.loads(raw)
+
+    def set(self, key, value, ttl):
+        self._redis.set(self.prefix + key, pickle.dumps(value), px=max(1, int(ttl * 1000)))
+
+    def counter(self, key):
+        return int(self._redis.get(self.prefix + 'gen:' + key) or 0)
+
+    def incr(self, key):
+        return self._redis.incr(self.prefix + 'gen:' + key)
+
+    def clear(self):
+        for key in self._redis.scan_iter(match=self.prefix + '*'):
+            self._redis.delete(key)
+
+    def stats(self):
+        # DBSIZE is O(1); counting our prefix would SCAN the whole keyspace. It
+        # includes keys outside the prefix, so give the cache its own Redis db.
+        return {
+            'backend': self.name,
+            'keys': self._redis.dbsize(),
+        }
+
+
+class TenantCache:
+    """Namespaced, tenant-scoped cache with hit/miss counters (counters are per process)"""
+
+    def __init__(self, backend, default_ttl=30):
+        self.backend = backend
+        self.default_ttl = default_ttl
+        self._lock = threading.Lock()
+        self._metrics = {}  # namespace -> {'hits', 'misses', 'sets'}
+        self.invalidations = 0
+
+    def _count(self, namespace, metric):
+        with self._lock:
+            counts = self._metrics.setdefault(namespace, {'hits': 0, 'misses': 0, 'sets': 0})
+            counts[metric] += 1
+
+    def _key(self, namespace, tenant, key):
+        generation = self.backend.counter(str(tenant))
+        return f'{namespace}:{tenant}:{generation}:{key}'
+
+    def get(self, namespace, tenant, key=''):
+        """(hit, value)"""
+        try:
+            value = self.backend.get(self._key(namespace, tenant, key))
+        except Exception as e:
+            print(f"⚠️ Cache read failed ({namespace}): {e}")
+            value = _MISSING
+        if value is _MISSING:
+            self._count(namespace, 'misses')
+            return False, None
+        self._count(namespace, 'hits')
+        return True, value
+
+    def set(self, namespace, tenant, key, value, ttl=None):
+        ttl = self.default_ttl if ttl is None else ttl
+        if ttl <= 0:
+            return
+        try:
+            self.backend.set(self._key(namespace, tenant, key), value, ttl)
+            self._count(namespace, 'sets')
+        except Exception as e:
+            print(f"⚠️ Cache write failed ({namespace}): {e}")
+
+    def invalidate_tenant(self, tenant):
+        try:
+            self.backend.incr(str(tenant))
+        except Exception as e:
+            print(f"⚠️ Cache invalidation failed for {tenant}: {e}")
+        with self._lock:
+            self.invalidations += 1
+
+    def clear(self):
+        self.backend.clear()
+
+    def stats(self):
+        with self._lock:
+            namespaces = {}
+            for namespace, counts in self._metrics.items():
+                lookups = counts['hits'] + counts['misses']
+                namespaces[namespace] = {
+                    **counts,
+                    'hit_rate': round(counts['hits'] / lookups * 100, 1) if lookups else 0,
+                }
+            hits = sum(c['hits'] for c in self._metrics.values())
+            misses = sum(c['misses'] for c in self._metrics.values())
+            invalidations = self.invalidations
+        try:
+            backend = self.backend.stats()
+        except Exception as e:
+            backend = {'backend': self.backend.name, 'error': str(e)}
+        return {
+            **backend,
+            'default_ttl': self.default_ttl,
+            'hits': hits,
+            'misses': misses,
+            'invalidations': invalidations,
+            'namespaces': namespaces,
+        }
+
+
+def _create_backend():
+    backend = os.environ.get('CACHE_BACKEND', 'memory').lower()
+    max_entries = int(os.environ.get('CACHE_MAX_ENTRIES', 2048))
+    if backend == 'redis':
+        url = os.environ.get('CACHE_REDIS_URL') or os.environ.get('REDIS_URL')
+        try:
+            return RedisBackend(url)
+        except Exception as e:
+            print(f"⚠️ Redis cache unavailable ({e}), using in-process cache")
+    return MemoryBackend(max_entries)
+
+
+cache = TenantCache(_create_backend(), default_ttl=float(os.environ.get('CACHE_DEFAULT_TTL', 30)))
+
+DASHBOARD_CACHE_TTL = float(os.environ.get('DASHBOARD_CACHE_TTL', 5))
+REPORTS_CACHE_TTL = float(os.environ.get('REPORTS_CACHE_TTL', 60))
+
+
+def current_tenant_id():
+    """Tenant of the logged-in session (employees share their client's data)"""
+    if not has_request_context():
+        return None
+    if session.get('user_type') == 'employee':
+        return session.get('client_id')
+    return session.get('user_id')
+
+
+def invalidate_tenant(tenant_id):
+    """
+    Drop cached results after a write for this tenant. Unscoped (None) entries
+    aggregate every tenant, so they are dropped too.
+    """
+    cache.invalidate_tenant(tenant_id)
+    if tenant_id is not None:
+        cache.invalidate_tenant(None)
+
+
+def cached(namespace, ttl=None, tenant_arg=None):
+    """
+    Cache a function's return value per tenant and arguments.
+    The tenant is the `tenant_arg` argument if given, otherwise the session's tenant.
+    The undecorated function stays available as `func.uncached`.
+    """
+    def decorator(func):
+        signature = inspect.signature(func)
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            bound = signature.bind(*args, **kwargs)
+            bound.apply_defaults()
+            arguments = {k: v for k, v in bound.arguments.items() if k not in ('self', 'cls')}
+            tenant = arguments.get(tenant_arg) if tenant_arg else current_tenant_id()
+            key = repr(sorted(arguments.items()))
+
+            hit, value = cache.get(namespace, tenant, key)
+            if hit:
+                return value
+            value = func(*args, **kwargs)
+            cache.set(namespace, tenant, key, value, ttl)
+            return value
+
+        wrapper.uncached = func
+        return wrapper
+    return decorator
+
+
+def cached_response(namespace, ttl=None):
+    """
+    Cache a GET route's successful JSON response per tenant and full path
+    (query string included). Error responses are never cached.
+    """
+    def decorator(view):
+        @functools.wraps(view)
+        def wrapper(*args, **kwargs):
+            tenant = current_tenant_id()
+            key = request.full_path
+
+            hit, value = cache.get(namespace, tenant, key)
+            if hit:
+                body, status, mimetype = value
+                response = Response(body, status=status, mimetype=mimetype)
+                response.headers['X-Cache'] = 'HIT'
+                return response
+
+            response = make_response(view(*args, **kwargs))
+            if response.status_code == 200 and response.is_json:
+                cache.set(namespace, tenant, key,
+                          (response.get_data(), response.status_code, response.mimetype), ttl)
+            response.headers['X-Cache'] = 'MISS'
+            return response
+
+        return wrapper
+    return decorator
+
+
+def get_cache_stats():
+    return cache.stats()
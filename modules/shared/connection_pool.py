@@ -0,0 +1,401 @@
+"""
+Database connection pooling
+- PostgreSQL: thread-safe pool with min/max size, health checks and idle recycling
+- SQLite: one long-lived connection per thread with WAL journaling
+"""
+
+import os
+import sqlite3
+import threading
+import time
+
+from .sql_dialect import DialectCursor, PreparedStatementCache, prepare_threshold_from_env
+
+
+# Callbacks waiting for the current transaction of a connection to commit, by id(raw connection)
+_after_commit = {}
+
+
+def discard_after_commit(raw):
+    """Drop the callbacks of a transaction that was rolled back or abandoned"""
+    _after_commit.pop(id(raw), None)
+
+
+class PoolTimeoutError(Exception):
+    """Raised when no pooled connection becomes available in time"""
+    pass
+
+
+class PooledConnection:
+    """
+    Proxy handed out by get_db_connection().
+    Behaves like the underlying DB-API connection, but close() gives the
+    connection back to its pool instead of tearing down the socket/file.
+    On PostgreSQL, execute()/cursor() accept the same SQLite-style SQL the
+    modules are written in (see sql_dialect).
+
+    Inside a request every borrow gets its own proxy over the request's shared
+    connection. close() on such a proxy keeps the connection, but rolls back a
+    transaction this borrower started and did not commit, so a failed helper
+    cannot hand its half-written (or, on PostgreSQL, aborted) transaction to
+    the next one.
+    """
+
+    def __init__(self, pool, raw, request_scoped=False, borrows=None):
+        object.__setattr__(self, '_pool', pool)
+        object.__setattr__(self, '_raw', raw)
+        object.__setattr__(self, '_request_scoped', request_scoped)
+        object.__setattr__(self, '_released', False)
+        # Work already pending at borrow time belongs to an outer borrower
+        object.__setattr__(self, '_owns_transaction', not pool.in_transaction(raw))
+        object.__setattr__(self, '_borrows', borrows)
+        if borrows is not None:
+            borrows.add(self)
+
+    @property
+    def raw(self):
+        """The underlying psycopg2/sqlite3 connection"""
+        return self._raw
+
+    @property
+    def dialect(self):
+        return self._pool.dialect
+
+    def cursor(self, *args, **kwargs):
+        raw_cursor = self._raw.cursor(*args, **kwargs)
+        if self._pool.dialect != 'postgresql':
+            return raw_cursor
+        return DialectCursor(raw_cursor, self._pool.statement_cache(self._raw))
+
+    def after_commit(self, callback):
+        """Run callback() once the current transaction commits; it is dropped on rollback"""
+        _after_commit.setdefault(id(self._raw), []).append(callback)
+
+    def commit(self):
+        self._raw.commit()
+        for callback in _after_commit.pop(id(self._raw), ()):
+            try:
+                callback()
+            except Exception as e:
+                print(f"⚠️ After-commit callback failed: {e}")
+
+    def rollback(self):
+        discard_after_commit(self._raw)
+        self._raw.rollback()
+
+    def execute(self, sql, params=None):
+        """sqlite3-style shortcut: execute on a fresh cursor and return it"""
+        if self._pool.dialect != 'postgresql':
+            return self._raw.execute(sql, params if params is not None else ())
+        return self.cursor().execute(sql, params)
+
+    def executemany(self, sql, seq_of_params):
+        if self._pool.dialect != 'postgresql':
+            return self._raw.executemany(sql, seq_of_params)
+        return self.cursor().executemany(sql, seq_of_params)
+
+    def close(self):
+        if self._released:
+            return
+        object.__setattr__(self, '_released', True)
+        if self._request_scoped:
+            # The connection itself is returned in teardown_appcontext
+            if self._borrows is not None:
+                self._borrows.discard(self)
+            if self._owns_transaction and self._pool.in_transaction(self._raw):
+                self.rollback()
+            return
+        self._pool.release(self._raw)
+
+    def __getattr__(self, name):
+        return getattr(self._raw, name)
+
+    def __setattr__(self, name, value):
+        setattr(self._raw, name, value)
+
+    def __enter__(self):
+        self._raw.__enter__()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return self._raw.__exit__(exc_type, exc, tb)
+
+
+class PostgresConnectionPool:
+    """Thread-safe PostgreSQL connection pool"""
+
+    dialect = 'postgresql'
+
+    def __init__(self, connect, min_size=1, max_size=10, max_idle=300,
+                 max_lifetime=3600, health_check_interval=30, timeout=30):
+        self._connect = connect
+        self.min_size = max(0, min_size)
+        self.max_size = max(1, max_size, self.min_size)
+        self.max_idle = max_idle
+        self.max_lifetime = max_lifetime
+        self.health_check_interval = health_check_interval
+        self.timeout = timeout
+
+        self._lock = threading.Condition()
+        self._idle = []        # [(conn, created_at, last_used)]
+        self._created = {}     # id(conn) -> created_at
+        self._statements = {}  # id(conn) -> PreparedStatementCache
+        self.prepare_threshold = prepare_threshold_from_env()
+        self._in_use = 0
+        self._metrics = {
+            'connections_opened': 0,
+            'connections_closed': 0,
+            'borrows': 0,
+            'waits': 0,
+            'timeouts': 0,
+            'failed_health_checks': 0,
+            'recycled': 0,
+        }
+
+        for _ in range(self.min_size):
+            conn = self._open()
+            self._idle.append((conn, self._created[id(conn)], time.monotonic()))
+
+    def _open(self):
+        conn = self._connect()
+        with self._lock:
+            self._created[id(conn)] = time.monotonic()
+            self._metrics['connections_opened'] += 1
+        return conn
+
+    def _discard(self, conn):
+        self._created.pop(id(conn), None)
+        self._statements.pop(id(conn), None)
+        self._metrics['connections_closed'] += 1
+        try:
+            conn.close()
+        except Exception:
+            pass
+
+    def statement_cache(self, conn):
+        """Prepared statements live as long as the server session, so cache them per connection"""
+        cache = self._statements.get(id(conn))
+        if cache is None:
+            cache = self._statements.setdefault(id(conn), PreparedStatementCache(self.prepare_threshold))
+        return cache
+
+    def in_transaction(self, conn):
+        """True while the connection has a transaction open (or aborted) on the server"""
+        if getattr(conn, 'closed', 0):
+            return False
+        return conn.get_transaction_status() != 0  # psycopg2 TRANSACTION_STATUS_IDLE
+
+    def _is_healthy(self, conn, last_used):
+        if getattr(conn, 'closed', 0):
+            return False
+        if time.monotonic() - last_used < self.health_check_interval:
+            return True
+        try:
+            cursor = conn.cursor()
+            cursor.execute('SELECT 1')
+            cursor.fetchone()
+            cursor.close()
+            conn.rollback()
+            return True
+        except Exception:
+            return False
+
+    def _reserve(self, deadline):
+        """
+        Take a slot under the lock: (idle conn, last_used) to health-check, or
+        (None, None) when a new connection should be opened in the slot
+        """
+        with self._lock:
+            while True:
+                now = time.monotonic()
+                while self._idle:
+                    conn, created_at, last_used = self._idle.pop()
+                    if now - last_used > self.max_idle or now - created_at > self.max_lifetime:
+                        self._metrics['recycled'] += 1
+                        self._discard(conn)
+                        continue
+                    self._in_use += 1
+                    return conn, last_used
+
+                if self._in_use < self.max_size:
+                    # Reserve the slot before connecting so concurrent callers can't overshoot
+                    self._in_use += 1
+                    return None, None
+
+                remaining = deadline - now
+                if remaining <= 0:
+                    self._metrics['timeouts'] += 1
+                    raise PoolTimeoutError(
+                        f"No database connection available after {self.timeout}s "
+                        f"(max_size={self.max_size})"
+                    )
+                self._metrics['waits'] += 1
+                self._lock.wait(remaining)
+
+    def acquire(self):
+        """Borrow a connection, waiting up to `timeout` seconds if the pool is exhausted"""
+        deadline = time.monotonic() + self.timeout
+        while True:
+            conn, last_used = self._reserve(deadline)
+            if conn is None:
+                break
+            # The health check is a network round trip: run it outside the pool lock
+            if self._is_healthy(conn, last_used):
+                with self._lock:
+                    self._metrics['borrows'] += 1
+                return conn
+            with self._lock:
+                self._metrics['failed_health_checks'] += 1
+                self._in_use -= 1
+                self._discard(conn)
+                self._lock.notify()
+
+        try:
+            conn = self._open()
+        except Exception:
+            with self._lock:
+                self._in_use -= 1
+                self._lock.notify()
+            raise
+        with self._lock:
+            self._metrics['borrows'] += 1
+        return conn
+
+    def release(self, conn):
+        """Return a borrowed connection; uncommitted work is rolled back"""
+        discard_after_commit(conn)
+        healthy = not getattr(conn, 'closed', 0)
+        if healthy:
+            try:
+                conn.rollback()
+            except Exception:
+                healthy = False
+
+        with self._lock:
+            self._in_use -= 1
+            created_at = self._created.get(id(conn), time.monotonic())
+            if healthy and time.monotonic() - created_at <= self.max_lifetime:
+                self._idle.append((conn, created_at, time.monotonic()))
+            else:
+                self._discard(conn)
+            self._trim_idle()
+            self._lock.notify()
+
+    def _trim_idle(self):
+        """Close idle connections beyond min_size that have sat unused past max_idle"""
+        now = time.monotonic()
+        kept = []
+        for entry in self._idle:
+            conn, _, last_used = entry
+            if len(kept) >= self.min_size and now - last_used > self.max_idle:
+                self._metrics['recycled'] += 1
+                self._discard(conn)
+            else:
+                kept.append(entry)
+        self._idle = kept
+
+    def stats(self):
+        with self._lock:
+            return {
+                'type': 'postgresql',
+                'min_size': self.min_size,
+                'max_size': self.max_size,
+                'in_use': self._in_use,
+                'idle': len(self._idle),
+                'prepare_threshold': self.prepare_threshold,
+                'prepared_statements': sum(len(c._names) for c in self._statements.values()),
+                'prepared_hits': sum(c.hits for c in self._statements.values()),
+                **self._metrics,
+            }
+
+    def close_all(self):
+        with self._lock:
+            for conn, _, _ in self._idle:
+                self._discard(conn)
+            self._idle = []
+
+
+class SQLiteThreadPool:
+    """
+    One SQLite connection per thread, kept open for the thread's lifetime.
+    Nested borrows on the same thread share the connection; pending work is
+    rolled back only when the outermost borrower closes it.
+    """
+
+    dialect = 'sqlite'
+
+    def __init__(self, db_path, busy_timeout=30):
+        self.db_path = db_path
+        self.busy_timeout = busy_timeout
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._metrics = {
+            'connections_opened': 0,
+            'borrows': 0,
+        }
+
+    def _open(self):
+        conn = sqlite3.connect(self.db_path, timeout=self.busy_timeout, check_same_thread=False,
+                               cached_statements=512)
+        conn.row_factory = sqlite3.Row
+        try:
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            conn.execute(f'PRAGMA busy_timeout={int(self.busy_timeout * 1000)}')
+        except sqlite3.DatabaseError:
+            pass
+        with self._lock:
+            self._metrics['connections_opened'] += 1
+        return conn
+
+    def in_transaction(self, conn):
+        return conn.in_transaction
+
+    def acquire(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = self._open()
+            self._local.conn = conn
+            self._local.depth = 0
+        self._local.depth += 1
+        with self._lock:
+            self._metrics['borrows'] += 1
+        return conn
+
+    def release(self, conn):
+        if getattr(self._local, 'conn', None) is not conn:
+            # Released from a different thread than it was borrowed on
+            return
+        self._local.depth = max(0, self._local.depth - 1)
+        if self._local.depth == 0:
+            discard_after_commit(conn)
+            if conn.in_transaction:
+                conn.rollback()
+
+    def stats(self):
+        with self._lock:
+            return {
+                'type': 'sqlite',
+                'db_path': self.db_path,
+                'journal_mode': 'wal',
+                'thread_connection_open': getattr(self._local, 'conn', None) is not None,
+                **self._metrics,
+            }
+
+    def close_all(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is not None:
+            conn.close()
+            self._local.conn = None
+
+
+def pool_settings_from_env():
+    """Pool sizing knobs, overridable through environment variables"""
+    return {
+        'min_size': int(os.environ.get('DB_POOL_MIN_SIZE', 1)),
+        'max_size': int(os.environ.get('DB_POOL_MAX_SIZE', 10)),
+        'max_idle': float(os.environ.get('DB_POOL_MAX_IDLE', 300)),
+        'max_lifetime': float(os.environ.get('DB_POOL_MAX_LIFETIME', 3600)),
+        'health_check_interval': float(os.environ.get('DB_POOL_HEALTH_CHECK_INTERVAL', 30)),
+        'timeout': float(os.environ.get('DB_POOL_TIMEOUT', 30)),
+    }
@@ -0,0 +1,80 @@
+"""
+Weighted-average costing
+products.cost is the product's moving weighted-average unit cost. Every stock
+receipt that carries a unit cost (purchase entries, stock purchases - any
+post_movement() with unit_cost) re-averages it with the stock on hand, in
+the same transaction as the receipt:
+
+    cost = (on_hand * cost + quantity * unit_cost) / (on_hand + quantity)
+
+Stock at or below zero carries no value, so a receipt into an empty (or
+oversold) product takes the receipt's cost. Editing the cost price on the
+product form revalues the stock on hand; later receipts average from there.
+
+Sales snapshot the cost: create_bill writes unit_cost and cogs
+(unit_cost * quantity) onto each bill_items and sales row, so profit reports
+sum cogs from a single table - no products join, and a later cost change
+does not rewrite past profit. Rows written before the snapshot existed are
+backfilled once at the products' cost at that time.
+
+- apply_receipt(conn, product_id, quantity, unit_cost)  called by post_movement
+- unit_costs(conn, product_ids) -> {product_id: cost}
+"""
+
+import sqlite3
+
+SNAPSHOT_TABLES = ('bill_items', 'sales')
+
+
+def init_costing_columns(cursor, db_type='sqlite'):
+    """Add the unit_cost / cogs snapshot columns (called from init_db)"""
+    for table in SNAPSHOT_TABLES:
+        for column in ('unit_cost', 'cogs'):
+            if db_type == 'postgresql':
+                cursor.execute(f'ALTER TABLE {table} ADD COLUMN IF NOT EXISTS {column} NUMERIC(14,4)')
+            else:
+                try:
+                    cursor.execute(f'ALTER TABLE {table} ADD COLUMN {column} REAL')
+                except sqlite3.OperationalError:
+                    # Column already exists
+                    pass
+
+
+def apply_receipt(conn, product_id, quantity, unit_cost):
+    """
+    Re-average products.cost for `quantity` units received at `unit_cost`.
+    Must run on the caller's connection, before the stock increment, inside
+    the receipt's transaction.
+    """
+    conn.execute('''
+        UPDATE products SET cost = CASE
+            WHEN COALESCE(stock, 0) > 0
+                THEN (COALESCE(stock, 0) * COALESCE(cost, 0) + ? * ?) / (COALESCE(stock, 0) + ?)
+            ELSE ?
+        END
+        WHERE id = ?
+    ''', (quantity, unit_cost, quantity, unit_cost, product_id))
+
+
+def unit_costs(conn, product_ids):
+    """{product_id: current weighted-average cost} for the given products"""
+    product_ids = list(set(product_ids))
+    if not product_ids:
+        return {}
+    rows = conn.execute(f"SELECT id, cost FROM products WHERE id IN ({','.join('?' * len(product_ids))})",
+                        product_ids).fetchall()
+    return {row['id']: float(row['cost'] or 0) for row in rows}
+
+
+def backfill_cost_snapshots(conn):
+    """Snapshot today's product cost onto rows without one; returns the number of rows filled"""
+    filled = 0
+    for table in SNAPSHOT_TABLES:
+        filled += conn.execute(f'''
+            UPDATE {table} SET
+                unit_cost = COALESCE((SELECT p.cost FROM products p WHERE p.id = {table}.product_id), 0),
+                cogs = COALESCE((SELECT p.cost FROM products p WHERE p.id = {table}.product_id), 0)
+                       * COALESCE(quantity, 0)
+            WHERE cogs IS NULL
+        ''').rowcount
+    return filled
@@ -3,14 +3,22 @@ Database connection and initialization utilities
 UPDATED: Now uses Supabase PostgreSQL for persistent cloud storage
 """
 
+import io
 import uuid
 import hashlib
 from datetime import datetime, timedelta
 import os
 import json
 import sqlite3
+import threading
+import weakref
 from urllib.parse import urlparse
 from dotenv import load_dotenv
+from flask import g, has_request_context
+from .connection_pool import (PooledConnection, PostgresConnectionPool, SQLiteThreadPool, discard_after_commit,
+                              pool_settings_from_env)
+from .sql_dialect import date_bucket_sql, relative_date_sql, relative_timestamp_sql
+from .sales_rollup import init_rollup_table, rebuild_rollup
 
 # Load environment variables from .env file
 load_dotenv()
@@ -27,45 +35,151 @@ def get_db_type():
     """Determine database type - always PostgreSQL for production"""
     return 'postgresql' if get_database_url() else 'sqlite'
 
+_pool = None
+_pool_lock = threading.Lock()
+
+def _connect_postgres():
+    """Open a raw psycopg2 connection to Supabase PostgreSQL"""
+    import psycopg2
+    from psycopg2.extras import DictCursor
+    
+    # Parse DATABASE_URL
+    parsed = urlparse(get_database_url())
+    
+    conn = psycopg2.connect(
+        host=parsed.hostname,
+        port=parsed.port or 5432,
+        user=parsed.username,
+        password=parsed.password,
+        database=parsed.path[1:],  # Remove leading '/'
+        cursor_factory=DictCursor,  # rows support row['col'] and row[0], like sqlite3.Row
+        sslmode='require'  # Supabase requires SSL
+    )
+    conn.autocommit = False
+    return conn
+
+def get_pool():
+    """Get (lazily creating) the process-wide connection pool"""
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                if get_database_url():
+                    try:
+                        _pool = PostgresConnectionPool(_connect_postgres, **pool_settings_from_env())
+                        print("✅ Connected to Supabase PostgreSQL (pooled)")
+                    except Exception as e:
+                        print(f"❌ Supabase PostgreSQL connection failed: {e}")
+                        raise
+                else:
+                    print("⚠️  Using SQLite fallback (local development)")
+                    _pool = SQLiteThreadPool(DB_PATH)
+    return _pool
+
+def sql_date_bucket(column, bucket):
+    """Portable text bucket key for a timestamp column: 'hour', 'day', 'week', 'month' or 'year'"""
+    return date_bucket_sql(column, bucket, get_db_type())
+
+def sql_relative_date(days=0):
+    """Portable expression for today's date shifted by `days`"""
+    return relative_date_sql(get_db_type(), days)
+
+def sql_relative_timestamp(minutes=0):
+    """Portable expression for the current timestamp shifted by `minutes`"""
+    return relative_timestamp_sql(get_db_type(), minutes)
+
+def bulk_insert(conn, table, columns, rows, page_size=500):
+    """
+    Insert many rows in as few round trips as possible.
+    - PostgreSQL: psycopg2 execute_values (one multi-row VALUES statement per page)
+    - SQLite: a single executemany (in-process, no round trips)
+    Runs on the caller's connection; nothing is committed here.
+    """
+    if not rows:
+        return 0
+    if conn.dialect == 'postgresql':
+        from psycopg2.extras import execute_values
+        with conn.raw.cursor() as cursor:
+            execute_values(cursor, f"INSERT INTO {table} ({', '.join(columns)}) VALUES %s",
+                           rows, page_size=page_size)
+    else:
+        conn.executemany(f"INSERT INTO {table} ({', '.join(columns)}) VALUES ({', '.join('?' * len(columns))})",
+                         rows)
+    return len(rows)
+
+def _copy_field(value):
+    """One field of COPY's text format: \\N for NULL, backslash escapes for the separators"""
+    if value is None:
+        return '\\N'
+    if isinstance(value, bool):
+        return 't' if value else 'f'
+    return (str(value).replace('\\', '\\\\').replace('\t', '\\t')
+            .replace('\n', '\\n').replace('\r', '\\r'))
+
+def copy_insert(conn, table, columns, rows):
+    """
+    Load many rows at once.
+    - PostgreSQL: COPY ... FROM STDIN (one statement, no per-row parsing or planning)
+    - SQLite: bulk_insert
+    Runs on the caller's connection; nothing is committed here.
+    """
+    if not rows:
+        return 0
+    if conn.dialect != 'postgresql':
+        return bulk_insert(conn, table, columns, rows)
+    buffer = io.StringIO()
+    for row in rows:
+        buffer.write('\t'.join(_copy_field(value) for value in row))
+        buffer.write('\n')
+    buffer.seek(0)
+    with conn.raw.cursor() as cursor:
+        cursor.copy_expert(f"COPY {table} ({', '.join(columns)}) FROM STDIN", buffer)
+    return len(rows)
+
+def get_pool_stats():
+    """Connection pool metrics for monitoring"""
+    return get_pool().stats()
+
 def get_db_connection():
     """
     Get database connection to Supabase PostgreSQL.
     - Production/Supabase: PostgreSQL connection (persistent cloud storage)
     - Local fallback: SQLite (only for development without Supabase)
-    """
-    db_url = get_database_url()
     
-    if db_url:
-        # Supabase PostgreSQL connection
+    Connections come from a pool. Inside a Flask request the same connection is
+    reused for the whole request (stored on `g`) and returned in teardown;
+    close() keeps it but rolls back what that borrower left uncommitted.
+    Outside a request, close() returns the connection to the pool.
+    """
+    pool = get_pool()
+    
+    if has_request_context():
+        raw = g.get('_db_conn')
+        if raw is None:
+            raw = pool.acquire()
+            g._db_conn = raw
+            g._db_borrows = weakref.WeakSet()
+        elif not g._db_borrows and pool.in_transaction(raw):
+            # Left open by a helper that raised before close(); nobody else is using it
+            discard_after_commit(raw)
+            raw.rollback()
+        return PooledConnection(pool, raw, request_scoped=True, borrows=g._db_borrows)
+    
+    return PooledConnection(pool, pool.acquire())
+
+def release_request_connection(exception=None):
+    """teardown_appcontext hook: give the request's connection back to the pool"""
+    raw = g.pop('_db_conn', None)
+    g.pop('_db_borrows', None)
+    if raw is not None:
         try:
-            import psycopg2
-            from psycopg2.extras import RealDictCursor
-            
-            # Parse DATABASE_URL
-            parsed = urlparse(db_url)
-            
-            conn = psycopg2.connect(
-                host=parsed.hostname,
-                port=parsed.port or 5432,
-                user=parsed.username,
-                password=parsed.password,
-                database=parsed.path[1:],  # Remove leading '/'
-                cursor_factory=RealDictCursor,
-                sslmode='require'  # Supabase requires SSL
-            )
-            conn.autocommit = False
-            print("✅ Connected to Supabase PostgreSQL")
-            return conn
+            get_pool().release(raw)
         except Exception as e:
-            print(f"❌ Supabase PostgreSQL connection failed: {e}")
-            raise
-    else:
-        # SQLite fallback (local development only)
-        import sqlite3
-        print("⚠️  Using SQLite fallback (local development)")
-        conn = sqlite3.connect(DB_PATH)
-        conn.row_factory = sqlite3.Row
-        return conn
+            print(f"⚠️ Failed to release pooled connection: {e}")
+
+def init_app(app):
+    """Register per-request connection handling on the Flask app"""
+    app.teardown_appcontext(release_request_connection)
 
 def generate_id():
     return str(uuid.uuid4())
@@ -716,7 +830,19 @@ def init_db():
         )
     ''')
     
-
+    # Report job progress (services/report_runner.py): one row per company and
+    # report date, resumed by the next run until it is 'sent'
+    for column, definition in (('attempts', 'INTEGER DEFAULT 0'), ('render_ms', 'REAL'),
+                               ('send_ms', 'REAL'), ('updated_at', 'TIMESTAMP')):
+        if db_type == 'postgresql':
+            cursor.execute(f'ALTER TABLE whatsapp_reports_log ADD COLUMN IF NOT EXISTS {column} {definition}')
+        else:
+            try:
+                cursor.execute(f'ALTER TABLE whatsapp_reports_log ADD COLUMN {column} {definition}')
+            except sqlite3.OperationalError:
+                pass
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_whatsapp_reports_log_company_date '
+                   'ON whatsapp_reports_log(company_id, report_date, report_type)')
     
     # Initialize default CMS data
     cursor.execute('SELECT COUNT(*) FROM cms_site_settings')
@@ -815,9 +941,98 @@ def init_db():
     try:
         cursor.execute('CREATE INDEX IF NOT EXISTS idx_notification_settings_client_id ON notification_settings(client_id)')
         cursor.execute('CREATE INDEX IF NOT EXISTS idx_stock_alert_log_client_product_date ON stock_alert_log(client_id, product_id, alert_date)')
+        # Stock monitor sweep: a tenant's products at or below its threshold
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_products_user_stock ON products(user_id, stock)')
     except sqlite3.OperationalError:
         pass
 
+    # Tenant column used by the composite indexes below (older databases may lack it)
+    for table in ('bills', 'sales'):
+        if db_type == 'postgresql':
+            cursor.execute(f'ALTER TABLE {table} ADD COLUMN IF NOT EXISTS business_owner_id VARCHAR(255)')
+        else:
+            try:
+                cursor.execute(f'ALTER TABLE {table} ADD COLUMN business_owner_id TEXT')
+            except sqlite3.OperationalError:
+                # Column already exists
+                pass
+    
+    # Composite indexes for tenant-scoped, date-ranged queries
+    # (filters are written as `created_at >= ? AND created_at < ?`, see shared/date_ranges.py)
+    # (business_owner_id, created_at, id) also serves keyset pages (see shared/pagination.py)
+    # and supersedes the older (business_owner_id, created_at) index
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_bills_owner_created_id ON bills(business_owner_id, created_at, id)')
+    cursor.execute('DROP INDEX IF EXISTS idx_bills_owner_created_at')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_sales_owner_created_at ON sales(business_owner_id, created_at)')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_sales_owner_sale_date ON sales(business_owner_id, sale_date)')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_sales_bill_id ON sales(bill_id)')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_bill_items_bill_id ON bill_items(bill_id)')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_payments_bill_id ON payments(bill_id)')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_credit_transactions_bill_id ON credit_transactions(bill_id)')
+
+    # Daily sales rollup read by the dashboards/sales summary (see shared/sales_rollup.py)
+    init_rollup_table(cursor, db_type)
+    cursor.execute('SELECT COUNT(*) FROM daily_sales_rollup')
+    if cursor.fetchone()[0] == 0:
+        cursor.execute('SELECT COUNT(*) FROM bills')
+        if cursor.fetchone()[0] > 0:
+            print("📊 Backfilling daily_sales_rollup from existing bills...")
+            rebuild_rollup(conn)
+
+    # Cost-of-goods snapshot on bill_items/sales (see shared/costing.py)
+    from .costing import backfill_cost_snapshots, init_costing_columns
+    init_costing_columns(cursor, db_type)
+    filled = backfill_cost_snapshots(conn)
+    if filled > 0:
+        print(f"💰 Cost snapshots backfilled for {filled} bill item/sales rows")
+
+    # Per-bill item summary read by the sales lists (see shared/bill_summary.py)
+    from .bill_summary import backfill_bill_summaries, init_bill_summary_columns
+    init_bill_summary_columns(cursor, db_type)
+    filled = backfill_bill_summaries(conn)
+    if filled > 0:
+        print(f"🧾 Bill item summaries backfilled for {filled} bills")
+
+    # Background import jobs (see shared/import_jobs.py)
+    from .import_jobs import init_import_job_tables
+    init_import_job_tables(cursor, db_type)
+
+    # Outbox for post-commit side effects (see shared/outbox.py)
+    from .outbox import init_outbox_table
+    init_outbox_table(cursor, db_type)
+
+    # Stock ledger; products.stock is its materialized balance (see shared/stock_ledger.py)
+    from .stock_ledger import init_stock_ledger_tables, reconcile_stock_sources
+    init_stock_ledger_tables(cursor, db_type)
+    cursor.execute('SELECT COUNT(*) FROM stock_ledger')
+    if cursor.fetchone()[0] == 0:
+        cursor.execute('SELECT COUNT(*) FROM products WHERE COALESCE(stock, 0) <> 0')
+        if cursor.fetchone()[0] > 0:
+            print("📦 Migrating stock into the stock ledger...")
+            summary = reconcile_stock_sources(conn)
+            print(f"📦 Stock ledger: {summary['products']} products, {summary['entries']} entries, "
+                  f"{summary['divergent']} reconciled from divergent sources")
+
+    # Low-stock alert dedup state (see shared/stock_alerts.py)
+    from .stock_alerts import init_stock_alert_tables
+    init_stock_alert_tables(cursor, db_type)
+
+    # Durable multi-device sync log (see shared/sync_log.py)
+    from .sync_log import init_sync_log_tables
+    init_sync_log_tables(cursor, db_type)
+
+    # Row versions + tombstones for delta sync (see shared/row_versions.py)
+    from .row_versions import init_row_versions
+    init_row_versions(cursor, db_type)
+
+    # Trigram search indexes (see shared/search.py); triggers keep SQLite's current
+    from .search import init_search_index, rebuild_search_index
+    if init_search_index(cursor, db_type) and db_type == 'sqlite':
+        cursor.execute('SELECT COUNT(*) FROM search_docs')
+        if cursor.fetchone()[0] == 0:
+            print("🔎 Building search index...")
+            print(f"🔎 Search index: {rebuild_search_index(conn)} documents")
+
     # Initialize default company
     cursor.execute('SELECT COUNT(*) FROM companies')
     if cursor.fetchone()[0] == 0:
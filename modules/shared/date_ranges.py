@@ -0,0 +1,92 @@
+"""
+Date range helpers for index-friendly (sargable) filtering
+Filters are expressed as half-open ranges `column >= start AND column < end`
+computed in Python, instead of wrapping the column in DATE()/strftime(),
+so the (business_owner_id, created_at) indexes can be used.
+
+Bounds are 'YYYY-MM-DD' strings: they compare correctly against both
+SQLite text timestamps ('2024-05-01 10:30:00') and PostgreSQL TIMESTAMP columns.
+"""
+
+from datetime import datetime, date, timedelta
+
+
+def _as_date(value):
+    if isinstance(value, datetime):
+        return value.date()
+    if isinstance(value, date):
+        return value
+    return datetime.strptime(str(value)[:10], '%Y-%m-%d').date()
+
+
+def _fmt(value):
+    return value.strftime('%Y-%m-%d')
+
+
+def day_bounds(day):
+    """[day, day + 1)"""
+    day = _as_date(day)
+    return _fmt(day), _fmt(day + timedelta(days=1))
+
+
+def between_bounds(date_from=None, date_to=None):
+    """Inclusive calendar range [date_from, date_to] as half-open bounds; either side may be open"""
+    start = _fmt(_as_date(date_from)) if date_from else None
+    end = _fmt(_as_date(date_to) + timedelta(days=1)) if date_to else None
+    return start, end
+
+
+def month_bounds(day=None):
+    """[first of month, first of next month)"""
+    day = _as_date(day or datetime.now())
+    start = day.replace(day=1)
+    end = (start + timedelta(days=32)).replace(day=1)
+    return _fmt(start), _fmt(end)
+
+
+def period_bounds(period, today=None):
+    """
+    Bounds for the named filters used across the sales/invoice/earnings screens.
+    'week' and 'month' are rolling 7/30 day windows; 'this_week' starts on Monday
+    and 'this_month' on the 1st. Any other value is treated as a 'YYYY-MM-DD' day.
+    Returns (None, None) for 'all'/empty.
+    """
+    today = _as_date(today or datetime.now())
+    tomorrow = _fmt(today + timedelta(days=1))
+
+    if not period or period == 'all':
+        return None, None
+    if period == 'today':
+        return _fmt(today), tomorrow
+    if period == 'yesterday':
+        return _fmt(today - timedelta(days=1)), _fmt(today)
+    if period == 'week':
+        return _fmt(today - timedelta(days=7)), tomorrow
+    if period == 'month':
+        return _fmt(today - timedelta(days=30)), tomorrow
+    if period == 'this_week':
+        return _fmt(today - timedelta(days=today.weekday())), tomorrow
+    if period == 'this_month':
+        return month_bounds(today)
+    try:
+        return day_bounds(period)
+    except ValueError:
+        # Unparseable custom date: empty range, matches nothing
+        return str(period), str(period)
+
+
+def range_clause(column, start=None, end=None):
+    """(sql, params) for `column >= start AND column < end`, skipping open sides"""
+    clauses, params = [], []
+    if start:
+        clauses.append(f"{column} >= ?")
+        params.append(start)
+    if end:
+        clauses.append(f"{column} < ?")
+        params.append(end)
+    return " AND ".join(clauses), params
+
+
+def period_clause(column, period, today=None):
+    """(sql, params) for one of the named periods; ('', []) when unfiltered"""
+    return range_clause(column, *period_bounds(period, today))
@@ -0,0 +1,235 @@
+"""
+Streaming CSV / XLSX export
+Exports run a query on a dedicated pooled connection through a server-side
+cursor (a named psycopg2 cursor on PostgreSQL, SQLite's lazy cursor
+otherwise), pull it EXPORT_CHUNK_ROWS at a time and encode the rows into a
+chunked response as they arrive. Memory stays constant however many rows the
+date range covers; nothing is collected into a list.
+
+XLSX is written with the standard library: the workbook is a zip stream
+(no seeking, data descriptors) with inline-string cells, so no spreadsheet
+package is needed. Sheets roll over at Excel's row limit.
+
+- stream_rows(sql, params) -> generator of row tuples
+- export_date_bounds(request.args) -> (start, end) for range_clause
+- export_response(rows, columns, filename, fmt) -> streaming Flask Response
+"""
+
+import csv
+import io
+import os
+import re
+import uuid
+import zipfile
+from datetime import date, datetime
+from decimal import Decimal
+from xml.sax.saxutils import escape
+
+from flask import Response
+
+from .connection_pool import PooledConnection
+from .database import get_pool
+from .date_ranges import between_bounds, period_bounds
+from .sql_dialect import translate_sql
+
+EXPORT_CHUNK_ROWS = int(os.environ.get('EXPORT_CHUNK_ROWS', 2000))
+# Encoded output is flushed to the client in pieces of about this size
+EXPORT_FLUSH_BYTES = 64 * 1024
+XLSX_MAX_ROWS = 1048576  # per sheet, header included
+
+XLSX_MIMETYPE = 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+_ILLEGAL_XML = re.compile('[\x00-\x08\x0b\x0c\x0e-\x1f]')
+
+
+def export_format(value):
+    """'xlsx' for excel/xlsx, else 'csv'"""
+    return 'xlsx' if (value or '').lower() in ('excel', 'xlsx') else 'csv'
+
+
+def export_date_bounds(args):
+    """Half-open bounds from ?date_from/?date_to (inclusive) or a named ?date_range / ?date_filter"""
+    if args.get('date_from') or args.get('date_to'):
+        return between_bounds(args.get('date_from'), args.get('date_to'))
+    period = args.get('date_range') or args.get('date_filter')
+    if period == 'custom':
+        return None, None
+    return period_bounds(period)
+
+
+def stream_rows(sql, params=(), chunk_size=None):
+    """
+    Yield the rows of a SQLite-style query as tuples, fetched from a
+    server-side cursor in chunks. Runs on its own pooled connection, which is
+    released when the generator finishes or is closed (client disconnect).
+    """
+    chunk_size = chunk_size or EXPORT_CHUNK_ROWS
+    pool = get_pool()
+    conn = PooledConnection(pool, pool.acquire())
+    cursor = None
+    try:
+        if conn.dialect == 'postgresql':
+            cursor = conn.raw.cursor(name=f"export_{uuid.uuid4().hex}")
+            cursor.itersize = chunk_size
+            cursor.execute(translate_sql(sql, 'postgresql', has_params=bool(params)), tuple(params) or None)
+        else:
+            cursor = conn.execute(sql, tuple(params))
+        while True:
+            rows = cursor.fetchmany(chunk_size)
+            if not rows:
+                break
+            for row in rows:
+                yield tuple(row)
+    finally:
+        if cursor is not None:
+            try:
+                cursor.close()
+            except Exception:
+                pass
+        conn.close()
+
+
+def iter_csv(columns, rows):
+    """CSV text encoded as UTF-8 bytes, yielded in ~EXPORT_FLUSH_BYTES pieces"""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(columns)
+    for row in rows:
+        writer.writerow(row)
+        if buffer.tell() >= EXPORT_FLUSH_BYTES:
+            yield buffer.getvalue().encode('utf-8')
+            buffer.seek(0)
+            buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue().encode('utf-8')
+
+
+class _Sink:
+    """Write-only, non-seekable file for zipfile; the stream drains what was written"""
+
+    def __init__(self):
+        self._chunks = []
+        self._size = 0
+        self._offset = 0
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        self._size += len(data)
+        self._offset += len(data)
+        return len(data)
+
+    def tell(self):
+        return self._offset
+
+    def flush(self):
+        pass
+
+    def pending(self):
+        return self._size
+
+    def drain(self):
+        data = b''.join(self._chunks)
+        self._chunks, self._size = [], 0
+        return data
+
+
+def _xlsx_cell(value):
+    if value is None:
+        return '<c/>'
+    if isinstance(value, bool):
+        return f'<c t="b"><v>{int(value)}</v></c>'
+    if isinstance(value, (int, float, Decimal)):
+        return f'<c><v>{value}</v></c>'
+    if isinstance(value, (datetime, date)):
+        value = value.isoformat(sep=' ') if isinstance(value, datetime) else value.isoformat()
+    text = escape(_ILLEGAL_XML.sub('', str(value)))
+    return f'<c t="inlineStr"><is><t xml:space="preserve">{text}</t></is></c>'
+
+
+def _xlsx_row(values):
+    return ('<row>' + ''.join(_xlsx_cell(v) for v in values) + '</row>').encode('utf-8')
+
+
+_SHEET_HEAD = (b'<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+               b'<worksheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main"><sheetData>')
+_SHEET_TAIL = b'</sheetData></worksheet>'
+
+
+def _xlsx_package(sheets):
+    """(name, xml) of the workbook parts for `sheets` worksheets"""
+    content_types = ''.join(
+        f'<Override PartName="/xl/worksheets/sheet{i}.xml" '
+        f'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"/>'
+        for i in range(1, sheets + 1))
+    workbook_sheets = ''.join(f'<sheet name="Sheet{i}" sheetId="{i}" r:id="rId{i}"/>' for i in range(1, sheets + 1))
+    workbook_rels = ''.join(
+        f'<Relationship Id="rId{i}" Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/worksheet" '
+        f'Target="worksheets/sheet{i}.xml"/>' for i in range(1, sheets + 1))
+    header = '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+    return [
+        ('[Content_Types].xml', header +
+         '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+         '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+         '<Default Extension="xml" ContentType="application/xml"/>'
+         '<Override PartName="/xl/workbook.xml" '
+         'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml"/>'
+         f'{content_types}</Types>'),
+        ('_rels/.rels', header +
+         '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+         '<Relationship Id="rId1" Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument" '
+         'Target="xl/workbook.xml"/></Relationships>'),
+        ('xl/workbook.xml', header +
+         '<workbook xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main" '
+         'xmlns:r="http://schemas.openxmlformats.org/officeDocument/2006/relationships">'
+         f'<sheets>{workbook_sheets}</sheets></workbook>'),
+        ('xl/_rels/workbook.xml.rels', header +
+         '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+         f'{workbook_rels}</Relationships>'),
+    ]
+
+
+def iter_xlsx(columns, rows):
+    """XLSX workbook bytes, yielded in ~EXPORT_FLUSH_BYTES pieces"""
+    sink = _Sink()
+    with zipfile.ZipFile(sink, 'w', compression=zipfile.ZIP_DEFLATED) as archive:
+        header = _xlsx_row(columns)
+        sheets, sheet, sheet_rows = 0, None, XLSX_MAX_ROWS
+        try:
+            for row in rows:
+                if sheet_rows >= XLSX_MAX_ROWS:
+                    if sheet is not None:
+                        sheet.write(_SHEET_TAIL)
+                        sheet.close()
+                    sheets += 1
+                    sheet = archive.open(f'xl/worksheets/sheet{sheets}.xml', 'w', force_zip64=True)
+                    sheet.write(_SHEET_HEAD + header)
+                    sheet_rows = 1
+                sheet.write(_xlsx_row(row))
+                sheet_rows += 1
+                if sink.pending() >= EXPORT_FLUSH_BYTES:
+                    yield sink.drain()
+            if sheet is None:
+                sheets = 1
+                sheet = archive.open('xl/worksheets/sheet1.xml', 'w', force_zip64=True)
+                sheet.write(_SHEET_HEAD + header)
+            sheet.write(_SHEET_TAIL)
+        finally:
+            if sheet is not None:
+                sheet.close()
+        for name, xml in _xlsx_package(sheets):
+            archive.writestr(name, xml)
+    yield sink.drain()
+
+
+def export_response(rows, columns, filename, fmt='csv'):
+    """Streaming attachment response for `rows` (any iterable of sequences) in CSV or XLSX"""
+    fmt = export_format(fmt)
+    if fmt == 'xlsx':
+        body, mimetype = iter_xlsx(columns, rows), XLSX_MIMETYPE
+    else:
+        body, mimetype = iter_csv(columns, rows), 'text/csv'
+    return Response(body, mimetype=mimetype, headers={
+        'Content-Disposition': f'attachment; filename={filename}.{fmt}',
+        # Let proxies pass chunks through as they are produced
+        'X-Accel-Buffering': 'no',
+        'Cache-Control': 'no-store',
+    })
@@ -0,0 +1,179 @@
+"""
+Background import jobs
+An upload is saved to a temporary file and a job row is returned at once
+(202 + job id); the import itself runs on a small worker pool. The importer
+commits its work chunk by chunk and records progress and per-row errors in
+the same transaction as each chunk, so what the job reports is exactly what
+is in the database - also after a crash half way.
+
+- import_jobs:        one row per job (status, counters, timestamps)
+- import_job_errors:  one row per rejected input row (row number, key, message)
+
+Jobs run in the process that accepted the upload; their state lives in the
+database, so any worker can answer a status poll.
+
+- create_job(kind, business_owner_id, filename) -> job id
+- submit(job_id, func, *args)  run func(job_id, *args) on the worker pool
+- record_chunk(conn, job_id, processed, imported, errors)  on the chunk's transaction
+- get_job(job_id, business_owner_id) -> dict or None
+"""
+
+import os
+import threading
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+from .database import bulk_insert, generate_id, get_db_connection
+
+IMPORT_WORKERS = int(os.environ.get('IMPORT_WORKERS', 2))
+# Per-row errors kept per job; the counters still count all of them
+IMPORT_MAX_ERRORS = int(os.environ.get('IMPORT_MAX_ERRORS', 10000))
+
+ERROR_COLUMNS = ('job_id', 'row_number', 'row_key', 'message')
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def init_import_job_tables(cursor, db_type='sqlite'):
+    """Create the import job tables (called from init_db)"""
+    pk = 'SERIAL PRIMARY KEY' if db_type == 'postgresql' else 'INTEGER PRIMARY KEY AUTOINCREMENT'
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS import_jobs (
+            id VARCHAR(255) PRIMARY KEY,
+            kind VARCHAR(50) NOT NULL,
+            business_owner_id VARCHAR(255),
+            filename TEXT,
+            status VARCHAR(20) NOT NULL DEFAULT 'queued',
+            total_rows INTEGER,
+            processed_rows INTEGER NOT NULL DEFAULT 0,
+            imported_count INTEGER NOT NULL DEFAULT 0,
+            error_count INTEGER NOT NULL DEFAULT 0,
+            error TEXT,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            started_at TIMESTAMP,
+            updated_at TIMESTAMP,
+            finished_at TIMESTAMP
+        )
+    ''')
+    cursor.execute(f'''
+        CREATE TABLE IF NOT EXISTS import_job_errors (
+            id {pk},
+            job_id VARCHAR(255) NOT NULL,
+            row_number INTEGER,
+            row_key TEXT,
+            message TEXT
+        )
+    ''')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_import_jobs_owner ON import_jobs(business_owner_id, created_at)')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_import_job_errors_job ON import_job_errors(job_id, row_number)')
+
+
+def _now():
+    return datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+
+
+def create_job(kind, business_owner_id, filename=None):
+    """New queued job; returns its id"""
+    job_id = generate_id()
+    conn = get_db_connection()
+    try:
+        conn.execute('''
+            INSERT INTO import_jobs (id, kind, business_owner_id, filename, status, created_at, updated_at)
+            VALUES (?, ?, ?, ?, 'queued', ?, ?)
+        ''', (job_id, kind, business_owner_id, filename, _now(), _now()))
+        conn.commit()
+    finally:
+        conn.close()
+    return job_id
+
+
+def _update_job(job_id, **fields):
+    fields['updated_at'] = _now()
+    conn = get_db_connection()
+    try:
+        conn.execute(f"UPDATE import_jobs SET {', '.join(f'{name} = ?' for name in fields)} WHERE id = ?",
+                     list(fields.values()) + [job_id])
+        conn.commit()
+    finally:
+        conn.close()
+
+
+def start_job(job_id):
+    _update_job(job_id, status='running', started_at=_now())
+
+
+def finish_job(job_id, total_rows=None, error=None):
+    """Mark a job completed (or failed with `error`)"""
+    if error:
+        _update_job(job_id, status='failed', error=str(error)[:2000], finished_at=_now())
+    else:
+        _update_job(job_id, status='completed', total_rows=total_rows, finished_at=_now())
+
+
+def record_chunk(conn, job_id, processed, imported, errors):
+    """
+    Add a committed chunk's counts and [(row_number, row_key, message), ...]
+    errors to the job. Runs on the chunk's connection; nothing is committed here.
+    """
+    if errors:
+        logged = conn.execute('SELECT error_count FROM import_jobs WHERE id = ?', (job_id,)).fetchone()
+        room = IMPORT_MAX_ERRORS - int(logged['error_count'] if logged else 0)
+        if room > 0:
+            bulk_insert(conn, 'import_job_errors', ERROR_COLUMNS,
+                        [(job_id, row_number, row_key, message) for row_number, row_key, message in errors[:room]])
+    conn.execute('''
+        UPDATE import_jobs SET
+            processed_rows = processed_rows + ?,
+            imported_count = imported_count + ?,
+            error_count = error_count + ?,
+            updated_at = ?
+        WHERE id = ?
+    ''', (processed, imported, len(errors), _now(), job_id))
+
+
+def get_job(job_id, business_owner_id=None):
+    """The job as a dict (with its first errors), or None if it is not this tenant's"""
+    conn = get_db_connection()
+    try:
+        job = conn.execute('SELECT * FROM import_jobs WHERE id = ?', (job_id,)).fetchone()
+        if job is None or (business_owner_id is not None and job['business_owner_id'] != business_owner_id):
+            return None
+        errors = conn.execute('''
+            SELECT row_number, row_key, message FROM import_job_errors
+            WHERE job_id = ? ORDER BY row_number LIMIT 100
+        ''', (job_id,)).fetchall()
+    finally:
+        conn.close()
+    job = dict(job)
+    job['errors'] = [dict(error) for error in errors]
+    return job
+
+
+def error_rows_query(job_id):
+    """(sql, params) of a job's full error report, for export.stream_rows"""
+    return ('SELECT row_number, row_key, message FROM import_job_errors WHERE job_id = ? ORDER BY row_number',
+            (job_id,))
+
+
+def _run(job_id, func, args):
+    try:
+        start_job(job_id)
+        func(job_id, *args)
+    except Exception as e:
+        print(f"❌ Import job {job_id} failed: {e}")
+        traceback.print_exc()
+        try:
+            finish_job(job_id, error=e)
+        except Exception as update_error:
+            print(f"⚠️ Could not mark import job {job_id} as failed: {update_error}")
+
+
+def submit(job_id, func, *args):
+    """Run func(job_id, *args) on the import worker pool; func finishes the job itself"""
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=max(1, IMPORT_WORKERS), thread_name_prefix='import')
+    return _executor.submit(_run, job_id, func, args)
@@ -0,0 +1,291 @@
+"""
+Transactional outbox for post-commit side effects
+Write paths enqueue events in the SAME transaction as their business rows, so
+an event exists if and only if the write committed. A background worker pool
+drains the table in batches and runs the registered handler for each event.
+
+Guarantees
+- Ordering per aggregate (e.g. per bill): events carry a sequence number and an
+  aggregate is processed by one worker at a time, strictly in sequence order.
+  A failing event blocks the later events of the same aggregate until it
+  succeeds or is dead-lettered.
+- Retry: failed events are retried with exponential backoff up to
+  OUTBOX_MAX_ATTEMPTS, then marked 'dead' (kept for inspection).
+- At-least-once: a crash between a handler finishing and the event being marked
+  done re-runs the handler, so handlers should be idempotent where it matters.
+
+Aggregates are claimed with a lease (locked_by / locked_until) through a
+conditional UPDATE, so several threads or gunicorn workers can share the table.
+"""
+
+import json
+import os
+import socket
+import threading
+import traceback
+import uuid
+from datetime import datetime, timedelta
+
+from .database import bulk_insert, get_db_connection
+
+_handlers = {}
+
+
+def register_handler(event_type):
+    """Decorator: handler(payload) for one event type"""
+    def decorator(func):
+        _handlers[event_type] = func
+        return func
+    return decorator
+
+
+def init_outbox_table(cursor, db_type='sqlite'):
+    """Create the outbox table (called from init_db)"""
+    pk = 'SERIAL PRIMARY KEY' if db_type == 'postgresql' else 'INTEGER PRIMARY KEY AUTOINCREMENT'
+    cursor.execute(f'''
+        CREATE TABLE IF NOT EXISTS outbox_events (
+            id {pk},
+            aggregate_type VARCHAR(50) NOT NULL,
+            aggregate_id VARCHAR(255) NOT NULL,
+            seq INTEGER NOT NULL,
+            event_type VARCHAR(100) NOT NULL,
+            payload TEXT,
+            business_owner_id VARCHAR(255),
+            status VARCHAR(20) NOT NULL DEFAULT 'pending',
+            attempts INTEGER NOT NULL DEFAULT 0,
+            next_attempt_at TIMESTAMP,
+            locked_by VARCHAR(100),
+            locked_until TIMESTAMP,
+            last_error TEXT,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            processed_at TIMESTAMP,
+            UNIQUE(aggregate_id, seq)
+        )
+    ''')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_outbox_events_status_next ON outbox_events(status, next_attempt_at)')
+
+
+def _now(offset_seconds=0):
+    return (datetime.now() + timedelta(seconds=offset_seconds)).strftime('%Y-%m-%d %H:%M:%S')
+
+
+def enqueue_events(conn, aggregate_type, aggregate_id, events, business_owner_id=None):
+    """
+    Add [(event_type, payload_dict), ...] for one aggregate, in order.
+    Runs on the caller's connection; nothing is committed here.
+    """
+    if not events:
+        return 0
+    row = conn.execute('SELECT COALESCE(MAX(seq), 0) as last_seq FROM outbox_events WHERE aggregate_id = ?',
+                       (aggregate_id,)).fetchone()
+    first_seq = int(row['last_seq']) + 1
+    now = _now()
+    bulk_insert(conn, 'outbox_events',
+                ('aggregate_type', 'aggregate_id', 'seq', 'event_type', 'payload',
+                 'business_owner_id', 'status', 'attempts', 'next_attempt_at', 'created_at'), [
+        (aggregate_type, aggregate_id, first_seq + i, event_type,
+         json.dumps(payload, default=str), business_owner_id, 'pending', 0, now, now)
+        for i, (event_type, payload) in enumerate(events)
+    ])
+    return len(events)
+
+
+class OutboxWorker:
+    """Background worker pool that drains outbox_events"""
+
+    def __init__(self, threads=2, batch_size=20, poll_interval=1.0, lease_seconds=60,
+                 max_attempts=8, base_backoff=2.0, max_backoff=600):
+        self.threads = max(1, threads)
+        self.batch_size = batch_size
+        self.poll_interval = poll_interval
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max_attempts
+        self.base_backoff = base_backoff
+        self.max_backoff = max_backoff
+        self.running = False
+        self._wakeup = threading.Event()
+        self._workers = []
+        self._lock = threading.Lock()
+        self._metrics = {'processed': 0, 'failed': 0, 'dead': 0, 'batches': 0}
+        self.app = None
+
+    def start(self, app=None):
+        """Handlers run inside `app`'s context (needed for socketio/current_app)"""
+        if self.running:
+            print("📮 [OUTBOX] Worker already running")
+            return
+        self.app = app
+        self.running = True
+        for i in range(self.threads):
+            worker_id = f"{socket.gethostname()}:{os.getpid()}:{i}:{uuid.uuid4().hex[:6]}"
+            thread = threading.Thread(target=self._run, args=(worker_id,), daemon=True,
+                                      name=f"outbox-worker-{i}")
+            thread.start()
+            self._workers.append(thread)
+        print(f"🚀 [OUTBOX] {self.threads} worker thread(s) started")
+
+    def stop(self):
+        self.running = False
+        self._wakeup.set()
+        print("🛑 [OUTBOX] Worker stopped")
+
+    def notify(self):
+        """Wake the workers now instead of at the next poll (called after a commit)"""
+        self._wakeup.set()
+
+    def _run(self, worker_id):
+        while self.running:
+            try:
+                if self.app is not None:
+                    with self.app.app_context():
+                        handled = self.drain_once(worker_id)
+                else:
+                    handled = self.drain_once(worker_id)
+            except Exception as e:
+                print(f"❌ [OUTBOX] Worker loop error: {e}")
+                handled = 0
+            if not handled:
+                self._wakeup.wait(self.poll_interval)
+                self._wakeup.clear()
+
+    def _claim(self, conn, worker_id):
+        """Lease up to batch_size aggregates that have due, unlocked events"""
+        now = _now()
+        candidates = conn.execute('''
+            SELECT aggregate_id, MIN(id) as first_id
+            FROM outbox_events
+            WHERE status = 'pending' AND next_attempt_at <= ?
+              AND (locked_until IS NULL OR locked_until < ?)
+            GROUP BY aggregate_id
+            ORDER BY first_id
+            LIMIT ?
+        ''', (now, now, self.batch_size)).fetchall()
+
+        claimed = []
+        lease_until = _now(self.lease_seconds)
+        for row in candidates:
+            cursor = conn.execute('''
+                UPDATE outbox_events SET locked_by = ?, locked_until = ?
+                WHERE aggregate_id = ? AND status = 'pending'
+                  AND (locked_until IS NULL OR locked_until < ?)
+            ''', (worker_id, lease_until, row['aggregate_id'], now))
+            if cursor.rowcount:
+                claimed.append(row['aggregate_id'])
+        conn.commit()
+        return claimed
+
+    def drain_once(self, worker_id='manual'):
+        """Claim one batch of aggregates and process them; returns events handled"""
+        conn = get_db_connection()
+        try:
+            aggregates = self._claim(conn, worker_id)
+            handled = 0
+            for aggregate_id in aggregates:
+                handled += self._process_aggregate(conn, worker_id, aggregate_id)
+            if aggregates:
+                with self._lock:
+                    self._metrics['batches'] += 1
+            return handled
+        finally:
+            conn.close()
+
+    def _process_aggregate(self, conn, worker_id, aggregate_id):
+        events = conn.execute('''
+            SELECT id, event_type, payload, attempts, next_attempt_at
+            FROM outbox_events
+            WHERE aggregate_id = ? AND status = 'pending' AND locked_by = ?
+            ORDER BY seq
+        ''', (aggregate_id, worker_id)).fetchall()
+
+        handled = 0
+        now = _now()
+        for event in events:
+            if str(event['next_attempt_at']) > now:
+                break  # earlier failure still backing off; keep order
+            handler = _handlers.get(event['event_type'])
+            try:
+                if handler is None:
+                    raise LookupError(f"No outbox handler registered for {event['event_type']}")
+                handler(json.loads(event['payload']) if event['payload'] else {})
+            except Exception as e:
+                if not self._record_failure(conn, event, e):
+                    break  # will be retried; later events wait for it
+                continue
+
+            conn.execute('''
+                UPDATE outbox_events SET status = 'done', processed_at = ?, locked_by = NULL, locked_until = NULL
+                WHERE id = ?
+            ''', (_now(), event['id']))
+            conn.commit()
+            handled += 1
+            with self._lock:
+                self._metrics['processed'] += 1
+
+        # Release whatever is left (backing off or blocked) for the next claim
+        conn.execute('''
+            UPDATE outbox_events SET locked_by = NULL, locked_until = NULL
+            WHERE aggregate_id = ? AND locked_by = ?
+        ''', (aggregate_id, worker_id))
+        conn.commit()
+        return handled
+
+    def _record_failure(self, conn, event, error):
+        """Schedule a retry, or dead-letter after max_attempts. Returns True if dead-lettered."""
+        attempts = int(event['attempts']) + 1
+        message = f"{type(error).__name__}: {error}"
+        dead = attempts >= self.max_attempts
+        delay = min(self.max_backoff, self.base_backoff * (2 ** (attempts - 1)))
+        conn.execute('''
+            UPDATE outbox_events
+            SET status = ?, attempts = ?, last_error = ?, next_attempt_at = ?
+            WHERE id = ?
+        ''', ('dead' if dead else 'pending', attempts, message[:2000], _now(delay), event['id']))
+        conn.commit()
+        with self._lock:
+            self._metrics['dead' if dead else 'failed'] += 1
+        if dead:
+            print(f"💀 [OUTBOX] Event {event['id']} ({event['event_type']}) dead after {attempts} attempts: {message}")
+            traceback.print_exception(type(error), error, error.__traceback__)
+        else:
+            print(f"⚠️ [OUTBOX] Event {event['id']} ({event['event_type']}) failed, retry in {delay:.0f}s: {message}")
+        return dead
+
+    def stats(self):
+        conn = get_db_connection()
+        try:
+            rows = conn.execute('SELECT status, COUNT(*) as n FROM outbox_events GROUP BY status').fetchall()
+        finally:
+            conn.close()
+        with self._lock:
+            return {
+                'running': self.running,
+                'threads': self.threads,
+                'queue': {row['status']: int(row['n']) for row in rows},
+                **self._metrics,
+            }
+
+
+outbox_worker = OutboxWorker(
+    threads=int(os.environ.get('OUTBOX_WORKERS', 2)),
+    batch_size=int(os.environ.get('OUTBOX_BATCH_SIZE', 20)),
+    poll_interval=float(os.environ.get('OUTBOX_POLL_INTERVAL', 1.0)),
+    max_attempts=int(os.environ.get('OUTBOX_MAX_ATTEMPTS', 8)),
+)
+
+
+def start_outbox_worker(app=None):
+    """Start the outbox worker pool"""
+    outbox_worker.start(app)
+
+
+def stop_outbox_worker():
+    """Stop the outbox worker pool"""
+    outbox_worker.stop()
+
+
+def notify_outbox():
+    outbox_worker.notify()
+
+
+def get_outbox_stats():
+    return outbox_worker.stats()
@@ -0,0 +1,84 @@
+"""
+Keyset (cursor) pagination on (created_at, id)
+A page is `WHERE (created_at, id) < (cursor) ORDER BY created_at DESC, id DESC
+LIMIT n + 1`: one index range scan of n rows on (tenant, created_at, id), so
+the 1000th page costs the same as the first (OFFSET reads and discards every
+earlier row). The extra row only tells whether there is a next page.
+
+Cursors are opaque URL-safe tokens of the last row's (created_at, id); an
+empty cursor is the first page. Exact totals are not part of a page - they
+cost a full count - and are only computed when asked for (include_total),
+cached per tenant for PAGINATION_COUNT_TTL seconds and dropped on the
+tenant's next write like every other cached result.
+
+- decode_cursor(token) -> (created_at, id) or None
+- keyset_clause(created_column, id_column, cursor) -> (sql, params)
+- keyset_page(rows, limit) -> (rows, next_cursor)
+- cached_count(conn, namespace, tenant, sql, params) -> int
+"""
+
+import base64
+import json
+import os
+
+from .cache import cache
+
+PAGINATION_COUNT_TTL = float(os.environ.get('PAGINATION_COUNT_TTL', 60))
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 500
+
+
+def page_size(value, default=DEFAULT_PAGE_SIZE, maximum=MAX_PAGE_SIZE):
+    """Requested page size clamped to [1, maximum]"""
+    try:
+        size = int(value)
+    except (TypeError, ValueError):
+        return default
+    return max(1, min(size, maximum))
+
+
+def encode_cursor(created_at, row_id):
+    raw = json.dumps([str(created_at), row_id], separators=(',', ':')).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+
+def decode_cursor(token):
+    """(created_at, id) of a cursor token; None for the first page; ValueError if malformed"""
+    if not token:
+        return None
+    try:
+        raw = base64.urlsafe_b64decode(token + '=' * (-len(token) % 4))
+        created_at, row_id = json.loads(raw)
+    except Exception:
+        raise ValueError("Invalid pagination cursor")
+    return str(created_at), str(row_id)
+
+
+def keyset_clause(created_column, id_column, cursor):
+    """(sql, params) for rows after `cursor` in (created_at DESC, id DESC) order; ('', []) on the first page"""
+    if cursor is None:
+        return '', []
+    # Row-value comparison, so both SQLite and PostgreSQL turn it into an index range
+    return f"({created_column}, {id_column}) < (?, ?)", [cursor[0], cursor[1]]
+
+
+def keyset_page(rows, limit, created_key='created_at', id_key='id'):
+    """Trim the limit + 1 fetched rows to a page; returns (rows, next_cursor or None)"""
+    if len(rows) <= limit:
+        return rows, None
+    rows = rows[:limit]
+    last = rows[-1]
+    return rows, encode_cursor(last[created_key], last[id_key])
+
+
+def cached_count(conn, namespace, tenant, sql, params):
+    """COUNT(*) of `sql`, cached per tenant and query (not cached without a tenant)"""
+    if tenant is None:
+        return conn.execute(f"SELECT COUNT(*) FROM ({sql}) counted", params).fetchone()[0]
+    key = repr((sql, list(params)))
+    hit, value = cache.get(namespace, tenant, key)
+    if hit:
+        return value
+    value = conn.execute(f"SELECT COUNT(*) FROM ({sql}) counted", params).fetchone()[0]
+    cache.set(namespace, tenant, key, value, PAGINATION_COUNT_TTL)
+    return value
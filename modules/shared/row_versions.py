@@ -0,0 +1,248 @@
+"""
+Row versions and tombstones for incremental (delta) device sync
+Every insert/update of a synced table stamps the row with the next value of
+its tenant's clock (sync_clock), and every delete leaves a tombstone with one.
+A device keeps the highest version it has seen per table and asks only for
+rows and tombstones above it, so a reconnect costs the changes since the last
+sync instead of a full snapshot.
+
+- row_version:     column on each synced table, set by triggers (so every
+                   write path is covered without touching it)
+- sync_clock:      per-tenant counter; the version is taken with an upsert on
+                   the tenant's row, which serializes a tenant's writers, so
+                   versions also commit in order and a client cursor never
+                   skips a row that committed late
+- sync_tombstones: (table, row id, version) of deleted rows, kept for
+                   SYNC_TOMBSTONE_DAYS; a cursor older than the pruned
+                   tombstones must reload that table (reset)
+
+- changes_since(conn, entity, business_owner_id, since_version, limit)
+- current_versions(conn, business_owner_id)
+"""
+
+import os
+from datetime import datetime, timedelta
+
+# entity -> (table, tenant column); entity names are the keys devices already use
+SYNC_TABLES = {
+    'products': ('products', 'user_id'),
+    'customers': ('customers', 'user_id'),
+    'sales': ('sales', 'business_owner_id'),
+    'invoices': ('bills', 'business_owner_id'),
+}
+
+# Large base64 blobs that devices fetch on demand, never through sync
+HEAVY_COLUMNS = {'barcode_image', 'bill_receipt_photo'}
+
+SYNC_TOMBSTONE_DAYS = float(os.environ.get('SYNC_TOMBSTONE_DAYS', 30))
+
+
+def init_row_versions(cursor, db_type='sqlite'):
+    """Add row_version, the clock, tombstones and their triggers (called from init_db)"""
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS sync_clock (
+            business_owner_id VARCHAR(255) PRIMARY KEY,
+            version BIGINT NOT NULL DEFAULT 0,
+            pruned_version BIGINT NOT NULL DEFAULT 0
+        )
+    ''')
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS sync_tombstones (
+            table_name VARCHAR(50) NOT NULL,
+            row_id VARCHAR(255) NOT NULL,
+            business_owner_id VARCHAR(255) NOT NULL,
+            row_version BIGINT NOT NULL,
+            deleted_at TIMESTAMP NOT NULL,
+            PRIMARY KEY (table_name, row_id)
+        )
+    ''')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_sync_tombstones_owner ON sync_tombstones(business_owner_id, table_name, row_version)')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_sync_tombstones_deleted ON sync_tombstones(deleted_at)')
+
+    if db_type == 'postgresql':
+        _init_postgres(cursor)
+    else:
+        _init_sqlite(cursor)
+
+
+def _init_sqlite(cursor):
+    import sqlite3
+    for table, owner in SYNC_TABLES.values():
+        try:
+            cursor.execute(f'ALTER TABLE {table} ADD COLUMN row_version INTEGER')
+        except sqlite3.OperationalError:
+            pass
+        cursor.execute(f'CREATE INDEX IF NOT EXISTS idx_{table}_row_version ON {table}({owner}, row_version)')
+
+        tick = f'''
+            INSERT INTO sync_clock (business_owner_id, version) VALUES (COALESCE({{r}}.{owner}, ''), 1)
+            ON CONFLICT (business_owner_id) DO UPDATE SET version = version + 1;
+        '''
+        clock = f"(SELECT version FROM sync_clock WHERE business_owner_id = COALESCE({{r}}.{owner}, ''))"
+        cursor.execute(f'''
+            CREATE TRIGGER IF NOT EXISTS trg_{table}_version_insert AFTER INSERT ON {table}
+            BEGIN
+                {tick.format(r='new')}
+                UPDATE {table} SET row_version = {clock.format(r='new')} WHERE rowid = new.rowid;
+            END
+        ''')
+        # Writes that set row_version themselves (this trigger, the backfill) don't re-fire it
+        cursor.execute(f'''
+            CREATE TRIGGER IF NOT EXISTS trg_{table}_version_update AFTER UPDATE ON {table}
+            WHEN new.row_version IS old.row_version
+            BEGIN
+                {tick.format(r='new')}
+                UPDATE {table} SET row_version = {clock.format(r='new')} WHERE rowid = new.rowid;
+            END
+        ''')
+        cursor.execute(f'''
+            CREATE TRIGGER IF NOT EXISTS trg_{table}_version_delete AFTER DELETE ON {table}
+            BEGIN
+                {tick.format(r='old')}
+                INSERT OR REPLACE INTO sync_tombstones (table_name, row_id, business_owner_id, row_version, deleted_at)
+                VALUES ('{table}', old.id, COALESCE(old.{owner}, ''), {clock.format(r='old')}, datetime('now', 'localtime'));
+            END
+        ''')
+    _backfill(cursor)
+
+
+def _init_postgres(cursor):
+    cursor.execute('''
+        CREATE OR REPLACE FUNCTION bizpulse_row_version() RETURNS trigger AS $$
+        DECLARE
+            tenant TEXT := COALESCE(to_jsonb(NEW) ->> TG_ARGV[0], '');
+        BEGIN
+            IF TG_OP = 'UPDATE' AND NEW.row_version IS DISTINCT FROM OLD.row_version THEN
+                RETURN NEW;
+            END IF;
+            INSERT INTO sync_clock (business_owner_id, version) VALUES (tenant, 1)
+            ON CONFLICT (business_owner_id) DO UPDATE SET version = sync_clock.version + 1
+            RETURNING version INTO NEW.row_version;
+            RETURN NEW;
+        END
+        $$ LANGUAGE plpgsql
+    ''')
+    cursor.execute('''
+        CREATE OR REPLACE FUNCTION bizpulse_row_tombstone() RETURNS trigger AS $$
+        DECLARE
+            tenant TEXT := COALESCE(to_jsonb(OLD) ->> TG_ARGV[0], '');
+            deleted_version BIGINT;
+        BEGIN
+            INSERT INTO sync_clock (business_owner_id, version) VALUES (tenant, 1)
+            ON CONFLICT (business_owner_id) DO UPDATE SET version = sync_clock.version + 1
+            RETURNING version INTO deleted_version;
+            INSERT INTO sync_tombstones (table_name, row_id, business_owner_id, row_version, deleted_at)
+            VALUES (TG_TABLE_NAME, OLD.id, tenant, deleted_version, NOW())
+            ON CONFLICT (table_name, row_id) DO UPDATE
+            SET business_owner_id = EXCLUDED.business_owner_id, row_version = EXCLUDED.row_version,
+                deleted_at = EXCLUDED.deleted_at;
+            RETURN OLD;
+        END
+        $$ LANGUAGE plpgsql
+    ''')
+    for table, owner in SYNC_TABLES.values():
+        cursor.execute(f'ALTER TABLE {table} ADD COLUMN IF NOT EXISTS row_version BIGINT')
+        cursor.execute(f'CREATE INDEX IF NOT EXISTS idx_{table}_row_version ON {table}({owner}, row_version)')
+        cursor.execute(f'DROP TRIGGER IF EXISTS trg_{table}_row_version ON {table}')
+        cursor.execute(f'''
+            CREATE TRIGGER trg_{table}_row_version BEFORE INSERT OR UPDATE ON {table}
+            FOR EACH ROW EXECUTE FUNCTION bizpulse_row_version('{owner}')
+        ''')
+        cursor.execute(f'DROP TRIGGER IF EXISTS trg_{table}_row_tombstone ON {table}')
+        cursor.execute(f'''
+            CREATE TRIGGER trg_{table}_row_tombstone AFTER DELETE ON {table}
+            FOR EACH ROW EXECUTE FUNCTION bizpulse_row_tombstone('{owner}')
+        ''')
+    _backfill(cursor)
+
+
+def _backfill(cursor):
+    """Give rows written before versioning a version from their tenant's clock (one-time)"""
+    for table, owner in SYNC_TABLES.values():
+        cursor.execute(f'''
+            SELECT id, COALESCE({owner}, '') FROM {table} WHERE row_version IS NULL
+            ORDER BY COALESCE({owner}, ''), created_at, id
+        ''')
+        pending = cursor.fetchall()
+        if not pending:
+            continue
+        by_owner = {}
+        for row_id, tenant in pending:
+            by_owner.setdefault(tenant, []).append(row_id)
+        for tenant, ids in by_owner.items():
+            cursor.execute('''
+                INSERT INTO sync_clock (business_owner_id, version) VALUES (?, ?)
+                ON CONFLICT (business_owner_id) DO UPDATE SET version = sync_clock.version + ?
+            ''', (tenant, len(ids), len(ids)))
+            cursor.execute('SELECT version FROM sync_clock WHERE business_owner_id = ?', (tenant,))
+            first = cursor.fetchone()[0] - len(ids) + 1
+            cursor.executemany(f'UPDATE {table} SET row_version = ? WHERE id = ?',
+                               [(first + i, row_id) for i, row_id in enumerate(ids)])
+        print(f"🔄 Row versions assigned to {len(pending)} existing {table} rows")
+
+
+def _row(row):
+    data = dict(row)
+    for column in HEAVY_COLUMNS.intersection(data):
+        del data[column]
+    return data
+
+
+def changes_since(conn, entity, business_owner_id, since_version=None, limit=500):
+    """
+    Rows changed and ids deleted after `since_version` (None = everything),
+    oldest first, at most `limit` in total. Follow `version` while has_more.
+    """
+    table, owner = SYNC_TABLES[entity]
+    since = -1 if since_version is None else int(since_version)
+    rows = conn.execute(f'''
+        SELECT * FROM {table} WHERE {owner} = ? AND row_version > ?
+        ORDER BY row_version LIMIT ?
+    ''', (business_owner_id, since, limit + 1)).fetchall()
+
+    tombstones, reset = [], False
+    if since >= 0:
+        tombstones = conn.execute('''
+            SELECT row_id, row_version FROM sync_tombstones
+            WHERE business_owner_id = ? AND table_name = ? AND row_version > ?
+            ORDER BY row_version LIMIT ?
+        ''', (business_owner_id, table, since, limit + 1)).fetchall()
+        clock = conn.execute('SELECT pruned_version FROM sync_clock WHERE business_owner_id = ?',
+                             (business_owner_id,)).fetchone()
+        reset = bool(clock) and since < int(clock['pruned_version'])
+
+    merged = sorted([(r['row_version'], 'row', r) for r in rows] +
+                    [(t['row_version'], 'deleted', t) for t in tombstones], key=lambda item: item[0])
+    page = merged[:limit]
+    return {
+        'rows': [_row(item) for _, kind, item in page if kind == 'row'],
+        'deleted': [item['row_id'] for _, kind, item in page if kind == 'deleted'],
+        'version': page[-1][0] if page else max(since, 0),
+        'has_more': len(merged) > limit,
+        'reset': reset,
+    }
+
+
+def current_versions(conn, business_owner_id):
+    """
+    Version a fully synced device holds, per entity. All tables share the
+    tenant's clock, so its committed value covers every row and tombstone.
+    """
+    row = conn.execute('SELECT version FROM sync_clock WHERE business_owner_id = ?',
+                       (business_owner_id,)).fetchone()
+    version = int(row['version']) if row else 0
+    return {entity: version for entity in SYNC_TABLES}
+
+
+def prune_tombstones(conn, days=None):
+    """Drop old tombstones, remembering per tenant the highest version dropped; caller commits"""
+    days = SYNC_TOMBSTONE_DAYS if days is None else days
+    cutoff = (datetime.now() - timedelta(days=days)).strftime('%Y-%m-%d %H:%M:%S')
+    conn.execute('''
+        UPDATE sync_clock SET pruned_version = (
+            SELECT MAX(row_version) FROM sync_tombstones
+            WHERE sync_tombstones.business_owner_id = sync_clock.business_owner_id AND deleted_at < ?
+        )
+        WHERE business_owner_id IN (SELECT DISTINCT business_owner_id FROM sync_tombstones WHERE deleted_at < ?)
+    ''', (cutoff, cutoff))
+    return conn.execute('DELETE FROM sync_tombstones WHERE deleted_at < ?', (cutoff,)).rowcount
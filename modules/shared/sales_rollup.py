@@ -0,0 +1,213 @@
+"""
+Daily sales rollup
+One row per (business_owner_id, sale_date, payment_method) holding the bill
+aggregates the dashboards and the sales summary report need, so they read
+O(days) rows instead of re-scanning bills on every page load.
+
+The rollup is maintained incrementally inside the same transaction as the
+bill write: callers apply a bill's contribution with record_bill(+1) after
+creating it, and bracket any UPDATE of an existing bill with
+record_bill(-1) / record_bill(+1). rebuild_rollup() recomputes it from bills
+(used for the initial backfill and by scripts/rebuild_sales_rollup.py).
+
+NULL owners and payment methods are stored as '' so the key stays unique.
+"""
+
+from datetime import datetime
+
+ROLLUP_COLUMNS = ('bill_count', 'total_sales', 'revenue', 'credit_sales',
+                  'credit_balance', 'open_credit_bills')
+
+# Revenue = only the paid part of a bill (unpaid credit excluded)
+_REVENUE_SQL = """
+    CASE
+        WHEN COALESCE(CAST(is_credit AS INTEGER), 0) = 0 OR payment_status = 'paid' THEN COALESCE(total_amount, 0)
+        ELSE COALESCE(credit_paid_amount, 0)
+    END
+"""
+
+_OPEN_CREDIT_SQL = "COALESCE(CAST(is_credit AS INTEGER), 0) = 1 AND credit_balance > 0"
+
+
+def init_rollup_table(cursor, db_type='sqlite'):
+    """Create the rollup table (called from init_db)"""
+    money = 'NUMERIC(14,2)' if db_type == 'postgresql' else 'REAL'
+    cursor.execute(f'''
+        CREATE TABLE IF NOT EXISTS daily_sales_rollup (
+            business_owner_id VARCHAR(255) NOT NULL DEFAULT '',
+            sale_date DATE NOT NULL,
+            payment_method VARCHAR(50) NOT NULL DEFAULT '',
+            bill_count INTEGER NOT NULL DEFAULT 0,
+            total_sales {money} NOT NULL DEFAULT 0,
+            revenue {money} NOT NULL DEFAULT 0,
+            credit_sales {money} NOT NULL DEFAULT 0,
+            credit_balance {money} NOT NULL DEFAULT 0,
+            open_credit_bills INTEGER NOT NULL DEFAULT 0,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            PRIMARY KEY (business_owner_id, sale_date, payment_method)
+        )
+    ''')
+
+
+def bill_contribution(bill):
+    """Rollup deltas for a single bill row (dict-like)"""
+    total = float(bill['total_amount'] or 0)
+    is_credit = bool(bill['is_credit'])
+    credit_balance = float(bill['credit_balance'] or 0)
+    open_credit = is_credit and credit_balance > 0
+
+    if not is_credit or bill['payment_status'] == 'paid':
+        revenue = total
+    else:
+        revenue = float(bill['credit_paid_amount'] or 0)
+
+    return {
+        'bill_count': 1,
+        'total_sales': total,
+        'revenue': revenue,
+        'credit_sales': total if is_credit else 0,
+        'credit_balance': credit_balance if open_credit else 0,
+        'open_credit_bills': 1 if open_credit else 0,
+    }
+
+
+def record_bill(conn, bill_id, sign=1):
+    """
+    Add (sign=1) or remove (sign=-1) a bill's contribution to its day.
+    Must run on the caller's connection, inside the bill's transaction.
+    """
+    bill = conn.execute('''
+        SELECT business_owner_id, created_at, payment_method, total_amount, is_credit,
+               payment_status, credit_paid_amount, credit_balance
+        FROM bills WHERE id = ?
+    ''', (bill_id,)).fetchone()
+    if not bill or not bill['created_at']:
+        return False
+
+    key = (bill['business_owner_id'] or '', str(bill['created_at'])[:10], bill['payment_method'] or '')
+    deltas = bill_contribution(bill)
+    values = [sign * deltas[column] for column in ROLLUP_COLUMNS]
+    now = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+
+    conn.execute(f'''
+        INSERT INTO daily_sales_rollup (business_owner_id, sale_date, payment_method,
+            {', '.join(ROLLUP_COLUMNS)}, updated_at)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+        ON CONFLICT (business_owner_id, sale_date, payment_method) DO UPDATE SET
+            {', '.join(f'{c} = daily_sales_rollup.{c} + excluded.{c}' for c in ROLLUP_COLUMNS)},
+            updated_at = excluded.updated_at
+    ''', list(key) + values + [now])
+
+    if sign < 0:
+        conn.execute('''
+            DELETE FROM daily_sales_rollup
+            WHERE business_owner_id = ? AND sale_date = ? AND payment_method = ? AND bill_count <= 0
+        ''', key)
+    return True
+
+
+def rebuild_rollup(conn, business_owner_id=None):
+    """Recompute the rollup from bills (all tenants, or one). Caller commits."""
+    where, params = '', []
+    if business_owner_id is not None:
+        where = " AND COALESCE(business_owner_id, '') = ?"
+        params = [business_owner_id]
+        conn.execute('DELETE FROM daily_sales_rollup WHERE business_owner_id = ?', params)
+    else:
+        conn.execute('DELETE FROM daily_sales_rollup')
+    conn.execute(f'''
+        INSERT INTO daily_sales_rollup (business_owner_id, sale_date, payment_method,
+            {', '.join(ROLLUP_COLUMNS)}, updated_at)
+        SELECT
+            COALESCE(business_owner_id, ''),
+            DATE(created_at),
+            COALESCE(payment_method, ''),
+            COUNT(*),
+            COALESCE(SUM(total_amount), 0),
+            COALESCE(SUM({_REVENUE_SQL}), 0),
+            COALESCE(SUM(CASE WHEN COALESCE(CAST(is_credit AS INTEGER), 0) = 1 THEN total_amount ELSE 0 END), 0),
+            COALESCE(SUM(CASE WHEN {_OPEN_CREDIT_SQL} THEN credit_balance ELSE 0 END), 0),
+            SUM(CASE WHEN {_OPEN_CREDIT_SQL} THEN 1 ELSE 0 END),
+            CURRENT_TIMESTAMP
+        FROM bills
+        WHERE created_at IS NOT NULL{where}
+        GROUP BY COALESCE(business_owner_id, ''), DATE(created_at), COALESCE(payment_method, '')
+    ''', params)
+
+
+def _owner_filter(business_owner_id, include_unowned):
+    if not business_owner_id:
+        return '', []
+    if include_unowned:
+        return " AND business_owner_id IN (?, '')", [business_owner_id]
+    return ' AND business_owner_id = ?', [business_owner_id]
+
+
+def rollup_period_totals(conn, business_owner_id=None, periods=None, include_unowned=False):
+    """
+    {name: totals} for several [start, end) windows in one pass over the tenant's
+    rollup rows (conditional aggregation). periods maps a name to
+    ('YYYY-MM-DD' start, end); either bound may be None (open).
+    business_owner_id=None aggregates every tenant, like the unfiltered bill queries did.
+    """
+    select, params = [], []
+    for name, (start, end) in periods.items():
+        condition, window_params = [], []
+        if start:
+            condition.append('sale_date >= ?')
+            window_params.append(start)
+        if end:
+            condition.append('sale_date < ?')
+            window_params.append(end)
+        condition = ' AND '.join(condition) or '1=1'
+        for column in ROLLUP_COLUMNS:
+            select.append(f'COALESCE(SUM(CASE WHEN {condition} THEN {column} ELSE 0 END), 0) as {name}_{column}')
+            params.extend(window_params)
+
+    owner_sql, owner_params = _owner_filter(business_owner_id, include_unowned)
+    row = conn.execute(f'''
+        SELECT {', '.join(select)}
+        FROM daily_sales_rollup
+        WHERE 1=1{owner_sql}
+    ''', params + owner_params).fetchone()
+
+    totals = {}
+    for name in periods:
+        period = {c: float(row[f'{name}_{c}'] or 0) for c in ROLLUP_COLUMNS}
+        period['bill_count'] = int(period['bill_count'])
+        period['open_credit_bills'] = int(period['open_credit_bills'])
+        totals[name] = period
+    return totals
+
+
+def rollup_totals(conn, business_owner_id=None, start=None, end=None, include_unowned=False):
+    """Summed rollup columns for [start, end) ('YYYY-MM-DD' bounds, either may be open)"""
+    return rollup_period_totals(conn, business_owner_id, {'range': (start, end)}, include_unowned)['range']
+
+
+def rollup_daily(conn, business_owner_id=None, limit=30, include_unowned=False):
+    """Per-day totals with a cash/upi/card/credit split, newest first"""
+    owner_sql, owner_params = _owner_filter(business_owner_id, include_unowned)
+    rows = conn.execute(f'''
+        SELECT
+            sale_date as date,
+            SUM(bill_count) as total_bills,
+            SUM(total_sales) as total_revenue,
+            SUM(CASE WHEN payment_method = 'cash' THEN total_sales ELSE 0 END) as cash_sales,
+            SUM(CASE WHEN payment_method = 'upi' THEN total_sales ELSE 0 END) as upi_sales,
+            SUM(CASE WHEN payment_method = 'card' THEN total_sales ELSE 0 END) as card_sales,
+            SUM(credit_sales) as credit_sales
+        FROM daily_sales_rollup
+        WHERE bill_count > 0{owner_sql}
+        GROUP BY sale_date
+        ORDER BY sale_date DESC
+        LIMIT ?
+    ''', owner_params + [limit]).fetchall()
+
+    report = []
+    for row in rows:
+        day = dict(row)
+        day['date'] = str(day['date'])[:10]
+        day['avg_bill_value'] = day['total_revenue'] / day['total_bills'] if day['total_bills'] else 0
+        report.append(day)
+    return report
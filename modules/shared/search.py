@@ -0,0 +1,339 @@
+"""
+Indexed, tenant-scoped search for products, customers and bills
+Replaces leading-wildcard LIKE '%q%' scans, which read every row of the table,
+with trigram indexes kept current by the database itself:
+
+- SQLite:     FTS5 table (trigram tokenizer) + search_docs id map, maintained
+              by AFTER INSERT/UPDATE/DELETE triggers on the base tables. Every
+              MATCH is anchored on the indexed scope column ("<owner>|<entity>|"),
+              so it only walks the hits of one tenant and entity
+- PostgreSQL: pg_trgm GIN expression indexes on the same search document;
+              ILIKE and the word-similarity operator (<%) both use them
+
+Ranking: title prefix match, then substring match, then trigram similarity,
+so "basmati", "basm" and the typo "basmti" all find "Basmati Rice".
+Queries shorter than 3 characters (no trigram) use a title prefix match.
+If FTS5 / pg_trgm is unavailable everything degrades to the old LIKE scan.
+
+- search_ids(conn, entity, business_owner_id, query, limit)
+- search_rows(conn, entity, business_owner_id, query, limit, columns)
+"""
+
+import re
+import sqlite3
+
+# The search document of each entity; {p} is '' in queries and 'new.' in triggers.
+# PostgreSQL expression indexes are built on exactly this expression.
+SEARCH_ENTITIES = {
+    'product': {
+        'table': 'products',
+        'owner': 'user_id',
+        'title': 'name',
+        'document': "COALESCE({p}name, '') || ' ' || COALESCE({p}code, '') || ' ' || "
+                    "COALESCE({p}barcode_data, '') || ' ' || COALESCE({p}category, '')",
+        'columns': ('name', 'code', 'barcode_data', 'category', 'user_id'),
+        'active': 'is_active = 1',
+    },
+    'customer': {
+        'table': 'customers',
+        'owner': 'user_id',
+        'title': 'name',
+        'document': "COALESCE({p}name, '') || ' ' || COALESCE({p}phone, '') || ' ' || COALESCE({p}address, '')",
+        'columns': ('name', 'phone', 'address', 'user_id'),
+        'active': 'is_active = 1',
+    },
+    'bill': {
+        'table': 'bills',
+        'owner': 'business_owner_id',
+        'title': 'bill_number',
+        'document': "COALESCE({p}bill_number, '') || ' ' || COALESCE({p}customer_name, '')",
+        'columns': ('bill_number', 'customer_name', 'business_owner_id'),
+        'active': None,
+    },
+}
+
+# Typo-tolerant matches must share at least this fraction of the query's trigrams
+FUZZY_MIN_SCORE = 0.45
+
+_indexed = {}  # dialect -> whether the trigram index is usable
+
+
+def _document(entity, prefix=''):
+    return SEARCH_ENTITIES[entity]['document'].format(p=prefix)
+
+
+def _scope(entity, prefix=''):
+    """SQL for the indexed scope text of a row; _scope_match() anchors on it"""
+    return f"COALESCE({prefix}{SEARCH_ENTITIES[entity]['owner']}, '') || '|{entity}|'"
+
+
+def _scope_match(entity, business_owner_id):
+    return '^"' + f'{business_owner_id}|{entity}|'.replace('"', '""') + '"'
+
+
+def init_search_index(cursor, db_type='sqlite'):
+    """Create the trigram indexes (called from init_db). Returns False if unsupported."""
+    if db_type == 'postgresql':
+        try:
+            cursor.execute('SAVEPOINT search_index')
+            cursor.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+            for entity, spec in SEARCH_ENTITIES.items():
+                cursor.execute(f'''
+                    CREATE INDEX IF NOT EXISTS idx_{spec['table']}_search_trgm
+                    ON {spec['table']} USING gin (({_document(entity)}) gin_trgm_ops)
+                ''')
+                cursor.execute(f'''
+                    CREATE INDEX IF NOT EXISTS idx_{spec['table']}_search_title
+                    ON {spec['table']} (LOWER({spec['title']}) text_pattern_ops, {spec['owner']})
+                ''')
+            cursor.execute('RELEASE SAVEPOINT search_index')
+            _indexed['postgresql'] = True
+        except Exception as e:
+            cursor.execute('ROLLBACK TO SAVEPOINT search_index')
+            print(f"⚠️ pg_trgm not available, search falls back to ILIKE scans: {e}")
+            _indexed['postgresql'] = False
+        return _indexed['postgresql']
+
+    try:
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS search_docs (
+                doc_id INTEGER PRIMARY KEY AUTOINCREMENT,
+                entity_type TEXT NOT NULL,
+                entity_id TEXT NOT NULL,
+                UNIQUE(entity_type, entity_id)
+            )
+        ''')
+        cursor.execute("SELECT name FROM pragma_table_info('search_fts')")
+        fts_columns = [row[0] for row in cursor.fetchall()]
+        if fts_columns and 'scope' not in fts_columns:
+            # Index from before the scope column: drop it, init_db rebuilds an empty one
+            print("🔎 Search index lacks tenant scope, recreating it...")
+            for table in {spec['table'] for spec in SEARCH_ENTITIES.values()}:
+                for event in ('insert', 'update', 'delete'):
+                    cursor.execute(f'DROP TRIGGER IF EXISTS trg_{table}_search_{event}')
+            cursor.execute('DROP TABLE search_fts')
+            cursor.execute('DELETE FROM search_docs')
+        cursor.execute('''
+            CREATE VIRTUAL TABLE IF NOT EXISTS search_fts USING fts5(
+                scope, entity_type UNINDEXED, business_owner_id UNINDEXED, title, body,
+                tokenize = 'trigram'
+            )
+        ''')
+    except sqlite3.OperationalError as e:
+        print(f"⚠️ SQLite FTS5 trigram tokenizer not available, search falls back to LIKE scans: {e}")
+        _indexed['sqlite'] = False
+        return False
+
+    for entity, spec in SEARCH_ENTITIES.items():
+        table, owner, title = spec['table'], spec['owner'], spec['title']
+        # Short (< 3 character) queries are title prefix matches on this index. Title
+        # first: led by the owner it would win every "owner = ?" query and slow them down.
+        cursor.execute(f'CREATE INDEX IF NOT EXISTS idx_{table}_search_title ON {table} ({title} COLLATE NOCASE, {owner})')
+        doc_id = f"(SELECT doc_id FROM search_docs WHERE entity_type = '{entity}' AND entity_id = {{p}}id)"
+        cursor.execute(f'''
+            CREATE TRIGGER IF NOT EXISTS trg_{table}_search_insert AFTER INSERT ON {table}
+            BEGIN
+                INSERT OR IGNORE INTO search_docs (entity_type, entity_id) VALUES ('{entity}', new.id);
+                INSERT OR REPLACE INTO search_fts (rowid, scope, entity_type, business_owner_id, title, body)
+                VALUES ({doc_id.format(p='new.')}, {_scope(entity, 'new.')}, '{entity}', new.{owner},
+                        new.{title}, {_document(entity, 'new.')});
+            END
+        ''')
+        cursor.execute(f'''
+            CREATE TRIGGER IF NOT EXISTS trg_{table}_search_update
+            AFTER UPDATE OF {', '.join(spec['columns'])} ON {table}
+            BEGIN
+                UPDATE search_fts SET scope = {_scope(entity, 'new.')}, business_owner_id = new.{owner},
+                       title = new.{title}, body = {_document(entity, 'new.')}
+                WHERE rowid = {doc_id.format(p='new.')};
+            END
+        ''')
+        cursor.execute(f'''
+            CREATE TRIGGER IF NOT EXISTS trg_{table}_search_delete AFTER DELETE ON {table}
+            BEGIN
+                DELETE FROM search_fts WHERE rowid = {doc_id.format(p='old.')};
+                DELETE FROM search_docs WHERE entity_type = '{entity}' AND entity_id = old.id;
+            END
+        ''')
+    _indexed['sqlite'] = True
+    return True
+
+
+def rebuild_search_index(conn, entities=None):
+    """(Re)index existing rows; the triggers keep it current afterwards. SQLite only."""
+    if conn.dialect == 'postgresql' or not _index_ready(conn):
+        return 0
+    total = 0
+    for entity in entities or SEARCH_ENTITIES:
+        spec = SEARCH_ENTITIES[entity]
+        conn.execute('DELETE FROM search_fts WHERE rowid IN (SELECT doc_id FROM search_docs WHERE entity_type = ?)',
+                     (entity,))
+        conn.execute('DELETE FROM search_docs WHERE entity_type = ?', (entity,))
+        conn.execute(f"INSERT INTO search_docs (entity_type, entity_id) SELECT '{entity}', id FROM {spec['table']}")
+        cursor = conn.execute(f'''
+            INSERT INTO search_fts (rowid, scope, entity_type, business_owner_id, title, body)
+            SELECT d.doc_id, {_scope(entity, 't.')}, '{entity}', t.{spec['owner']}, t.{spec['title']},
+                   {_document(entity, 't.')}
+            FROM search_docs d JOIN {spec['table']} t ON t.id = d.entity_id
+            WHERE d.entity_type = '{entity}'
+        ''')
+        total += cursor.rowcount
+    return total
+
+
+def _index_ready(conn):
+    if conn.dialect not in _indexed:
+        if conn.dialect == 'postgresql':
+            row = conn.execute("SELECT COUNT(*) as n FROM pg_extension WHERE extname = 'pg_trgm'").fetchone()
+        else:
+            row = conn.execute("SELECT COUNT(*) as n FROM sqlite_master WHERE name = 'search_fts'").fetchone()
+        _indexed[conn.dialect] = bool(row['n'])
+    return _indexed[conn.dialect]
+
+
+def _normalize(query):
+    return re.sub(r'\s+', ' ', (query or '').replace('"', ' ')).strip().lower()
+
+
+def _trigrams(text):
+    """pg_trgm-style trigrams: each word padded with two leading and one trailing space"""
+    grams = set()
+    for word in text.split():
+        padded = f'  {word} '
+        grams.update(padded[i:i + 3] for i in range(len(padded) - 2))
+    return grams
+
+
+def _score(query, title, body):
+    """Title prefix > title substring > body substring > share of query trigrams found"""
+    title, body = (title or '').lower(), (body or '').lower()
+    if title.startswith(query):
+        return 3.0
+    if query in title:
+        return 2.0
+    if query in body:
+        return 1.0
+    grams = _trigrams(query)
+    return len(grams & _trigrams(body)) / len(grams) if grams else 0.0
+
+
+def _like_ids(conn, entity, business_owner_id, query, limit, prefix_only=False):
+    spec = SEARCH_ENTITIES[entity]
+    active = f" AND {spec['active']}" if spec['active'] else ''
+    if prefix_only and conn.dialect == 'postgresql':
+        condition, order = f"LOWER({spec['title']}) LIKE ?", f"LOWER({spec['title']})"
+    elif prefix_only:
+        # LIKE is case-insensitive in SQLite and uses the NOCASE title index
+        condition, order = f"{spec['title']} LIKE ?", f"{spec['title']} COLLATE NOCASE"
+    else:
+        condition, order = f"LOWER({_document(entity)}) LIKE ?", spec['title']
+    param = f'{query}%' if prefix_only else f'%{query}%'
+    rows = conn.execute(f'''
+        SELECT id FROM {spec['table']}
+        WHERE {spec['owner']} = ?{active} AND {condition}
+        ORDER BY {order}
+        LIMIT ?
+    ''', (business_owner_id, param, limit)).fetchall()
+    return [row['id'] for row in rows]
+
+
+def _fts_candidates(conn, entity, business_owner_id, match, limit):
+    # The scope phrase restricts the MATCH itself to this tenant's rows, so LIMIT
+    # counts only their hits. The trigram tokenizer folds case, hence the exact
+    # owner re-check. No ORDER BY: FTS5 streams matches in rowid order and stops
+    # at LIMIT, where bm25() would score every match first; Python re-ranks.
+    rows = conn.execute('''
+        SELECT d.entity_id, f.title, f.body
+        FROM search_fts f JOIN search_docs d ON d.doc_id = f.rowid
+        WHERE search_fts MATCH ? AND f.entity_type = ? AND f.business_owner_id = ?
+        LIMIT ?
+    ''', (f'scope : {_scope_match(entity, business_owner_id)} AND ({match})',
+          entity, business_owner_id, limit)).fetchall()
+    return [(row['entity_id'], row['title'], row['body']) for row in rows]
+
+
+def _fuzzy_matches(query):
+    """
+    FTS5 queries for a query with one typo, strictest first. A single edit
+    breaks at most three consecutive trigrams, so for longer queries every
+    other trigram must still match; short ones fall back to pairs, then any.
+    """
+    grams = [query[i:i + 3] for i in range(len(query) - 2)]
+    quoted = [f'"{gram}"' for gram in grams]
+    matches = []
+    if len(grams) >= 5:
+        matches.append(' OR '.join(
+            '(' + ' AND '.join(quoted[:i] + quoted[i + 3:]) + ')' for i in range(len(grams) - 2)))
+    if len(grams) >= 2:
+        matches.append(' OR '.join(f'({a} AND {b})' for a, b in zip(quoted, quoted[1:])))
+    matches.append(' OR '.join(quoted))
+    return matches
+
+
+def _sqlite_search(conn, entity, business_owner_id, query, limit):
+    ranked = {}
+
+    def collect(match, count, min_score=0.0):
+        for entity_id, title, body in _fts_candidates(conn, entity, business_owner_id, match, count):
+            if entity_id not in ranked:
+                score = _score(query, title, body)
+                if score >= min_score:
+                    ranked[entity_id] = (score, (title or '').lower())
+
+    # Title prefix (^ anchors the phrase at the start of the column), then substring anywhere
+    collect(f'title : ^"{query}"', limit)
+    if len(ranked) < limit:
+        collect(f'"{query}"', limit * 2)
+
+    # Typo tolerance for words (codes, phones and barcodes are matched exactly)
+    if len(ranked) < limit and not any(ch.isdigit() for ch in query):
+        for match in _fuzzy_matches(query):
+            collect(match, limit * 8, FUZZY_MIN_SCORE)
+            if len(ranked) >= limit:
+                break
+
+    return [entity_id for entity_id, _ in sorted(ranked.items(), key=lambda item: (-item[1][0], item[1][1]))]
+
+
+def _postgres_search(conn, entity, business_owner_id, query, limit):
+    spec = SEARCH_ENTITIES[entity]
+    document, title = _document(entity), spec['title']
+    active = f" AND {spec['active']}" if spec['active'] else ''
+    rows = conn.execute(f'''
+        SELECT id FROM {spec['table']}
+        WHERE {spec['owner']} = ?{active}
+          AND (({document}) ILIKE ? OR ? <% ({document}))
+        ORDER BY ({title} ILIKE ?) DESC, ({title} ILIKE ?) DESC,
+                 word_similarity(?, ({document})) DESC, {title}
+        LIMIT ?
+    ''', (business_owner_id, f'%{query}%', query, f'{query}%', f'%{query}%', query, limit)).fetchall()
+    return [row['id'] for row in rows]
+
+
+def search_ids(conn, entity, business_owner_id, query, limit=10):
+    """Ranked ids of `entity` rows of one tenant matching `query` (may include inactive rows on SQLite)"""
+    query = _normalize(query)
+    if not query or not business_owner_id:
+        return []
+    if len(query) < 3:
+        return _like_ids(conn, entity, business_owner_id, query, limit, prefix_only=True)
+    if not _index_ready(conn):
+        return _like_ids(conn, entity, business_owner_id, query, limit)
+    if conn.dialect == 'postgresql':
+        return _postgres_search(conn, entity, business_owner_id, query, limit)
+    return _sqlite_search(conn, entity, business_owner_id, query, limit)
+
+
+def search_rows(conn, entity, business_owner_id, query, limit=10, columns='*'):
+    """search_ids() + fetch of the matching active rows, in rank order"""
+    spec = SEARCH_ENTITIES[entity]
+    ids = search_ids(conn, entity, business_owner_id, query, limit * 2)
+    if not ids:
+        return []
+    active = f" AND {spec['active']}" if spec['active'] else ''
+    rows = conn.execute(f'''
+        SELECT {columns} FROM {spec['table']}
+        WHERE id IN ({', '.join('?' * len(ids))}){active}
+    ''', ids).fetchall()
+    position = {entity_id: i for i, entity_id in enumerate(ids)}
+    return sorted(rows, key=lambda row: position[row['id']])[:limit]
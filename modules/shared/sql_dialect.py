@@ -0,0 +1,351 @@
+"""
+Dialect-neutral SQL layer
+Lets the SQLite-flavoured queries used across modules (`?` placeholders,
+DATE('now', ...), strftime(), GROUP_CONCAT, INSERT OR IGNORE) run unchanged
+on PostgreSQL, and caches translated/prepared statements per connection.
+"""
+
+import os
+import re
+import threading
+from functools import lru_cache
+
+
+# ==================== SQL TRANSLATION ====================
+
+_STRFTIME_TO_PG = {
+    '%Y': 'YYYY', '%m': 'MM', '%d': 'DD', '%H': 'HH24', '%M': 'MI',
+    '%S': 'SS', '%W': 'IW', '%j': 'DDD', '%w': 'D', '%%': '%',
+}
+
+_UNIT_ALIASES = {
+    'day': 'days', 'days': 'days',
+    'hour': 'hours', 'hours': 'hours',
+    'minute': 'minutes', 'minutes': 'minutes',
+    'second': 'seconds', 'seconds': 'seconds',
+    'month': 'months', 'months': 'months',
+    'year': 'years', 'years': 'years',
+}
+
+_NOW_CALL = re.compile(r"\b(date|datetime)\s*\(\s*'now'((?:\s*,\s*'[^']*')*)\s*\)", re.IGNORECASE)
+_MODIFIER = re.compile(r"'([^']*)'")
+_SHIFT = re.compile(r'^([+-]?\d+)\s+([a-z]+)$')
+_WEEKDAY = re.compile(r'^weekday\s+([0-6])$')
+_STRFTIME_CALL = re.compile(r"\bstrftime\s*\(\s*'([^']*)'\s*,", re.IGNORECASE)
+_GROUP_CONCAT_CALL = re.compile(r'\bgroup_concat\s*\(', re.IGNORECASE)
+_IFNULL = re.compile(r'\bifnull\s*\(', re.IGNORECASE)
+_INSERT_OR_IGNORE = re.compile(r'^\s*insert\s+or\s+ignore\s+into\b', re.IGNORECASE)
+_BEGIN = re.compile(r'^\s*begin(\s+(deferred|immediate|exclusive))?(\s+transaction)?\s*;?\s*$', re.IGNORECASE)
+
+
+def _pg_now_expression(func, modifiers):
+    """Translate SQLite date('now', ...)/datetime('now', ...) into a PostgreSQL expression"""
+    is_date = func.lower() == 'date'
+    expr = 'CURRENT_DATE' if is_date else 'LOCALTIMESTAMP'
+    for modifier in _MODIFIER.findall(modifiers or ''):
+        modifier = modifier.strip().lower()
+        if modifier in ('localtime', 'utc', ''):
+            continue
+        if modifier == 'start of month':
+            expr = f"DATE_TRUNC('month', {expr})"
+            continue
+        if modifier == 'start of year':
+            expr = f"DATE_TRUNC('year', {expr})"
+            continue
+        if modifier == 'start of day':
+            expr = f"DATE_TRUNC('day', {expr})"
+            continue
+        weekday = _WEEKDAY.match(modifier)
+        if weekday:
+            # Advance to the next given weekday (0=Sunday), or stay if already on it
+            target = int(weekday.group(1))
+            expr = f"({expr} + ((({target} - EXTRACT(DOW FROM {expr})::int) + 7) % 7) * INTERVAL '1 day')"
+            continue
+        shift = _SHIFT.match(modifier)
+        if shift and shift.group(2) in _UNIT_ALIASES:
+            expr = f"({expr} + INTERVAL '{int(shift.group(1))} {_UNIT_ALIASES[shift.group(2)]}')"
+            continue
+        raise ValueError(f"Unsupported SQLite date modifier for PostgreSQL: '{modifier}'")
+    if is_date and expr != 'CURRENT_DATE':
+        expr = f'({expr})::date'
+    return expr
+
+
+def _split_call_args(sql, start):
+    """Return (args, end) for the call whose '(' was consumed right before `start`"""
+    depth, quote, args, current = 0, None, [], []
+    i = start
+    while i < len(sql):
+        ch = sql[i]
+        if quote:
+            current.append(ch)
+            if ch == quote:
+                quote = None
+        elif ch in ("'", '"'):
+            quote = ch
+            current.append(ch)
+        elif ch == '(':
+            depth += 1
+            current.append(ch)
+        elif ch == ')':
+            if depth == 0:
+                args.append(''.join(current).strip())
+                return args, i + 1
+            depth -= 1
+            current.append(ch)
+        elif ch == ',' and depth == 0:
+            args.append(''.join(current).strip())
+            current = []
+        else:
+            current.append(ch)
+        i += 1
+    raise ValueError('Unbalanced parentheses in SQL')
+
+
+def _rewrite_calls(sql, pattern, build):
+    """Rewrite every call matched by `pattern` using build(match, args)"""
+    out, pos = [], 0
+    while True:
+        match = pattern.search(sql, pos)
+        if not match:
+            out.append(sql[pos:])
+            return ''.join(out)
+        args, end = _split_call_args(sql, match.end())
+        out.append(sql[pos:match.start()])
+        out.append(build(match, args))
+        pos = end
+
+
+def _pg_strftime(match, args):
+    fmt = match.group(1)
+    for sqlite_code, pg_code in _STRFTIME_TO_PG.items():
+        fmt = fmt.replace(sqlite_code, pg_code)
+    expr = args[0]
+    if expr.strip().lower() == "'now'":
+        expr = 'LOCALTIMESTAMP'
+    else:
+        expr = f'({expr})::timestamp'
+    return f"to_char({expr}, '{fmt}')"
+
+
+def _pg_group_concat(match, args):
+    expr = args[0]
+    separator = args[1] if len(args) > 1 else "','"
+    distinct = ''
+    if expr.lower().startswith('distinct '):
+        distinct, expr = 'DISTINCT ', expr[len('distinct '):]
+    return f'STRING_AGG({distinct}CAST({expr} AS TEXT), {separator})'
+
+
+def _rewrite_placeholders(sql, style):
+    """
+    Replace `?` placeholders outside string literals/identifiers.
+    style='pyformat' -> %s (doubling literal %), style='numeric' -> $1, $2, ...
+    """
+    out, quote, count = [], None, 0
+    i = 0
+    while i < len(sql):
+        ch = sql[i]
+        if quote:
+            if ch == '%' and style == 'pyformat':
+                out.append('%%')
+            else:
+                out.append(ch)
+            if ch == quote:
+                quote = None
+        elif ch in ("'", '"'):
+            quote = ch
+            out.append(ch)
+        elif ch == '-' and sql.startswith('--', i):
+            end = sql.find('\n', i)
+            end = len(sql) if end == -1 else end
+            out.append(sql[i:end].replace('?', '').replace('%', '%%' if style == 'pyformat' else '%'))
+            i = end
+            continue
+        elif ch == '?':
+            count += 1
+            out.append('%s' if style == 'pyformat' else f'${count}')
+        elif ch == '%' and style == 'pyformat':
+            out.append('%%')
+        else:
+            out.append(ch)
+        i += 1
+    return ''.join(out), count
+
+
+@lru_cache(maxsize=2048)
+def _translate_functions_pg(sql):
+    sql = _NOW_CALL.sub(lambda m: _pg_now_expression(m.group(1), m.group(2)), sql)
+    sql = _rewrite_calls(sql, _STRFTIME_CALL, _pg_strftime)
+    sql = _rewrite_calls(sql, _GROUP_CONCAT_CALL, _pg_group_concat)
+    sql = _IFNULL.sub('COALESCE(', sql)
+    if _INSERT_OR_IGNORE.match(sql):
+        sql = _INSERT_OR_IGNORE.sub('INSERT INTO', sql, count=1).rstrip().rstrip(';')
+        sql += ' ON CONFLICT DO NOTHING'
+    return sql
+
+
+@lru_cache(maxsize=2048)
+def translate_sql(sql, dialect, has_params=True):
+    """
+    Compile a SQLite-style statement for the target dialect (cached per process).
+    SQLite statements are returned unchanged.
+    """
+    if dialect != 'postgresql':
+        return sql
+    sql = _translate_functions_pg(sql)
+    if not has_params:
+        return sql
+    translated, count = _rewrite_placeholders(sql, 'pyformat')
+    # No `?` means the caller already wrote psycopg2 (%s) placeholders
+    return translated if count else sql
+
+
+@lru_cache(maxsize=2048)
+def translate_sql_for_prepare(sql):
+    """Compile a SQLite-style statement into PREPARE form ($1, $2, ...) and its parameter count"""
+    return _rewrite_placeholders(_translate_functions_pg(sql), 'numeric')
+
+
+def is_begin_statement(sql):
+    """True for BEGIN / BEGIN TRANSACTION (psycopg2 opens transactions implicitly)"""
+    return bool(_BEGIN.match(sql))
+
+
+# ==================== DATE BUCKETING HELPERS ====================
+
+_BUCKET_FORMATS = {
+    # bucket: (sqlite strftime format, postgres to_char format)
+    'hour': ('%Y-%m-%d %H:00', 'YYYY-MM-DD HH24:00'),
+    'day': ('%Y-%m-%d', 'YYYY-MM-DD'),
+    'week': ('%Y-%W', 'IYYY-IW'),
+    'month': ('%Y-%m', 'YYYY-MM'),
+    'year': ('%Y', 'YYYY'),
+}
+
+
+def date_bucket_sql(column, bucket, dialect):
+    """SQL expression grouping `column` into a text bucket key ('2024-05', '2024-05-17', ...)"""
+    if bucket not in _BUCKET_FORMATS:
+        raise ValueError(f"Unknown date bucket: {bucket}")
+    sqlite_format, pg_format = _BUCKET_FORMATS[bucket]
+    if dialect == 'postgresql':
+        return f"to_char(({column})::timestamp, '{pg_format}')"
+    return f"strftime('{sqlite_format}', {column})"
+
+
+def relative_date_sql(dialect, days=0):
+    """SQL expression for today's date shifted by `days` (local time)"""
+    if dialect == 'postgresql':
+        return f"(CURRENT_DATE + INTERVAL '{int(days)} days')::date" if days else 'CURRENT_DATE'
+    return f"DATE('now', 'localtime', '{int(days):+d} days')" if days else "DATE('now', 'localtime')"
+
+
+def relative_timestamp_sql(dialect, minutes=0):
+    """SQL expression for the current timestamp shifted by `minutes`"""
+    if dialect == 'postgresql':
+        return f"(LOCALTIMESTAMP + INTERVAL '{int(minutes)} minutes')" if minutes else 'LOCALTIMESTAMP'
+    return f"datetime('now', '{int(minutes):+d} minutes')" if minutes else "datetime('now')"
+
+
+# ==================== POSTGRESQL CURSOR WRAPPER ====================
+
+def prepare_threshold_from_env():
+    """Executions of a statement before it is server-side prepared (0 disables)"""
+    return int(os.environ.get('DB_PREPARE_THRESHOLD', 5))
+
+
+class PreparedStatementCache:
+    """
+    Per-connection registry of server-side prepared statements.
+    A statement is PREPAREd once it has been executed `threshold` times on the
+    connection; afterwards it runs via EXECUTE and skips parse/plan.
+    """
+
+    MAX_STATEMENTS = 256
+
+    def __init__(self, threshold):
+        self.threshold = threshold
+        self._counts = {}
+        self._names = {}
+        self._unpreparable = set()
+        self._lock = threading.Lock()
+        self.hits = 0
+
+    def lookup(self, raw_cursor, sql):
+        """Return the prepared statement name for `sql`, preparing it if it is now hot"""
+        if self.threshold <= 0 or sql in self._unpreparable:
+            return None
+        name = self._names.get(sql)
+        if name:
+            self.hits += 1
+            return name
+        with self._lock:
+            count = self._counts.get(sql, 0) + 1
+            self._counts[sql] = count
+            if count < self.threshold or len(self._names) >= self.MAX_STATEMENTS:
+                return None
+            name = f'bp_stmt_{len(self._names) + 1}'
+        if self._prepare(raw_cursor, sql, name):
+            self._names[sql] = name
+            return name
+        self._unpreparable.add(sql)
+        return None
+
+    def _prepare(self, raw_cursor, sql, name):
+        if ';' in sql.strip().rstrip(';'):
+            return False
+        prepared_sql, param_count = translate_sql_for_prepare(sql)
+        if not param_count:
+            return False
+        # Savepoint keeps a failed PREPARE from aborting the caller's transaction
+        try:
+            raw_cursor.execute(f'SAVEPOINT bp_prepare; PREPARE {name} AS {prepared_sql}; RELEASE SAVEPOINT bp_prepare')
+            return True
+        except Exception:
+            try:
+                raw_cursor.execute('ROLLBACK TO SAVEPOINT bp_prepare; RELEASE SAVEPOINT bp_prepare')
+            except Exception:
+                pass
+            return False
+
+    def forget(self, sql):
+        self._names.pop(sql, None)
+        self._unpreparable.add(sql)
+
+
+class DialectCursor:
+    """psycopg2 cursor that accepts SQLite-style SQL and returns itself from execute()"""
+
+    def __init__(self, raw_cursor, statements=None):
+        self._raw = raw_cursor
+        self._statements = statements
+
+    def execute(self, sql, params=None):
+        if is_begin_statement(sql):
+            return self
+        has_params = params is not None and len(params) > 0
+        if has_params and self._statements is not None:
+            name = self._statements.lookup(self._raw, sql)
+            if name:
+                _, param_count = translate_sql_for_prepare(sql)
+                if param_count == len(params):
+                    try:
+                        self._raw.execute(f"EXECUTE {name} ({', '.join(['%s'] * param_count)})", tuple(params))
+                        return self
+                    except Exception:
+                        # e.g. plan invalidated by a schema change: stop preparing this one
+                        self._statements.forget(sql)
+                        raise
+        self._raw.execute(translate_sql(sql, 'postgresql', has_params), params if has_params else None)
+        return self
+
+    def executemany(self, sql, seq_of_params):
+        self._raw.executemany(translate_sql(sql, 'postgresql', True), seq_of_params)
+        return self
+
+    def __iter__(self):
+        return iter(self._raw)
+
+    def __getattr__(self, name):
+        return getattr(self._raw, name)
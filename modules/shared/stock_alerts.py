@@ -0,0 +1,171 @@
+"""
+Event-driven low-stock alerts
+The stock ledger calls check_crossing() for every outgoing movement, in the
+movement's transaction. A movement that takes a product's balance from above
+its threshold to at/below it ("low_stock"), or from above zero to zero or
+less ("out_of_stock"), queues one stock.threshold_crossed outbox event, so an
+alert exists exactly when the decrement committed and is sent within the
+outbox worker's poll interval - no catalogue scan.
+
+Threshold: the product's min_stock, or the tenant's
+notification_settings.low_stock_threshold when min_stock is not set.
+
+Dedup: stock_alert_state keeps, per (tenant, product, kind), when it last
+alerted. A crossing is only notified if that was more than
+STOCK_ALERT_DEDUP_MINUTES ago, so a product bouncing around its threshold
+(sale, return, sale) does not alert on every bounce. The claim is one
+conditional upsert, safe across workers.
+
+- check_crossing(conn, product_id, business_owner_id, prior, balance, min_stock)
+- claim_alerts(conn, alerts) -> claimed (tenant, product, kind) keys
+- forget_settings(business_owner_id) after notification settings change
+"""
+
+import os
+import threading
+import time
+from datetime import datetime, timedelta
+
+from .database import bulk_insert, generate_id, get_db_connection
+from .outbox import enqueue_events, register_handler
+
+STOCK_ALERT_DEDUP_MINUTES = float(os.environ.get('STOCK_ALERT_DEDUP_MINUTES', 1440))
+# Tenant settings are read at most this often per process (on the billing path)
+_SETTINGS_TTL = 60
+DEFAULT_THRESHOLD = 5
+
+_settings_cache = {}  # tenant -> (enabled, threshold, loaded_at)
+_settings_lock = threading.Lock()
+
+
+def init_stock_alert_tables(cursor, db_type='sqlite'):
+    """Create stock_alert_state (called from init_db)"""
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS stock_alert_state (
+            client_id VARCHAR(255) NOT NULL,
+            product_id VARCHAR(255) NOT NULL,
+            kind VARCHAR(20) NOT NULL,
+            stock_level INTEGER NOT NULL,
+            threshold_level INTEGER NOT NULL,
+            alerted_at TIMESTAMP NOT NULL,
+            PRIMARY KEY (client_id, product_id, kind)
+        )
+    ''')
+
+
+def _now(offset_seconds=0):
+    return (datetime.now() + timedelta(seconds=offset_seconds)).strftime('%Y-%m-%d %H:%M:%S')
+
+
+def tenant_settings(conn, business_owner_id):
+    """(alerts enabled, fallback threshold) for a tenant; defaults when it never saved settings"""
+    with _settings_lock:
+        cached = _settings_cache.get(business_owner_id)
+        if cached and time.monotonic() - cached[2] < _SETTINGS_TTL:
+            return cached[0], cached[1]
+    row = conn.execute('SELECT low_stock_enabled, low_stock_threshold FROM notification_settings WHERE client_id = ?',
+                       (business_owner_id,)).fetchone()
+    enabled = bool(row[0]) if row else True
+    threshold = int(row[1]) if row and row[1] is not None else DEFAULT_THRESHOLD
+    with _settings_lock:
+        _settings_cache[business_owner_id] = (enabled, threshold, time.monotonic())
+    return enabled, threshold
+
+
+def forget_settings(business_owner_id):
+    with _settings_lock:
+        _settings_cache.pop(business_owner_id, None)
+
+
+def crossing_kind(prior, balance, threshold):
+    """'out_of_stock' / 'low_stock' if prior -> balance crossed zero / the threshold, else None"""
+    if prior > 0 >= balance:
+        return 'out_of_stock'
+    if threshold > 0 and prior > threshold >= balance:
+        return 'low_stock'
+    return None
+
+
+def check_crossing(conn, product_id, business_owner_id, prior, balance, min_stock):
+    """Queue a stock.threshold_crossed event if this movement crossed a threshold; caller commits"""
+    if balance >= prior or not business_owner_id:
+        return None
+    threshold = int(min_stock or 0)
+    if threshold <= 0:
+        enabled, threshold = tenant_settings(conn, business_owner_id)
+        if not enabled:
+            return None
+    kind = crossing_kind(prior, balance, threshold)
+    if kind is None:
+        return None
+    enqueue_events(conn, 'product', product_id, [('stock.threshold_crossed', {
+        'business_owner_id': business_owner_id,
+        'product_id': product_id,
+        'kind': kind,
+        'stock': balance,
+        'prior': prior,
+        'threshold': threshold,
+    })], business_owner_id)
+    return kind
+
+
+def claim_alerts(conn, alerts, window_minutes=None):
+    """
+    Claim (client_id, product_id, kind, stock, threshold) alerts outside the
+    dedup window; returns the claimed (client_id, product_id, kind). Caller commits.
+    """
+    window_minutes = STOCK_ALERT_DEDUP_MINUTES if window_minutes is None else window_minutes
+    now, cutoff = _now(), _now(-window_minutes * 60)
+    claimed = set()
+    for i in range(0, len(alerts), 100):
+        chunk = alerts[i:i + 100]
+        params = []
+        for client_id, product_id, kind, stock, threshold in chunk:
+            params += [client_id, product_id, kind, int(stock), int(threshold), now]
+        rows = conn.execute(f'''
+            INSERT INTO stock_alert_state (client_id, product_id, kind, stock_level, threshold_level, alerted_at)
+            VALUES {', '.join(['(?, ?, ?, ?, ?, ?)'] * len(chunk))}
+            ON CONFLICT (client_id, product_id, kind) DO UPDATE
+            SET stock_level = excluded.stock_level, threshold_level = excluded.threshold_level,
+                alerted_at = excluded.alerted_at
+            WHERE stock_alert_state.alerted_at < ?
+            RETURNING client_id, product_id, kind
+        ''', params + [cutoff]).fetchall()
+        claimed.update((row[0], row[1], row[2]) for row in rows)
+    return claimed
+
+
+def alert_message(kind, name, stock, category):
+    if kind == 'out_of_stock':
+        return f"Out of Stock: {name} ({category})"
+    return f"Low Stock Alert: {name} - Only {stock} remaining ({category})"
+
+
+def insert_alert_notifications(conn, notifications):
+    """Bulk-insert (client_id, message) alert notifications; caller commits"""
+    now = datetime.now().isoformat()
+    return bulk_insert(conn, 'notifications',
+                       ('id', 'user_id', 'type', 'message', 'action_url', 'is_read', 'created_at'),
+                       [(generate_id(), client_id, 'alert', message, '/retail/products', 0, now)
+                        for client_id, message in notifications])
+
+
+@register_handler('stock.threshold_crossed')
+def handle_threshold_crossed(payload):
+    owner, product_id, kind = payload['business_owner_id'], payload['product_id'], payload['kind']
+    conn = get_db_connection()
+    try:
+        row = conn.execute('SELECT low_stock_enabled FROM notification_settings WHERE client_id = ?',
+                           (owner,)).fetchone()
+        if row is not None and not row[0]:
+            return
+        product = conn.execute('SELECT name, category FROM products WHERE id = ?', (product_id,)).fetchone()
+        if product is None:
+            return
+        if claim_alerts(conn, [(owner, product_id, kind, payload['stock'], payload['threshold'])]):
+            insert_alert_notifications(conn, [(owner, alert_message(kind, product['name'], payload['stock'],
+                                                                    product['category']))])
+            print(f"🔔 [STOCK ALERT] {kind}: {product['name']} (stock: {payload['stock']})")
+        conn.commit()
+    finally:
+        conn.close()
@@ -0,0 +1,394 @@
+"""
+Stock ledger - the single source of truth for stock
+Every stock movement is appended to stock_ledger; the per-product balance is
+materialized in products.stock (the column every screen already reads) and is
+updated in the SAME statement that assigns the entry its sequence number, so
+the ledger and the balance can never disagree and current stock is an O(1)
+primary-key read.
+
+- stock_ledger:    append-only, one row per movement, signed quantity,
+                   per-product seq and balance_after (history = range scans)
+- products.stock:  materialized balance; products.ledger_seq = last seq
+- stock_snapshots: checkpoint of the balance every STOCK_SNAPSHOT_INTERVAL
+                   entries, so verification only sums entries since the
+                   last checkpoint
+
+Write paths call post_movement() / set_stock() on their own connection, inside
+their transaction. A decrement that crosses the product's low-stock threshold
+queues its alert in the same transaction (see stock_alerts.py), and a receipt
+with a unit cost re-averages products.cost (see costing.py).
+reconcile_stock_sources() is the one-time migration from the
+older, divergent sources (products.stock, current_stock and the two
+stock_transactions conventions: signed 'IN'/'OUT' vs unsigned 'in'/'out').
+"""
+
+import os
+import sqlite3
+from datetime import datetime
+
+from . import barcode_index, costing, stock_alerts
+from .database import bulk_insert, copy_insert, generate_id
+
+STOCK_SNAPSHOT_INTERVAL = int(os.environ.get('STOCK_SNAPSHOT_INTERVAL', 200))
+
+# Optional structured details of a movement (purchase supplier and batch, sale customer)
+LEDGER_DETAIL_COLUMNS = ('supplier_name', 'customer_name', 'batch_number', 'expiry_date')
+
+LEDGER_COLUMNS = ('id', 'product_id', 'business_owner_id', 'seq', 'transaction_type', 'quantity',
+                  'balance_after', 'unit_cost', 'reference_type', 'reference_id', 'notes',
+                  'created_by', 'created_at') + LEDGER_DETAIL_COLUMNS
+NO_DETAILS = (None,) * len(LEDGER_DETAIL_COLUMNS)
+
+
+def init_stock_ledger_tables(cursor, db_type='sqlite'):
+    """Create the ledger and snapshot tables and products.ledger_seq (called from init_db)"""
+    if db_type == 'postgresql':
+        cursor.execute('ALTER TABLE products ADD COLUMN IF NOT EXISTS ledger_seq INTEGER DEFAULT 0')
+    else:
+        try:
+            cursor.execute('ALTER TABLE products ADD COLUMN ledger_seq INTEGER DEFAULT 0')
+        except sqlite3.OperationalError:
+            pass
+    money = 'NUMERIC(12,2)' if db_type == 'postgresql' else 'REAL'
+    cursor.execute(f'''
+        CREATE TABLE IF NOT EXISTS stock_ledger (
+            id VARCHAR(255) PRIMARY KEY,
+            product_id VARCHAR(255) NOT NULL,
+            business_owner_id VARCHAR(255),
+            seq INTEGER NOT NULL,
+            transaction_type VARCHAR(20) NOT NULL,
+            quantity INTEGER NOT NULL,
+            balance_after INTEGER NOT NULL,
+            unit_cost {money},
+            reference_type VARCHAR(50),
+            reference_id VARCHAR(255),
+            notes TEXT,
+            created_by VARCHAR(255),
+            created_at TIMESTAMP NOT NULL,
+            supplier_name TEXT,
+            customer_name TEXT,
+            batch_number TEXT,
+            expiry_date DATE,
+            UNIQUE(product_id, seq)
+        )
+    ''')
+    for column, definition in (('supplier_name', 'TEXT'), ('customer_name', 'TEXT'),
+                               ('batch_number', 'TEXT'), ('expiry_date', 'DATE')):
+        if db_type == 'postgresql':
+            cursor.execute(f'ALTER TABLE stock_ledger ADD COLUMN IF NOT EXISTS {column} {definition}')
+        else:
+            try:
+                cursor.execute(f'ALTER TABLE stock_ledger ADD COLUMN {column} {definition}')
+            except sqlite3.OperationalError:
+                pass
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_stock_ledger_product_created ON stock_ledger(product_id, created_at)')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_stock_ledger_owner_created ON stock_ledger(business_owner_id, created_at)')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_stock_ledger_reference ON stock_ledger(reference_type, reference_id)')
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS stock_snapshots (
+            product_id VARCHAR(255) NOT NULL,
+            seq INTEGER NOT NULL,
+            quantity INTEGER NOT NULL,
+            business_owner_id VARCHAR(255),
+            created_at TIMESTAMP NOT NULL,
+            PRIMARY KEY (product_id, seq)
+        )
+    ''')
+
+
+def _now():
+    return datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+
+
+def _append(conn, product_id, seq, quantity, balance_after, business_owner_id, reference_type,
+            reference_id=None, notes=None, created_by=None, unit_cost=None, transaction_type=None,
+            details=None):
+    now = _now()
+    if transaction_type is None:
+        transaction_type = 'IN' if quantity > 0 else 'OUT'
+    details = details or {}
+    bulk_insert(conn, 'stock_ledger', LEDGER_COLUMNS, [(
+        generate_id(), product_id, business_owner_id, seq, transaction_type, quantity,
+        balance_after, unit_cost, reference_type, reference_id, notes, created_by, now
+    ) + tuple(details.get(column) or None for column in LEDGER_DETAIL_COLUMNS)])
+    if STOCK_SNAPSHOT_INTERVAL > 0 and seq % STOCK_SNAPSHOT_INTERVAL == 0:
+        conn.execute('''
+            INSERT INTO stock_snapshots (product_id, seq, quantity, business_owner_id, created_at)
+            VALUES (?, ?, ?, ?, ?)
+        ''', (product_id, seq, balance_after, business_owner_id, now))
+
+
+def _append_movement(conn, product_id, row, quantity, business_owner_id, reference_type, reference_id,
+                     notes, created_by, unit_cost=None, transaction_type=None, details=None):
+    """Ledger entry for a balance update that returned (stock, ledger_seq, user_id, min_stock)"""
+    seq, balance = row['ledger_seq'], row['stock']
+    owner = business_owner_id or row['user_id']
+    prior = balance - quantity
+    if seq == 1 and prior != 0:
+        # First movement of a product that was never in the ledger: record the
+        # stock it already had so the ledger still sums to the balance
+        seq = 2
+        conn.execute('UPDATE products SET ledger_seq = ? WHERE id = ?', (seq, product_id))
+        _append(conn, product_id, 1, prior, prior, owner, 'opening', product_id, 'Opening stock')
+    _append(conn, product_id, seq, quantity, balance, owner, reference_type, reference_id,
+            notes, created_by, unit_cost, transaction_type, details)
+    # Scans must not see stock from a transaction that may still roll back
+    conn.after_commit(lambda: barcode_index.note_stock(row['user_id'], product_id, balance))
+    stock_alerts.check_crossing(conn, product_id, row['user_id'], balance - quantity, balance, row['min_stock'])
+
+
+def post_movement(conn, product_id, quantity, reference_type, reference_id=None, business_owner_id=None,
+                  created_by=None, notes=None, unit_cost=None, transaction_type=None, require_available=False,
+                  details=None):
+    """
+    Apply a signed stock movement and append it to the ledger.
+    With require_available, an outgoing movement only applies if enough stock is
+    on hand (check-and-decrement in one statement). Returns the new balance, or
+    None if the product does not exist or stock is insufficient.
+    A receipt with a unit_cost re-averages the product's cost (costing.py).
+    `details` fills LEDGER_DETAIL_COLUMNS, e.g. {'supplier_name': ..., 'batch_number': ...}.
+    Caller commits.
+    """
+    if unit_cost and quantity > 0:
+        costing.apply_receipt(conn, product_id, quantity, unit_cost)
+    guard, params = '', [quantity, product_id]
+    if require_available and quantity < 0:
+        guard = ' AND stock >= ?'
+        params.append(-quantity)
+    row = conn.execute(f'''
+        UPDATE products SET stock = COALESCE(stock, 0) + ?, ledger_seq = COALESCE(ledger_seq, 0) + 1
+        WHERE id = ?{guard}
+        RETURNING stock, ledger_seq, user_id, min_stock
+    ''', params).fetchone()
+    if row is None:
+        return None
+
+    _append_movement(conn, product_id, row, quantity, business_owner_id, reference_type, reference_id,
+                     notes, created_by, unit_cost, transaction_type, details)
+    return row['stock']
+
+
+def set_stock(conn, product_id, new_quantity, reference_type='adjustment', reference_id=None,
+              business_owner_id=None, created_by=None, notes=None, attempts=3):
+    """
+    Set a product's stock to an absolute count (edit forms, stock takes) by
+    posting the difference as an ADJUSTMENT. The difference is applied with a
+    compare-and-set on the balance it was computed from, so a concurrent sale
+    is never overwritten. Returns the new balance, or None if the product is missing.
+    """
+    new_quantity = int(new_quantity)
+    for _ in range(attempts):
+        current = conn.execute('SELECT stock FROM products WHERE id = ?', (product_id,)).fetchone()
+        if current is None:
+            return None
+        old_quantity = int(current['stock'] or 0)
+        difference = new_quantity - old_quantity
+        if difference == 0:
+            return old_quantity
+
+        row = conn.execute('''
+            UPDATE products SET stock = ?, ledger_seq = COALESCE(ledger_seq, 0) + 1
+            WHERE id = ? AND COALESCE(stock, 0) = ?
+            RETURNING stock, ledger_seq, user_id, min_stock
+        ''', (new_quantity, product_id, old_quantity)).fetchone()
+        if row is not None:
+            _append_movement(conn, product_id, row, difference, business_owner_id, reference_type,
+                             reference_id, notes, created_by, transaction_type='ADJUSTMENT')
+            return row['stock']
+    raise RuntimeError(f"Stock for product {product_id} kept changing; adjustment not applied")
+
+
+def record_opening_stock(conn, product_id, business_owner_id=None, created_by=None, notes=None, unit_cost=None):
+    """
+    Ledger entry for the stock a product was inserted with (INSERT INTO products
+    ... stock = N). Balance is unchanged; only the history is recorded.
+    """
+    row = conn.execute('''
+        UPDATE products SET ledger_seq = COALESCE(ledger_seq, 0) + 1
+        WHERE id = ? AND COALESCE(ledger_seq, 0) = 0 AND COALESCE(stock, 0) <> 0
+        RETURNING stock, ledger_seq, user_id
+    ''', (product_id,)).fetchone()
+    if row is None:
+        return None
+    _append(conn, product_id, row['ledger_seq'], row['stock'], row['stock'],
+            business_owner_id or row['user_id'], 'opening', product_id,
+            notes or 'Opening stock', created_by, unit_cost)
+    return row['stock']
+
+
+def bulk_opening_stock(conn, entries, created_by=None):
+    """
+    Ledger entries for many products inserted with their opening stock and
+    ledger_seq = 1 (bulk imports): [(product_id, stock, business_owner_id, unit_cost), ...].
+    One bulk load instead of record_opening_stock() per product.
+    """
+    now = _now()
+    rows = [(generate_id(), product_id, owner, 1, 'IN' if stock > 0 else 'OUT', stock, stock, unit_cost,
+             'opening', product_id, 'Opening stock', created_by or owner, now) + NO_DETAILS
+            for product_id, stock, owner, unit_cost in entries if stock]
+    copy_insert(conn, 'stock_ledger', LEDGER_COLUMNS, rows)
+    if STOCK_SNAPSHOT_INTERVAL == 1:
+        bulk_insert(conn, 'stock_snapshots', ('product_id', 'seq', 'quantity', 'business_owner_id', 'created_at'),
+                    [(row[1], 1, row[5], row[2], now) for row in rows])
+    return len(rows)
+
+
+def stock_history(conn, product_id=None, business_owner_id=None, start=None, end=None, limit=50):
+    """Newest-first ledger entries for a product or a tenant, optionally in [start, end)"""
+    where, params = [], []
+    if product_id:
+        where.append('l.product_id = ?')
+        params.append(product_id)
+    if business_owner_id:
+        where.append('l.business_owner_id = ?')
+        params.append(business_owner_id)
+    if start:
+        where.append('l.created_at >= ?')
+        params.append(start)
+    if end:
+        where.append('l.created_at < ?')
+        params.append(end)
+    rows = conn.execute(f'''
+        SELECT l.*, p.name as product_name
+        FROM stock_ledger l
+        LEFT JOIN products p ON l.product_id = p.id
+        WHERE {' AND '.join(where) or '1=1'}
+        ORDER BY l.created_at DESC, l.seq DESC
+        LIMIT ?
+    ''', params + [limit]).fetchall()
+    return [dict(row) for row in rows]
+
+
+def stock_at(conn, product_id, at):
+    """Balance of a product just before timestamp `at` (0 if it had no movements yet)"""
+    row = conn.execute('''
+        SELECT balance_after FROM stock_ledger
+        WHERE product_id = ? AND created_at < ?
+        ORDER BY created_at DESC, seq DESC
+        LIMIT 1
+    ''', (product_id, at)).fetchone()
+    return int(row['balance_after']) if row else 0
+
+
+def verify_balances(conn, business_owner_id=None):
+    """
+    Products whose materialized balance differs from latest snapshot + entries
+    since it. Returns [{product_id, stock, ledger_stock, ledger_seq, last_seq}].
+    """
+    owner_sql, params = '', []
+    if business_owner_id:
+        owner_sql = ' AND p.user_id = ?'
+        params.append(business_owner_id)
+    rows = conn.execute(f'''
+        SELECT p.id as product_id, COALESCE(p.stock, 0) as stock, COALESCE(p.ledger_seq, 0) as ledger_seq,
+               COALESCE(s.quantity, 0) + COALESCE(SUM(l.quantity), 0) as ledger_stock,
+               COALESCE(MAX(l.seq), s.seq, 0) as last_seq
+        FROM products p
+        LEFT JOIN stock_snapshots s ON s.product_id = p.id
+             AND s.seq = (SELECT MAX(seq) FROM stock_snapshots WHERE product_id = p.id)
+        LEFT JOIN stock_ledger l ON l.product_id = p.id AND l.seq > COALESCE(s.seq, 0)
+        WHERE COALESCE(p.ledger_seq, 0) > 0{owner_sql}
+        GROUP BY p.id, p.stock, p.ledger_seq, s.quantity, s.seq
+    ''', params).fetchall()
+    return [dict(row) for row in rows
+            if int(row['stock']) != int(row['ledger_stock']) or int(row['ledger_seq']) != int(row['last_seq'])]
+
+
+def _table_exists(conn, table):
+    if conn.dialect == 'postgresql':
+        return conn.execute('SELECT to_regclass(?) IS NOT NULL as present', (table,)).fetchone()['present']
+    return conn.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (table,)).fetchone() is not None
+
+
+def _legacy_transactions(conn):
+    """Rows of the old stock_transactions table, normalized to signed quantities"""
+    if not _table_exists(conn, 'stock_transactions'):
+        return {}
+    # SELECT *: the two writers created the table with different optional columns
+    rows = [dict(row) for row in conn.execute('''
+        SELECT * FROM stock_transactions
+        ORDER BY product_id, created_at
+    ''').fetchall()]
+
+    by_product = {}
+    for row in rows:
+        kind, quantity = row['transaction_type'] or '', int(row['quantity'] or 0)
+        if kind == 'in':            # integrated_inventory: unsigned quantity
+            quantity = abs(quantity)
+        elif kind == 'out':
+            quantity = -abs(quantity)
+        # 'IN' / 'OUT' / 'ADJUSTMENT' (stock module) are already signed
+        if quantity == 0:
+            continue
+        by_product.setdefault(row['product_id'], []).append((row, quantity))
+    return by_product
+
+
+def reconcile_stock_sources(conn, business_owner_id=None):
+    """
+    One-time migration into the ledger for products that have no ledger entries yet.
+    Legacy stock_transactions are replayed in time order; a final 'reconciliation'
+    adjustment brings the ledger to products.stock (the balance billing has always
+    decremented), noting what current_stock and the transaction sum said.
+    Caller commits. Returns counts for reporting.
+    """
+    legacy = _legacy_transactions(conn)
+    cached = {}
+    if _table_exists(conn, 'current_stock'):
+        cached = {row['product_id']: int(row['current_quantity'] or 0)
+                  for row in conn.execute('SELECT product_id, current_quantity FROM current_stock').fetchall()}
+
+    owner_sql, params = '', []
+    if business_owner_id:
+        owner_sql = ' AND user_id = ?'
+        params.append(business_owner_id)
+    products = conn.execute(f'''
+        SELECT id, COALESCE(stock, 0) as stock, user_id FROM products
+        WHERE COALESCE(ledger_seq, 0) = 0{owner_sql}
+    ''', params).fetchall()
+
+    summary = {'products': 0, 'entries': 0, 'divergent': 0}
+    now = _now()
+    ledger_rows, snapshot_rows = [], []
+    for product in products:
+        product_id, stock, owner = product['id'], int(product['stock']), product['user_id']
+        entries, balance = [], 0
+        for row, quantity in legacy.get(product_id, []):
+            balance += quantity
+            entries.append((
+                generate_id(), product_id, row['business_owner_id'] or owner, len(entries) + 1,
+                'IN' if quantity > 0 else 'OUT', quantity, balance, None,
+                row['reference_type'], row['reference_id'], row['notes'], row['created_by'],
+                str(row['created_at'] or now)[:19].replace('T', ' ')
+            ) + tuple(row.get(column) or None for column in LEDGER_DETAIL_COLUMNS))
+
+        if (entries and balance != stock) or cached.get(product_id, stock) != stock:
+            summary['divergent'] += 1
+        if stock != balance:
+            sources = f"products.stock={stock}, transactions={balance}"
+            if product_id in cached:
+                sources += f", current_stock={cached[product_id]}"
+            entries.append((
+                generate_id(), product_id, owner, len(entries) + 1, 'ADJUSTMENT',
+                stock - balance, stock, None, 'reconciliation' if entries else 'opening', None,
+                f"Ledger migration ({sources})", None, now
+            ) + NO_DETAILS)
+        if not entries:
+            continue
+
+        # Claim the product only if its balance didn't move since we read it
+        claimed = conn.execute('''
+            UPDATE products SET ledger_seq = ?
+            WHERE id = ? AND COALESCE(ledger_seq, 0) = 0 AND COALESCE(stock, 0) = ?
+        ''', (len(entries), product_id, stock))
+        if not claimed.rowcount:
+            continue
+        ledger_rows.extend(entries)
+        snapshot_rows.append((product_id, len(entries), stock, owner, now))
+        summary['products'] += 1
+        summary['entries'] += len(entries)
+
+    bulk_insert(conn, 'stock_ledger', LEDGER_COLUMNS, ledger_rows)
+    bulk_insert(conn, 'stock_snapshots', ('product_id', 'seq', 'quantity', 'business_owner_id', 'created_at'),
+                snapshot_rows)
+    return summary
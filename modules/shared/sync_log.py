@@ -0,0 +1,445 @@
+"""
+Durable sync event log shared by every worker process
+Multi-device sync events used to live in per-process dicts (lost on restart,
+invisible to devices connected to another gunicorn worker). They are now
+appended to sync_log with a per-tenant sequence number, so a device that was
+offline catches up with an indexed range read: seq > its last seen seq.
+
+- sync_log:       append-only events, UNIQUE(business_owner_id, seq)
+- sync_log_heads: per-tenant last_seq (assigned in the same statement that
+                  bumps it, so seqs are gap-free and commit in order per
+                  tenant) and trimmed_seq (highest seq removed by retention;
+                  a cursor below it must resync from a snapshot)
+
+Retention (compact_sync_log): events older than SYNC_LOG_RETENTION_DAYS are
+deleted; events older than SYNC_LOG_COMPACT_AFTER_HOURS that a later event for
+the same record supersedes are dropped first, so a late catch-up replays only
+the latest change per record.
+
+Fan-out (SyncFanout): each process tails sync_log_heads for the tenants whose
+devices are connected to it and emits new events to their socket rooms, so an
+event appended by any worker reaches every device without a shared broker.
+Devices that connect with ?batch=json|gzip|msgpack get one data_sync_batch
+frame per tenant per poll (a 50-line bill is one frame, not 50 messages);
+the fan-out waits SYNC_COALESCE_MS after a wake-up so a burst of commits
+lands in the same frame. Older clients keep one data_sync per event.
+"""
+
+import gzip
+import json
+import os
+import threading
+import time
+from datetime import datetime, timedelta
+
+from .database import get_db_connection
+
+# Optional: binary frames for native clients (pip install msgpack)
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+SYNC_LOG_RETENTION_DAYS = float(os.environ.get('SYNC_LOG_RETENTION_DAYS', 7))
+SYNC_LOG_COMPACT_AFTER_HOURS = float(os.environ.get('SYNC_LOG_COMPACT_AFTER_HOURS', 1))
+SYNC_LOG_COMPACT_INTERVAL = float(os.environ.get('SYNC_LOG_COMPACT_INTERVAL', 3600))
+SYNC_COALESCE_MS = float(os.environ.get('SYNC_COALESCE_MS', 50))
+SYNC_COMPRESS_MIN_BYTES = int(os.environ.get('SYNC_COMPRESS_MIN_BYTES', 1024))
+SYNC_PAGE_LIMIT = 500
+
+# Delivery modes: 'events' = one data_sync per event (legacy clients), the
+# others = data_sync_batch frames in that encoding
+BATCH_ENCODINGS = ('json', 'gzip', 'msgpack')
+# Column order of each event in a batch frame
+BATCH_FIELDS = ('seq', 'event_type', 'data', 'timestamp', 'source_session')
+
+_last_compaction = 0.0
+
+
+def init_sync_log_tables(cursor, db_type='sqlite'):
+    """Create sync_log and sync_log_heads (called from init_db)"""
+    pk = 'SERIAL PRIMARY KEY' if db_type == 'postgresql' else 'INTEGER PRIMARY KEY AUTOINCREMENT'
+    cursor.execute(f'''
+        CREATE TABLE IF NOT EXISTS sync_log (
+            id {pk},
+            business_owner_id VARCHAR(255) NOT NULL,
+            seq INTEGER NOT NULL,
+            event_type VARCHAR(20) NOT NULL,
+            table_name VARCHAR(100),
+            record_id VARCHAR(255),
+            payload TEXT,
+            source_session VARCHAR(255),
+            created_at TIMESTAMP NOT NULL,
+            UNIQUE(business_owner_id, seq)
+        )
+    ''')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_sync_log_record ON sync_log(business_owner_id, table_name, record_id, seq)')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_sync_log_created ON sync_log(created_at)')
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS sync_log_heads (
+            business_owner_id VARCHAR(255) PRIMARY KEY,
+            last_seq INTEGER NOT NULL DEFAULT 0,
+            trimmed_seq INTEGER NOT NULL DEFAULT 0
+        )
+    ''')
+
+
+def _now(offset_seconds=0):
+    return (datetime.now() + timedelta(seconds=offset_seconds)).strftime('%Y-%m-%d %H:%M:%S')
+
+
+def _to_event(row, business_owner_id):
+    return {
+        'id': f"sync_{row['seq']}",
+        'seq': row['seq'],
+        'user_id': business_owner_id,
+        'event_type': row['event_type'],
+        'data': json.loads(row['payload']) if row['payload'] else {},
+        'timestamp': str(row['created_at']),
+        'source_session': row['source_session'],
+    }
+
+
+def append_events(conn, business_owner_id, items, source_session=None):
+    """
+    Append (event_type, data) items for a tenant with consecutive seqs and
+    return them. Runs on the caller's connection (so it can share the write's
+    transaction); caller commits.
+    """
+    if not items:
+        return []
+    row = conn.execute('''
+        INSERT INTO sync_log_heads (business_owner_id, last_seq, trimmed_seq) VALUES (?, ?, 0)
+        ON CONFLICT (business_owner_id) DO UPDATE SET last_seq = sync_log_heads.last_seq + ?
+        RETURNING last_seq
+    ''', (business_owner_id, len(items), len(items))).fetchone()
+    first_seq = row['last_seq'] - len(items) + 1
+    created_at = _now()
+
+    events, rows = [], []
+    for offset, (event_type, data) in enumerate(items):
+        data = data if isinstance(data, dict) else {'value': data}
+        record = data.get('record') if isinstance(data.get('record'), dict) else data
+        record_id = record.get('id')
+        event_row = {
+            'seq': first_seq + offset,
+            'event_type': event_type,
+            'payload': json.dumps(data, default=str),
+            'source_session': source_session,
+            'created_at': created_at,
+        }
+        rows.append((business_owner_id, event_row['seq'], event_type, data.get('table'),
+                     str(record_id) if record_id is not None else None, event_row['payload'],
+                     source_session, created_at))
+        events.append(_to_event(event_row, business_owner_id))
+    conn.executemany('''
+        INSERT INTO sync_log (business_owner_id, seq, event_type, table_name, record_id, payload,
+                              source_session, created_at)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+    ''', rows)
+    return events
+
+
+def append_event(conn, business_owner_id, event_type, data, source_session=None):
+    """Append one event for a tenant and return it; caller commits"""
+    return append_events(conn, business_owner_id, [(event_type, data)], source_session)[0]
+
+
+def record_events(business_owner_id, items, source_session=None):
+    """append_events on its own connection, committed in one transaction, then wake the local fan-out"""
+    conn = get_db_connection()
+    try:
+        events = append_events(conn, business_owner_id, items, source_session)
+        conn.commit()
+    finally:
+        conn.close()
+    sync_fanout.wake()
+    return events
+
+
+def record_event(business_owner_id, event_type, data, source_session=None):
+    """record_events for a single event"""
+    return record_events(business_owner_id, [(event_type, data)], source_session)[0]
+
+
+def head_seq(conn, business_owner_id):
+    row = conn.execute('SELECT last_seq FROM sync_log_heads WHERE business_owner_id = ?',
+                       (business_owner_id,)).fetchone()
+    return int(row['last_seq']) if row else 0
+
+
+def events_after(conn, business_owner_id, after_seq=0, limit=SYNC_PAGE_LIMIT):
+    """
+    Events with seq > after_seq, oldest first, at most `limit`.
+    reset_required means events after the cursor were removed by retention
+    and the client must reload a snapshot before continuing from head_seq.
+    """
+    after_seq = max(0, int(after_seq or 0))
+    limit = max(1, min(int(limit), SYNC_PAGE_LIMIT))
+    rows = conn.execute('''
+        SELECT seq, event_type, payload, source_session, created_at FROM sync_log
+        WHERE business_owner_id = ? AND seq > ?
+        ORDER BY seq LIMIT ?
+    ''', (business_owner_id, after_seq, limit + 1)).fetchall()
+    head = conn.execute('SELECT last_seq, trimmed_seq FROM sync_log_heads WHERE business_owner_id = ?',
+                        (business_owner_id,)).fetchone()
+    events = [_to_event(row, business_owner_id) for row in rows[:limit]]
+    return {
+        'events': events,
+        'head_seq': int(head['last_seq']) if head else 0,
+        'next_after_seq': events[-1]['seq'] if events else after_seq,
+        'has_more': len(rows) > limit,
+        'reset_required': bool(head) and after_seq < int(head['trimmed_seq']),
+    }
+
+
+def events_since(conn, business_owner_id, since_timestamp, limit=SYNC_PAGE_LIMIT):
+    """Legacy timestamp cursor: the first seq created after `since_timestamp`, then events_after"""
+    row = conn.execute('''
+        SELECT MIN(seq) as first_seq FROM sync_log
+        WHERE business_owner_id = ? AND created_at > ?
+    ''', (business_owner_id, str(since_timestamp).replace('T', ' ')[:19])).fetchone()
+    if row is None or row['first_seq'] is None:
+        return events_after(conn, business_owner_id, head_seq(conn, business_owner_id), limit)
+    return events_after(conn, business_owner_id, int(row['first_seq']) - 1, limit)
+
+
+def compact_sync_log(conn, retention_days=None, compact_after_hours=None):
+    """Drop superseded and expired events; caller commits. Returns the counts removed."""
+    retention_days = SYNC_LOG_RETENTION_DAYS if retention_days is None else retention_days
+    compact_after_hours = SYNC_LOG_COMPACT_AFTER_HOURS if compact_after_hours is None else compact_after_hours
+
+    compact_cutoff = _now(-compact_after_hours * 3600)
+    superseded = conn.execute('''
+        DELETE FROM sync_log
+        WHERE created_at < ? AND record_id IS NOT NULL AND EXISTS (
+            SELECT 1 FROM sync_log newer
+            WHERE newer.business_owner_id = sync_log.business_owner_id
+              AND newer.table_name = sync_log.table_name
+              AND newer.record_id = sync_log.record_id
+              AND newer.seq > sync_log.seq
+        )
+    ''', (compact_cutoff,)).rowcount
+
+    expire_cutoff = _now(-retention_days * 86400)
+    conn.execute('''
+        UPDATE sync_log_heads SET trimmed_seq = (
+            SELECT MAX(seq) FROM sync_log
+            WHERE sync_log.business_owner_id = sync_log_heads.business_owner_id AND created_at < ?
+        )
+        WHERE business_owner_id IN (SELECT DISTINCT business_owner_id FROM sync_log WHERE created_at < ?)
+    ''', (expire_cutoff, expire_cutoff))
+    expired = conn.execute('DELETE FROM sync_log WHERE created_at < ?', (expire_cutoff,)).rowcount
+    return {'superseded': max(0, superseded), 'expired': max(0, expired)}
+
+
+def maybe_compact_sync_log():
+    """
+    compact_sync_log (and prune delta-sync tombstones) at most once per
+    SYNC_LOG_COMPACT_INTERVAL in this process
+    """
+    from .row_versions import prune_tombstones
+    global _last_compaction
+    if time.monotonic() - _last_compaction < SYNC_LOG_COMPACT_INTERVAL:
+        return None
+    _last_compaction = time.monotonic()
+    conn = get_db_connection()
+    try:
+        removed = compact_sync_log(conn)
+        removed['tombstones'] = max(0, prune_tombstones(conn))
+        conn.commit()
+    finally:
+        conn.close()
+    if any(removed.values()):
+        print(f"🧹 Sync log: {removed['superseded']} superseded and {removed['expired']} expired events, "
+              f"{removed['tombstones']} tombstones removed")
+    return removed
+
+
+def negotiate_batch_mode(requested):
+    """Delivery mode for a device's ?batch= value; msgpack falls back to json when not installed"""
+    requested = (requested or '').strip().lower()
+    if requested in ('', '0', 'false', 'no'):
+        return 'events'
+    if requested == 'msgpack' and msgpack is None:
+        return 'json'
+    return requested if requested in BATCH_ENCODINGS else 'json'
+
+
+def sync_room(tenant_id, mode):
+    """Socket room of a tenant's devices that receive `mode` deliveries"""
+    return f"sync_{tenant_id}_{mode}"
+
+
+def batch_frame(tenant_id, events):
+    """One compact frame for consecutive events: field names once, events as rows"""
+    return {
+        'user_id': tenant_id,
+        'first_seq': events[0]['seq'],
+        'last_seq': events[-1]['seq'],
+        'fields': BATCH_FIELDS,
+        'events': [[event[field] for field in BATCH_FIELDS] for event in events],
+    }
+
+
+def encode_batch(frame, encoding):
+    """
+    Socket payload for a batch frame. gzip / msgpack put the bytes in
+    'payload' (sent as a binary attachment); small or json frames go as-is.
+    """
+    if encoding == 'msgpack' and msgpack is not None:
+        return {'encoding': 'msgpack', 'payload': msgpack.packb(frame, default=str)}
+    if encoding == 'gzip':
+        body = json.dumps(frame, default=str, separators=(',', ':')).encode('utf-8')
+        if len(body) >= SYNC_COMPRESS_MIN_BYTES:
+            return {'encoding': 'gzip', 'payload': gzip.compress(body, compresslevel=6)}
+    return {'encoding': None, 'frame': frame}
+
+
+class SyncFanout:
+    """Per-process tailer: emits new sync_log events to this process's connected tenants"""
+
+    def __init__(self, poll_interval=0.5, batch_size=SYNC_PAGE_LIMIT, coalesce_window=0.05):
+        self.poll_interval = poll_interval
+        self.batch_size = batch_size
+        self.coalesce_window = coalesce_window
+        self.running = False
+        self._socketio = None
+        self._thread = None
+        self._wakeup = threading.Event()
+        self._lock = threading.Lock()
+        self._tenants = {}  # tenant_id -> [{delivery mode: connected sessions}, last emitted seq]
+        self._metrics = {'emitted': 0, 'frames': 0, 'polls': 0, 'errors': 0}
+
+    def track(self, tenant_id, mode='events'):
+        """A device of this tenant connected here; new events are emitted from the current head on"""
+        with self._lock:
+            if tenant_id in self._tenants:
+                modes = self._tenants[tenant_id][0]
+                modes[mode] = modes.get(mode, 0) + 1
+                return
+        conn = get_db_connection()
+        try:
+            head = head_seq(conn, tenant_id)
+        finally:
+            conn.close()
+        with self._lock:
+            modes = self._tenants.setdefault(tenant_id, [{}, head])[0]
+            modes[mode] = modes.get(mode, 0) + 1
+
+    def untrack(self, tenant_id, mode='events'):
+        with self._lock:
+            entry = self._tenants.get(tenant_id)
+            if entry is None:
+                return
+            modes = entry[0]
+            modes[mode] = modes.get(mode, 0) - 1
+            if modes[mode] <= 0:
+                del modes[mode]
+            if not modes:
+                del self._tenants[tenant_id]
+
+    def wake(self):
+        self._wakeup.set()
+
+    def start(self, socketio):
+        self._socketio = socketio
+        if self.running:
+            return
+        self.running = True
+        self._thread = threading.Thread(target=self._run, name='sync-fanout', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self.running = False
+        self._wakeup.set()
+
+    def _run(self):
+        while self.running:
+            # After a wake-up, give the rest of the burst (the other items of
+            # a bill, a bulk edit) the coalescing window to commit
+            if self._wakeup.wait(self.poll_interval) and self.coalesce_window:
+                time.sleep(self.coalesce_window)
+            self._wakeup.clear()
+            try:
+                self.poll_once()
+            except Exception as e:
+                with self._lock:
+                    self._metrics['errors'] += 1
+                print(f"❌ Sync fan-out error: {e}")
+                time.sleep(self.poll_interval)
+
+    def _emit(self, tenant, modes, events):
+        """Deliver a page of events in every mode in use; returns the socket emits made"""
+        frames = 0
+        for mode in modes:
+            room = sync_room(tenant, mode)
+            if mode == 'events':
+                for event in events:
+                    self._socketio.emit('data_sync', {
+                        'event': event,
+                        'source_session': event['source_session']
+                    }, room=room, skip_sid=event['source_session'])
+                frames += len(events)
+            else:
+                # Devices skip their own events by source_session
+                self._socketio.emit('data_sync_batch', encode_batch(batch_frame(tenant, events), mode), room=room)
+                frames += 1
+        return frames
+
+    def poll_once(self):
+        """Emit every event appended (by any process) since the last poll; returns the count"""
+        with self._lock:
+            cursors = {tenant: (entry[1], list(entry[0])) for tenant, entry in self._tenants.items()}
+            self._metrics['polls'] += 1
+        if not cursors or self._socketio is None:
+            return 0
+
+        emitted = frames = 0
+        tenants = list(cursors)
+        conn = get_db_connection()
+        try:
+            for i in range(0, len(tenants), 200):
+                chunk = tenants[i:i + 200]
+                heads = conn.execute(
+                    f"SELECT business_owner_id, last_seq FROM sync_log_heads "
+                    f"WHERE business_owner_id IN ({', '.join('?' * len(chunk))})", chunk).fetchall()
+                for head in heads:
+                    tenant = head['business_owner_id']
+                    after, modes = cursors[tenant]
+                    while head['last_seq'] > after:
+                        page = events_after(conn, tenant, after, self.batch_size)
+                        if page['events']:
+                            frames += self._emit(tenant, modes, page['events'])
+                        emitted += len(page['events'])
+                        after = page['next_after_seq'] if page['events'] else head['last_seq']
+                        if not page['has_more']:
+                            break
+                    with self._lock:
+                        if tenant in self._tenants:
+                            self._tenants[tenant][1] = max(self._tenants[tenant][1], after)
+        finally:
+            conn.close()
+        with self._lock:
+            self._metrics['emitted'] += emitted
+            self._metrics['frames'] += frames
+        return emitted
+
+    def stats(self):
+        with self._lock:
+            modes = {}
+            for entry in self._tenants.values():
+                for mode, count in entry[0].items():
+                    modes[mode] = modes.get(mode, 0) + count
+            return {
+                'running': self.running,
+                'tenants': len(self._tenants),
+                'sessions': sum(modes.values()),
+                'modes': modes,
+                'msgpack_available': msgpack is not None,
+                **self._metrics,
+            }
+
+
+sync_fanout = SyncFanout(poll_interval=float(os.environ.get('SYNC_FANOUT_INTERVAL', 0.5)),
+                         coalesce_window=SYNC_COALESCE_MS / 1000)
@@ -3,8 +3,8 @@ Stock Management Database Schema
 Transaction-based stock tracking system
 """
 
-from modules.shared.database import get_db_connection, generate_id
-from datetime import datetime
+from modules.shared.database import get_db_connection
+from modules.shared.stock_ledger import reconcile_stock_sources
 
 def init_stock_tables():
     """Initialize stock management tables"""
@@ -93,129 +93,34 @@ def init_stock_tables():
     conn.close()
     print("✅ Stock management tables created successfully")
 
-def migrate_existing_stock_data():
-    """Migrate existing products.stock to stock_transactions"""
+def migrate_existing_stock_data(business_owner_id=None):
+    """Migrate existing stock into the stock ledger (see modules/shared/stock_ledger.py)"""
     conn = get_db_connection()
-    cursor = conn.cursor()
     
     print("🔄 Starting stock data migration...")
-    
-    # Get all products with stock > 0
-    cursor.execute("SELECT id, name, stock, user_id FROM products WHERE stock > 0 AND is_active = 1")
-    products_with_stock = cursor.fetchall()
-    
-    migration_count = 0
-    
-    for product in products_with_stock:
-        product_id = product[0]
-        product_name = product[1]
-        current_stock = product[2]
-        user_id = product[3]
-        
-        if current_stock > 0:
-            # Create opening stock transaction
-            transaction_id = generate_id()
-            cursor.execute("""
-                INSERT INTO stock_transactions (
-                    id, product_id, transaction_type, quantity, 
-                    reference_type, notes, created_by, business_owner_id, created_at
-                ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
-            """, (
-                transaction_id,
-                product_id,
-                'IN',
-                current_stock,
-                'opening',
-                f'Opening stock for {product_name}',
-                user_id,
-                user_id,
-                datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-            ))
-            
-            # Update current_stock table
-            cursor.execute("""
-                INSERT OR REPLACE INTO current_stock (
-                    product_id, current_quantity, business_owner_id, last_updated
-                ) VALUES (?, ?, ?, ?)
-            """, (
-                product_id,
-                current_stock,
-                user_id,
-                datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-            ))
-            
-            migration_count += 1
-            print(f"✅ Migrated {product_name}: {current_stock} units")
-    
+    summary = reconcile_stock_sources(conn, business_owner_id)
     conn.commit()
     conn.close()
     
-    print(f"🎉 Migration completed! {migration_count} products migrated")
-    return migration_count
+    print(f"🎉 Migration completed! {summary['products']} products migrated "
+          f"({summary['divergent']} reconciled from divergent sources)")
+    return summary['products']
 
 def get_current_stock(product_id, business_owner_id=None):
-    """Get current stock for a product"""
+    """
+    Get current stock for a product.
+    products.stock is the stock ledger's materialized balance, so this is a key lookup.
+    """
     conn = get_db_connection()
-    
-    # Try to get from current_stock table first (faster)
-    if business_owner_id:
-        result = conn.execute("""
-            SELECT current_quantity FROM current_stock 
-            WHERE product_id = ? AND business_owner_id = ?
-        """, (product_id, business_owner_id)).fetchone()
-    else:
-        result = conn.execute("""
-            SELECT current_quantity FROM current_stock 
-            WHERE product_id = ?
-        """, (product_id,)).fetchone()
-    
-    if result:
-        conn.close()
-        return result[0]
-    
-    # Fallback: Calculate from transactions
     if business_owner_id:
         result = conn.execute("""
-            SELECT COALESCE(SUM(quantity), 0) as current_stock
-            FROM stock_transactions 
-            WHERE product_id = ? AND business_owner_id = ? AND is_active = 1
+            SELECT stock FROM products WHERE id = ? AND user_id = ?
         """, (product_id, business_owner_id)).fetchone()
     else:
-        result = conn.execute("""
-            SELECT COALESCE(SUM(quantity), 0) as current_stock
-            FROM stock_transactions 
-            WHERE product_id = ? AND is_active = 1
-        """, (product_id,)).fetchone()
-    
-    current_stock = result[0] if result else 0
+        result = conn.execute("SELECT stock FROM products WHERE id = ?", (product_id,)).fetchone()
     conn.close()
-    return current_stock
+    return (result[0] or 0) if result else 0
 
 def update_current_stock(product_id, business_owner_id):
-    """Recalculate and update current stock for a product"""
-    conn = get_db_connection()
-    
-    # Calculate current stock from all transactions
-    result = conn.execute("""
-        SELECT COALESCE(SUM(quantity), 0) as total_stock
-        FROM stock_transactions 
-        WHERE product_id = ? AND business_owner_id = ? AND is_active = 1
-    """, (product_id, business_owner_id)).fetchone()
-    
-    current_stock = result[0] if result else 0
-    
-    # Update current_stock table
-    conn.execute("""
-        INSERT OR REPLACE INTO current_stock (
-            product_id, current_quantity, business_owner_id, last_updated
-        ) VALUES (?, ?, ?, ?)
-    """, (
-        product_id,
-        current_stock,
-        business_owner_id,
-        datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-    ))
-    
-    conn.commit()
-    conn.close()
-    return current_stock
\ No newline at end of file
+    """Kept for callers of the old API: the balance is maintained by every ledger movement"""
+    return get_current_stock(product_id)
@@ -270,13 +270,13 @@ def migrate_stock_data():
         
         # Check if migration already done
         conn = get_db_connection()
-        existing_transactions = conn.execute("""
-            SELECT COUNT(*) as count FROM stock_transactions 
-            WHERE reference_type = 'opening' AND business_owner_id = ?
+        pending_products = conn.execute("""
+            SELECT COUNT(*) as count FROM products 
+            WHERE user_id = ? AND COALESCE(ledger_seq, 0) = 0 AND COALESCE(stock, 0) <> 0
         """, (user_id,)).fetchone()
         conn.close()
         
-        if existing_transactions and existing_transactions[0] > 0:
+        if not pending_products or pending_products[0] == 0:
             return jsonify({
                 'success': False,
                 'error': 'Migration already completed for this user'
@@ -286,7 +286,7 @@ def migrate_stock_data():
         init_stock_tables()
         
         # Migrate data
-        migrated_count = migrate_existing_stock_data()
+        migrated_count = migrate_existing_stock_data(user_id)
         
         return jsonify({
             'success': True,
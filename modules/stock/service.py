@@ -4,13 +4,15 @@ Handles all stock transactions and movements
 """
 
 from modules.shared.database import get_db_connection, generate_id
-from modules.stock.database import get_current_stock, update_current_stock
+from modules.shared.stock_ledger import post_movement, set_stock, stock_history
+from modules.stock.database import get_current_stock
 from datetime import datetime
 
 class StockService:
     
     def create_stock_transaction(self, product_id, transaction_type, quantity, reference_type=None, 
-                               reference_id=None, notes=None, created_by=None, business_owner_id=None):
+                               reference_id=None, notes=None, created_by=None, business_owner_id=None,
+                               unit_cost=None):
         """
         Create a stock transaction
         
@@ -23,51 +25,39 @@ class StockService:
             notes: Additional notes
             created_by: User who created the transaction
             business_owner_id: For multi-tenant isolation
+            unit_cost: Cost per unit of a receipt (re-averages the product's cost)
         """
         conn = get_db_connection()
         
         try:
-            # Validate stock for OUT transactions
+            # OUT quantities are given as positive numbers
             if transaction_type == 'OUT' and quantity > 0:
-                current_stock = get_current_stock(product_id, business_owner_id)
-                if current_stock < quantity:
-                    return {
-                        'success': False,
-                        'error': f'Insufficient stock. Available: {current_stock}, Requested: {quantity}'
-                    }
-                # Make quantity negative for OUT transactions
                 quantity = -quantity
             
-            # Create transaction record
-            transaction_id = generate_id()
-            conn.execute("""
-                INSERT INTO stock_transactions (
-                    id, product_id, transaction_type, quantity, reference_type, 
-                    reference_id, notes, created_by, business_owner_id, created_at
-                ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-            """, (
-                transaction_id,
-                product_id,
-                transaction_type,
-                quantity,
-                reference_type,
-                reference_id,
-                notes,
-                created_by,
-                business_owner_id,
-                datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-            ))
-            
-            # Update current stock
-            new_stock = update_current_stock(product_id, business_owner_id)
+            # Check-and-apply in one statement, ledger entry in the same transaction
+            new_stock = post_movement(
+                conn, product_id, quantity, reference_type,
+                reference_id=reference_id,
+                business_owner_id=business_owner_id,
+                created_by=created_by,
+                notes=notes,
+                transaction_type=transaction_type,
+                unit_cost=unit_cost,
+                require_available=transaction_type == 'OUT'
+            )
+            if new_stock is None:
+                conn.rollback()
+                return {
+                    'success': False,
+                    'error': f'Insufficient stock. Available: {get_current_stock(product_id)}, Requested: {-quantity}'
+                }
             
             conn.commit()
             
             return {
                 'success': True,
-                'transaction_id': transaction_id,
                 'new_stock': new_stock,
-                'message': f'Stock transaction created successfully'
+                'message': 'Stock transaction created successfully'
             }
             
         except Exception as e:
@@ -104,7 +94,8 @@ class StockService:
             reference_type='purchase',
             notes=purchase_notes,
             created_by=created_by,
-            business_owner_id=business_owner_id
+            business_owner_id=business_owner_id,
+            unit_cost=unit_cost
         )
     
     def adjust_stock(self, product_id, adjustment_type, new_quantity, reason=None, 
@@ -132,50 +123,56 @@ class StockService:
         product_name = product[0] if product else "Unknown Product"
         conn.close()
         
-        # Create adjustment record
-        conn = get_db_connection()
-        adjustment_id = generate_id()
-        conn.execute("""
-            INSERT INTO stock_adjustments (
-                id, product_id, adjustment_type, old_quantity, new_quantity, 
-                difference, reason, notes, created_by, business_owner_id, created_at
-            ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-        """, (
-            adjustment_id,
-            product_id,
-            adjustment_type,
-            current_stock,
-            new_quantity,
-            difference,
-            reason,
-            notes,
-            created_by,
-            business_owner_id,
-            datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-        ))
-        conn.commit()
-        conn.close()
-        
-        # Create stock transaction
         adjustment_notes = f"Stock adjustment: {product_name} - {adjustment_type}"
         if reason:
             adjustment_notes += f" ({reason})"
         if notes:
             adjustment_notes += f" - {notes}"
         
-        transaction_type = 'IN' if difference > 0 else 'OUT'
-        quantity = abs(difference)
+        # Adjustment record and ledger movement in one transaction
+        conn = get_db_connection()
+        adjustment_id = generate_id()
+        try:
+            conn.execute("""
+                INSERT INTO stock_adjustments (
+                    id, product_id, adjustment_type, old_quantity, new_quantity, 
+                    difference, reason, notes, created_by, business_owner_id, created_at
+                ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+            """, (
+                adjustment_id,
+                product_id,
+                adjustment_type,
+                current_stock,
+                new_quantity,
+                difference,
+                reason,
+                notes,
+                created_by,
+                business_owner_id,
+                datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+            ))
+            new_stock = set_stock(
+                conn, product_id, new_quantity, 'adjustment',
+                reference_id=adjustment_id,
+                business_owner_id=business_owner_id,
+                created_by=created_by,
+                notes=adjustment_notes
+            )
+            conn.commit()
+        except Exception as e:
+            conn.rollback()
+            return {
+                'success': False,
+                'error': f'Failed to create stock transaction: {str(e)}'
+            }
+        finally:
+            conn.close()
         
-        return self.create_stock_transaction(
-            product_id=product_id,
-            transaction_type=transaction_type,
-            quantity=quantity,
-            reference_type='adjustment',
-            reference_id=adjustment_id,
-            notes=adjustment_notes,
-            created_by=created_by,
-            business_owner_id=business_owner_id
-        )
+        return {
+            'success': True,
+            'new_stock': new_stock,
+            'message': 'Stock transaction created successfully'
+        }
     
     def create_sale_transaction(self, product_id, quantity, bill_id, bill_number, 
                               created_by=None, business_owner_id=None):
@@ -203,51 +200,26 @@ class StockService:
     def get_stock_history(self, product_id=None, business_owner_id=None, limit=50):
         """Get stock transaction history"""
         conn = get_db_connection()
-        
-        if product_id:
-            # Get history for specific product
-            query = """
-                SELECT st.*, p.name as product_name
-                FROM stock_transactions st
-                LEFT JOIN products p ON st.product_id = p.id
-                WHERE st.product_id = ? AND st.business_owner_id = ? AND st.is_active = 1
-                ORDER BY st.created_at DESC
-                LIMIT ?
-            """
-            params = [product_id, business_owner_id, limit]
-        else:
-            # Get history for all products
-            query = """
-                SELECT st.*, p.name as product_name
-                FROM stock_transactions st
-                LEFT JOIN products p ON st.product_id = p.id
-                WHERE st.business_owner_id = ? AND st.is_active = 1
-                ORDER BY st.created_at DESC
-                LIMIT ?
-            """
-            params = [business_owner_id, limit]
-        
-        transactions = conn.execute(query, params).fetchall()
+        transactions = stock_history(conn, product_id, business_owner_id, limit=limit)
         conn.close()
         
-        return [dict(row) for row in transactions]
+        return transactions
     
     def get_low_stock_products(self, business_owner_id, threshold=None):
         """Get products with low stock"""
         conn = get_db_connection()
         
         query = """
-            SELECT p.id, p.name, p.min_stock, cs.current_quantity,
+            SELECT p.id, p.name, p.min_stock, p.stock as current_quantity,
                    CASE 
-                       WHEN cs.current_quantity = 0 THEN 'out_of_stock'
-                       WHEN cs.current_quantity <= p.min_stock THEN 'low_stock'
+                       WHEN p.stock = 0 THEN 'out_of_stock'
+                       WHEN p.stock <= p.min_stock THEN 'low_stock'
                        ELSE 'normal'
                    END as stock_status
             FROM products p
-            LEFT JOIN current_stock cs ON p.id = cs.product_id
             WHERE p.user_id = ? AND p.is_active = 1
-            AND (cs.current_quantity = 0 OR cs.current_quantity <= p.min_stock)
-            ORDER BY cs.current_quantity ASC, p.name ASC
+            AND (p.stock = 0 OR p.stock <= p.min_stock)
+            ORDER BY p.stock ASC, p.name ASC
         """
         
         products = conn.execute(query, (business_owner_id,)).fetchall()
@@ -263,12 +235,11 @@ class StockService:
         summary = conn.execute("""
             SELECT 
                 COUNT(DISTINCT p.id) as total_products,
-                COALESCE(SUM(cs.current_quantity), 0) as total_stock_units,
-                COALESCE(SUM(cs.current_quantity * p.cost), 0) as total_stock_value,
-                COUNT(CASE WHEN cs.current_quantity = 0 THEN 1 END) as out_of_stock_count,
-                COUNT(CASE WHEN cs.current_quantity <= p.min_stock AND cs.current_quantity > 0 THEN 1 END) as low_stock_count
+                COALESCE(SUM(p.stock), 0) as total_stock_units,
+                COALESCE(SUM(p.stock * p.cost), 0) as total_stock_value,
+                COUNT(CASE WHEN p.stock = 0 THEN 1 END) as out_of_stock_count,
+                COUNT(CASE WHEN p.stock <= p.min_stock AND p.stock > 0 THEN 1 END) as low_stock_count
             FROM products p
-            LEFT JOIN current_stock cs ON p.id = cs.product_id
             WHERE p.user_id = ? AND p.is_active = 1
         """, (business_owner_id,)).fetchone()
         
@@ -3,9 +3,11 @@ Sync API Routes
 REST endpoints for data synchronization
 """
 
-from flask import Blueprint, request, jsonify, session
+from flask import Blueprint, Response, request, jsonify, session
 from modules.sync.service import sync_service
+from modules.sync.utils import compress_payload
 from modules.shared.auth_decorators import require_auth
+from modules.shared.row_versions import SYNC_TABLES
 import logging
 
 logger = logging.getLogger(__name__)
@@ -46,11 +48,13 @@ def get_latest_data():
         if not user_id:
             return jsonify({'success': False, 'message': 'User not authenticated'}), 401
         
+        sync_seq = sync_service.get_head_seq(user_id)
         latest_data = sync_service.get_latest_data_for_user(user_id)
         
         return jsonify({
             'success': True,
             'data': latest_data,
+            'sync_seq': sync_seq,
             'message': 'Latest data retrieved successfully'
         })
         
@@ -58,23 +62,73 @@ def get_latest_data():
         logger.error(f"❌ Latest data error: {e}")
         return jsonify({'success': False, 'message': str(e)}), 500
 
+@sync_api_bp.route('/changes', methods=['GET', 'POST'])
+@require_auth
+def get_changes():
+    """
+    Delta sync. Send the last version seen per table, e.g.
+    GET ?products=120&sales=98 or POST {"since": {"products": 120, "sales": 98}};
+    tables left out are sent from the start. Returns changed rows, deleted ids
+    (tombstones) and the new versions; repeat with them while has_more.
+    A table with reset=true must be dropped locally and re-synced from the start.
+    Gzipped when the client sends Accept-Encoding: gzip.
+    """
+    try:
+        user_id = session.get('user_id')
+        if not user_id:
+            return jsonify({'success': False, 'message': 'User not authenticated'}), 401
+        
+        if request.method == 'POST':
+            data = request.get_json(silent=True) or {}
+            since, limit = data.get('since') or {}, data.get('limit', 500)
+        else:
+            since = {entity: request.args.get(entity, type=int) for entity in SYNC_TABLES
+                     if request.args.get(entity) is not None}
+            limit = request.args.get('limit', 500, type=int)
+        
+        sync_seq = sync_service.get_head_seq(user_id)
+        changes = sync_service.get_changes(user_id, since, limit)
+        
+        body, encoding = compress_payload({'success': True, 'data': changes, 'sync_seq': sync_seq},
+                                          request.headers.get('Accept-Encoding', ''))
+        response = Response(body, mimetype='application/json')
+        if encoding:
+            response.headers['Content-Encoding'] = encoding
+        response.headers['Vary'] = 'Accept-Encoding'
+        return response
+        
+    except Exception as e:
+        logger.error(f"❌ Changes error: {e}")
+        return jsonify({'success': False, 'message': str(e)}), 500
+
 @sync_api_bp.route('/pending-events', methods=['GET'])
 @require_auth
 def get_pending_events():
-    """Get pending sync events for user"""
+    """
+    Get sync events after a cursor: ?after_seq=N (preferred) or ?since=<ISO timestamp>.
+    Follow next_after_seq while has_more; reset_required means the cursor is older
+    than the retained log and the client must reload /latest-data first.
+    """
     try:
         user_id = session.get('user_id')
         if not user_id:
             return jsonify({'success': False, 'message': 'User not authenticated'}), 401
         
+        after_seq = request.args.get('after_seq', type=int)
+        limit = request.args.get('limit', 500, type=int)
         since_timestamp = request.args.get('since')
-        pending_events = sync_service.get_pending_sync_events(user_id, since_timestamp)
+        page = sync_service.get_events_after(user_id, after_seq, limit, since_timestamp=since_timestamp)
+        pending_events = page['events']
         
         return jsonify({
             'success': True,
             'data': {
                 'events': pending_events,
-                'count': len(pending_events)
+                'count': len(pending_events),
+                'head_seq': page['head_seq'],
+                'next_after_seq': page['next_after_seq'],
+                'has_more': page['has_more'],
+                'reset_required': page['reset_required']
             },
             'message': f'Retrieved {len(pending_events)} pending events'
         })
@@ -6,6 +6,9 @@ Handles WebSocket connections for multi-device sync
 from flask import request, session
 from flask_socketio import SocketIO, emit, join_room, leave_room, disconnect
 from modules.sync.service import sync_service
+from modules.sync.utils import compress_payload
+from modules.shared.sync_log import negotiate_batch_mode, sync_fanout, sync_room
+from datetime import datetime
 import json
 import logging
 
@@ -14,6 +17,9 @@ logger = logging.getLogger(__name__)
 def init_socketio_events(socketio: SocketIO):
     """Initialize WebSocket event handlers"""
     
+    # Deliver sync_log events (appended by any worker) to this worker's devices
+    sync_fanout.start(socketio)
+    
     @socketio.on('connect')
     def handle_connect():
         """Handle client connection"""
@@ -36,26 +42,33 @@ def init_socketio_events(socketio: SocketIO):
                 'platform': request.args.get('platform', 'web')
             }
             
-            # Register session
+            # Register session; ?batch=json|gzip|msgpack opts in to batched frames
             session_id = request.sid
-            success = sync_service.register_session(session_id, user_id, device_info)
+            delivery = negotiate_batch_mode(request.args.get('batch'))
+            success = sync_service.register_session(session_id, user_id, device_info, delivery)
             
             if success:
-                # Join user room for targeted broadcasts
+                # Join user room for targeted broadcasts, and the fan-out room for its delivery mode
                 join_room(f"user_{user_id}")
+                join_room(sync_room(user_id, delivery))
                 
-                # Send initial sync data
-                latest_data = sync_service.get_latest_data_for_user(user_id)
-                emit('initial_sync', {
-                    'success': True,
-                    'data': latest_data,
-                    'message': 'Connected and synced'
-                })
+                # Delta-capable clients ask for their changes with request_changes;
+                # older clients get the first page of a full sync. The seq is read
+                # first so no event between it and the snapshot is skipped on catch-up
+                if not request.args.get('delta'):
+                    sync_seq = sync_service.get_head_seq(user_id)
+                    latest_data = sync_service.get_latest_data_for_user(user_id)
+                    emit('initial_sync', {
+                        'success': True,
+                        'data': latest_data,
+                        'sync_seq': sync_seq,
+                        'message': 'Connected and synced'
+                    })
                 
                 # Notify other devices about new connection
                 emit('device_connected', {
                     'device_info': device_info,
-                    'timestamp': latest_data.get('sync_timestamp')
+                    'timestamp': datetime.now().isoformat()
                 }, room=f"user_{user_id}", include_self=False)
                 
                 logger.info(f"✅ WebSocket connected: {session_id} for user {user_id}")
@@ -77,12 +90,13 @@ def init_socketio_events(socketio: SocketIO):
             if session_id in sync_service.active_sessions:
                 user_id = sync_service.active_sessions[session_id]['user_id']
                 leave_room(f"user_{user_id}")
+                leave_room(sync_room(user_id, sync_service.active_sessions[session_id].get('delivery', 'events')))
                 sync_service.unregister_session(session_id)
                 
                 # Notify other devices about disconnection
                 emit('device_disconnected', {
                     'session_id': session_id,
-                    'timestamp': sync_service.get_latest_data_for_user(user_id).get('sync_timestamp')
+                    'timestamp': datetime.now().isoformat()
                 }, room=f"user_{user_id}")
                 
                 logger.info(f"✅ WebSocket disconnected: {session_id}")
@@ -95,9 +109,7 @@ def init_socketio_events(socketio: SocketIO):
         """Handle ping for keepalive"""
         session_id = request.sid
         sync_service.mark_session_active(session_id)
-        emit('pong', {'timestamp': sync_service.get_latest_data_for_user(
-            sync_service.active_sessions.get(session_id, {}).get('user_id', '')
-        ).get('sync_timestamp')})
+        emit('pong', {'timestamp': datetime.now().isoformat()})
     
     @socketio.on('request_sync')
     def handle_sync_request(data):
@@ -110,9 +122,11 @@ def init_socketio_events(socketio: SocketIO):
             
             user_id = sync_service.active_sessions[session_id]['user_id']
             since_timestamp = data.get('since_timestamp')
+            after_seq = data.get('after_seq')
             
-            # Get pending sync events
-            pending_events = sync_service.get_pending_sync_events(user_id, since_timestamp)
+            # Get pending sync events (seq cursor; timestamp for older clients)
+            page = sync_service.get_events_after(user_id, after_seq, since_timestamp=since_timestamp)
+            pending_events = page['events']
             
             # Get latest data if requested
             include_full_data = data.get('include_full_data', False)
@@ -123,8 +137,11 @@ def init_socketio_events(socketio: SocketIO):
             emit('sync_response', {
                 'success': True,
                 'pending_events': pending_events,
+                'next_after_seq': page['next_after_seq'],
+                'has_more': page['has_more'],
+                'reset_required': page['reset_required'],
                 'latest_data': latest_data,
-                'timestamp': sync_service.get_latest_data_for_user(user_id).get('sync_timestamp')
+                'timestamp': datetime.now().isoformat()
             })
             
             sync_service.mark_session_active(session_id)
@@ -133,6 +150,33 @@ def init_socketio_events(socketio: SocketIO):
             logger.error(f"❌ Sync request error: {e}")
             emit('sync_error', {'message': str(e)})
     
+    @socketio.on('request_changes')
+    def handle_changes_request(data):
+        """Delta sync: rows changed/deleted since the client's per-table versions"""
+        try:
+            session_id = request.sid
+            if session_id not in sync_service.active_sessions:
+                emit('sync_error', {'message': 'Session not found'})
+                return
+            
+            data = data or {}
+            user_id = sync_service.active_sessions[session_id]['user_id']
+            sync_seq = sync_service.get_head_seq(user_id)
+            changes = sync_service.get_changes(user_id, data.get('since'), data.get('limit', 500))
+            changes['sync_seq'] = sync_seq
+            
+            body, encoding = compress_payload(changes, data.get('compress', ''))
+            if encoding:
+                emit('delta_sync', {'success': True, 'encoding': encoding, 'payload': body})
+            else:
+                emit('delta_sync', {'success': True, 'data': changes})
+            
+            sync_service.mark_session_active(session_id)
+            
+        except Exception as e:
+            logger.error(f"❌ Changes request error: {e}")
+            emit('sync_error', {'message': str(e)})
+    
     @socketio.on('data_changed')
     def handle_data_change(data):
         """Handle data change notification from client"""
@@ -144,20 +188,14 @@ def init_socketio_events(socketio: SocketIO):
             
             user_id = sync_service.active_sessions[session_id]['user_id']
             
-            # Create sync event
-            sync_event = sync_service.create_sync_event(
+            # Log the event; the fan-out broadcasts it to the user's other devices
+            sync_service.create_sync_event(
                 user_id=user_id,
                 event_type=data.get('event_type', 'update'),
                 data=data.get('data', {}),
                 source_session=session_id
             )
             
-            # Broadcast to other devices of the same user
-            emit('data_sync', {
-                'event': sync_event,
-                'source_session': session_id
-            }, room=f"user_{user_id}", include_self=False)
-            
             sync_service.mark_session_active(session_id)
             
             logger.info(f"📡 Data change broadcasted for user {user_id}: {data.get('event_type')}")
@@ -169,20 +207,14 @@ def init_socketio_events(socketio: SocketIO):
 def broadcast_data_change(user_id: str, event_type: str, data: dict, socketio: SocketIO, source_session: str = None):
     """Broadcast data change to all user devices (called from API endpoints)"""
     try:
-        # Create sync event
-        sync_event = sync_service.create_sync_event(
+        # Logged durably; sync_fanout emits it to the devices on every worker
+        sync_service.create_sync_event(
             user_id=user_id,
             event_type=event_type,
             data=data,
             source_session=source_session
         )
         
-        # Broadcast to all user devices
-        socketio.emit('data_sync', {
-            'event': sync_event,
-            'source_session': source_session
-        }, room=f"user_{user_id}")
-        
         logger.info(f"📡 API data change broadcasted for user {user_id}: {event_type}")
         
     except Exception as e:
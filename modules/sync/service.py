@@ -8,28 +8,28 @@ import time
 from datetime import datetime
 from typing import Dict, List, Any, Optional
 from modules.shared.database import get_db_connection
+from modules.shared.sync_log import events_after, events_since, head_seq, record_event, record_events, sync_fanout
+from modules.shared.row_versions import SYNC_TABLES, changes_since, current_versions
 import logging
 
 logger = logging.getLogger(__name__)
 
 class SyncService:
     def __init__(self):
+        # Connected devices of THIS process; events themselves live in sync_log
         self.active_sessions = {}  # {session_id: {user_id, device_info, last_seen}}
-        self.sync_queue = {}       # {user_id: [sync_events]}
         
-    def register_session(self, session_id: str, user_id: str, device_info: Dict) -> bool:
-        """Register a new device session"""
+    def register_session(self, session_id: str, user_id: str, device_info: Dict, delivery: str = 'events') -> bool:
+        """Register a new device session (`delivery`: 'events' or a batch encoding)"""
         try:
             self.active_sessions[session_id] = {
                 'user_id': user_id,
                 'device_info': device_info,
+                'delivery': delivery,
                 'last_seen': time.time(),
                 'connected_at': datetime.now().isoformat()
             }
-            
-            # Initialize sync queue for user if not exists
-            if user_id not in self.sync_queue:
-                self.sync_queue[user_id] = []
+            sync_fanout.track(user_id, delivery)
                 
             logger.info(f"✅ Session registered: {session_id} for user {user_id}")
             return True
@@ -43,7 +43,8 @@ class SyncService:
         try:
             if session_id in self.active_sessions:
                 user_id = self.active_sessions[session_id]['user_id']
-                del self.active_sessions[session_id]
+                delivery = self.active_sessions.pop(session_id).get('delivery', 'events')
+                sync_fanout.untrack(user_id, delivery)
                 logger.info(f"✅ Session unregistered: {session_id} for user {user_id}")
                 return True
             return False
@@ -60,43 +61,35 @@ class SyncService:
         ]
     
     def create_sync_event(self, user_id: str, event_type: str, data: Dict, source_session: str = None) -> Dict:
-        """Create a sync event for distribution"""
-        sync_event = {
-            'id': f"sync_{int(time.time() * 1000)}",
-            'user_id': user_id,
-            'event_type': event_type,  # 'create', 'update', 'delete'
-            'data': data,
-            'timestamp': datetime.now().isoformat(),
-            'source_session': source_session
-        }
-        
-        # Add to sync queue
-        if user_id not in self.sync_queue:
-            self.sync_queue[user_id] = []
-        
-        self.sync_queue[user_id].append(sync_event)
-        
-        # Keep only last 100 events per user
-        if len(self.sync_queue[user_id]) > 100:
-            self.sync_queue[user_id] = self.sync_queue[user_id][-100:]
-            
-        return sync_event
+        """Append a sync event to the durable log; the fan-out delivers it to every device"""
+        return record_event(user_id, event_type, data, source_session)
     
-    def get_pending_sync_events(self, user_id: str, since_timestamp: str = None) -> List[Dict]:
-        """Get pending sync events for a user since timestamp"""
-        if user_id not in self.sync_queue:
-            return []
-        
-        events = self.sync_queue[user_id]
-        
-        if since_timestamp:
-            # Filter events after timestamp
-            events = [
-                event for event in events
-                if event['timestamp'] > since_timestamp
-            ]
-        
-        return events
+    def create_sync_events(self, user_id: str, items: List, source_session: str = None) -> List[Dict]:
+        """Append several (event_type, data) events in one transaction; they reach devices as one batch"""
+        return record_events(user_id, items, source_session)
+    
+    def get_head_seq(self, user_id: str) -> int:
+        """Latest sync seq for a user (the cursor a freshly synced device starts from)"""
+        conn = get_db_connection()
+        try:
+            return head_seq(conn, user_id)
+        finally:
+            conn.close()
+    
+    def get_events_after(self, user_id: str, after_seq: int = 0, limit: int = 500,
+                         since_timestamp: str = None) -> Dict:
+        """Page of sync events after a seq cursor (or, for old clients, a timestamp)"""
+        conn = get_db_connection()
+        try:
+            if after_seq is None and since_timestamp:
+                return events_since(conn, user_id, since_timestamp, limit)
+            return events_after(conn, user_id, after_seq or 0, limit)
+        finally:
+            conn.close()
+    
+    def get_pending_sync_events(self, user_id: str, since_timestamp: str = None, after_seq: int = None) -> List[Dict]:
+        """Get pending sync events for a user since a seq or timestamp"""
+        return self.get_events_after(user_id, after_seq, since_timestamp=since_timestamp)['events']
     
     def mark_session_active(self, session_id: str):
         """Update last seen timestamp for session"""
@@ -122,54 +115,56 @@ class SyncService:
         return {
             'active_sessions': len(self.active_sessions),
             'total_users': len(set(data['user_id'] for data in self.active_sessions.values())),
-            'sync_queue_size': sum(len(events) for events in self.sync_queue.values()),
+            'fanout': sync_fanout.stats(),
             'sessions_by_user': {
                 user_id: len(self.get_user_sessions(user_id))
                 for user_id in set(data['user_id'] for data in self.active_sessions.values())
             }
         }
     
-    def get_latest_data_for_user(self, user_id: str) -> Dict:
-        """Get latest data snapshot for user (called on login)"""
+    def get_changes(self, user_id: str, since: Optional[Dict] = None, limit: int = 500) -> Dict:
+        """
+        Delta sync: per table, the rows changed and ids deleted after the client's
+        high-water mark (row version). Tables missing from `since` (or all, when
+        `since` is None) are sent from the start, `limit` rows per call.
+        """
+        since = since or {}
+        limit = max(1, min(int(limit), 2000))
         conn = get_db_connection()
         try:
-            # Get latest data from all relevant tables
-            latest_data = {}
-            
-            # Products
-            products = conn.execute("""
-                SELECT * FROM products 
-                WHERE user_id = ? 
-                ORDER BY updated_at DESC LIMIT 100
-            """, (user_id,)).fetchall()
-            latest_data['products'] = [dict(row) for row in products] if products else []
-            
-            # Sales
-            sales = conn.execute("""
-                SELECT * FROM sales 
-                WHERE user_id = ? 
-                ORDER BY created_at DESC LIMIT 50
-            """, (user_id,)).fetchall()
-            latest_data['sales'] = [dict(row) for row in sales] if sales else []
-            
-            # Customers
-            customers = conn.execute("""
-                SELECT * FROM customers 
-                WHERE user_id = ? 
-                ORDER BY updated_at DESC LIMIT 100
-            """, (user_id,)).fetchall()
-            latest_data['customers'] = [dict(row) for row in customers] if customers else []
-            
-            # Invoices (bills)
-            invoices = conn.execute("""
-                SELECT * FROM bills 
-                WHERE user_id = ? 
-                ORDER BY created_at DESC LIMIT 50
-            """, (user_id,)).fetchall()
-            latest_data['invoices'] = [dict(row) for row in invoices] if invoices else []
-            
-            latest_data['sync_timestamp'] = datetime.now().isoformat()
-            
+            tables = {}
+            for entity in SYNC_TABLES:
+                version = since.get(entity)
+                tables[entity] = changes_since(conn, entity, user_id,
+                                               None if version is None else int(version), limit)
+            return {
+                'tables': tables,
+                'versions': {entity: page['version'] for entity, page in tables.items()},
+                'has_more': any(page['has_more'] for page in tables.values()),
+                'sync_timestamp': datetime.now().isoformat()
+            }
+        finally:
+            conn.close()
+    
+    def get_sync_versions(self, user_id: str) -> Dict:
+        """Current high-water mark per table (what a fully synced device holds)"""
+        conn = get_db_connection()
+        try:
+            return current_versions(conn, user_id)
+        finally:
+            conn.close()
+    
+    def get_latest_data_for_user(self, user_id: str, limit: int = 500) -> Dict:
+        """
+        First page of a full sync in the legacy snapshot shape (products, sales,
+        customers, invoices), plus the versions to continue with get_changes
+        """
+        try:
+            changes = self.get_changes(user_id, None, limit)
+            latest_data = {entity: page['rows'] for entity, page in changes['tables'].items()}
+            latest_data['versions'] = changes['versions']
+            latest_data['has_more'] = changes['has_more']
+            latest_data['sync_timestamp'] = changes['sync_timestamp']
             return latest_data
             
         except Exception as e:
@@ -177,8 +172,6 @@ class SyncService:
             import traceback
             traceback.print_exc()
             return {}
-        finally:
-            conn.close()
 
 # Global sync service instance
 sync_service = SyncService()
\ No newline at end of file
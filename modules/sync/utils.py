@@ -3,11 +3,26 @@ Sync Utilities
 Helper functions for broadcasting data changes
 """
 
-from flask import current_app, session
+from flask import session
+import gzip
+import json
 import logging
 
+# Smaller payloads gain nothing from gzip
+from modules.shared.sync_log import SYNC_COMPRESS_MIN_BYTES
+
 logger = logging.getLogger(__name__)
 
+def compress_payload(payload, accept_encoding: str = ''):
+    """
+    JSON-encode a sync payload, gzipped if the client accepts gzip and it is
+    large enough to be worth it. Returns (body bytes, 'gzip' or None).
+    """
+    body = json.dumps(payload, default=str, separators=(',', ':')).encode('utf-8')
+    if 'gzip' in (accept_encoding or '').lower() and len(body) >= SYNC_COMPRESS_MIN_BYTES:
+        return gzip.compress(body, compresslevel=6), 'gzip'
+    return body, None
+
 def broadcast_data_change(event_type: str, table_name: str, record_data: dict, user_id: str = None):
     """
     Broadcast data change to all connected devices
@@ -27,25 +42,19 @@ def broadcast_data_change(event_type: str, table_name: str, record_data: dict, u
             logger.warning("❌ Cannot broadcast data change: No user_id")
             return False
         
-        # Get socketio instance from app
-        socketio = getattr(current_app, 'socketio', None)
-        if not socketio:
-            logger.warning("❌ SocketIO not available for broadcasting")
-            return False
-        
         # Import here to avoid circular imports
-        from modules.sync.routes import broadcast_data_change as broadcast_func
+        from modules.sync.service import sync_service
         
-        # Broadcast the change
-        broadcast_func(
+        # Log the change durably; every worker's sync fan-out emits it to the
+        # connected devices, and offline devices catch up via after_seq
+        sync_service.create_sync_event(
             user_id=user_id,
             event_type=event_type,
             data={
                 'table': table_name,
                 'record': record_data,
                 'timestamp': record_data.get('updated_at') or record_data.get('created_at')
-            },
-            socketio=socketio
+            }
         )
         
         logger.info(f"📡 Broadcasted {event_type} on {table_name} for user {user_id}")
@@ -55,18 +64,52 @@ def broadcast_data_change(event_type: str, table_name: str, record_data: dict, u
         logger.error(f"❌ Failed to broadcast data change: {e}")
         return False
 
+def broadcast_data_changes(event_type: str, table_name: str, records: list, user_id: str = None):
+    """
+    broadcast_data_change for several records (e.g. a bill's line items),
+    logged in one transaction so connected devices get them as one batch
+    """
+    try:
+        if not user_id:
+            user_id = session.get('user_id')
+        
+        if not user_id:
+            logger.warning("❌ Cannot broadcast data changes: No user_id")
+            return False
+        
+        if not records:
+            return True
+        
+        from modules.sync.service import sync_service
+        
+        sync_service.create_sync_events(user_id, [
+            (event_type, {
+                'table': table_name,
+                'record': record,
+                'timestamp': record.get('updated_at') or record.get('created_at')
+            })
+            for record in records
+        ])
+        
+        logger.info(f"📡 Broadcasted {len(records)} {event_type} changes on {table_name} for user {user_id}")
+        return True
+        
+    except Exception as e:
+        logger.error(f"❌ Failed to broadcast data changes: {e}")
+        return False
+
 def sync_on_login(user_id: str):
     """
-    Trigger sync when user logs in
+    Trigger sync when user logs in. Devices pull their own delta after login,
+    so this only reports the current per-table versions (no row data).
     """
     try:
         from modules.sync.service import sync_service
         
-        # Get latest data for user
-        latest_data = sync_service.get_latest_data_for_user(user_id)
+        versions = sync_service.get_sync_versions(user_id)
         
-        logger.info(f"✅ Sync data prepared for user {user_id} login")
-        return latest_data
+        logger.info(f"✅ Sync versions prepared for user {user_id} login")
+        return {'versions': versions}
         
     except Exception as e:
         logger.error(f"❌ Failed to prepare sync data on login: {e}")
@@ -0,0 +1,108 @@
+#!/usr/bin/env python3
+"""
+Benchmark: create_bill write path, row-at-a-time vs bulk inserts
+For bills of 1/10/100/500 lines, times the statements create_bill issues for
+bill_items, sales and payments:
+
+- legacy: executemany() per table (one round trip per row on psycopg2), then
+  UPDATE sales SET balance_due/paid_amount for the rows just inserted
+- bulk:   final values computed up front, one bulk_insert() per table
+          (execute_values multi-row VALUES on PostgreSQL)
+
+Every run is rolled back, so it is safe against a real database. Uses the
+local billing.db, or DATABASE_URL when set (where the difference is largest).
+
+Usage:
+    python scripts/benchmark_bill_inserts.py --runs 20
+"""
+
+import argparse
+import os
+import statistics
+import sys
+import time
+from datetime import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from modules.shared.database import get_db_connection, get_db_type, generate_id, bulk_insert
+
+SALES_COLUMNS = ('id', 'bill_id', 'bill_number', 'customer_id', 'customer_name',
+                 'product_id', 'product_name', 'category', 'quantity', 'unit_price',
+                 'total_price', 'tax_amount', 'discount_amount', 'payment_method',
+                 'business_owner_id', 'sale_date', 'sale_time', 'balance_due', 'paid_amount', 'created_at')
+ITEM_COLUMNS = ('id', 'bill_id', 'product_id', 'product_name', 'quantity', 'unit_price', 'total_price')
+
+
+def insert_bill(conn, bill_id):
+    conn.execute("""INSERT INTO bills (id, bill_number, business_owner_id, total_amount, status, created_at)
+        VALUES (?, ?, ?, ?, ?, ?)""", (bill_id, f"BENCH-{bill_id[:8]}", 'benchmark', 0, 'completed',
+                                       datetime.now().strftime('%Y-%m-%d %H:%M:%S')))
+
+
+def build_rows(bill_id, lines, balance_due, paid_amount):
+    now = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+    items, sales = [], []
+    for i in range(lines):
+        product_id = f"bench-product-{i}"
+        items.append((generate_id(), bill_id, product_id, f"Product {i}", 1, 10.0, 10.0))
+        sales.append((generate_id(), bill_id, f"BENCH-{bill_id[:8]}", None, 'Benchmark',
+                      product_id, f"Product {i}", 'General', 1, 10.0, 10.0, 0, 0, 'cash',
+                      'benchmark', now[:10], now[11:], balance_due, paid_amount, now))
+    return items, sales, now
+
+
+def legacy_path(conn, lines):
+    bill_id = generate_id()
+    insert_bill(conn, bill_id)
+    items, sales, now = build_rows(bill_id, lines, 0, 0)
+    conn.executemany(f"INSERT INTO bill_items ({', '.join(ITEM_COLUMNS)}) VALUES ({', '.join('?' * len(ITEM_COLUMNS))})", items)
+    conn.executemany(f"INSERT INTO sales ({', '.join(SALES_COLUMNS[:-3])}, created_at) "
+                     f"VALUES ({', '.join('?' * (len(SALES_COLUMNS) - 2))})",
+                     [row[:-3] + row[-1:] for row in sales])
+    conn.execute("UPDATE sales SET balance_due = ?, paid_amount = ? WHERE bill_id = ?", (0, 10.0 * lines, bill_id))
+    conn.execute("INSERT INTO payments (id, bill_id, method, amount, processed_at) VALUES (?, ?, ?, ?, ?)",
+                 (generate_id(), bill_id, 'cash', 10.0 * lines, now))
+
+
+def bulk_path(conn, lines):
+    bill_id = generate_id()
+    insert_bill(conn, bill_id)
+    items, sales, now = build_rows(bill_id, lines, 0, 10.0 * lines)
+    bulk_insert(conn, 'bill_items', ITEM_COLUMNS, items)
+    bulk_insert(conn, 'sales', SALES_COLUMNS, sales)
+    bulk_insert(conn, 'payments', ('id', 'bill_id', 'method', 'amount', 'processed_at'),
+                [(generate_id(), bill_id, 'cash', 10.0 * lines, now)])
+
+
+def time_path(path, lines, runs):
+    timings = []
+    conn = get_db_connection()
+    try:
+        for _ in range(runs):
+            started = time.perf_counter()
+            path(conn, lines)
+            timings.append((time.perf_counter() - started) * 1000)
+            conn.rollback()
+    finally:
+        conn.rollback()
+        conn.close()
+    return statistics.median(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--runs', type=int, default=20)
+    parser.add_argument('--lines', type=int, nargs='+', default=[1, 10, 100, 500])
+    args = parser.parse_args()
+
+    print(f"📊 {get_db_type()} | median of {args.runs} runs (rolled back)")
+    print(f"{'lines':>6} {'legacy ms':>11} {'bulk ms':>9} {'speedup':>8}")
+    for lines in args.lines:
+        legacy = time_path(legacy_path, lines, args.runs)
+        bulk = time_path(bulk_path, lines, args.runs)
+        print(f"{lines:>6} {legacy:>11.2f} {bulk:>9.2f} {legacy / bulk if bulk else 0:>7.1f}x")
+
+
+if __name__ == '__main__':
+    main()
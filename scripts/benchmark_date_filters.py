@@ -0,0 +1,126 @@
+#!/usr/bin/env python3
+"""
+Benchmark: DATE()/strftime() filters vs half-open created_at ranges
+Builds a throwaway SQLite database with N bills spread across tenants and
+times the dashboard-style queries before and after the rewrite, with and
+without the (business_owner_id, created_at) composite index.
+
+Usage:
+    python scripts/benchmark_date_filters.py --bills 1000000 --tenants 200
+"""
+
+import argparse
+import os
+import random
+import sqlite3
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from modules.shared.date_ranges import period_bounds
+
+
+def build_database(path, bill_count, tenant_count, days):
+    conn = sqlite3.connect(path)
+    conn.execute('''
+        CREATE TABLE bills (
+            id TEXT PRIMARY KEY,
+            business_owner_id TEXT,
+            total_amount REAL,
+            payment_status TEXT,
+            credit_paid_amount REAL DEFAULT 0,
+            created_at TIMESTAMP
+        )
+    ''')
+    now = datetime.now()
+    rng = random.Random(42)
+    batch = []
+    for i in range(bill_count):
+        created = now - timedelta(seconds=rng.randint(0, days * 86400))
+        batch.append((
+            f'bill-{i}',
+            f'tenant-{rng.randint(1, tenant_count)}',
+            round(rng.uniform(10, 5000), 2),
+            rng.choice(('paid', 'paid', 'paid', 'partial', 'unpaid')),
+            0,
+            created.strftime('%Y-%m-%d %H:%M:%S'),
+        ))
+        if len(batch) >= 50000:
+            conn.executemany('INSERT INTO bills VALUES (?, ?, ?, ?, ?, ?)', batch)
+            batch = []
+    if batch:
+        conn.executemany('INSERT INTO bills VALUES (?, ?, ?, ?, ?, ?)', batch)
+    # Single-column indexes the production database already has
+    conn.execute('CREATE INDEX idx_bills_business_owner_id ON bills(business_owner_id)')
+    conn.execute('CREATE INDEX idx_bills_created_at ON bills(created_at)')
+    conn.commit()
+    return conn
+
+
+AGGREGATE = '''
+    SELECT COALESCE(SUM(total_amount), 0), COUNT(*)
+    FROM bills
+    WHERE {condition} AND business_owner_id = ?
+'''
+
+BEFORE = {
+    'today': ("DATE(created_at) = DATE('now', 'localtime')", lambda: []),
+    'week': ("DATE(created_at) >= ?", lambda: [period_bounds('week')[0]]),
+    'month': ("strftime('%Y-%m', created_at) = strftime('%Y-%m', 'now', 'localtime')", lambda: []),
+}
+
+AFTER = {
+    'today': ('created_at >= ? AND created_at < ?', lambda: list(period_bounds('today'))),
+    'week': ('created_at >= ? AND created_at < ?', lambda: list(period_bounds('week'))),
+    'month': ('created_at >= ? AND created_at < ?', lambda: list(period_bounds('this_month'))),
+}
+
+
+def time_queries(conn, queries, tenants, repeat):
+    results = {}
+    for name, (condition, params) in queries.items():
+        sql = AGGREGATE.format(condition=condition)
+        started = time.perf_counter()
+        for i in range(repeat):
+            conn.execute(sql, params() + [tenants[i % len(tenants)]]).fetchone()
+        results[name] = (time.perf_counter() - started) / repeat * 1000
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--bills', type=int, default=1_000_000)
+    parser.add_argument('--tenants', type=int, default=200)
+    parser.add_argument('--days', type=int, default=365)
+    parser.add_argument('--repeat', type=int, default=20)
+    args = parser.parse_args()
+
+    path = os.path.join(tempfile.mkdtemp(), 'bench.db')
+    print(f"Building {args.bills:,} bills across {args.tenants} tenants ({args.days} days)...")
+    started = time.perf_counter()
+    conn = build_database(path, args.bills, args.tenants, args.days)
+    print(f"  built in {time.perf_counter() - started:.1f}s -> {path}")
+
+    tenants = [f'tenant-{i}' for i in range(1, args.tenants + 1)]
+    before = time_queries(conn, BEFORE, tenants, args.repeat)
+    after_single = time_queries(conn, AFTER, tenants, args.repeat)
+
+    conn.execute('CREATE INDEX idx_bills_owner_created_at ON bills(business_owner_id, created_at)')
+    conn.execute('ANALYZE')
+    before_composite = time_queries(conn, BEFORE, tenants, args.repeat)
+    after_composite = time_queries(conn, AFTER, tenants, args.repeat)
+
+    print()
+    print(f"{'period':<8}{'DATE() filter':>16}{'range, old idx':>18}{'DATE() + comp':>16}{'range + comp':>16}")
+    for name in BEFORE:
+        print(f"{name:<8}{before[name]:>13.2f} ms{after_single[name]:>15.2f} ms"
+              f"{before_composite[name]:>13.2f} ms{after_composite[name]:>13.2f} ms")
+
+    conn.close()
+
+
+if __name__ == '__main__':
+    main()
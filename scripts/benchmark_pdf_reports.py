@@ -0,0 +1,95 @@
+#!/usr/bin/env python3
+"""
+Benchmark: daily report PDF rendering, cold vs warm
+Renders --reports synthetic daily sales reports with services.pdf_generator
+three ways and prints per-PDF latency (median, p95) and PDF size:
+
+- cold:  template, stylesheet and FontConfiguration rebuilt for every PDF
+         (what every report used to cost)
+- warm:  the per-process cached assets, one render_daily_sales_report call
+         per PDF
+- batch: render_batch over all reports in this warm process
+
+The first PDF of the process (imports plus asset setup) is reported
+separately. Needs WeasyPrint and its system libraries; no database is used.
+
+Usage:
+    python scripts/benchmark_pdf_reports.py --reports 50
+"""
+
+import argparse
+import os
+import random
+import statistics
+import sys
+import time
+from datetime import date, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from services.pdf_generator import PDFGenerator, reset_render_assets
+
+
+def synthetic_reports(count):
+    rng = random.Random(42)
+    reports = []
+    for i in range(count):
+        sales = round(rng.uniform(500, 250000), 2)
+        reports.append((
+            {'id': f"bench-{i}", 'business_name': f"Bench Store {i:03d}", 'phone_number': '9876543210',
+             'email': f"store{i}@example.com"},
+            {'total_sales': sales, 'total_profit': round(sales * rng.uniform(0.05, 0.4), 2),
+             'total_invoices': rng.randint(1, 400)},
+            date.today() - timedelta(days=1),
+        ))
+    return reports
+
+
+def timed(generator, reports, reset):
+    durations, sizes = [], []
+    for company_data, report_data, report_date in reports:
+        if reset:
+            reset_render_assets()
+        started = time.perf_counter()
+        pdf = generator.render_daily_sales_report(company_data, report_data, report_date)
+        durations.append((time.perf_counter() - started) * 1000)
+        sizes.append(len(pdf))
+    return durations, sizes
+
+
+def p95(values):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--reports', type=int, default=50, help='PDFs per mode')
+    args = parser.parse_args()
+
+    generator = PDFGenerator()
+    reports = synthetic_reports(args.reports)
+
+    started = time.perf_counter()
+    generator.render_daily_sales_report(*reports[0])
+    first_ms = (time.perf_counter() - started) * 1000
+
+    cold, cold_sizes = timed(generator, reports, reset=True)
+    warm, warm_sizes = timed(generator, reports, reset=False)
+    started = time.perf_counter()
+    batch = generator.render_batch(reports)
+    batch_total = (time.perf_counter() - started) * 1000
+    batch_ms = [r['render_ms'] for r in batch]
+
+    print(f"📊 {args.reports} reports per mode | first PDF in process: {first_ms:.0f}ms")
+    print(f"{'mode':<7} {'p50':>9} {'p95':>9} {'total':>10} {'avg KB':>8}")
+    for mode, durations, sizes in (('cold', cold, cold_sizes), ('warm', warm, warm_sizes),
+                                   ('batch', batch_ms, [len(r['pdf'] or b'') for r in batch])):
+        total = batch_total if mode == 'batch' else sum(durations)
+        print(f"{mode:<7} {statistics.median(durations):>7.1f}ms {p95(durations):>7.1f}ms {total:>8.0f}ms "
+              f"{statistics.mean(sizes) / 1024:>8.1f}")
+    print(f"warm speedup (p50): {statistics.median(cold) / statistics.median(warm):.2f}x")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,186 @@
+#!/usr/bin/env python3
+"""
+Benchmark: sales list and earnings summary, correlated subqueries vs summaries
+Builds a throwaway SQLite database with N bills (1-8 items each) spread
+across tenants and times, per tenant:
+
+- sales list:  three correlated bill_items subqueries per bill row (before)
+               vs the stored per-bill summary columns (shared/bill_summary.py)
+- earnings:    two queries with a correlated cost subquery per bill (before)
+               vs one pass over bills using the stored items_total / cogs
+
+Usage:
+    python scripts/benchmark_sales_queries.py --bills 100000 --tenants 10
+"""
+
+import argparse
+import os
+import random
+import sqlite3
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from modules.shared.date_ranges import period_bounds
+from modules.sales.service import BILL_SALES_SELECT
+
+
+def build_database(path, bill_count, tenant_count, days):
+    conn = sqlite3.connect(path)
+    conn.executescript('''
+        CREATE TABLE products (id TEXT PRIMARY KEY, name TEXT, cost REAL);
+        CREATE TABLE customers (id TEXT PRIMARY KEY, name TEXT);
+        CREATE TABLE bills (
+            id TEXT PRIMARY KEY, bill_number TEXT, customer_id TEXT, customer_name TEXT,
+            business_owner_id TEXT, total_amount REAL, subtotal REAL, tax_amount REAL,
+            discount_amount REAL, payment_method TEXT, payment_status TEXT, is_credit INTEGER,
+            credit_balance REAL, credit_paid_amount REAL, business_type TEXT, status TEXT,
+            created_at TIMESTAMP, item_count INTEGER, total_quantity REAL, product_names TEXT,
+            items_total REAL, cogs REAL
+        );
+        CREATE TABLE bill_items (
+            id TEXT PRIMARY KEY, bill_id TEXT, product_id TEXT, product_name TEXT,
+            quantity INTEGER, unit_price REAL, total_price REAL
+        );
+    ''')
+    rng = random.Random(42)
+    products = [(f'product-{i}', f'Product {i}', round(rng.uniform(5, 400), 2)) for i in range(500)]
+    conn.executemany('INSERT INTO products VALUES (?, ?, ?)', products)
+
+    now = datetime.now()
+    bills, items = [], []
+    for i in range(bill_count):
+        created = now - timedelta(seconds=rng.randint(0, days * 86400))
+        lines = [rng.choice(products) for _ in range(rng.randint(1, 8))]
+        quantities = [rng.randint(1, 5) for _ in lines]
+        total = cogs = 0.0
+        for n, ((product_id, name, cost), quantity) in enumerate(zip(lines, quantities)):
+            price = round(cost * 1.3, 2)
+            total += price * quantity
+            cogs += cost * quantity
+            items.append((f'item-{i}-{n}', f'bill-{i}', product_id, name, quantity, price, price * quantity))
+        method = rng.choice(('cash', 'cash', 'upi', 'card', 'credit', 'partial'))
+        is_credit = method in ('credit', 'partial')
+        balance = round(total * rng.uniform(0.2, 1.0), 2) if is_credit else 0
+        bills.append((f'bill-{i}', f'BILL-{i}', None, 'Walk-in Customer', f'tenant-{rng.randint(1, tenant_count)}',
+                      total, total, 0, 0, method, 'partial' if is_credit else 'paid', int(is_credit), balance,
+                      total - balance if is_credit else 0, 'retail', 'completed',
+                      created.strftime('%Y-%m-%d %H:%M:%S'), len(lines), float(sum(quantities)),
+                      ', '.join(name for _, name, _ in lines), total, cogs))
+        if len(bills) >= 20000:
+            conn.executemany(f"INSERT INTO bills VALUES ({', '.join('?' * 22)})", bills)
+            conn.executemany('INSERT INTO bill_items VALUES (?, ?, ?, ?, ?, ?, ?)', items)
+            bills, items = [], []
+    if bills:
+        conn.executemany(f"INSERT INTO bills VALUES ({', '.join('?' * 22)})", bills)
+        conn.executemany('INSERT INTO bill_items VALUES (?, ?, ?, ?, ?, ?, ?)', items)
+    # Indexes the production database has (see init_db)
+    conn.execute('CREATE INDEX idx_bills_owner_created_id ON bills(business_owner_id, created_at, id)')
+    conn.execute('CREATE INDEX idx_bill_items_bill_id ON bill_items(bill_id)')
+    conn.execute('ANALYZE')
+    conn.commit()
+    return conn
+
+
+SALES_BEFORE = BILL_SALES_SELECT.replace(
+    "COALESCE(b.product_names, 'Multiple Items') as products,",
+    "COALESCE((SELECT GROUP_CONCAT(bi.product_name, ', ') FROM bill_items bi WHERE bi.bill_id = b.id),"
+    " 'Multiple Items') as products,"
+).replace(
+    "b.total_quantity as quantity,",
+    "(SELECT SUM(bi.quantity) FROM bill_items bi WHERE bi.bill_id = b.id) as quantity,"
+).replace(
+    "b.item_count as items_count,",
+    "(SELECT COUNT(*) FROM bill_items bi WHERE bi.bill_id = b.id) as items_count,"
+)
+assert SALES_BEFORE != BILL_SALES_SELECT
+
+WHERE = "WHERE b.business_owner_id = ? AND b.created_at >= ? AND b.created_at < ?"
+
+EARNINGS_BEFORE = [f"""
+    SELECT COUNT(DISTINCT b.id), COALESCE(SUM(b.total_amount), 0),
+           COALESCE(SUM((SELECT SUM(COALESCE(p.cost, 0) * bi.quantity)
+                         FROM bill_items bi LEFT JOIN products p ON bi.product_id = p.id
+                         WHERE bi.bill_id = b.id)), 0)
+    FROM bills b {WHERE}
+    AND (b.payment_method NOT IN ('credit', 'partial') OR b.payment_method IS NULL)
+""", f"""
+    SELECT COALESCE(SUM(b.credit_balance), 0),
+           COALESCE(SUM((SELECT SUM((bi.total_price - (COALESCE(p.cost, 0) * bi.quantity)) * (b.credit_balance / b.total_amount))
+                         FROM bill_items bi LEFT JOIN products p ON bi.product_id = p.id
+                         WHERE bi.bill_id = b.id)), 0)
+    FROM bills b {WHERE}
+    AND b.payment_method IN ('credit', 'partial') AND b.credit_balance > 0
+"""]
+
+PAID = "(b.payment_method NOT IN ('credit', 'partial') OR b.payment_method IS NULL)"
+PENDING = "(b.payment_method IN ('credit', 'partial') AND b.credit_balance > 0)"
+EARNINGS_AFTER = [f"""
+    SELECT COALESCE(SUM(CASE WHEN {PAID} THEN 1 ELSE 0 END), 0),
+           COALESCE(SUM(CASE WHEN {PAID} THEN b.total_amount ELSE 0 END), 0),
+           COALESCE(SUM(CASE WHEN {PAID} THEN b.cogs ELSE 0 END), 0),
+           COALESCE(SUM(CASE WHEN {PENDING} THEN b.credit_balance ELSE 0 END), 0),
+           COALESCE(SUM(CASE WHEN {PENDING}
+               THEN (b.items_total - b.cogs) * (b.credit_balance / NULLIF(b.total_amount, 0))
+               ELSE 0 END), 0)
+    FROM bills b {WHERE}
+"""]
+
+
+def time_statements(conn, statements, params, tenants, repeat):
+    """p50 / p95 in ms of running all `statements` for one tenant"""
+    samples = []
+    for i in range(repeat):
+        tenant_params = [tenants[i % len(tenants)]] + params
+        started = time.perf_counter()
+        for sql in statements:
+            conn.execute(sql, tenant_params).fetchall()
+        samples.append((time.perf_counter() - started) * 1000)
+    samples.sort()
+    return statistics.median(samples), samples[min(len(samples) - 1, int(len(samples) * 0.95))]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--bills', type=int, default=100_000)
+    parser.add_argument('--tenants', type=int, default=10)
+    parser.add_argument('--days', type=int, default=365)
+    parser.add_argument('--repeat', type=int, default=20)
+    args = parser.parse_args()
+
+    path = os.path.join(tempfile.mkdtemp(), 'bench.db')
+    print(f"Building {args.bills:,} bills across {args.tenants} tenants ({args.days} days)...")
+    started = time.perf_counter()
+    conn = build_database(path, args.bills, args.tenants, args.days)
+    print(f"  built in {time.perf_counter() - started:.1f}s -> {path}")
+
+    tenants = [f'tenant-{i}' for i in range(1, args.tenants + 1)]
+    order = " ORDER BY b.created_at DESC"
+    rows = []
+    for period in ('today', 'month', 'all'):
+        start, end = period_bounds(period) if period != 'all' else ('0000-01-01', '9999-12-31')
+        limit = " LIMIT 500" if period == 'all' else ''
+        rows.append((f"sales list ({period})",
+                     time_statements(conn, [SALES_BEFORE + WHERE + order + limit], [start, end], tenants, args.repeat),
+                     time_statements(conn, [BILL_SALES_SELECT + WHERE + order + limit], [start, end], tenants,
+                                     args.repeat)))
+    for period in ('today', 'month', 'all'):
+        start, end = period_bounds(period) if period != 'all' else ('0000-01-01', '9999-12-31')
+        rows.append((f"earnings ({period})",
+                     time_statements(conn, EARNINGS_BEFORE, [start, end], tenants, args.repeat),
+                     time_statements(conn, EARNINGS_AFTER, [start, end], tenants, args.repeat)))
+
+    print()
+    print(f"{'query':<24}{'before p50':>12}{'p95':>10}{'after p50':>12}{'p95':>10}")
+    for name, (before_p50, before_p95), (after_p50, after_p95) in rows:
+        print(f"{name:<24}{before_p50:>9.2f} ms{before_p95:>7.2f} ms{after_p50:>9.2f} ms{after_p95:>7.2f} ms")
+
+    conn.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,129 @@
+#!/usr/bin/env python3
+"""
+Benchmark: tenant search, LIKE '%q%' scan vs the trigram index
+Creates a synthetic tenant with --rows products and --rows customers (plus
+--tenants other tenants with the same catalogue, so matches of other tenants
+are in the index too), then times the old leading-wildcard LIKE query against modules.shared.search for
+exact, prefix, substring, typo and phone-number queries (median and p95).
+
+By default it runs against a throwaway copy of the local billing.db. With
+DATABASE_URL set it runs against that database, using a temporary business
+owner whose rows are deleted afterwards.
+
+Usage:
+    python scripts/benchmark_search.py --rows 100000 --runs 50
+    python scripts/benchmark_search.py --rows 20000 --tenants 9
+"""
+
+import argparse
+import os
+import random
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+import uuid
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import modules.shared.database as database
+from modules.shared.database import get_db_connection, bulk_insert
+from modules.shared.search import search_ids
+
+BRANDS = ['Tata', 'Amul', 'Britannia', 'Parle', 'Haldiram', 'Nestle', 'Dabur', 'Patanjali', 'Aashirvaad', 'Fortune']
+ITEMS = ['Basmati Rice', 'Toor Dal', 'Sunflower Oil', 'Green Tea', 'Butter Cookies', 'Masala Noodles',
+         'Wheat Flour', 'Rock Salt', 'Mango Pickle', 'Cashew Nuts', 'Turmeric Powder', 'Ghee', 'Paneer',
+         'Chocolate Bar', 'Detergent Powder', 'Toothpaste', 'Shampoo', 'Coconut Oil', 'Sugar', 'Tea Leaves']
+SIZES = ['100g', '250g', '500g', '1kg', '5kg', '1L', '500ml', 'Pack of 6']
+FIRST = ['Rahul', 'Priya', 'Amit', 'Sneha', 'Rajesh', 'Anita', 'Vikram', 'Pooja', 'Suresh', 'Kavita', 'Arjun', 'Meera']
+LAST = ['Sharma', 'Verma', 'Reddy', 'Patel', 'Iyer', 'Khan', 'Singh', 'Nair', 'Gupta', 'Rao']
+
+QUERIES = {
+    'product': ['basmati', 'Haldiram Cashew', 'turm', 'oil 1L', 'basmti', 'chocolte', 'P0004242'],
+    'customer': ['rajesh', 'Meera Nair', 'kavita g', 'rajsh', '98450123'],
+}
+
+LIKE_SQL = {
+    'product': ('SELECT id FROM products WHERE user_id = ? AND is_active = 1 '
+                'AND (name LIKE ? OR code LIKE ? OR barcode_data LIKE ? OR category LIKE ?) ORDER BY name LIMIT 10', 4),
+    'customer': ('SELECT id FROM customers WHERE user_id = ? AND is_active = 1 '
+                 'AND (name LIKE ? OR phone LIKE ? OR address LIKE ?) ORDER BY name LIMIT 10', 3),
+}
+
+
+def populate(conn, owner, rows, offset=0):
+    rng = random.Random(42)
+    products, customers = [], []
+    for i in range(rows):
+        name = f"{rng.choice(BRANDS)} {rng.choice(ITEMS)} {rng.choice(SIZES)}"
+        products.append((f"bench-p-{owner}-{i}", f"P{offset + i:07d}", name, rng.choice(['Grocery', 'Snacks', 'Personal Care']),
+                         10.0, 0, 'piece', f"890{offset + i:010d}", owner, True))
+        customers.append((f"bench-c-{owner}-{i}", f"{rng.choice(FIRST)} {rng.choice(LAST)}",
+                          f"9845{i:06d}", f"{rng.randrange(1, 500)} MG Road", owner, True))
+    started = time.perf_counter()
+    bulk_insert(conn, 'products', ('id', 'code', 'name', 'category', 'price', 'stock', 'unit', 'barcode_data',
+                                   'user_id', 'is_active'), products)
+    bulk_insert(conn, 'customers', ('id', 'name', 'phone', 'address', 'user_id', 'is_active'), customers)
+    conn.commit()
+    return time.perf_counter() - started
+
+
+def cleanup(conn, owner):
+    conn.execute("DELETE FROM products WHERE user_id = ?", (owner,))
+    conn.execute("DELETE FROM customers WHERE user_id = ?", (owner,))
+    conn.commit()
+
+
+def timed(func, runs):
+    timings = []
+    for _ in range(runs):
+        started = time.perf_counter()
+        result = func()
+        timings.append((time.perf_counter() - started) * 1000)
+    timings.sort()
+    return statistics.median(timings), timings[int(len(timings) * 0.95) - 1 if len(timings) > 1 else 0], result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, default=100000, help='Products and customers for the tenant')
+    parser.add_argument('--tenants', type=int, default=0, help='Other tenants with the same catalogue')
+    parser.add_argument('--runs', type=int, default=30)
+    args = parser.parse_args()
+
+    if not database.get_database_url():
+        scratch = os.path.join(tempfile.mkdtemp(), 'search.db')
+        shutil.copy(database.DB_PATH, scratch)
+        database.DB_PATH = scratch
+    database.init_db()
+
+    run_id = uuid.uuid4().hex[:8]
+    owner = f"bench-owner-{run_id}"
+    others = [f"bench-other-{run_id}-{i}" for i in range(args.tenants)]
+    conn = get_db_connection()
+    try:
+        # Other tenants first: their rows get the lower rowids, which an FTS scan visits first
+        elapsed = sum(populate(conn, tenant, args.rows, (n + 1) * args.rows) for n, tenant in enumerate(others))
+        elapsed += populate(conn, owner, args.rows)
+        print(f"📊 {database.get_db_type()} | {len(others) + 1} tenant(s) x {args.rows:,} products + "
+              f"{args.rows:,} customers inserted and indexed in {elapsed:.1f}s | {args.runs} runs")
+        print(f"{'entity':<9} {'query':<18} {'LIKE p50':>9} {'p95':>7} {'index p50':>10} {'p95':>7} {'hits':>5}  top hit")
+        for entity, queries in QUERIES.items():
+            sql, fields = LIKE_SQL[entity]
+            table = 'products' if entity == 'product' else 'customers'
+            for query in queries:
+                params = (owner,) + (f'%{query}%',) * fields
+                like_p50, like_p95, _ = timed(lambda: conn.execute(sql, params).fetchall(), args.runs)
+                index_p50, index_p95, ids = timed(lambda: search_ids(conn, entity, owner, query, 10), args.runs)
+                top = conn.execute(f"SELECT name FROM {table} WHERE id = ?", (ids[0],)).fetchone()['name'] if ids else '-'
+                print(f"{entity:<9} {query:<18} {like_p50:>8.2f}ms {like_p95:>6.2f} {index_p50:>9.2f}ms "
+                      f"{index_p95:>6.2f} {len(ids):>5}  {top}")
+    finally:
+        for tenant in [owner] + others:
+            cleanup(conn, tenant)
+        conn.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,170 @@
+#!/usr/bin/env python3
+"""
+Load test: sync broadcasts of multi-line bills to connected devices
+Simulates --devices sockets spread over --tenants tenants and pushes --bills
+bills of --lines line items per tenant through the real sync path (the
+billing.sync_broadcast outbox handler -> sync_log -> SyncFanout), once per
+delivery mode:
+
+- per-item:      the old behaviour, one broadcast per line item and one
+                 data_sync message per event to every device
+- batch-json / batch-gzip / batch-msgpack:
+                 one broadcast per bill, one data_sync_batch frame per bill
+                 (msgpack only when installed)
+
+The socket server is an in-process stand-in that encodes each emit once, the
+way python-socketio does for a room, and counts the messages and bytes every
+device would receive; network writes are not performed. Reported: messages
+delivered per second, bills per second end to end, bytes per bill, and
+process CPU time for the write and fan-out sides.
+
+Runs against a throwaway copy of the local billing.db (or DATABASE_URL, with
+temporary tenants whose sync rows are deleted afterwards).
+
+Usage:
+    python scripts/load_test_sync_broadcast.py --devices 500 --tenants 10 --bills 20 --lines 50
+"""
+
+import argparse
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+import uuid
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import modules.shared.database as database
+from modules.shared.database import get_db_connection
+from modules.shared.sync_log import SyncFanout, msgpack, sync_room
+from modules.billing.side_effects import handle_sync_broadcast
+
+
+class RoomServer:
+    """Counts what each device in a room would receive; encodes every emit once"""
+
+    def __init__(self):
+        self.rooms = {}
+        self.emits = self.messages = self.bytes = 0
+
+    def join(self, sid, room):
+        self.rooms.setdefault(room, []).append(sid)
+
+    def emit(self, event, data, room=None, skip_sid=None):
+        binary = data.get('payload') if isinstance(data.get('payload'), bytes) else None
+        header = {k: v for k, v in data.items() if k != 'payload'} if binary is not None else data
+        size = len(json.dumps([event, header], default=str, separators=(',', ':')).encode('utf-8'))
+        size += len(binary) if binary is not None else 0
+        self.emits += 1
+        for sid in self.rooms.get(room, ()):
+            if sid != skip_sid:
+                self.messages += 1
+                self.bytes += size
+
+
+def sale_lines(bill_number, lines):
+    return [{
+        'bill_id': f"load-bill-{bill_number}",
+        'bill_number': f"BILL-{bill_number}",
+        'customer_name': 'Walk-in Customer',
+        'product_name': f"Product {line:03d}",
+        'quantity': 1 + line % 3,
+        'total_price': 25.0 * (1 + line % 3),
+        'payment_method': 'cash',
+        'created_at': time.strftime('%Y-%m-%d %H:%M:%S'),
+    } for line in range(lines)]
+
+
+def run_mode(mode, tenants, devices, bills, lines):
+    server = RoomServer()
+    fanout = SyncFanout(coalesce_window=0)
+    fanout._socketio = server  # polled by hand below instead of the background thread
+    delivery = 'events' if mode == 'per-item' else mode.split('-', 1)[1]
+    for device in range(devices):
+        tenant = tenants[device % len(tenants)]
+        server.join(f"sid-{device}", sync_room(tenant, delivery))
+        fanout.track(tenant, delivery)
+
+    write_cpu = fanout_cpu = 0.0
+    started = time.perf_counter()
+    for bill in range(bills):
+        for tenant in tenants:
+            sales = sale_lines(f"{tenant}-{bill}", lines)
+            cpu = time.process_time()
+            if mode == 'per-item':
+                for sale in sales:
+                    handle_sync_broadcast({'business_owner_id': tenant, 'sale': sale})
+            else:
+                handle_sync_broadcast({'business_owner_id': tenant, 'sales': sales})
+            write_cpu += time.process_time() - cpu
+        # One fan-out poll per round of bills, as the background thread would do
+        cpu = time.process_time()
+        fanout.poll_once()
+        fanout_cpu += time.process_time() - cpu
+    elapsed = time.perf_counter() - started
+
+    total_bills = bills * len(tenants)
+    stats = fanout.stats()
+    return {
+        'mode': mode,
+        'events': stats['emitted'],
+        'emits': server.emits,
+        'messages': server.messages,
+        'msgs_per_bill_device': server.messages / total_bills / (devices / len(tenants)),
+        'kb_per_bill': server.bytes / total_bills / 1024,
+        'msgs_per_sec': server.messages / elapsed if elapsed else 0,
+        'bills_per_sec': total_bills / elapsed if elapsed else 0,
+        'write_cpu_ms': write_cpu * 1000 / total_bills,
+        'fanout_cpu_ms': fanout_cpu * 1000 / total_bills,
+        'elapsed': elapsed,
+    }
+
+
+def cleanup(tenants):
+    conn = get_db_connection()
+    try:
+        for tenant in tenants:
+            conn.execute("DELETE FROM sync_log WHERE business_owner_id = ?", (tenant,))
+            conn.execute("DELETE FROM sync_log_heads WHERE business_owner_id = ?", (tenant,))
+        conn.commit()
+    finally:
+        conn.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--devices', type=int, default=500, help='Connected devices, spread over the tenants')
+    parser.add_argument('--tenants', type=int, default=10)
+    parser.add_argument('--bills', type=int, default=20, help='Bills per tenant')
+    parser.add_argument('--lines', type=int, default=50, help='Line items per bill')
+    args = parser.parse_args()
+
+    if not database.get_database_url():
+        scratch = os.path.join(tempfile.mkdtemp(), 'broadcast.db')
+        shutil.copy(database.DB_PATH, scratch)
+        database.DB_PATH = scratch
+    database.init_db()
+
+    modes = ['per-item', 'batch-json', 'batch-gzip'] + (['batch-msgpack'] if msgpack is not None else [])
+    run = uuid.uuid4().hex[:8]
+    print(f"📊 {database.get_db_type()} | {args.devices} devices over {args.tenants} tenants | "
+          f"{args.bills} bills x {args.lines} lines per tenant"
+          f"{'' if msgpack is not None else ' | msgpack not installed'}")
+    print(f"{'mode':<14} {'events':>7} {'emits':>7} {'messages':>10} {'msg/bill/dev':>13} {'KB/bill':>9} "
+          f"{'msg/s':>10} {'bills/s':>8} {'write CPU':>10} {'fan-out CPU':>12}")
+    for mode in modes:
+        tenants = [f"load-{run}-{mode}-{i}" for i in range(args.tenants)]
+        try:
+            r = run_mode(mode, tenants, args.devices, args.bills, args.lines)
+        finally:
+            cleanup(tenants)
+        print(f"{r['mode']:<14} {r['events']:>7} {r['emits']:>7} {r['messages']:>10,} "
+              f"{r['msgs_per_bill_device']:>13.1f} {r['kb_per_bill']:>9.1f} {r['msgs_per_sec']:>10,.0f} {r['bills_per_sec']:>8.0f} "
+              f"{r['write_cpu_ms']:>8.2f}ms {r['fanout_cpu_ms']:>10.2f}ms")
+    print("CPU columns are process CPU per bill; messages are socket messages to all devices")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,64 @@
+#!/usr/bin/env python3
+"""
+Rebuild the daily_sales_rollup table from bills
+Run after importing/editing bills outside the app, or to verify drift:
+the --check flag compares the rollup against a fresh aggregate without writing.
+
+Usage:
+    python scripts/rebuild_sales_rollup.py                 # all tenants
+    python scripts/rebuild_sales_rollup.py --owner <id>    # one tenant
+    python scripts/rebuild_sales_rollup.py --check
+"""
+
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from modules.shared.database import get_db_connection, get_db_type
+from modules.shared.sales_rollup import init_rollup_table, rebuild_rollup, rollup_totals
+
+
+def bill_totals(conn, business_owner_id=None):
+    sql = 'SELECT COUNT(*) as bills, COALESCE(SUM(total_amount), 0) as sales FROM bills WHERE created_at IS NOT NULL'
+    params = []
+    if business_owner_id is not None:
+        sql += " AND COALESCE(business_owner_id, '') = ?"
+        params.append(business_owner_id)
+    row = conn.execute(sql, params).fetchone()
+    return int(row['bills']), float(row['sales'])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--owner', help='Only rebuild this business_owner_id')
+    parser.add_argument('--check', action='store_true', help='Compare rollup with bills, do not write')
+    args = parser.parse_args()
+
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    init_rollup_table(cursor, get_db_type())
+
+    bills, sales = bill_totals(conn, args.owner)
+    if args.check:
+        totals = rollup_totals(conn, args.owner)
+        print(f"bills:  {bills:>10,}  rollup: {totals['bill_count']:>10,}")
+        print(f"sales:  {sales:>14,.2f}  rollup: {totals['total_sales']:>14,.2f}")
+        ok = bills == totals['bill_count'] and abs(sales - totals['total_sales']) < 0.01
+        print("✅ Rollup matches bills" if ok else "❌ Rollup drifted - run without --check to rebuild")
+        conn.close()
+        sys.exit(0 if ok else 1)
+
+    started = time.perf_counter()
+    rebuild_rollup(conn, args.owner)
+    conn.commit()
+    rows = conn.execute('SELECT COUNT(*) as n FROM daily_sales_rollup').fetchone()['n']
+    conn.close()
+    print(f"✅ Rebuilt daily_sales_rollup from {bills:,} bills -> {rows:,} rows "
+          f"in {time.perf_counter() - started:.2f}s")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,55 @@
+#!/usr/bin/env python3
+"""
+Bring products into the stock ledger, or verify the ledger against the balances
+Without flags, every product that has no ledger entries yet is reconciled from
+the legacy sources (products.stock, current_stock, stock_transactions) - the
+same migration init_db runs on first start. --check recomputes each balance
+from the latest snapshot plus the entries since it, without writing.
+
+Usage:
+    python scripts/reconcile_stock_ledger.py                 # all tenants
+    python scripts/reconcile_stock_ledger.py --owner <id>    # one tenant
+    python scripts/reconcile_stock_ledger.py --check
+"""
+
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from modules.shared.database import get_db_connection, get_db_type
+from modules.shared.stock_ledger import init_stock_ledger_tables, reconcile_stock_sources, verify_balances
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--owner', help='Only this business_owner_id')
+    parser.add_argument('--check', action='store_true', help='Compare balances with the ledger, do not write')
+    args = parser.parse_args()
+
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    init_stock_ledger_tables(cursor, get_db_type())
+
+    if args.check:
+        drift = verify_balances(conn, args.owner)
+        for row in drift[:20]:
+            print(f"  {row['product_id']}: stock {row['stock']} vs ledger {row['ledger_stock']} "
+                  f"(seq {row['ledger_seq']} vs {row['last_seq']})")
+        print("✅ Stock balances match the ledger" if not drift
+              else f"❌ {len(drift)} product(s) drifted from the ledger")
+        conn.close()
+        sys.exit(0 if not drift else 1)
+
+    started = time.perf_counter()
+    summary = reconcile_stock_sources(conn, args.owner)
+    conn.commit()
+    conn.close()
+    print(f"✅ Reconciled {summary['products']:,} products -> {summary['entries']:,} ledger entries "
+          f"({summary['divergent']:,} had divergent sources) in {time.perf_counter() - started:.2f}s")
+
+
+if __name__ == '__main__':
+    main()
@@ -1,10 +1,14 @@
 """
 Schema Converter: SQLite to PostgreSQL
-Converts SQLite CREATE TABLE statements to PostgreSQL syntax
+Converts SQLite CREATE TABLE statements to PostgreSQL syntax, and SQLite
+values to what a PostgreSQL column of a given type accepts (coerce_value)
 """
 
+import json
 import re
 import sqlite3
+from datetime import date, datetime, time
+from decimal import Decimal, InvalidOperation
 from typing import Dict, List, Tuple
 
 # Type mapping from SQLite to PostgreSQL
@@ -75,6 +79,81 @@ def convert_default_value(default_val: str, col_type: str) -> str:
     
     return default_val
 
+INTEGER_TYPES = ('smallint', 'integer', 'bigint')
+NUMERIC_TYPES = ('numeric', 'real', 'double precision')
+TEXT_TYPES = ('text', 'character varying', 'character')
+TRUE_STRINGS = ('1', 'true', 't', 'yes', 'y', 'on')
+FALSE_STRINGS = ('0', 'false', 'f', 'no', 'n', 'off')
+
+def coerce_value(value, pg_type: str):
+    """
+    Convert a value read from SQLite (dynamically typed) for a PostgreSQL
+    column of `pg_type` (information_schema data_type), e.g. 0/1 -> BOOLEAN,
+    '5' / 5.0 -> INTEGER, ISO text -> TIMESTAMP / DATE, blobs -> BYTEA.
+    Empty strings become NULL outside text columns.
+    Raises ValueError if the value cannot be represented.
+    """
+    if value is None:
+        return None
+    if pg_type in TEXT_TYPES:
+        if isinstance(value, bytes):
+            value = value.decode('utf-8', 'replace')
+        return str(value).replace('\x00', '')
+    if isinstance(value, str):
+        value = value.strip()
+        if value == '':
+            return None
+    
+    if pg_type in INTEGER_TYPES:
+        number = float(value) if isinstance(value, str) else value
+        if isinstance(number, float):
+            if not number.is_integer():
+                raise ValueError(f"{value!r} is not a whole number")
+            number = int(number)
+        return int(number)
+    
+    if pg_type in NUMERIC_TYPES:
+        if isinstance(value, float):
+            return Decimal(repr(value))
+        try:
+            return Decimal(str(value))
+        except InvalidOperation:
+            raise ValueError(f"{value!r} is not a number")
+    
+    if pg_type == 'boolean':
+        if isinstance(value, (bool, int, float)):
+            return bool(value)
+        if str(value).lower() in TRUE_STRINGS:
+            return True
+        if str(value).lower() in FALSE_STRINGS:
+            return False
+        raise ValueError(f"{value!r} is not a boolean")
+    
+    if pg_type.startswith('timestamp'):
+        if isinstance(value, datetime):
+            return value
+        return datetime.fromisoformat(str(value).replace('Z', '+00:00'))
+    
+    if pg_type == 'date':
+        if isinstance(value, datetime):
+            return value.date()
+        return date.fromisoformat(str(value)[:10])
+    
+    if pg_type.startswith('time'):
+        return time.fromisoformat(str(value))
+    
+    if pg_type in ('json', 'jsonb'):
+        if isinstance(value, str):
+            json.loads(value)
+            return value
+        return json.dumps(value)
+    
+    if pg_type == 'bytea':
+        raw = value if isinstance(value, bytes) else str(value).encode('utf-8')
+        return '\\x' + raw.hex()
+    
+    return value
+
 def convert_create_table_statement(sqlite_sql: str) -> str:
     """
     Convert SQLite CREATE TABLE statement to PostgreSQL syntax
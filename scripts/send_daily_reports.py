@@ -0,0 +1,49 @@
+#!/usr/bin/env python3
+"""
+Send the daily WhatsApp sales report to every company (cron entry point)
+Runs services/report_runner.py: reports render in a process pool and send in
+a thread pool, with per-stage timeouts and retries. Progress is kept in
+whatsapp_reports_log, so re-running for the same date only retries the
+companies that were not sent.
+
+Usage:
+    python scripts/send_daily_reports.py
+    python scripts/send_daily_reports.py --date 2026-10-17 --send-workers 16 --timeout 90
+"""
+
+import argparse
+import json
+import os
+import sys
+from datetime import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from services.report_runner import ReportJobRunner
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--date', help='Report date (YYYY-MM-DD), default today')
+    parser.add_argument('--render-workers', type=int, help='Render processes (REPORT_RENDER_WORKERS)')
+    parser.add_argument('--send-workers', type=int, help='Send threads (REPORT_SEND_WORKERS)')
+    parser.add_argument('--timeout', type=float, help='Seconds per stage per company (REPORT_TIMEOUT)')
+    parser.add_argument('--max-attempts', type=int, help='Tries per stage (REPORT_MAX_ATTEMPTS)')
+    args = parser.parse_args()
+
+    report_date = datetime.strptime(args.date, '%Y-%m-%d').date() if args.date else None
+    runner = ReportJobRunner(render_workers=args.render_workers, send_workers=args.send_workers,
+                             timeout=args.timeout, max_attempts=args.max_attempts)
+    result = runner.run(report_date)
+
+    print(f"📊 Daily reports {result['report_date']}: {result['successful_reports']} sent, "
+          f"{result['failed_reports']} failed, {result['skipped_reports']} already sent")
+    for r in result['results']:
+        if not r['success']:
+            print(f"❌ {r['company_name']} ({r['attempts']} attempts): {r['error']}")
+    print(json.dumps(result['summary'], indent=2))
+    sys.exit(1 if result['failed_reports'] else 0)
+
+
+if __name__ == '__main__':
+    main()
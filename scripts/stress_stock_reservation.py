@@ -0,0 +1,156 @@
+#!/usr/bin/env python3
+"""
+Stress test: concurrent bills for the same SKU
+Starts N threads that all sell one unit of a single product through
+BillingService.create_bill until the stock runs out, then checks that the
+product never oversold (final stock == initial - units billed, and >= 0) and
+reports the throughput.
+
+--legacy runs the old read-validate-then-decrement sequence instead, to show
+the race the conditional UPDATE closes.
+
+By default it runs against a throwaway copy of the local billing.db. With
+DATABASE_URL set it runs against that database, using a temporary product and
+business owner that are deleted afterwards.
+
+Usage:
+    python scripts/stress_stock_reservation.py --threads 16 --stock 500
+    python scripts/stress_stock_reservation.py --threads 16 --stock 500 --legacy
+"""
+
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import time
+import uuid
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import modules.shared.database as database
+from modules.shared.database import get_db_connection, generate_id
+
+
+def create_product(owner, stock):
+    product_id = f"stress-{uuid.uuid4().hex[:12]}"
+    conn = get_db_connection()
+    conn.execute("""INSERT INTO products (id, code, name, category, price, cost, stock, min_stock, unit, user_id, is_active)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)""",
+        (product_id, product_id, 'Stress Test SKU', 'General', 10.0, 5.0, stock, 0, 'piece', owner, True))
+    conn.commit()
+    conn.close()
+    return product_id
+
+
+def current_stock(product_id):
+    conn = get_db_connection()
+    row = conn.execute("SELECT stock FROM products WHERE id = ?", (product_id,)).fetchone()
+    conn.close()
+    return row['stock']
+
+
+def legacy_sell(product_id, owner):
+    """The pre-fix sequence: validate on a read, decrement later without a guard"""
+    conn = get_db_connection()
+    try:
+        stock = conn.execute("SELECT stock FROM products WHERE id = ?", (product_id,)).fetchone()['stock']
+        if stock < 1:
+            return False
+        time.sleep(0)  # yield, as the real code did between validation and update
+        conn.execute('BEGIN TRANSACTION')
+        conn.execute("""INSERT INTO bills (id, bill_number, business_owner_id, total_amount, status, created_at)
+            VALUES (?, ?, ?, ?, ?, CURRENT_TIMESTAMP)""", (generate_id(), f"STRESS-{uuid.uuid4().hex[:8]}", owner, 10.0, 'completed'))
+        conn.execute("UPDATE products SET stock = stock - ? WHERE id = ?", (1, product_id))
+        conn.commit()
+        return True
+    finally:
+        conn.close()
+
+
+def run(threads, product_id, owner, legacy):
+    from modules.billing.service import BillingService
+    service = BillingService()
+    item = {'product_id': product_id, 'product_name': 'Stress Test SKU',
+            'quantity': 1, 'unit_price': 10.0, 'total_price': 10.0}
+    counts = {'sold': 0, 'rejected': 0, 'errors': 0}
+    lock = threading.Lock()
+
+    def worker():
+        while True:
+            try:
+                if legacy:
+                    ok = legacy_sell(product_id, owner)
+                else:
+                    result = service.create_bill({
+                        'items': [item], 'business_owner_id': owner, 'customer_name': 'Stress Test',
+                        'payment_method': 'cash', 'subtotal': 10.0, 'total_amount': 10.0,
+                    })
+                    ok = result.get('success', False)
+            except Exception as e:
+                with lock:
+                    counts['errors'] += 1
+                print(f"⚠️ {e}")
+                continue
+            with lock:
+                counts['sold' if ok else 'rejected'] += 1
+            if not ok:
+                return
+
+    pool = [threading.Thread(target=worker) for _ in range(threads)]
+    started = time.perf_counter()
+    for thread in pool:
+        thread.start()
+    for thread in pool:
+        thread.join()
+    return counts, time.perf_counter() - started
+
+
+def cleanup(product_id, owner):
+    conn = get_db_connection()
+    for table, column in (('bill_items', 'product_id'), ('sales', 'product_id')):
+        conn.execute(f"DELETE FROM {table} WHERE {column} = ?", (product_id,))
+    conn.execute("DELETE FROM payments WHERE bill_id IN (SELECT id FROM bills WHERE business_owner_id = ?)", (owner,))
+    for table in ('bills', 'daily_sales_rollup', 'outbox_events'):
+        conn.execute(f"DELETE FROM {table} WHERE business_owner_id = ?", (owner,))
+    conn.execute("DELETE FROM products WHERE id = ?", (product_id,))
+    conn.commit()
+    conn.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--threads', type=int, default=16)
+    parser.add_argument('--stock', type=int, default=500)
+    parser.add_argument('--legacy', action='store_true', help='Run the old unguarded read-then-update sequence')
+    args = parser.parse_args()
+
+    if not database.get_database_url():
+        scratch = os.path.join(tempfile.mkdtemp(), 'stress.db')
+        shutil.copy(database.DB_PATH, scratch)
+        database.DB_PATH = scratch
+    print(f"📊 {database.get_db_type()} | {args.threads} threads | initial stock {args.stock} | "
+          f"{'legacy read-then-update' if args.legacy else 'conditional UPDATE ... RETURNING'}")
+    database.init_db()
+
+    owner = f"stress-owner-{uuid.uuid4().hex[:8]}"
+    product_id = create_product(owner, args.stock)
+    try:
+        counts, elapsed = run(args.threads, product_id, owner, args.legacy)
+        final = current_stock(product_id)
+    finally:
+        cleanup(product_id, owner)
+
+    attempts = counts['sold'] + counts['rejected']
+    print(f"sold: {counts['sold']}  rejected: {counts['rejected']}  errors: {counts['errors']}")
+    print(f"final stock: {final}  expected: {args.stock - counts['sold']}")
+    print(f"throughput: {attempts / elapsed:,.0f} bills/s ({elapsed:.2f}s)")
+
+    ok = final >= 0 and final == args.stock - counts['sold'] and counts['sold'] == args.stock
+    print("✅ No oversell" if ok else "❌ Stock is inconsistent (oversold or lost updates)")
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == '__main__':
+    main()
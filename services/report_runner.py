@@ -0,0 +1,337 @@
+"""
+Daily Report Job Runner
+Fans the daily WhatsApp report out across companies in parallel
+
+Rendering (WeasyPrint, CPU-bound) runs in a process pool; sending (blocking
+HTTP) runs in a bounded thread pool, so one slow upstream only holds one
+sender slot. Each stage of each company has its own timeout and is retried
+with exponential backoff up to max_attempts.
+
+Progress lives in whatsapp_reports_log, one row per company and report date
+(status pending -> rendered -> sent / failed / unknown, attempts, timings). A
+run skips companies already 'sent' for that date, so re-running after a crash
+or a partial failure resumes where it stopped.
+
+A send that is still running when it times out is not retried, since it may
+yet deliver: the row is left 'unknown' and becomes 'sent' if the late send
+succeeds; otherwise the next run sends it again.
+"""
+
+import logging
+import os
+import random
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, ThreadPoolExecutor, wait
+from datetime import date, datetime
+
+from modules.shared.database import bulk_insert, get_db_connection
+from .report_service import ReportService
+
+logger = logging.getLogger(__name__)
+
+REPORT_TYPE = 'daily_sales'
+
+_pdf_generator = None
+
+
+def _render(company_data, report_data, report_date):
+    """Process-pool entry point: render one report PDF, returns its path"""
+    global _pdf_generator
+    if _pdf_generator is None:
+        from .pdf_generator import PDFGenerator
+        _pdf_generator = PDFGenerator()
+    return _pdf_generator.generate_daily_sales_report(company_data, report_data, report_date)
+
+
+def percentiles(values, points=(50, 95, 99)):
+    """{'p50': ..., ...} in ms (nearest-rank) for a list of durations"""
+    if not values:
+        return {f'p{p}': None for p in points}
+    ordered = sorted(values)
+    return {f'p{p}': round(ordered[min(len(ordered) - 1, max(0, -(-p * len(ordered) // 100) - 1))], 1)
+            for p in points}
+
+
+class _Job:
+    __slots__ = ('company', 'log_id', 'report_data', 'stage', 'attempts', 'ready_at', 'started',
+                 'future', 'pdf_path', 'render_ms', 'send_ms', 'first_started', 'finished', 'error',
+                 'timeouts', 'whatsapp_result')
+
+    def __init__(self, company, log_id):
+        self.company = company
+        self.log_id = log_id
+        self.report_data = None
+        self.stage = 'render'
+        self.attempts = 0
+        self.ready_at = 0.0
+        self.started = None
+        self.future = None
+        self.pdf_path = None
+        self.render_ms = self.send_ms = None
+        self.first_started = None
+        self.finished = None
+        self.error = None
+        self.timeouts = 0
+        self.whatsapp_result = None
+
+
+class ReportJobRunner:
+    """Parallel, resumable daily report fan-out"""
+
+    def __init__(self, report_service=None, render_workers=None, send_workers=None, timeout=None,
+                 max_attempts=None, backoff=None):
+        self.report_service = report_service or ReportService()
+        self.render_workers = render_workers or int(os.environ.get('REPORT_RENDER_WORKERS') or os.cpu_count() or 2)
+        self.send_workers = send_workers or int(os.environ.get('REPORT_SEND_WORKERS', 8))
+        self.timeout = timeout or float(os.environ.get('REPORT_TIMEOUT', 60))
+        self.max_attempts = max_attempts or int(os.environ.get('REPORT_MAX_ATTEMPTS', 3))
+        self.backoff = backoff if backoff is not None else float(os.environ.get('REPORT_RETRY_BACKOFF', 5))
+
+    # ------------------------------------------------------------------
+    # Progress (whatsapp_reports_log)
+    # ------------------------------------------------------------------
+
+    def _load_progress(self, companies, report_date):
+        """{company_id: (log_id, status, attempts)}, creating 'pending' rows for companies without one"""
+        day = report_date.strftime('%Y-%m-%d')
+        conn = get_db_connection()
+        try:
+            rows = conn.execute('''
+                SELECT id, company_id, status, COALESCE(attempts, 0) as attempts FROM whatsapp_reports_log
+                WHERE report_date = ? AND report_type = ?
+                ORDER BY created_at
+            ''', (day, REPORT_TYPE)).fetchall()
+            progress = {}
+            for row in rows:
+                # A 'sent' row wins; otherwise the latest row carries the progress
+                current = progress.get(row['company_id'])
+                if current is None or current[1] != 'sent':
+                    progress[row['company_id']] = (row['id'], row['status'], row['attempts'])
+
+            now = datetime.now().isoformat()
+            missing = [c for c in companies if c['id'] not in progress]
+            new_rows = []
+            for company in missing:
+                log_id = self.report_service.generate_id()
+                progress[company['id']] = (log_id, 'pending', 0)
+                new_rows.append((log_id, company['id'], day, REPORT_TYPE, company.get('whatsapp_number'),
+                                 'pending', 0, now, now))
+            bulk_insert(conn, 'whatsapp_reports_log',
+                        ('id', 'company_id', 'report_date', 'report_type', 'whatsapp_number',
+                         'status', 'attempts', 'created_at', 'updated_at'), new_rows)
+            conn.commit()
+            return progress
+        finally:
+            conn.close()
+
+    def _save(self, job, status, **fields):
+        fields.update(status=status, attempts=job.attempts, updated_at=datetime.now().isoformat())
+        conn = get_db_connection()
+        try:
+            conn.execute(f"UPDATE whatsapp_reports_log SET {', '.join(f'{k} = ?' for k in fields)} WHERE id = ?",
+                         list(fields.values()) + [job.log_id])
+            conn.commit()
+        except Exception as e:
+            logger.error(f"Could not save report progress for {job.company['id']}: {e}")
+        finally:
+            conn.close()
+
+    # ------------------------------------------------------------------
+    # Stages
+    # ------------------------------------------------------------------
+
+    def _send(self, job):
+        return self.report_service.whatsapp_service.send_daily_report(job.company, job.report_data, job.pdf_path)
+
+    def _submit(self, job, render_pool, send_pool, report_date):
+        job.attempts += 1
+        job.started = time.monotonic()
+        job.first_started = job.first_started or job.started
+        if job.stage == 'render':
+            if job.report_data is None:
+                job.report_data = self.report_service.get_daily_sales_data(job.company['id'], report_date)
+            job.future = render_pool.submit(_render, job.company, job.report_data, report_date)
+        else:
+            job.future = send_pool.submit(self._send, job)
+
+    def _fail(self, job, error):
+        """Retry with backoff, or give up after max_attempts; returns True if the job is finished"""
+        job.error = error
+        if job.attempts < self.max_attempts:
+            delay = self.backoff * (2 ** (job.attempts - 1)) * random.uniform(0.8, 1.2)
+            job.ready_at = time.monotonic() + delay
+            job.future = None
+            logger.warning(f"Report {job.stage} for {job.company['business_name']} failed "
+                           f"(attempt {job.attempts}/{self.max_attempts}), retrying in {delay:.1f}s: {error}")
+            return False
+        self._save(job, 'failed', error_message=str(error)[:500], render_ms=job.render_ms, send_ms=job.send_ms)
+        self._cleanup(job)
+        job.finished = time.monotonic()
+        logger.error(f"❌ Failed to send report to {job.company['business_name']}: {error}")
+        return True
+
+    def _complete(self, job):
+        """Handle a finished future; returns True if the job is finished"""
+        elapsed = (time.monotonic() - job.started) * 1000
+        try:
+            result = job.future.result()
+        except Exception as e:
+            return self._fail(job, f"{job.stage} error: {e}")
+
+        if job.stage == 'render':
+            job.render_ms, job.pdf_path = elapsed, result
+            job.stage, job.ready_at, job.future = 'send', 0.0, None
+            # Sending gets its own attempts
+            job.attempts = 0
+            self._save(job, 'rendered', pdf_filename=os.path.basename(result), render_ms=round(elapsed, 1),
+                       total_sales=job.report_data['total_sales'], total_profit=job.report_data['total_profit'],
+                       total_invoices=job.report_data['total_invoices'])
+            return False
+
+        job.send_ms = elapsed
+        if not result.get('success'):
+            return self._fail(job, result.get('error') or 'send failed')
+        self._record_sent(job, result, elapsed)
+        self._cleanup(job)
+        job.error, job.finished = None, time.monotonic()
+        logger.info(f"✅ Report sent to {job.company['business_name']}")
+        return True
+
+    def _record_sent(self, job, result, elapsed):
+        job.whatsapp_result = result
+        self._save(job, 'sent', whatsapp_number=result.get('whatsapp_number'), pdf_filename=result.get('filename'),
+                   media_id=result.get('media_id'), message_id=result.get('message_id'), error_message=None,
+                   send_ms=round(elapsed, 1), sent_at=datetime.now().isoformat())
+
+    def _send_timed_out(self, job):
+        """
+        The send is already running and may still deliver, so it is not retried
+        (that could send the report twice). Returns True: the job is finished.
+        """
+        job.error = f"send timed out after {self.timeout:.0f}s, delivery unknown"
+        self._save(job, 'unknown', error_message=job.error, render_ms=job.render_ms)
+        job.future.add_done_callback(lambda future: self._late_send(job, future))
+        job.finished = time.monotonic()
+        logger.error(f"❌ Report send to {job.company['business_name']} timed out; not retried")
+        return True
+
+    def _late_send(self, job, future):
+        """Done-callback of a timed-out send: record it if it did deliver after all"""
+        try:
+            result = None if future.cancelled() or future.exception() else future.result()
+            if result and result.get('success'):
+                self._record_sent(job, result, (time.monotonic() - job.started) * 1000)
+                logger.info(f"✅ Late send to {job.company['business_name']} succeeded")
+        finally:
+            self._cleanup(job)
+
+    def _cleanup(self, job):
+        if job.pdf_path:
+            try:
+                self.report_service.pdf_generator.cleanup_temp_files(job.pdf_path)
+            except Exception as e:
+                logger.warning(f"Could not clean up PDF file: {e}")
+
+    def _render_pool(self):
+        try:
+            return ProcessPoolExecutor(max_workers=self.render_workers)
+        except (OSError, NotImplementedError) as e:
+            logger.warning(f"Process pool unavailable ({e}); rendering in threads")
+            return ThreadPoolExecutor(max_workers=self.render_workers, thread_name_prefix='report-render')
+
+    # ------------------------------------------------------------------
+    # Run
+    # ------------------------------------------------------------------
+
+    def run(self, report_date=None):
+        """Render and send every pending report for `report_date`; returns results and a summary"""
+        report_date = report_date or date.today()
+        started = time.monotonic()
+        companies = self.report_service.get_companies_for_reports()
+        progress = self._load_progress(companies, report_date)
+
+        jobs, skipped = [], []
+        for company in companies:
+            log_id, status, _ = progress[company['id']]
+            if status == 'sent':
+                skipped.append(company)
+            else:
+                jobs.append(_Job(company, log_id))
+        logger.info(f"Starting daily reports for {len(jobs)} companies - {report_date} "
+                    f"({len(skipped)} already sent, {self.render_workers} renderers, {self.send_workers} senders)")
+
+        active = list(jobs)
+        render_pool = self._render_pool()
+        send_pool = ThreadPoolExecutor(max_workers=self.send_workers, thread_name_prefix='report-send')
+        try:
+            while active:
+                now = time.monotonic()
+                still_active = []
+                for job in active:
+                    finished = False
+                    if job.future is None:
+                        if now >= job.ready_at:
+                            try:
+                                self._submit(job, render_pool, send_pool, report_date)
+                            except Exception as e:
+                                finished = self._fail(job, f"{job.stage} error: {e}")
+                    elif job.future.done():
+                        finished = self._complete(job)
+                    elif now - job.started > self.timeout:
+                        job.timeouts += 1
+                        # cancel() only stops a job that has not started yet
+                        cancelled = job.future.cancel()
+                        if job.stage == 'send' and not cancelled:
+                            finished = self._send_timed_out(job)
+                        else:
+                            # A running render keeps going, but its result is ignored
+                            finished = self._fail(job, f"{job.stage} timed out after {self.timeout:.0f}s")
+                    if not finished:
+                        still_active.append(job)
+                active = still_active
+
+                running = [job.future for job in active if job.future is not None]
+                if running:
+                    wait(running, timeout=0.25, return_when=FIRST_COMPLETED)
+                elif active:
+                    time.sleep(min(0.25, max(0.0, min(job.ready_at for job in active) - time.monotonic())))
+        finally:
+            render_pool.shutdown(wait=False, cancel_futures=True)
+            send_pool.shutdown(wait=False, cancel_futures=True)
+
+        elapsed = time.monotonic() - started
+        results = [{
+            'company_id': job.company['id'],
+            'company_name': job.company['business_name'],
+            'success': job.error is None,
+            'error': job.error,
+            'attempts': job.attempts,
+            'total_sales': (job.report_data or {}).get('total_sales', 0),
+            'total_profit': (job.report_data or {}).get('total_profit', 0),
+            'total_invoices': (job.report_data or {}).get('total_invoices', 0),
+        } for job in jobs]
+        successful = sum(1 for r in results if r['success'])
+        summary = {
+            'elapsed_seconds': round(elapsed, 2),
+            'throughput_per_minute': round(len(jobs) / elapsed * 60, 1) if elapsed and jobs else 0,
+            'skipped_already_sent': len(skipped),
+            'timeouts': sum(job.timeouts for job in jobs),
+            'render_ms': percentiles([job.render_ms for job in jobs if job.render_ms is not None]),
+            'send_ms': percentiles([job.send_ms for job in jobs if job.send_ms is not None]),
+            'end_to_end_ms': percentiles([(job.finished - job.first_started) * 1000 for job in jobs
+                                          if job.finished and job.first_started]),
+        }
+        logger.info(f"Daily reports completed: {successful} successful, {len(results) - successful} failed, "
+                    f"{len(skipped)} skipped in {elapsed:.1f}s | render p95 {summary['render_ms']['p95']}ms, "
+                    f"send p95 {summary['send_ms']['p95']}ms")
+
+        return {
+            'success': True,
+            'report_date': report_date.strftime('%Y-%m-%d'),
+            'total_companies': len(companies),
+            'successful_reports': successful,
+            'failed_reports': len(results) - successful,
+            'skipped_reports': len(skipped),
+            'results': results,
+            'summary': summary,
+        }
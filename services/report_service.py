@@ -26,10 +26,8 @@ class ReportService:
         self.whatsapp_service = WhatsAppService()
     
     def get_db_connection(self):
-        """Get database connection"""
-        conn = sqlite3.connect(self.db_path)
-        conn.row_factory = sqlite3.Row
-        return conn
+        """Get database connection (shared pool; SQLite or PostgreSQL)"""
+        return get_db_connection()
     
     def generate_id(self):
         """Generate unique ID"""
@@ -290,64 +288,18 @@ class ReportService:
         """
         Send daily reports to all companies that have it enabled
         
+        Companies are rendered and sent in parallel by ReportJobRunner (process
+        pool for PDFs, bounded thread pool for WhatsApp), with per-company
+        timeouts and retries; a re-run resumes from whatsapp_reports_log.
+        
         Args:
             report_date (date, optional): Date for reports. Defaults to today.
             
         Returns:
-            dict: Summary of all sent reports
+            dict: Summary of all sent reports, with throughput and latency percentiles
         """
-        if report_date is None:
-            report_date = date.today()
-        
-        companies = self.get_companies_for_reports()
-        results = []
-        
-        logger.info(f"Starting daily reports for {len(companies)} companies - {report_date}")
-        
-        for company in companies:
-            try:
-                result = self.send_daily_report_whatsapp(company['id'], report_date)
-                results.append({
-                    'company_id': company['id'],
-                    'company_name': company['business_name'],
-                    'success': result['success'],
-                    'error': result.get('error'),
-                    'total_sales': result.get('report_data', {}).get('total_sales', 0),
-                    'total_profit': result.get('report_data', {}).get('total_profit', 0),
-                    'total_invoices': result.get('report_data', {}).get('total_invoices', 0)
-                })
-                
-                if result['success']:
-                    logger.info(f"✅ Report sent to {company['business_name']}")
-                else:
-                    logger.error(f"❌ Failed to send report to {company['business_name']}: {result.get('error')}")
-                    
-            except Exception as e:
-                logger.error(f"❌ Error processing {company['business_name']}: {str(e)}")
-                results.append({
-                    'company_id': company['id'],
-                    'company_name': company['business_name'],
-                    'success': False,
-                    'error': str(e),
-                    'total_sales': 0,
-                    'total_profit': 0,
-                    'total_invoices': 0
-                })
-        
-        # Summary
-        successful = len([r for r in results if r['success']])
-        failed = len(results) - successful
-        
-        logger.info(f"Daily reports completed: {successful} successful, {failed} failed")
-        
-        return {
-            'success': True,
-            'report_date': report_date.strftime('%Y-%m-%d'),
-            'total_companies': len(companies),
-            'successful_reports': successful,
-            'failed_reports': failed,
-            'results': results
-        }
+        from .report_runner import ReportJobRunner
+        return ReportJobRunner(report_service=self).run(report_date)
     
     def get_report_logs(self, company_id=None, days=7):
         """